@@ -1,13 +1,19 @@
+import copy
 import os
-import firebase_admin
-from firebase_admin import credentials, db
+import threading
+import time
+from datetime import datetime
 
 _app = None
 
+# firebase_admin (and google-auth beneath it) is imported on first use so
+# processes that never touch Firebase don't pay for it at boot.
 def init_firebase():
     global _app
     if _app is not None:
         return _app
+    import firebase_admin
+    from firebase_admin import credentials
     cred_path = os.environ.get("FIREBASE_CREDENTIALS")
     db_url = os.environ.get("FIREBASE_DB_URL")
     if not cred_path or not db_url:
@@ -18,6 +24,331 @@ def init_firebase():
 
 def rtdb():
     init_firebase()
+    from firebase_admin import db
     return db
 
 
+# ───────────────────────────────────────────────────────────────
+#  In-process mirror of hot RTDB paths
+# ───────────────────────────────────────────────────────────────
+# Opt-in with FIREBASE_MIRROR=1. Each worker keeps a copy of the subscribed
+# paths, patched from streaming listener events. Reads are served from memory
+# as long as the copy was confirmed within FIREBASE_MIRROR_MAX_STALENESS
+# seconds (an event arrived or a resync ran); otherwise the path is re-read
+# directly, so a stalled stream can never serve data older than that bound.
+# Paths outside the subscribed roots always go straight to RTDB.
+
+HOT_PATHS = (
+    "/configurations/layout",   # includes /configurations/layout/occupied
+    "/pwdRequests",
+    "/incidents",
+)
+
+
+def _norm(path):
+    return "/" + "/".join(p for p in str(path or "").split("/") if p)
+
+
+def _split(path):
+    return [p for p in str(path or "").split("/") if p]
+
+
+def _child(node, key):
+    if isinstance(node, dict):
+        return node.get(key)
+    if isinstance(node, list) and key.isdigit() and int(key) < len(node):
+        return node[int(key)]
+    return None
+
+
+def _set_child(node, key, value):
+    """Set node[key] = value, returning the (possibly replaced) container."""
+    if isinstance(node, list) and key.isdigit():
+        idx = int(key)
+        if idx < len(node):
+            node[idx] = value
+            return node
+        if idx == len(node) and value is not None:
+            node.append(value)
+            return node
+        node = {str(i): v for i, v in enumerate(node) if v is not None}
+    if not isinstance(node, dict):
+        node = {}
+    if value is None:
+        node.pop(key, None)
+    else:
+        node[key] = value
+    return node
+
+
+def _put(tree, parts, value):
+    """Return tree with the value at parts replaced (None deletes)."""
+    if not parts:
+        return value
+    head, rest = parts[0], parts[1:]
+    return _set_child(tree, head, _put(_child(tree, head), rest, value))
+
+
+class _MirroredPath:
+    def __init__(self, path):
+        self.path = path
+        self.data = None
+        self.primed = False
+        self.synced_at = 0.0
+        self.registration = None
+
+
+class Mirror:
+    """Per-process cache of RTDB subtrees kept current by listener events."""
+
+    def __init__(self, max_staleness=None):
+        if max_staleness is None:
+            max_staleness = float(os.environ.get("FIREBASE_MIRROR_MAX_STALENESS", "30") or 30)
+        self.max_staleness = max_staleness
+        self._paths = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, *paths):
+        for path in paths:
+            path = _norm(path)
+            with self._lock:
+                if path in self._paths:
+                    continue
+                entry = self._paths[path] = _MirroredPath(path)
+            try:
+                entry.registration = rtdb().reference(path).listen(
+                    lambda event, entry=entry: self._on_event(entry, event)
+                )
+            except Exception:
+                # Leave the entry unprimed; reads fall back to direct gets
+                entry.registration = None
+
+    def close(self):
+        with self._lock:
+            entries = list(self._paths.values())
+            self._paths.clear()
+        for entry in entries:
+            try:
+                if entry.registration is not None:
+                    entry.registration.close()
+            except Exception:
+                pass
+
+    def _on_event(self, entry, event):
+        parts = _split(getattr(event, "path", "/"))
+        data = getattr(event, "data", None)
+        with self._lock:
+            if getattr(event, "event_type", "put") == "patch" and isinstance(data, dict):
+                for key, value in data.items():
+                    entry.data = _put(entry.data, parts + _split(key), value)
+            else:
+                entry.data = _put(entry.data, parts, data)
+            entry.primed = True
+            entry.synced_at = time.monotonic()
+
+    def _root_for(self, path):
+        for root, entry in self._paths.items():
+            if path == root or path.startswith(root + "/"):
+                return entry
+        return None
+
+    def _resync(self, entry):
+        data = rtdb().reference(entry.path).get()
+        with self._lock:
+            entry.data = data
+            entry.primed = True
+            entry.synced_at = time.monotonic()
+
+    def get(self, path):
+        """Return a private copy of the value at path."""
+        path = _norm(path)
+        with self._lock:
+            entry = self._root_for(path)
+        if entry is None:
+            return rtdb().reference(path).get()
+        if not entry.primed or time.monotonic() - entry.synced_at > self.max_staleness:
+            self._resync(entry)
+        with self._lock:
+            node = entry.data
+            for key in _split(path[len(entry.path):]):
+                node = _child(node, key)
+                if node is None:
+                    break
+            return copy.deepcopy(node)
+
+
+_mirror = None
+_mirror_lock = threading.Lock()
+
+
+def mirror_enabled():
+    return os.environ.get("FIREBASE_MIRROR", "0") == "1"
+
+
+def mirror():
+    """Return this worker's Mirror (created on first use)."""
+    global _mirror
+    with _mirror_lock:
+        if _mirror is None:
+            _mirror = Mirror()
+        return _mirror
+
+
+def subscribe(*paths):
+    """Start mirroring paths (default HOT_PATHS) when FIREBASE_MIRROR=1."""
+    if mirror_enabled():
+        mirror().subscribe(*(paths or HOT_PATHS))
+
+
+def read(path):
+    """Read path from the mirror when it is subscribed, else directly from RTDB."""
+    if mirror_enabled():
+        return mirror().get(path)
+    return rtdb().reference(_norm(path)).get()
+
+
+# ───────────────────────────────────────────────────────────────
+#  Indexed range queries
+# ───────────────────────────────────────────────────────────────
+# Bounded orderByChild queries, so RTDB only sends the records inside the
+# window. Every child queried this way needs an ".indexOn" entry (see
+# database.indexes.json, merged into the project's rules); without one the
+# server falls back to sending the whole path and filtering on the client.
+
+def _bound(value):
+    """datetimes become epoch milliseconds, matching how timeIn/timeOut are stored."""
+    if isinstance(value, datetime):
+        return int(value.timestamp() * 1000)
+    return value
+
+
+def query_range(path, child, start=None, end=None, limit=None):
+    """Return {key: record} for children of path whose child is in [start, end].
+
+    Both bounds are inclusive and optional. ``limit`` keeps the first N in
+    child order. Numbers sort before strings in RTDB, so a numeric window
+    never picks up records with legacy string timestamps.
+    """
+    query = rtdb().reference(_norm(path)).order_by_child(child)
+    if start is not None:
+        query = query.start_at(_bound(start))
+    if end is not None:
+        query = query.end_at(_bound(end))
+    if limit:
+        query = query.limit_to_first(int(limit))
+    snapshot = query.get() or {}
+    return dict(snapshot) if isinstance(snapshot, dict) else {}
+
+
+def _order(value):
+    # RTDB child order: null, false, true, numbers, strings, objects
+    if value is None:
+        return (0, 0)
+    if isinstance(value, bool):
+        return (1, int(value))
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, str):
+        return (3, value)
+    return (4, 0)
+
+
+def query_pages(path, child, start=None, end=None, batch_size=500):
+    """Yield [(key, record)] pages of query_range(path, child, start, end) in child order.
+
+    Each page starts at the last child value of the one before; records
+    already returned with that value are skipped. A run of equal values
+    longer than a page grows the page until it gets past them.
+    """
+    seen, limit = set(), batch_size
+    while True:
+        page = query_range(path, child, start, end, limit)
+        fresh = [(str(k), v) for k, v in page.items() if str(k) not in seen and isinstance(v, dict)]
+        if not fresh:
+            if len(page) < limit:
+                return
+            limit *= 2
+            continue
+        fresh.sort(key=lambda kv: (_order(kv[1].get(child)), kv[0]))
+        last = fresh[-1][1].get(child)
+        seen = {k for k, v in fresh if v.get(child) == last} | (seen if start == last else set())
+        full = len(page) >= limit
+        start, limit = last, batch_size
+        yield fresh
+        if not full:
+            return
+
+
+def transactions_between(start=None, end=None, field="timeIn"):
+    """Transactions whose numeric timeIn (or timeOut) falls in [start, end)."""
+    if end is not None:
+        end = _bound(end) - 1
+    txs = query_range("/transactions", field, start, end)
+    # An open-ended window also matches string timestamps, which sort last
+    return {k: v for k, v in txs.items() if isinstance(v, dict) and isinstance(v.get(field), (int, float))}
+
+
+# ───────────────────────────────────────────────────────────────
+#  Batched multi-location writes
+# ───────────────────────────────────────────────────────────────
+# Collects writes across paths and sends them as one root-level update():
+# one HTTPS round trip, applied atomically (all paths or none).
+#
+#     with WriteBatch() as batch:
+#         batch.update(f"/pwdRequests/{uid}", {"status": "approved"})
+#         batch.set(f"/banned/users/{uid}", payload)
+#         batch.delete(f"/users/{uid}")
+#
+# RTDB rejects an update whose paths overlap, so a write below a path that
+# is already being set is folded into that value, and a write above an
+# existing one is refused.
+
+class WriteBatch:
+    def __init__(self):
+        self.updates = {}
+
+    def __len__(self):
+        return len(self.updates)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.commit()
+        return False
+
+    def _put(self, path, value):
+        path = _norm(path)
+        if path == "/":
+            raise ValueError("WriteBatch cannot write the database root")
+        for existing in list(self.updates):
+            if existing == path:
+                break
+            if path.startswith(existing + "/"):
+                rest = _split(path[len(existing):])
+                self.updates[existing] = _put(self.updates[existing], rest, copy.deepcopy(value))
+                return self
+            if existing.startswith(path + "/"):
+                raise ValueError(f"WriteBatch: {path} overlaps pending write to {existing}")
+        self.updates[path] = copy.deepcopy(value)
+        return self
+
+    def set(self, path, value):
+        return self._put(path, value)
+
+    def update(self, path, fields):
+        for key, value in (fields or {}).items():
+            self._put(f"{_norm(path)}/{key}", value)
+        return self
+
+    def delete(self, path):
+        return self._put(path, None)
+
+    def commit(self):
+        """Send every pending write in one update; returns the number of paths."""
+        if not self.updates:
+            return 0
+        updates, self.updates = self.updates, {}
+        rtdb().reference("/").update({path.lstrip("/"): value for path, value in updates.items()})
+        return len(updates)
@@ -0,0 +1,183 @@
+"""Shared outbound HTTP layer: per-host keep-alive pools, deadlines, hedging.
+
+    from core.outbound import client, Deadline, hedged
+
+    deadline = Deadline(8)                      # whole stage, not per attempt
+    res = client().get(url, deadline=deadline, timeout=5)
+
+Every request records its latency against the host so ``client().budget(url)``
+can hand out a percentile-based hedge delay and ``client().stats()`` can be
+surfaced for tuning.
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from urllib.parse import urlsplit
+
+
+class DeadlineExceeded(Exception):
+    pass
+
+
+class Deadline:
+    """Wall-clock budget shared by all attempts of one pipeline stage."""
+
+    def __init__(self, seconds):
+        self.expires = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires - time.monotonic())
+
+    def timeout(self, cap=None):
+        """Per-call timeout: what's left of the deadline, optionally capped."""
+        left = self.remaining()
+        if left <= 0:
+            raise DeadlineExceeded("stage deadline exceeded")
+        return min(left, cap) if cap else left
+
+
+class HostStats:
+    def __init__(self, window=512):
+        self.latencies = deque(maxlen=window)
+        self.requests = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, ok):
+        with self._lock:
+            self.requests += 1
+            if ok:
+                self.latencies.append(seconds)
+            else:
+                self.errors += 1
+
+    def percentile(self, pct):
+        with self._lock:
+            values = sorted(self.latencies)
+        if not values:
+            return None
+        return values[min(len(values) - 1, int(len(values) * pct / 100.0))]
+
+    def snapshot(self):
+        p = {f"p{n}": self.percentile(n) for n in (50, 90, 99)}
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'samples': len(self.latencies),
+            **{k: round(v * 1000.0, 1) if v is not None else None for k, v in p.items()},
+        }
+
+
+def _host(url):
+    parts = urlsplit(url)
+    return f"{parts.scheme}://{parts.netloc}"
+
+
+class Client:
+    """One keep-alive requests.Session per host, with latency bookkeeping."""
+
+    def __init__(self, pool_size=None):
+        self.pool_size = pool_size or int(os.environ.get("OUTBOUND_POOL_SIZE", "8") or 8)
+        self._sessions = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def session(self, url):
+        host = _host(url)
+        with self._lock:
+            sess = self._sessions.get(host)
+            if sess is None:
+                # requests is imported on first outbound call, not at boot
+                import requests
+                from requests.adapters import HTTPAdapter
+                sess = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                sess.mount(host, adapter)
+                self._sessions[host] = sess
+                self._stats[host] = HostStats()
+            return sess
+
+    def host_stats(self, url):
+        self.session(url)
+        return self._stats[_host(url)]
+
+    def request(self, method, url, deadline=None, timeout=None, **kwargs):
+        if deadline is not None:
+            timeout = deadline.timeout(timeout)
+        sess = self.session(url)
+        stats = self._stats[_host(url)]
+        started = time.monotonic()
+        try:
+            res = sess.request(method, url, timeout=timeout, **kwargs)
+        except Exception:
+            stats.record(time.monotonic() - started, ok=False)
+            raise
+        stats.record(time.monotonic() - started, ok=res.status_code < 500)
+        return res
+
+    def get(self, url, **kwargs):
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request('POST', url, **kwargs)
+
+    def budget(self, url, pct=90, default=2.0, floor=0.05):
+        """Hedge delay for url: the pct-th latency seen for its host."""
+        value = self.host_stats(url).percentile(pct)
+        return max(floor, value) if value is not None else default
+
+    def stats(self):
+        with self._lock:
+            items = list(self._stats.items())
+        return {host: s.snapshot() for host, s in items}
+
+
+_client = None
+_client_lock = threading.Lock()
+_hedge_pool = ThreadPoolExecutor(
+    max_workers=int(os.environ.get("OUTBOUND_HEDGE_WORKERS", "8") or 8),
+    thread_name_prefix="outbound-hedge",
+)
+
+
+def client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = Client()
+        return _client
+
+
+def hedged(calls, delay, accept=bool, deadline=None):
+    """Run calls as hedged alternatives and return the first accepted result.
+
+    ``calls[0]`` starts at once. The next call starts when ``delay`` seconds
+    pass without an accepted answer, or as soon as a running call finishes
+    with a rejected result or an error. Returns None if nothing is accepted
+    before the calls run out or the deadline passes. Losing calls are left to
+    finish in the background; their results are discarded.
+    """
+    pending = set()
+    queue = list(calls)
+    while queue or pending:
+        if queue:
+            pending.add(_hedge_pool.submit(queue.pop(0)))
+        timeout = delay if queue else None
+        if deadline is not None:
+            left = deadline.remaining()
+            if left <= 0:
+                return None
+            timeout = min(timeout, left) if timeout is not None else left
+        done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+        if not done and not queue:
+            return None  # deadline hit with no more alternatives
+        for fut in done:
+            try:
+                result = fut.result()
+            except Exception:
+                continue
+            if accept(result):
+                return result
+    return None
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import ParkingSlot, ParkingLog, PWDRequest, FeeConfig, Payment, Violation
+from .models import ParkingSlot, ParkingLog, PWDRequest, FeeConfig, Payment, Violation, SyncState, LayoutProvision
 
 @admin.register(ParkingSlot)
 class ParkingSlotAdmin(admin.ModelAdmin):
@@ -9,9 +9,9 @@ class ParkingSlotAdmin(admin.ModelAdmin):
 
 @admin.register(ParkingLog)
 class ParkingLogAdmin(admin.ModelAdmin):
-    list_display = ('user', 'slot', 'entry_time', 'exit_time', 'payment_status')
-    list_filter = ('payment_status',)
-    search_fields = ('user__username', 'slot__slot_id')
+    list_display = ('tx_id', 'uid', 'slot_name', 'vehicle_type', 'entry_time', 'exit_time', 'status', 'payment_status')
+    list_filter = ('payment_status', 'status', 'vehicle_type')
+    search_fields = ('tx_id', 'uid', 'plate_number', 'user__username', 'slot__slot_id')
 
 @admin.register(PWDRequest)
 class PWDRequestAdmin(admin.ModelAdmin):
@@ -25,11 +25,20 @@ class FeeConfigAdmin(admin.ModelAdmin):
 
 @admin.register(Payment)
 class PaymentAdmin(admin.ModelAdmin):
-    list_display = ('user', 'log', 'amount', 'method', 'status', 'timestamp')
+    list_display = ('tx_id', 'log', 'amount', 'method', 'status', 'paid_at')
     list_filter = ('method', 'status')
-    search_fields = ('user__username',)
+    search_fields = ('tx_id', 'reference_number', 'user__username')
 
 @admin.register(Violation)
 class ViolationAdmin(admin.ModelAdmin):
     list_display = ('user', 'slot', 'timestamp')
-    search_fields = ('user__username', 'slot__slot_id')
\ No newline at end of file
+    search_fields = ('user__username', 'slot__slot_id')
+
+@admin.register(SyncState)
+class SyncStateAdmin(admin.ModelAdmin):
+    list_display = ('name', 'watermark', 'updated_at')
+
+@admin.register(LayoutProvision)
+class LayoutProvisionAdmin(admin.ModelAdmin):
+    list_display = ('id', 'floors', 'car_slots', 'motor_slots', 'pwd_slots', 'status', 'written', 'total', 'created_at')
+    list_filter = ('status',)
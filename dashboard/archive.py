@@ -0,0 +1,486 @@
+"""Cold archive tier: old /transactions, /pastIncidents and /auditTrail on local disk.
+
+Records older than the retention window (ARCHIVE_RETENTION_DAYS, default
+180) are moved out of RTDB into one file per dataset and month (Asia/Manila,
+by the dataset's time field):
+
+    <ARCHIVE_DIR>/transactions/2025-01.cga
+    <ARCHIVE_DIR>/pastIncidents/2025-01.cga
+    <ARCHIVE_DIR>/auditTrail/2025-01.cga
+
+Files are append-only. Every archive run appends one segment per month it
+touched:
+
+    b"CGA1", u32 header length, u32 body length   (little-endian)
+    header   JSON {"rows", "minTime", "maxTime", "columns": [[name, type, offset, length], ...]}
+    body     one zlib-compressed blob per column
+
+Every segment has the columns ``key``, ``time`` (epoch ms) and ``record``
+(the full RTDB value as JSON), plus the dataset's own columns (DATASETS).
+Numeric columns are packed arrays (``i8`` int64, ``f8`` float64). String
+columns are JSON lists. A reader maps the file read-only with mmap, skips
+segments whose [minTime, maxTime] misses the query, and decompresses only
+the columns it asks for. A segment cut short by a crash is ignored by
+readers and cut off by the next append.
+
+Moving is copy-then-delete: segments are fsync'd before the RTDB deletes
+go out (WriteBatch chunks). If a run dies between the two, the next run
+archives the same records again. Readers keep the last copy of each key,
+and a key always lands in the same month file, so that is harmless.
+Transactions are archived only once they are no longer ONGOING. Their
+/rollups/applied markers go with them. Times may be epoch ms or ISO strings
+(the monitor and slot assignment write ISO ``timeIn``); RTDB sorts the two
+apart, so every scan covers a numeric window and a string window.
+
+Reads that may reach past the retention window go through the merge layer:
+
+    between(dataset, start, end)    {key: record}: archive plus hot RTDB, hot wins
+    transactions_between(...)       core.firebase.transactions_between over both tiers
+    every(dataset)                  full history (rollup and status-index rebuilds)
+    recent(dataset, before, limit)  newest-first page over both tiers
+"""
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from array import array
+from datetime import datetime, timezone
+
+from django.conf import settings
+
+from core.firebase import WriteBatch, query_pages, query_range, rtdb
+from .rollups import month_key, parse_time, tz_ph
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows
+    fcntl = None
+
+try:
+    import mmap
+except ImportError:  # pragma: no cover
+    mmap = None
+
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR") or os.path.join(settings.BASE_DIR, 'data', 'archive')
+RETENTION_DAYS = int(os.environ.get("ARCHIVE_RETENTION_DAYS", "180") or 180)
+BATCH_SIZE = int(os.environ.get("ARCHIVE_BATCH_SIZE", "1000") or 1000)
+DELETE_CHUNK = 500
+MIN_NUMBER = -(2 ** 53)             # below any epoch-ms time, above null and booleans
+ISO_MARGIN_MS = 14 * 3600000        # widest UTC offset an ISO string can carry
+LEVEL = 6
+
+MAGIC = b'CGA1'
+_PREFIX = struct.Struct('<4sII')
+
+
+class Dataset:
+    def __init__(self, path, time_field, columns, eligible=None, stage_drop=None):
+        self.path = path
+        self.time_field = time_field
+        self.columns = columns          # [(name, 'str' | 'i8' | 'f8')]
+        self.eligible = eligible or (lambda record: True)
+        self.stage_drop = stage_drop or (lambda batch, key: None)
+
+
+def _closed(record):
+    return str(record.get('status') or '').upper() != 'ONGOING'
+
+
+def _drop_rollup_markers(batch, key):
+    batch.delete(f"/rollups/applied/completions/{key}")
+    batch.delete(f"/rollups/applied/entries/{key}")
+
+
+DATASETS = {
+    'transactions': Dataset(
+        '/transactions', 'timeIn',
+        [('uid', 'str'), ('status', 'str'), ('vehicleType', 'str'), ('slot', 'str'),
+         ('plateNumber', 'str'), ('timeOut', 'i8'), ('amountPaid', 'f8')],
+        eligible=_closed, stage_drop=_drop_rollup_markers,
+    ),
+    'pastIncidents': Dataset(
+        '/pastIncidents', 'resolvedAt',
+        [('uid', 'str'), ('priority', 'str'), ('categoryTitle', 'str'), ('status', 'str')],
+    ),
+    'auditTrail': Dataset(
+        '/auditTrail', 'timestamp',
+        [('action', 'str'), ('targetUid', 'str'), ('performedBy', 'str')],
+    ),
+}
+
+
+def time_ms(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    dt = parse_time(value) if value else None
+    return int(dt.timestamp() * 1000) if dt else None
+
+
+def month_of(ms):
+    return month_key(datetime.fromtimestamp(ms / 1000.0, tz=timezone.utc).astimezone(tz_ph()))
+
+
+def _dataset(name):
+    if name not in DATASETS:
+        raise ValueError(f"dataset must be one of {', '.join(DATASETS)}")
+    return DATASETS[name]
+
+
+def _dir(dataset):
+    return os.path.join(ARCHIVE_DIR, dataset)
+
+
+# ── segment encoding ────────────────────────────────────────────
+
+def _number(value, kind):
+    if kind == 'i8':
+        ms = time_ms(value)
+        return ms if ms is not None else 0
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _encode_column(values, kind):
+    if kind == 'i8':
+        raw = array('q', values).tobytes()
+    elif kind == 'f8':
+        raw = array('d', values).tobytes()
+    else:
+        raw = json.dumps(values, separators=(',', ':'), default=str).encode('utf-8')
+    return zlib.compress(raw, LEVEL)
+
+
+def _decode_column(blob, kind):
+    raw = zlib.decompress(blob)
+    if kind in ('i8', 'f8'):
+        out = array('q' if kind == 'i8' else 'd')
+        out.frombytes(raw)
+        return out
+    return json.loads(raw.decode('utf-8'))
+
+
+def encode_segment(ds, rows):
+    """Bytes of one segment for rows [(key, time_ms, record)]."""
+    columns = [('key', 'str', [k for k, _, _ in rows]),
+               ('time', 'i8', [t for _, t, _ in rows]),
+               ('record', 'str', [json.dumps(r, separators=(',', ':'), default=str) for _, _, r in rows])]
+    for name, kind in ds.columns:
+        values = [r.get(name) for _, _, r in rows]
+        if kind == 'str':
+            values = [None if v is None else str(v) for v in values]
+        else:
+            values = [_number(v, kind) for v in values]
+        columns.append((name, kind, values))
+    blobs, specs, offset = [], [], 0
+    for name, kind, values in columns:
+        blob = _encode_column(values, kind)
+        specs.append([name, kind, offset, len(blob)])
+        blobs.append(blob)
+        offset += len(blob)
+    times = [t for _, t, _ in rows]
+    header = json.dumps({'rows': len(rows), 'minTime': min(times), 'maxTime': max(times), 'columns': specs},
+                        separators=(',', ':')).encode('utf-8')
+    return _PREFIX.pack(MAGIC, len(header), offset) + header + b''.join(blobs)
+
+
+def _segments(buf):
+    """[(header, body offset)] of the complete segments in buf, and where the last one ends."""
+    out, pos, size = [], 0, len(buf)
+    while pos + _PREFIX.size <= size:
+        magic, header_len, body_len = _PREFIX.unpack_from(buf, pos)
+        start = pos + _PREFIX.size
+        end = start + header_len + body_len
+        if magic != MAGIC or end > size:
+            break
+        try:
+            header = json.loads(bytes(buf[start:start + header_len]).decode('utf-8'))
+        except ValueError:
+            break
+        out.append((header, start + header_len))
+        pos = end
+    return out, pos
+
+
+# ── writing ─────────────────────────────────────────────────────
+
+def _valid_end(fh):
+    """Offset just past the last complete segment, reading only the segment prefixes."""
+    fh.seek(0, os.SEEK_END)
+    size = fh.tell()
+    pos = 0
+    while pos + _PREFIX.size <= size:
+        fh.seek(pos)
+        magic, header_len, body_len = _PREFIX.unpack(fh.read(_PREFIX.size))
+        end = pos + _PREFIX.size + header_len + body_len
+        if magic != MAGIC or end > size:
+            break
+        pos = end
+    return pos
+
+
+_write_lock = threading.Lock()
+
+
+def append(dataset, month, rows):
+    """Append rows [(key, time_ms, record)] as one segment to the month's file (fsync'd)."""
+    if not rows:
+        return 0
+    ds = _dataset(dataset)
+    os.makedirs(_dir(dataset), exist_ok=True)
+    path = os.path.join(_dir(dataset), f"{month}.cga")
+    segment = encode_segment(ds, rows)
+    with _write_lock, open(path, 'a+b') as fh:
+        if fcntl is not None:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            valid = _valid_end(fh)
+            fh.truncate(valid)
+            fh.seek(valid)
+            fh.write(segment)
+            fh.flush()
+            os.fsync(fh.fileno())
+        finally:
+            if fcntl is not None:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+    return len(rows)
+
+
+def _iso(ms):
+    return datetime.fromtimestamp(ms / 1000.0, tz=timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def _passes(cutoff):
+    """(start, end) child-value windows covering every time <= cutoff.
+
+    RTDB orders numbers before strings, so epoch-ms times and ISO-string
+    times (the app's and the monitor's format) need a window each. Strings
+    compare by their own wall clock, so the string window runs ISO_MARGIN_MS
+    past the cutoff and callers check the parsed time.
+    """
+    return ((MIN_NUMBER, cutoff), ('', _iso(cutoff + ISO_MARGIN_MS)))
+
+
+def _old_pages(ds, cutoff, batch_size):
+    """Yield pages of [(key, ms, record)] with time <= cutoff, in time-index order."""
+    for start, end in _passes(cutoff):
+        for page in query_pages(ds.path, ds.time_field, start, end, batch_size):
+            items = [(k, time_ms(v.get(ds.time_field)), v) for k, v in page]
+            yield [(k, ms, v) for k, ms, v in items if ms is not None and ms <= cutoff]
+
+
+def archive(dataset, retention_days=RETENTION_DAYS, batch_size=BATCH_SIZE, dry_run=False, now_ms=None, log=None):
+    """Move dataset records older than retention_days into the archive.
+
+    Pages through the dataset's time index up to the cutoff, batch_size at a
+    time, numeric times first and then ISO-string ones. Returns
+    {'archived', 'kept', 'months'}; kept counts old records that are not
+    eligible yet (e.g. ONGOING transactions).
+    """
+    ds = _dataset(dataset)
+    now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+    cutoff = now_ms - int(retention_days) * 86400000
+    counts = {'archived': 0, 'kept': 0, 'months': set()}
+    for items in _old_pages(ds, cutoff, batch_size):
+        if not items:
+            continue
+        last = max(ms for _, ms, _ in items)
+        by_month, moved = {}, []
+        for key, ms, record in items:
+            if not ds.eligible(record):
+                counts['kept'] += 1
+                continue
+            by_month.setdefault(month_of(ms), []).append((key, ms, record))
+            moved.append(key)
+        if moved and not dry_run:
+            for month, rows in sorted(by_month.items()):
+                append(dataset, month, rows)
+            for i in range(0, len(moved), DELETE_CHUNK):
+                batch = WriteBatch()
+                for key in moved[i:i + DELETE_CHUNK]:
+                    batch.delete(f"{ds.path}/{key}")
+                    ds.stage_drop(batch, key)
+                batch.commit()
+        counts['archived'] += len(moved)
+        counts['months'].update(by_month)
+        if log and moved:
+            log(f"{dataset}: {counts['archived']} archived through {month_of(last)}")
+    counts['months'] = sorted(counts['months'])
+    return counts
+
+
+# ── reading ─────────────────────────────────────────────────────
+
+class ArchiveFile:
+    """Read-only, memory-mapped view of one month file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self._fh = open(path, 'rb')
+        if mmap is not None and self.size:
+            self._buf = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        else:
+            self._buf = self._fh.read()
+        self.segments, _ = _segments(self._buf)
+
+    def close(self):
+        if mmap is not None and isinstance(self._buf, mmap.mmap):
+            self._buf.close()
+        self._fh.close()
+
+    def _column(self, header, body, name):
+        for col_name, kind, offset, length in header['columns']:
+            if col_name == name:
+                return _decode_column(memoryview(self._buf)[body + offset:body + offset + length], kind)
+        return None
+
+    def scan(self, start=None, end=None, columns=('record',)):
+        """Yield (key, time_ms, {column: value}) with start <= time <= end, oldest segment first."""
+        for header, body in self.segments:
+            if (start is not None and header['maxTime'] < start) or (end is not None and header['minTime'] > end):
+                continue
+            times = self._column(header, body, 'time')
+            keys = self._column(header, body, 'key')
+            cols = {name: self._column(header, body, name) for name in columns}
+            for i, ms in enumerate(times):
+                if (start is None or ms >= start) and (end is None or ms <= end):
+                    yield keys[i], ms, {name: (values[i] if values is not None else None) for name, values in cols.items()}
+
+
+_files = {}
+_files_lock = threading.Lock()
+
+
+def _open(path):
+    """Shared ArchiveFile for path, reopened when an append has grown it.
+
+    A replaced map is left to the garbage collector, since another thread
+    may still be scanning it.
+    """
+    size = os.path.getsize(path)
+    with _files_lock:
+        current = _files.get(path)
+        if current is None or current.size != size:
+            current = _files[path] = ArchiveFile(path)
+        return current
+
+
+def months(dataset):
+    try:
+        names = os.listdir(_dir(dataset))
+    except FileNotFoundError:
+        return []
+    return sorted(name[:-4] for name in names if name.endswith('.cga'))
+
+
+def _months_between(dataset, start, end):
+    lo = month_of(start) if start is not None else None
+    hi = month_of(end) if end is not None else None
+    return [m for m in months(dataset) if (lo is None or m >= lo) and (hi is None or m <= hi)]
+
+
+def archived(dataset, start=None, end=None):
+    """Yield (key, record) from the archive with start <= time <= end, a month at a time, oldest first."""
+    _dataset(dataset)
+    start, end = time_ms(start) if start is not None else None, time_ms(end) if end is not None else None
+    for month in _months_between(dataset, start, end):
+        latest = {}
+        for key, _, cols in _open(os.path.join(_dir(dataset), f"{month}.cga")).scan(start, end):
+            latest[key] = cols['record']
+        for key, raw in latest.items():
+            yield key, json.loads(raw)
+
+
+def _within(value, lo, hi):
+    ms = time_ms(value)
+    return ms is not None and (lo is None or ms >= lo) and (hi is None or ms <= hi)
+
+
+def between(dataset, start=None, end=None):
+    """{key: record} with start <= time <= end across both tiers; hot RTDB records win."""
+    ds = _dataset(dataset)
+    out = dict(archived(dataset, start, end))
+    lo, hi = time_ms(start) if start is not None else None, time_ms(end) if end is not None else None
+    hot = query_range(ds.path, ds.time_field, lo, hi)
+    if lo is not None or hi is not None:
+        # ISO-string times sort after every number and need their own window (see _passes)
+        hot.update(query_range(ds.path, ds.time_field,
+                               _iso(lo - ISO_MARGIN_MS) if lo is not None else '',
+                               _iso(hi + ISO_MARGIN_MS) if hi is not None else None))
+        hot = {k: v for k, v in hot.items() if isinstance(v, dict) and _within(v.get(ds.time_field), lo, hi)}
+    out.update({k: v for k, v in hot.items() if isinstance(v, dict)})
+    return out
+
+
+def transactions_between(start=None, end=None, field="timeIn"):
+    """core.firebase.transactions_between, plus archived transactions in the window."""
+    from core.firebase import _bound, transactions_between as hot_between
+
+    hot = hot_between(start, end, field)
+    if field != DATASETS['transactions'].time_field:
+        # Archive files are partitioned by timeIn; other fields need a full archive scan
+        lo, hi = _bound(start), (_bound(end) - 1 if end is not None else None)
+        old = {k: v for k, v in archived('transactions')
+               if isinstance(v.get(field), (int, float)) and (lo is None or v[field] >= lo) and (hi is None or v[field] <= hi)}
+    else:
+        old = dict(archived('transactions', _bound(start), _bound(end) - 1 if end is not None else None))
+    return {**old, **hot}
+
+
+def every(dataset):
+    """Every record of dataset, archived and hot: {key: record} (hot wins)."""
+    ds = _dataset(dataset)
+    out = dict(archived(dataset))
+    hot = rtdb().reference(ds.path).get() or {}
+    if isinstance(hot, dict):
+        out.update(hot)
+    return out
+
+
+def recent(dataset, before=None, limit=50):
+    """Newest-first page over both tiers: ([(key, record)], next 'before' cursor or None)."""
+    ds = _dataset(dataset)
+    limit = max(1, min(500, int(limit)))
+    end = int(before) - 1 if before else None
+    query = rtdb().reference(ds.path).order_by_child(ds.time_field)
+    if end is not None:
+        query = query.end_at(end)
+    hot = query.limit_to_last(limit + 1).get() or {}
+    rows = [(str(k), time_ms(v.get(ds.time_field)), v) for k, v in (hot.items() if isinstance(hot, dict) else [])
+            if isinstance(v, dict)]
+    rows = [r for r in rows if r[1] is not None]
+    if len(rows) <= limit:
+        # Hot data runs out inside this page; fill from archive months, newest first
+        taken = {k for k, _, _ in rows}
+        for month in reversed(_months_between(dataset, None, end)):
+            found = {}
+            for key, ms, cols in _open(os.path.join(_dir(dataset), f"{month}.cga")).scan(None, end):
+                if key not in taken:
+                    found[key] = (ms, cols['record'])
+            rows += [(k, ms, json.loads(raw)) for k, (ms, raw) in found.items()]
+            if len(rows) > limit:
+                break
+    rows.sort(key=lambda r: r[1], reverse=True)
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return [(k, v) for k, _, v in rows], (rows[-1][1] if more and rows else None)
+
+
+def stats():
+    """{dataset: {month: {'bytes', 'segments', 'rows'}}} for every archive file."""
+    out = {}
+    for dataset in DATASETS:
+        for month in months(dataset):
+            f = _open(os.path.join(_dir(dataset), f"{month}.cga"))
+            out.setdefault(dataset, {})[month] = {
+                'bytes': f.size,
+                'segments': len(f.segments),
+                'rows': sum(h['rows'] for h, _ in f.segments),
+            }
+    return out
@@ -0,0 +1,205 @@
+"""Cached matplotlib renders of the CSV-backed dashboard charts.
+
+A render is keyed on the chart name, the source CSV's mtime and size, and the
+render parameters (size, dpi, format). Hits are served from an in-process LRU
+first, then from a disk tier shared by all workers; only a miss in both draws
+a figure. The same key doubles as the HTTP ETag.
+
+A new CSV means new keys, so the disk tier is pruned after every write:
+files older than CHART_CACHE_MAX_AGE_HOURS go first, then the least
+recently used ones until the directory is under CHART_CACHE_MAX_BYTES. A
+disk hit touches its file's mtime to mark it as used.
+"""
+import csv
+import hashlib
+import io
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+
+DATA_DIR = os.path.join(settings.BASE_DIR, "data")
+CACHE_DIR = os.environ.get("CHART_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "cygo-chart-cache")
+CACHE_SIZE = int(os.environ.get("CHART_CACHE_SIZE", "32") or 32)
+CACHE_MAX_BYTES = int(os.environ.get("CHART_CACHE_MAX_BYTES", str(64 * 1024 * 1024)) or 64 * 1024 * 1024)
+CACHE_MAX_AGE_HOURS = float(os.environ.get("CHART_CACHE_MAX_AGE_HOURS", "168") or 168)
+
+FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+
+
+def _entries_chart(rows, fig, ax):
+    days = [row["Day"] for row in rows]
+    entries = [int(row["Entries"]) for row in rows]
+    ax.bar(days, entries, color="#e8b931")
+    ax.set_title("Weekly Parking Entries")
+    ax.set_ylabel("Entries")
+    ax.set_xlabel("Day")
+
+
+def _earnings_chart(rows, fig, ax):
+    months = [row["Month"] for row in rows]
+    earnings = [int(row["Earnings"]) for row in rows]
+    ax.plot(months, earnings, marker='o', color="#333")
+    ax.set_title("Monthly Earnings")
+    ax.set_ylabel("Earnings (₱)")
+    ax.set_xlabel("Month")
+    ax.grid(True)
+
+
+CHARTS = {
+    "entries": ("parking_entries.csv", _entries_chart),
+    "earnings": ("monthly_earnings.csv", _earnings_chart),
+}
+
+
+def params_from_request(request):
+    """Render parameters from the query string, clamped to sane values."""
+    def _num(name, default, lo, hi, cast=float):
+        try:
+            return min(hi, max(lo, cast(request.GET.get(name, default))))
+        except (TypeError, ValueError):
+            return default
+    fmt = (request.GET.get("format") or "png").lower()
+    return {
+        "width": _num("w", 10, 2, 30),     # inches, as before: figsize=(10, 6)
+        "height": _num("h", 6, 2, 20),
+        "dpi": _num("dpi", 100, 50, 300, int),
+        "format": fmt if fmt in FORMATS else "png",
+    }
+
+
+def source_path(name):
+    return os.path.join(DATA_DIR, CHARTS[name][0])
+
+
+def cache_key(name, params):
+    """Key for the current source file + params, or None if the CSV is missing."""
+    try:
+        st = os.stat(source_path(name))
+    except OSError:
+        return None
+    raw = f"{name}|{st.st_mtime_ns}|{st.st_size}|{params['width']}|{params['height']}|{params['dpi']}|{params['format']}"
+    return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+
+def source_mtime(name):
+    try:
+        return os.stat(source_path(name)).st_mtime
+    except OSError:
+        return None
+
+
+def _pyplot():
+    """Import pyplot on first render so workers that never draw skip its boot cost."""
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+
+def render(name, params):
+    """Draw the chart; returns image bytes."""
+    with open(source_path(name), newline="") as csvfile:
+        rows = list(csv.DictReader(csvfile))
+    plt = _pyplot()
+    fig, ax = plt.subplots(figsize=(params["width"], params["height"]))
+    try:
+        CHARTS[name][1](rows, fig, ax)
+        buffer = io.BytesIO()
+        fig.tight_layout()
+        fig.savefig(buffer, format=params["format"], dpi=params["dpi"])
+    finally:
+        plt.close(fig)
+    return buffer.getvalue()
+
+
+class RenderCache:
+    """Two-tier cache: in-memory LRU in front of a directory of rendered files."""
+
+    def __init__(self, size=CACHE_SIZE, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, max_age_hours=CACHE_MAX_AGE_HOURS):
+        self.size = size
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_hours = max_age_hours
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.disk_hits = self.misses = 0
+
+    def _path(self, key, fmt):
+        return os.path.join(self.directory, f"{key}.{fmt}")
+
+    def _remember(self, key, body):
+        with self._lock:
+            self._items[key] = body
+            self._items.move_to_end(key)
+            while len(self._items) > self.size:
+                self._items.popitem(last=False)
+
+    def get_or_render(self, name, params, key):
+        with self._lock:
+            body = self._items.get(key)
+            if body is not None:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return body
+        path = self._path(key, params["format"])
+        try:
+            with open(path, "rb") as fh:
+                body = fh.read()
+            self.disk_hits += 1
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+        except OSError:
+            body = render(name, params)
+            self.misses += 1
+            try:
+                os.makedirs(self.directory, exist_ok=True)
+                tmp = f"{path}.{os.getpid()}.tmp"
+                with open(tmp, "wb") as fh:
+                    fh.write(body)
+                os.replace(tmp, path)
+                self.prune()
+            except OSError:
+                pass  # disk tier is best-effort
+        self._remember(key, body)
+        return body
+
+    def prune(self):
+        """Drop expired files, then the least recently used until under max_bytes."""
+        cutoff = time.time() - self.max_age_hours * 3600
+        files = []
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                st = os.stat(path)
+                if st.st_mtime < cutoff:
+                    os.remove(path)
+                else:
+                    files.append((st.st_mtime, st.st_size, path))
+            except OSError:
+                pass
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+_cache = RenderCache()
+
+
+def cache():
+    return _cache
@@ -0,0 +1,255 @@
+"""Closing-time notification scheduler.
+
+gate.write_closing_info gives every entering user a closing deadline and
+60/30/15/5-minute thresholds under /users/<uid>/closingInfo. Along with that
+it writes a small schedule entry:
+
+    /closingSchedule/<uid>   {txId, deadline, pending: {"<minutes>": notifyAt}}
+
+ClosingScheduler keeps every pending threshold in a min-heap keyed on
+notifyAt. It sleeps until the earliest one is due, then flips everything
+due by then to ``status: 'due'`` and drops those pending entries. Each wake-up
+sends a single WriteBatch. Recovery on start is one indexed query on
+/closingSchedule (deadline >= now - RECOVERY_GRACE). After that a listener
+on the same node picks up new, replaced and cancelled entries, so the work
+scales with the number of thresholds rather than with users or open tabs.
+
+Before firing, each due user's profile is checked with a shallow read.
+Thresholds of deleted users are dropped rather than written, and bans and
+deletes cancel the schedule in the same update (``stage_cancel``).
+
+Run exactly one scheduler per database (``manage.py run_closing_scheduler``);
+a status flip is idempotent, so a brief overlap during a restart is harmless.
+"""
+import heapq
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from core.firebase import WriteBatch, _put, _split, query_range, rtdb
+
+ROOT = '/closingSchedule'
+THRESHOLDS = (60, 30, 15, 5)
+READ_CONCURRENCY = int(os.environ.get("CLOSING_READ_CONCURRENCY", "16") or 16)
+RECOVERY_GRACE_MS = int(float(os.environ.get("CLOSING_RECOVERY_GRACE_HOURS", "12") or 12) * 3600 * 1000)
+
+
+def schedule_entry(tx_id, deadline_ms, thresholds):
+    """The /closingSchedule/<uid> value for a closingInfo thresholds map."""
+    pending = {
+        key: t.get('notifyAt')
+        for key, t in (thresholds or {}).items()
+        if isinstance(t, dict) and t.get('status') == 'scheduled'
+    }
+    return {'txId': tx_id, 'deadline': deadline_ms, 'pending': pending}
+
+
+def stage_cancel(batch, uid):
+    """Drop uid's pending notifications (e.g. when its transaction completes)."""
+    if uid:
+        batch.delete(f'{ROOT}/{uid}')
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def _existing(uids):
+    """The uids in uids that still have a /users profile (shallow reads, READ_CONCURRENCY at a time)."""
+    uids = sorted(uids)
+    if not uids:
+        return set()
+    db = rtdb()
+    with ThreadPoolExecutor(max_workers=min(READ_CONCURRENCY, len(uids))) as pool:
+        found = pool.map(lambda uid: db.reference(f'/users/{uid}').get(shallow=True), uids)
+        return {uid for uid, value in zip(uids, found) if value is not None}
+
+
+def _pending(entry):
+    """entry['pending'] as a dict (RTDB may hand sparse numeric keys back as a list)."""
+    pending = entry.get('pending') if isinstance(entry, dict) else None
+    if isinstance(pending, list):
+        pending = {str(i): v for i, v in enumerate(pending) if v is not None}
+        entry['pending'] = pending
+    return pending if isinstance(pending, dict) else {}
+
+
+class ClosingScheduler:
+    def __init__(self):
+        self._heap = []          # (notifyAt, uid, minutes, txId)
+        self._entries = {}       # uid -> schedule entry (local copy of /closingSchedule)
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._listener = None
+        self.fired = 0
+        self.batches = 0
+        self.max_lag_ms = 0
+
+    # -- loading -------------------------------------------------------------
+
+    def _push_entry(self, uid):
+        entry = self._entries.get(uid)
+        if not isinstance(entry, dict):
+            return
+        for minutes, at in _pending(entry).items():
+            if isinstance(at, (int, float)):
+                heapq.heappush(self._heap, (int(at), uid, str(minutes), entry.get('txId')))
+
+    def load(self, entries):
+        """Replace all entries (recovery, or a full listener snapshot)."""
+        cutoff = _now_ms() - RECOVERY_GRACE_MS
+        with self._cond:
+            self._entries = {
+                uid: e for uid, e in (entries or {}).items()
+                if isinstance(e, dict) and (e.get('deadline') or 0) >= cutoff
+            }
+            self._heap = []
+            for uid in self._entries:
+                self._push_entry(uid)
+            self._cond.notify()
+
+    def recover(self):
+        entries = query_range(ROOT, 'deadline', start=_now_ms() - RECOVERY_GRACE_MS)
+        self.load(entries)
+        return len(self._heap)
+
+    def _on_event(self, event):
+        parts = _split(getattr(event, 'path', '/'))
+        data = getattr(event, 'data', None)
+        if not parts and getattr(event, 'event_type', 'put') == 'put':
+            self.load(data if isinstance(data, dict) else {})
+            return
+        changes = (
+            [(parts + _split(k), v) for k, v in data.items()]
+            if getattr(event, 'event_type', 'put') == 'patch' and isinstance(data, dict)
+            else [(parts, data)]
+        )
+        with self._cond:
+            touched = set()
+            for path, value in changes:
+                if not path:
+                    continue
+                self._entries = _put(self._entries, path, value) or {}
+                touched.add(path[0])
+            for uid in touched:
+                # Stale heap items for uid are skipped when popped
+                self._push_entry(uid)
+            self._cond.notify()
+
+    # -- firing --------------------------------------------------------------
+
+    def _is_current(self, uid, minutes, at, tx_id):
+        entry = self._entries.get(uid)
+        if not isinstance(entry, dict) or entry.get('txId') != tx_id:
+            return False
+        return _pending(entry).get(minutes) == at
+
+    def _pop_due(self, now_ms):
+        due = []
+        while self._heap and self._heap[0][0] <= now_ms:
+            at, uid, minutes, tx_id = heapq.heappop(self._heap)
+            if self._is_current(uid, minutes, at, tx_id):
+                due.append((at, uid, minutes, tx_id))
+                _pending(self._entries[uid]).pop(minutes, None)
+        return due
+
+    def fire(self, due, now_ms):
+        """Flip due thresholds in one batched write.
+
+        Users whose profile is gone (deleted or banned since scheduling) get
+        their schedule dropped instead, so the write can't recreate a stub
+        /users/<uid> node.
+        """
+        if not due:
+            return 0
+        live = _existing({uid for _, uid, _, _ in due})
+        batch = WriteBatch()
+        by_uid, gone = {}, set()
+        for at, uid, minutes, _ in due:
+            if uid not in live:
+                gone.add(uid)
+                continue
+            by_uid.setdefault(uid, []).append(minutes)
+            batch.update(f'/users/{uid}/closingInfo/thresholds/{minutes}', {'status': 'due', 'firedAt': now_ms})
+        for uid in gone:
+            batch.delete(f'{ROOT}/{uid}')
+        with self._cond:
+            for uid in gone:
+                self._entries.pop(uid, None)
+            for uid, minutes_list in by_uid.items():
+                if not _pending(self._entries.get(uid)):
+                    batch.delete(f'{ROOT}/{uid}')
+                else:
+                    for minutes in minutes_list:
+                        batch.delete(f'{ROOT}/{uid}/pending/{minutes}')
+        batch.commit()
+        with self._cond:
+            for uid in by_uid:
+                if not _pending(self._entries.get(uid)):
+                    self._entries.pop(uid, None)
+            self.max_lag_ms = max([self.max_lag_ms] + [now_ms - d[0] for d in due])
+        fired = sum(len(m) for m in by_uid.values())
+        self.fired += fired
+        self.batches += 1
+        return fired
+
+    def run_once(self, now_ms=None):
+        now_ms = now_ms if now_ms is not None else _now_ms()
+        with self._cond:
+            due = self._pop_due(now_ms)
+        try:
+            return self.fire(due, now_ms)
+        except Exception:
+            # Put the thresholds back so the next wake-up retries them
+            with self._cond:
+                for at, uid, minutes, tx_id in due:
+                    entry = self._entries.setdefault(uid, {'txId': tx_id, 'pending': {}})
+                    if entry.get('txId') == tx_id:
+                        _pending(entry)[minutes] = at
+                        heapq.heappush(self._heap, (at, uid, minutes, tx_id))
+            raise
+
+    def next_at(self):
+        with self._cond:
+            return self._heap[0][0] if self._heap else None
+
+    def run(self, listen=True):
+        """Recover, then fire thresholds as they come due until stop()."""
+        self.recover()
+        if listen:
+            self._listener = rtdb().reference(ROOT).listen(self._on_event)
+        while True:
+            with self._cond:
+                if self._stopped:
+                    break
+                wait = None
+                if self._heap:
+                    wait = max(0.0, (self._heap[0][0] - _now_ms()) / 1000.0)
+                if wait is None or wait > 0:
+                    self._cond.wait(timeout=wait)
+                if self._stopped:
+                    break
+            try:
+                self.run_once()
+            except Exception:
+                # Keep the loop alive; the next wake-up retries anything unfired
+                time.sleep(1.0)
+        if self._listener is not None:
+            self._listener.close()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'scheduled': sum(len(_pending(e)) for e in self._entries.values()),
+                'heap': len(self._heap),
+                'nextAt': self._heap[0][0] if self._heap else None,
+                'fired': self.fired,
+                'batches': self.batches,
+                'maxLagMs': self.max_lag_ms,
+            }
@@ -0,0 +1,174 @@
+"""Maintained user counters and index sets stored in RTDB under /counters.
+
+Layout:
+    /counters/totals              {users, pwdUsers}: one small node, one get
+    /counters/index/users/<uid>   true for every counted profile
+    /counters/index/pwd/<uid>     true for every approved PWD user
+
+The index sets make every update idempotent: a uid is only counted when its
+marker flips, so a retried approval or a double delete can't skew totals.
+Entries per week are already kept in /rollups/weekly/<YYYY-Www>/entries
+(see dashboard.rollups), so they are not duplicated here.
+
+``rebuild()`` recomputes everything from one /users scan
+(``manage.py reconcile_counters``).
+"""
+from core.firebase import WriteBatch, rtdb
+
+ROOT = '/counters'
+
+
+def _flip(db, kind, uid, present):
+    """Atomically set or clear the uid marker in index/kind; True if it changed."""
+    changed = {'ok': False}
+
+    def _txn(current):
+        changed['ok'] = bool(current) != present
+        return True if present else None
+
+    db.reference(f'{ROOT}/index/{kind}/{uid}').transaction(_txn)
+    return changed['ok']
+
+
+def _adjust(db, field, delta):
+    db.reference(f'{ROOT}/totals/{field}').transaction(lambda current: max(0, int(current or 0) + delta))
+
+
+def add_user(uid, is_pwd=False):
+    """Count a newly registered profile once."""
+    if not uid:
+        return False
+    db = rtdb()
+    added = _flip(db, 'users', uid, True)
+    if added:
+        _adjust(db, 'users', 1)
+    if is_pwd:
+        add_pwd(uid)
+    return added
+
+
+def add_pwd(uid):
+    """Record a PWD approval."""
+    if not uid:
+        return False
+    db = rtdb()
+    if _flip(db, 'pwd', uid, True):
+        _adjust(db, 'pwdUsers', 1)
+        return True
+    return False
+
+
+def remove_pwd(uid):
+    if not uid:
+        return False
+    db = rtdb()
+    if _flip(db, 'pwd', uid, False):
+        _adjust(db, 'pwdUsers', -1)
+        return True
+    return False
+
+
+def remove_user(uid):
+    """Uncount a deleted or banned profile (and its PWD marker)."""
+    if not uid:
+        return False
+    db = rtdb()
+    remove_pwd(uid)
+    if _flip(db, 'users', uid, False):
+        _adjust(db, 'users', -1)
+        return True
+    return False
+
+
+def stage_remove_pwd(batch, uid):
+    """Stage uid's PWD marker removal and the pwdUsers decrement into batch.
+
+    Lets a caller uncount the approval in the same update that changes the
+    PWD status. The marker is read first, so like _bulk_flip a concurrent
+    update of the same uid can skew the total by one until the next
+    reconcile. Returns True if uid was counted.
+    """
+    if not uid or not rtdb().reference(f'{ROOT}/index/pwd/{uid}').get():
+        return False
+    batch.delete(f'{ROOT}/index/pwd/{uid}')
+    batch.set(f'{ROOT}/totals/pwdUsers', {'.sv': {'increment': -1}})
+    return True
+
+
+def _bulk_flip(db, kind, uids, present):
+    """Set or clear many markers in one read and one batched write; returns the uids that changed.
+
+    Unlike _flip this isn't a per-uid transaction, so a single-uid update
+    racing the same uid can skew a total by one until the next reconcile.
+    """
+    current = db.reference(f'{ROOT}/index/{kind}').get(shallow=True) or {}
+    current = set(current.keys()) if isinstance(current, dict) else set()
+    changed = [uid for uid in dict.fromkeys(uids) if uid and (uid in current) != present]
+    if changed:
+        batch = WriteBatch()
+        for uid in changed:
+            batch.set(f'{ROOT}/index/{kind}/{uid}', True if present else None)
+        batch.commit()
+    return changed
+
+
+def add_pwds(uids):
+    db = rtdb()
+    changed = _bulk_flip(db, 'pwd', uids, True)
+    if changed:
+        _adjust(db, 'pwdUsers', len(changed))
+    return changed
+
+
+def remove_pwds(uids):
+    db = rtdb()
+    changed = _bulk_flip(db, 'pwd', uids, False)
+    if changed:
+        _adjust(db, 'pwdUsers', -len(changed))
+    return changed
+
+
+def remove_users(uids):
+    db = rtdb()
+    pwd = _bulk_flip(db, 'pwd', uids, False)
+    if pwd:
+        _adjust(db, 'pwdUsers', -len(pwd))
+    users = _bulk_flip(db, 'users', uids, False)
+    if users:
+        _adjust(db, 'users', -len(users))
+    return users
+
+
+def build_from_users(users):
+    """Return the full /counters tree for a /users snapshot."""
+    items = users.items() if isinstance(users, dict) else enumerate(users if isinstance(users, list) else [])
+    user_ids, pwd_ids = {}, {}
+    for uid, profile in items:
+        if profile is None:
+            continue
+        user_ids[str(uid)] = True
+        if isinstance(profile, dict) and profile.get('isPWD'):
+            pwd_ids[str(uid)] = True
+    return {
+        'totals': {'users': len(user_ids), 'pwdUsers': len(pwd_ids)},
+        'index': {'users': user_ids, 'pwd': pwd_ids},
+    }
+
+
+def rebuild():
+    """Recompute /counters from scratch with one full /users scan."""
+    db = rtdb()
+    tree = build_from_users(db.reference('/users').get() or {})
+    db.reference(ROOT).set(tree)
+    return tree
+
+
+def read_totals():
+    data = rtdb().reference(f'{ROOT}/totals').get() or {}
+    return data if isinstance(data, dict) else {}
+
+
+def pwd_uids():
+    """Set of approved PWD uids, read shallowly (keys only)."""
+    data = rtdb().reference(f'{ROOT}/index/pwd').get(shallow=True) or {}
+    return set(data.keys()) if isinstance(data, dict) else set()
@@ -0,0 +1,294 @@
+"""Paginated user and transaction listings for the database page.
+
+Every listing is keyset-paginated: a page is one bounded, index-ordered
+query that starts after the previous page's last key. The cost of a page
+does not depend on how many users or transactions exist, and the browser
+holds one screen of rows instead of whole trees.
+
+Users come from one of these sources, picked by the most selective filter:
+
+    banned=1       /banned/users                       by key
+    status=X       /userTxStatus ordered by ``sk``     "<status>|<uid>" range
+    pwd=1          /counters/index/pwd                 by key (dashboard.counters)
+    (none)         /users                              by key
+
+Any other filters are checked per row. A page is filled from at most
+MAX_SCAN_PAGES source pages, and the cursor lets the next request carry on
+from there.
+
+/userTxStatus/<uid> = {status, txId, at, sk} is the latest-transaction
+status the page used to work out in the browser from all of /transactions:
+ONGOING while any transaction is open, else PAID once one was paid, else
+NONE. Server-side writers keep it current (user_registered, the entrance
+pipeline, mockpay_complete; bans and deletes drop it).
+``manage.py rebuild_user_index`` recomputes it with one /transactions scan
+(plus the archived months, see dashboard.archive).
+
+Transactions are paged from the ParkingLog SQL mirror (dashboard.sync)
+over its (status, entry_time) indexes, newest first. They are as fresh as
+the last sync_parking_logs run.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+
+from core.firebase import WriteBatch, rtdb
+from . import archive
+from .models import ParkingLog
+
+TX_STATUS_ROOT = '/userTxStatus'
+STATUSES = ('ONGOING', 'PAID', 'NONE')
+PAGE_SIZE = int(os.environ.get("DIRECTORY_PAGE_SIZE", "50") or 50)
+MAX_PAGE_SIZE = 200
+MAX_SCAN_PAGES = int(os.environ.get("DIRECTORY_MAX_SCAN_PAGES", "5") or 5)
+READ_CONCURRENCY = int(os.environ.get("DIRECTORY_READ_CONCURRENCY", "16") or 16)
+
+
+# ── latest-transaction status index ─────────────────────────────
+
+def tx_status_entry(uid, status, tx_id='', at_ms=None):
+    return {'status': status, 'txId': tx_id or '', 'at': at_ms or 0, 'sk': f"{status}|{uid}"}
+
+
+def stage_tx_status(batch, uid, status, tx_id='', at_ms=None):
+    if uid:
+        batch.set(f"{TX_STATUS_ROOT}/{uid}", tx_status_entry(uid, status, tx_id, at_ms))
+
+
+def stage_drop(batch, uid):
+    if uid:
+        batch.delete(f"{TX_STATUS_ROOT}/{uid}")
+
+
+def ensure_tx_status(uid):
+    """Give a new user a NONE entry unless one exists already."""
+    rtdb().reference(f"{TX_STATUS_ROOT}/{uid}").transaction(
+        lambda current: current if isinstance(current, dict) else tx_status_entry(uid, 'NONE')
+    )
+
+
+def compute_tx_statuses(transactions):
+    """{uid: (status, txId, at)} with the page's old rule: ONGOING beats PAID beats nothing."""
+    out = {}
+    items = transactions.items() if isinstance(transactions, dict) else []
+    for tx_id, tx in items:
+        if not isinstance(tx, dict) or not tx.get('uid'):
+            continue
+        uid = str(tx['uid'])
+        status = str(tx.get('status') or '').upper()
+        at = tx.get('timeIn') if isinstance(tx.get('timeIn'), (int, float)) else 0
+        if status == 'ONGOING':
+            if out.get(uid, ('',))[0] != 'ONGOING' or at >= out[uid][2]:
+                out[uid] = ('ONGOING', tx_id, at)
+        elif status in ('PAID', 'COMPLETED'):
+            current = out.get(uid)
+            if current is None or (current[0] == 'PAID' and at >= current[2]):
+                out[uid] = ('PAID', tx_id, at)
+    return out
+
+
+def rebuild_tx_status(chunk_size=500):
+    """Recompute /userTxStatus for every /users profile; returns the entry count."""
+    db = rtdb()
+    uids = db.reference('/users').get(shallow=True) or {}
+    statuses = compute_tx_statuses(archive.every('transactions'))
+    tree = {}
+    for uid in (uids if isinstance(uids, dict) else {}):
+        status, tx_id, at = statuses.get(uid, ('NONE', '', 0))
+        tree[uid] = tx_status_entry(uid, status, tx_id, at)
+    db.reference(TX_STATUS_ROOT).delete()
+    keys = list(tree)
+    for start in range(0, len(keys), chunk_size):
+        batch = WriteBatch()
+        for uid in keys[start:start + chunk_size]:
+            batch.set(f"{TX_STATUS_ROOT}/{uid}", tree[uid])
+        batch.commit()
+    return len(tree)
+
+
+# ── users ───────────────────────────────────────────────────────
+
+def _limit(value):
+    try:
+        return max(1, min(MAX_PAGE_SIZE, int(value)))
+    except (TypeError, ValueError):
+        return PAGE_SIZE
+
+
+def _after(data, cursor, limit):
+    """[(key, value)] after cursor, at most limit + 1 (the extra one means "more")."""
+    items = list(data.items()) if isinstance(data, dict) else []
+    return [(k, v) for k, v in items if k != cursor][:limit + 1]
+
+
+def _by_key(path, cursor, limit):
+    query = rtdb().reference(path).order_by_key()
+    if cursor:
+        query = query.start_at(cursor)
+    return _after(query.limit_to_first(limit + 2).get() or {}, cursor, limit)
+
+
+def _by_status(status, cursor, limit):
+    query = (rtdb().reference(TX_STATUS_ROOT).order_by_child('sk')
+             .start_at(f"{status}|{cursor or ''}").end_at(f"{status}|\uf8ff"))
+    return _after(query.limit_to_first(limit + 2).get() or {}, cursor, limit)
+
+
+def _read_many(paths):
+    if not paths:
+        return {}
+    db = rtdb()
+    with ThreadPoolExecutor(max_workers=max(1, min(READ_CONCURRENCY, len(paths)))) as pool:
+        return dict(zip(paths, pool.map(lambda p: db.reference(p).get(), paths)))
+
+
+def _row(uid, profile, tx_status, ban=None):
+    profile = profile if isinstance(profile, dict) else {}
+    tx_status = tx_status if isinstance(tx_status, dict) else {}
+    status = tx_status.get('status') or ('ONGOING' if profile.get('activeTransaction') else 'NONE')
+    row = {
+        'uid': uid,
+        'displayName': profile.get('displayName') or (ban or {}).get('displayName') or '',
+        'email': profile.get('email') or (ban or {}).get('email') or '',
+        'contactNumber': profile.get('contactNumber') or (ban or {}).get('contactNumber') or '',
+        'userType': 'pwd' if profile.get('isPWD') else 'regular',
+        'pwdStatus': profile.get('pwdStatus') or 'none',
+        'txStatus': status,
+        'activeTransaction': profile.get('activeTransaction') or '',
+    }
+    if ban is not None:
+        row['banned'] = {'reason': ban.get('reason') or '', 'bannedAt': ban.get('bannedAt'), 'bannedBy': ban.get('bannedBy') or ''}
+    return row
+
+
+def list_users(status=None, pwd=None, banned=False, cursor=None, limit=PAGE_SIZE):
+    """One page of user rows: {'rows', 'next'} (next is None on the last page)."""
+    status = (status or '').upper() or None
+    if status is not None and status not in STATUSES:
+        raise ValueError(f"status must be one of {', '.join(STATUSES)}")
+    limit = _limit(limit)
+    rows, after = [], cursor or None
+    for _ in range(MAX_SCAN_PAGES):
+        if banned:
+            page = _by_key('/banned/users', after, limit)
+        elif status:
+            page = _by_status(status, after, limit)
+        elif pwd:
+            page = _by_key('/counters/index/pwd', after, limit)
+        else:
+            page = _by_key('/users', after, limit)
+        more = len(page) > limit
+        page = page[:limit]
+        if not page:
+            return {'rows': rows, 'next': None}
+        uids = [k for k, _ in page]
+
+        # Fill in whatever the source node doesn't carry
+        if banned or status or pwd:
+            fetched = _read_many([f"/users/{uid}" for uid in uids])
+            profiles = {uid: fetched.get(f"/users/{uid}") for uid in uids}
+        else:
+            profiles = dict(page)
+        if status:
+            statuses = dict(page)
+        else:
+            fetched = _read_many([f"{TX_STATUS_ROOT}/{uid}" for uid in uids])
+            statuses = {uid: fetched.get(f"{TX_STATUS_ROOT}/{uid}") for uid in uids}
+        bans = dict(page) if banned else {}
+
+        for uid in uids:
+            after = uid
+            if not banned and not isinstance(profiles.get(uid), dict):
+                continue  # index entry left behind by a deleted profile
+            row = _row(uid, profiles.get(uid), statuses.get(uid), bans.get(uid) if banned else None)
+            if status and row['txStatus'] != status:
+                continue
+            if pwd is not None and (row['userType'] == 'pwd') != bool(pwd):
+                continue
+            rows.append(row)
+            if len(rows) == limit:
+                return {'rows': rows, 'next': uid if (more or uid != uids[-1]) else None}
+        if not more:
+            return {'rows': rows, 'next': None}
+    return {'rows': rows, 'next': after}
+
+
+# ── transactions ────────────────────────────────────────────────
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _tx_cursor(log):
+    """"<entry_time in whole microseconds>.<pk>": exact, so the keyset never skips or repeats a row."""
+    return f"{(log.entry_time - _EPOCH) // _MICROSECOND}.{log.pk}"
+
+
+def list_transactions(status=None, cursor=None, limit=PAGE_SIZE):
+    """One page of transactions, newest entry first: {'rows', 'next'}."""
+    from django.db.models import Q
+
+    limit = _limit(limit)
+    qs = ParkingLog.objects.exclude(tx_id=None)
+    if status:
+        qs = qs.filter(status=str(status).upper())
+    if cursor:
+        try:
+            us, pk = str(cursor).split('.', 1)
+            at = _EPOCH + int(us) * _MICROSECOND
+            qs = qs.filter(Q(entry_time__lt=at) | Q(entry_time=at, pk__lt=int(pk)))
+        except (TypeError, ValueError, OverflowError):
+            raise ValueError("invalid cursor")
+    logs = list(qs.order_by('-entry_time', '-pk')[:limit + 1])
+    more = len(logs) > limit
+    logs = logs[:limit]
+
+    uids = sorted({log.uid for log in logs if log.uid})
+    names = _read_many([f"/users/{uid}/displayName" for uid in uids])
+    rows = [{
+        'txId': log.tx_id,
+        'uid': log.uid,
+        'name': names.get(f"/users/{log.uid}/displayName") or log.uid,
+        'vehicleType': log.vehicle_type,
+        'slot': log.slot_name,
+        'timeIn': log.entry_time.isoformat() if log.entry_time else None,
+        'timeOut': log.exit_time.isoformat() if log.exit_time else None,
+        'status': log.status,
+        'amountPaid': float(log.amount_paid or 0),
+        'plateNumber': log.plate_number,
+    } for log in logs]
+    return {'rows': rows, 'next': _tx_cursor(logs[-1]) if more and logs else None}
+
+
+# ── occupants (admin parking tab) ───────────────────────────────
+
+def occupants(occupied):
+    """Rows for OCCUPIED slots, joined with just those users and transactions."""
+    taken = [
+        (key, entry) for key, entry in (occupied.items() if isinstance(occupied, dict) else [])
+        if isinstance(entry, dict) and str(entry.get('status') or '').upper() == 'OCCUPIED'
+    ]
+    uids = sorted({str(e.get('uid')) for _, e in taken if e.get('uid')})
+    tx_ids = sorted({str(e.get('txId')) for _, e in taken if e.get('txId')})
+    fetched = _read_many([f"/users/{u}" for u in uids] + [f"/transactions/{t}" for t in tx_ids])
+    rows = []
+    for key, entry in taken:
+        uid = str(entry.get('uid') or '')
+        profile = fetched.get(f"/users/{uid}") if uid else None
+        profile = profile if isinstance(profile, dict) else {}
+        tx_id = str(entry.get('txId') or profile.get('activeTransaction') or '')
+        tx = fetched.get(f"/transactions/{tx_id}") if tx_id else None
+        tx = tx if isinstance(tx, dict) else {}
+        rows.append({
+            'key': key,
+            'slotName': entry.get('slotName') or key,
+            'uid': uid,
+            'name': profile.get('displayName') or profile.get('email') or uid,
+            'contactNumber': profile.get('contactNumber') or '',
+            'userType': 'pwd' if profile.get('isPWD') else 'regular',
+            'txId': tx_id,
+            'txStatus': 'ONGOING' if str(tx.get('status') or '').upper() == 'ONGOING' else ('PAST' if tx_id else 'NONE'),
+            'plateNumber': tx.get('plateNumber') or '',
+            'plateImageUrl': tx.get('plateImageUrl') or '',
+        })
+    return rows
@@ -0,0 +1,360 @@
+"""Server-side report exports: CSV and XLSX, streamed in constant memory.
+
+A report is a date range plus a grouping over the ParkingLog SQL mirror
+(dashboard.sync), so it is as fresh as the last sync_parking_logs run:
+
+    group=""                      one row per transaction
+    group="month"                 one row per month
+    group="week,vehicle_type"     one row per (ISO week, vehicle type)
+
+Grouping dimensions are day | week | month (at most one; Asia/Manila
+buckets keyed like dashboard.rollups) and vehicle_type | status. Grouped
+rows are aggregated in SQL. Detail rows come from ``QuerySet.iterator``,
+so only CHUNK_SIZE rows are held at a time. ``basis`` picks the timestamp
+the range and buckets use: entry (default) or exit.
+
+Writers are generators of bytes, ready for StreamingHttpResponse:
+
+    csv_chunks     UTF-8 with BOM, so Excel detects the encoding
+    xlsx_chunks    a one-sheet workbook with inline strings, zipped as it
+                   is written to an unseekable sink that is drained every
+                   CHUNK_SIZE rows
+
+Long exports run on the "exports" job queue and write to EXPORT_DIR. The
+job result names the file, which ``export_path`` resolves for download.
+Files older than EXPORT_TTL_HOURS are removed when the next job starts.
+"""
+import csv
+import io
+import os
+import re
+import time
+import zipfile
+from datetime import date, datetime, time as dtime, timedelta
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+
+from . import jobs
+from .models import ParkingLog
+from .rollups import day_key, month_key, tz_ph, week_key
+
+CHUNK_SIZE = int(os.environ.get("EXPORT_CHUNK_SIZE", "2000") or 2000)
+EXPORT_DIR = os.environ.get("EXPORT_DIR") or os.path.join(settings.BASE_DIR, 'data', 'exports')
+EXPORT_TTL_HOURS = float(os.environ.get("EXPORT_TTL_HOURS", "24") or 24)
+MAX_RANGE_DAYS = int(os.environ.get("EXPORT_MAX_RANGE_DAYS", "1100") or 1100)
+
+PERIODS = ('day', 'week', 'month')
+DIMENSIONS = PERIODS + ('vehicle_type', 'status')
+FORMATS = ('csv', 'xlsx')
+CONTENT_TYPES = {
+    'csv': 'text/csv; charset=utf-8',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+PAID_STATUSES = ('COMPLETED', 'PAID')
+
+DETAIL_COLUMNS = [
+    ('txId', 'tx_id'), ('uid', 'uid'), ('vehicleType', 'vehicle_type'), ('slot', 'slot_name'),
+    ('plateNumber', 'plate_number'), ('status', 'status'), ('timeIn', 'entry_time'),
+    ('timeOut', 'exit_time'), ('stayMinutes', None), ('amountPaid', 'amount_paid'),
+]
+SUMMARY_COLUMNS = ['transactions', 'completed', 'income', 'avgStayMinutes']
+
+
+class ExportError(ValueError):
+    """Bad report parameters; the message is safe to show."""
+
+
+class Report:
+    def __init__(self, start, end, group=(), basis='entry'):
+        self.start, self.end = start, end
+        self.group = tuple(group)
+        self.basis = basis
+
+    @classmethod
+    def from_params(cls, params):
+        """Build from request-style params: start, end (YYYY-MM-DD, inclusive), group, basis."""
+        try:
+            start = date.fromisoformat(str(params.get('start') or ''))
+            end = date.fromisoformat(str(params.get('end') or ''))
+        except ValueError:
+            raise ExportError("start and end must be YYYY-MM-DD dates")
+        if end < start:
+            raise ExportError("end is before start")
+        if (end - start).days > MAX_RANGE_DAYS:
+            raise ExportError(f"range is limited to {MAX_RANGE_DAYS} days")
+        group = list(dict.fromkeys(g.strip() for g in str(params.get('group') or '').split(',') if g.strip()))
+        unknown = [g for g in group if g not in DIMENSIONS]
+        if unknown:
+            raise ExportError(f"unknown grouping: {', '.join(unknown)} (use {', '.join(DIMENSIONS)})")
+        if sum(1 for g in group if g in PERIODS) > 1:
+            raise ExportError("group by at most one of day, week, month")
+        basis = params.get('basis') or 'entry'
+        if basis not in ('entry', 'exit'):
+            raise ExportError("basis must be entry or exit")
+        return cls(start, end, group, basis)
+
+    @property
+    def field(self):
+        return 'entry_time' if self.basis == 'entry' else 'exit_time'
+
+    @property
+    def period(self):
+        return next((g for g in self.group if g in PERIODS), None)
+
+    def filename(self, fmt):
+        suffix = '-by-' + '-'.join(self.group) if self.group else ''
+        return f"report-{self.start.isoformat()}-{self.end.isoformat()}{suffix}.{fmt}"
+
+    def queryset(self):
+        tz = tz_ph()
+        lo = datetime.combine(self.start, dtime.min, tzinfo=tz)
+        hi = datetime.combine(self.end + timedelta(days=1), dtime.min, tzinfo=tz)
+        return ParkingLog.objects.filter(**{f'{self.field}__gte': lo, f'{self.field}__lt': hi})
+
+    def header(self):
+        if not self.group:
+            return [label for label, _ in DETAIL_COLUMNS]
+        return [self.period if g in PERIODS else ('vehicleType' if g == 'vehicle_type' else g)
+                for g in self.group] + SUMMARY_COLUMNS
+
+    def rows(self):
+        """Yield the report's rows (lists of str/int/float/None), in order."""
+        return self._summary_rows() if self.group else self._detail_rows()
+
+    def _detail_rows(self):
+        fields = [f for _, f in DETAIL_COLUMNS if f]
+        qs = self.queryset().order_by(self.field, 'pk').values_list(*fields)
+        tz = tz_ph()
+        for values in qs.iterator(chunk_size=CHUNK_SIZE):
+            row = dict(zip(fields, values))
+            t_in, t_out = row['entry_time'], row['exit_time']
+            stay = round((t_out - t_in).total_seconds() / 60.0, 1) if t_in and t_out else None
+            yield [
+                row['tx_id'], row['uid'], row['vehicle_type'], row['slot_name'], row['plate_number'],
+                row['status'], t_in.astimezone(tz).isoformat() if t_in else None,
+                t_out.astimezone(tz).isoformat() if t_out else None, stay, float(row['amount_paid'] or 0),
+            ]
+
+    def _summary_rows(self):
+        from django.db.models import Avg, Count, DurationField, ExpressionWrapper, F, Q, Sum
+        from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+
+        trunc = {'day': TruncDay, 'week': TruncWeek, 'month': TruncMonth}
+        label = {'day': day_key, 'week': week_key, 'month': month_key}
+        qs = self.queryset()
+        keys = []
+        for g in self.group:
+            if g in PERIODS:
+                qs = qs.annotate(bucket=trunc[g](self.field, tzinfo=tz_ph()))
+                keys.append('bucket')
+            else:
+                keys.append(g)
+        stay = ExpressionWrapper(F('exit_time') - F('entry_time'), output_field=DurationField())
+        qs = qs.values(*keys).annotate(
+            n=Count('pk'),
+            completed=Count('pk', filter=Q(status__in=PAID_STATUSES)),
+            income=Sum('amount_paid'),
+            avg_stay=Avg(stay, filter=Q(exit_time__isnull=False)),
+        ).order_by(*keys)
+        for row in qs.iterator(chunk_size=CHUNK_SIZE):
+            out = []
+            for g, k in zip(self.group, keys):
+                value = row[k]
+                out.append(label[g](value.astimezone(tz_ph())) if g in PERIODS and value else value)
+            avg = row['avg_stay']
+            out += [
+                row['n'], row['completed'], float(row['income'] or 0),
+                round(avg.total_seconds() / 60.0, 1) if avg is not None else None,
+            ]
+            yield out
+
+
+# ── writers ─────────────────────────────────────────────────────
+
+class _Sink(io.RawIOBase):
+    """Unseekable byte sink; zipfile then writes data descriptors instead of seeking back."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def writable(self):
+        return True
+
+    def write(self, b):
+        self._chunks.append(bytes(b))
+        return len(b)
+
+    def drain(self):
+        out = b''.join(self._chunks)
+        self._chunks = []
+        return out
+
+
+def _cell_value(value):
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+
+def csv_chunks(header, rows):
+    sink = io.StringIO()
+    writer = csv.writer(sink)
+    writer.writerow(header)
+    yield ('\ufeff' + sink.getvalue()).encode('utf-8')
+    sink.seek(0)
+    sink.truncate()
+    for n, row in enumerate(rows, 1):
+        writer.writerow(['' if v is None else _cell_value(v) for v in row])
+        if n % CHUNK_SIZE == 0:
+            yield sink.getvalue().encode('utf-8')
+            sink.seek(0)
+            sink.truncate()
+    if sink.tell():
+        yield sink.getvalue().encode('utf-8')
+
+
+_XML_ILLEGAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+_XLSX_PARTS = {
+    '[Content_Types].xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        '<Override PartName="/xl/workbook.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+        '<Override PartName="/xl/worksheets/sheet1.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+        '<Override PartName="/xl/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.styles+xml"/>'
+        '</Types>'
+    ),
+    '_rels/.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="xl/workbook.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/workbook.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+        'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+        '<sheets><sheet name="Report" sheetId="1" r:id="rId1"/></sheets></workbook>'
+    ),
+    'xl/_rels/workbook.xml.rels': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" Target="worksheets/sheet1.xml"/>'
+        '<Relationship Id="rId2" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+        '</Relationships>'
+    ),
+    'xl/styles.xml': (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<styleSheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main">'
+        '<fonts count="2"><font><sz val="11"/><name val="Calibri"/></font><font><b/><sz val="11"/><name val="Calibri"/></font></fonts>'
+        '<fills count="1"><fill><patternFill patternType="none"/></fill></fills>'
+        '<borders count="1"><border/></borders>'
+        '<cellStyleXfs count="1"><xf/></cellStyleXfs>'
+        '<cellXfs count="2"><xf/><xf fontId="1" applyFont="1"/></cellXfs>'
+        '</styleSheet>'
+    ),
+}
+
+
+def _xlsx_row(values, style=None):
+    cells = []
+    s = f' s="{style}"' if style else ''
+    for value in values:
+        value = _cell_value(value)
+        if value is None:
+            cells.append('<c/>')
+        elif isinstance(value, bool) or not isinstance(value, (int, float)):
+            text = escape(_XML_ILLEGAL.sub('', str(value)))
+            cells.append(f'<c t="inlineStr"{s}><is><t xml:space="preserve">{text}</t></is></c>')
+        else:
+            cells.append(f'<c{s}><v>{value!r}</v></c>')
+    return '<row>' + ''.join(cells) + '</row>'
+
+
+def xlsx_chunks(header, rows):
+    sink = _Sink()
+    with zipfile.ZipFile(sink, 'w', compression=zipfile.ZIP_DEFLATED) as zf:
+        for name, body in _XLSX_PARTS.items():
+            zf.writestr(name, body)
+        with zf.open('xl/worksheets/sheet1.xml', 'w', force_zip64=True) as sheet:
+            sheet.write((
+                '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+                '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+                + _xlsx_row(header, style=1)
+            ).encode('utf-8'))
+            for n, row in enumerate(rows, 1):
+                sheet.write(_xlsx_row(row).encode('utf-8'))
+                if n % CHUNK_SIZE == 0:
+                    yield sink.drain()
+            sheet.write(b'</sheetData></worksheet>')
+    yield sink.drain()
+
+
+WRITERS = {'csv': csv_chunks, 'xlsx': xlsx_chunks}
+
+
+def chunks(report, fmt):
+    if fmt not in WRITERS:
+        raise ExportError(f"format must be one of {', '.join(FORMATS)}")
+    return WRITERS[fmt](report.header(), report.rows())
+
+
+# ── background exports ──────────────────────────────────────────
+
+def _prune():
+    cutoff = time.time() - EXPORT_TTL_HOURS * 3600
+    try:
+        names = os.listdir(EXPORT_DIR)
+    except FileNotFoundError:
+        return
+    for name in names:
+        path = os.path.join(EXPORT_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+
+def run_export(job, params, fmt):
+    """Job body: write the report to EXPORT_DIR, reporting rows written as it goes."""
+    report = Report.from_params(params)
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    _prune()
+    name = f"{job.id}.{fmt}"
+    path = os.path.join(EXPORT_DIR, name)
+    counted = {'rows': 0}
+
+    def _rows():
+        for row in report.rows():
+            counted['rows'] += 1
+            if counted['rows'] % CHUNK_SIZE == 0:
+                job.stage('writing', rows=counted['rows'])
+            yield row
+
+    job.stage('writing', rows=0)
+    with open(path + '.part', 'wb') as fh:
+        for chunk in WRITERS[fmt](report.header(), _rows()):
+            fh.write(chunk)
+    os.replace(path + '.part', path)
+    return {'file': name, 'filename': report.filename(fmt), 'format': fmt,
+            'rows': counted['rows'], 'bytes': os.path.getsize(path)}
+
+
+def start_export(params, fmt):
+    """Validate and queue an export; returns the job id (jobs.QueueFull when busy)."""
+    if fmt not in WRITERS:
+        raise ExportError(f"format must be one of {', '.join(FORMATS)}")
+    Report.from_params(params)
+    return jobs.get_queue('exports', workers=1, limit=8).submit(run_export, dict(params), fmt)
+
+
+def export_path(result):
+    """Path of a finished job's file, or None if it is gone."""
+    name = os.path.basename(str((result or {}).get('file') or ''))
+    path = os.path.join(EXPORT_DIR, name)
+    return path if name and os.path.isfile(path) else None
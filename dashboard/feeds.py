@@ -0,0 +1,239 @@
+"""Per-worker change feeds over RTDB subtrees, for push and polling clients.
+
+A Feed keeps one listener per worker on an RTDB path (occupancy:
+/configurations/layout/occupied). It turns listener events into per-key
+deltas:
+
+    (seq, {key: value, ...})     value None = key removed
+
+seq goes up by one per delta. The last FEED_LOG_SIZE deltas are kept in
+memory, so a client that comes back with its cursor gets only what it
+missed, merged into one {key: value} map. The cursor looks like
+``"<epoch>-<seq>"``. The epoch is random per Feed, so a cursor issued by
+another worker or an earlier process falls back to a full snapshot rather
+than a wrong diff. So does a cursor older than the log.
+
+Tabs, gate displays and kiosks share this one subscription instead of
+each opening their own listener on the whole tree:
+
+    api/occupancy/stream/   Server-Sent Events. Event ids are cursors, so
+                            EventSource resumes via Last-Event-ID on reconnect.
+    api/occupancy/?since=   Polling for devices that can't hold a connection.
+                            Returns the cursor as "v" plus only the slots that
+                            changed, each as one status letter (see poll()).
+
+Cursors are per worker. Behind a load balancer without sticky routing, a
+poll that lands on another worker gets a snapshot, which is correct but
+not small.
+"""
+import asyncio
+import copy
+import json
+import os
+import threading
+from collections import deque
+
+from core.firebase import _put, _split, rtdb
+
+LOG_SIZE = int(os.environ.get("FEED_LOG_SIZE", "1024") or 1024)
+HEARTBEAT_SECONDS = float(os.environ.get("FEED_HEARTBEAT", "15") or 15)
+RETRY_MS = int(os.environ.get("FEED_RETRY_MS", "2000") or 2000)
+
+
+class Feed:
+    def __init__(self, path, log_size=LOG_SIZE):
+        self.path = path
+        self.epoch = os.urandom(4).hex()
+        self.seq = 0
+        self._data = {}
+        self._log = deque(maxlen=log_size)     # (seq, {key: value})
+        self._lock = threading.Lock()
+        self._waiters = set()                  # (loop, asyncio.Event)
+        self._listener = None
+        self._started = False
+
+    # -- upstream ------------------------------------------------------------
+
+    def start(self):
+        """Prime from one read and attach the listener (once per worker)."""
+        with self._lock:
+            if self._started:
+                return
+            self._started = True
+        try:
+            data = rtdb().reference(self.path).get()
+            with self._lock:
+                self._data = dict(data) if isinstance(data, dict) else {}
+            self._listener = rtdb().reference(self.path).listen(self._on_event)
+        except Exception:
+            with self._lock:
+                self._started = False
+            raise
+
+    def stop(self):
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        with self._lock:
+            self._started = False
+
+    def _on_event(self, event):
+        parts = _split(getattr(event, 'path', '/'))
+        data = getattr(event, 'data', None)
+        if getattr(event, 'event_type', 'put') == 'patch' and isinstance(data, dict):
+            writes = [(parts + _split(k), v) for k, v in data.items()]
+        else:
+            writes = [(parts, data)]
+        self.apply(writes)
+
+    def apply(self, writes):
+        """Apply [(parts, value)] below self.path and log the top-level keys that changed."""
+        with self._lock:
+            changes = {}
+            for parts, value in writes:
+                if not parts:
+                    new = dict(value) if isinstance(value, dict) else {}
+                    for key in set(self._data) | set(new):
+                        if self._data.get(key) != new.get(key):
+                            changes[key] = new.get(key)
+                    self._data = new
+                    continue
+                key = parts[0]
+                current = self._data.get(key)
+                updated = _put(copy.deepcopy(current), parts[1:], value) if parts[1:] else value
+                if updated is None:
+                    self._data.pop(key, None)
+                else:
+                    self._data[key] = updated
+                if updated != current:
+                    changes[key] = updated
+            if not changes:
+                return None
+            self.seq += 1
+            self._log.append((self.seq, changes))
+            waiters = list(self._waiters)
+        for loop, event in waiters:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # loop already closed
+        return self.seq
+
+    # -- readers -------------------------------------------------------------
+
+    def cursor(self):
+        return f"{self.epoch}-{self.seq}"
+
+    def _parse(self, cursor):
+        epoch, _, seq = str(cursor or '').partition('-')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def since(self, cursor):
+        """('delta', cursor, {key: value}) since cursor, or ('snapshot', cursor, data)."""
+        with self._lock:
+            seq = self._parse(cursor)
+            oldest = self._log[0][0] if self._log else self.seq + 1
+            if seq is None or seq > self.seq or seq < oldest - 1:
+                return 'snapshot', self.cursor(), dict(self._data)
+            merged = {}
+            for entry_seq, changes in self._log:
+                if entry_seq > seq:
+                    merged.update(changes)
+            return 'delta', self.cursor(), merged
+
+    async def wait(self, cursor, timeout):
+        """Wait until the feed moves past cursor; False on timeout."""
+        event = asyncio.Event()
+        waiter = (asyncio.get_running_loop(), event)
+        with self._lock:
+            if self.cursor() != cursor:
+                return True
+            self._waiters.add(waiter)
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._lock:
+                self._waiters.discard(waiter)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'path': self.path,
+                'cursor': self.cursor(),
+                'keys': len(self._data),
+                'logged': len(self._log),
+                'clients': len(self._waiters),
+            }
+
+
+OCCUPANCY_CODES = {'OCCUPIED': 'O', 'RESERVED': 'R'}
+
+
+def occupancy_code(entry):
+    """One-letter slot status: O(ccupied), R(eserved), F(ree); None if the key is gone."""
+    if entry is None:
+        return None
+    status = str(entry.get('status') or '').upper() if isinstance(entry, dict) else ''
+    return OCCUPANCY_CODES.get(status, 'F')
+
+
+def poll(f, cursor, project=occupancy_code):
+    """Body for a polling client at cursor: {"v"} when current, plus "s" (changed
+    or, with "full": 1, all keys) mapped through project.
+    """
+    kind, current, payload = f.since(cursor)
+    body = {'v': current}
+    if kind == 'snapshot':
+        body['full'] = 1
+        body['s'] = {k: project(v) for k, v in payload.items() if project(v) is not None}
+    elif payload:
+        body['s'] = {k: project(v) for k, v in payload.items()}
+    return body
+
+
+def _sse(kind, cursor, payload):
+    body = json.dumps({'cursor': cursor, 'data': payload}, separators=(',', ':'), default=str)
+    return f"id: {cursor}\nevent: {kind}\ndata: {body}\n\n"
+
+
+async def sse_events(f, cursor):
+    """Endless SSE stream for an ASGI response: catch-up, then deltas as they land."""
+    yield f"retry: {RETRY_MS}\n\n"
+    while True:
+        kind, cursor, payload = f.since(cursor)
+        if kind == 'snapshot' or payload:
+            yield _sse(kind, cursor, payload)
+        if not await f.wait(cursor, HEARTBEAT_SECONDS):
+            yield ": ping\n\n"
+
+
+def sse_once(f, cursor):
+    """Catch-up only, then close; under WSGI EventSource reconnects after RETRY_MS
+    with Last-Event-ID, so the stream degrades to polling without pinning a worker.
+    """
+    yield f"retry: {RETRY_MS}\n\n"
+    kind, cursor, payload = f.since(cursor)
+    yield _sse(kind, cursor, payload)
+
+
+_feeds = {}
+_feeds_lock = threading.Lock()
+
+PATHS = {
+    'occupancy': '/configurations/layout/occupied',
+}
+
+
+def feed(name):
+    """This worker's Feed for name (see PATHS), started on first use."""
+    with _feeds_lock:
+        f = _feeds.get(name)
+        if f is None:
+            f = _feeds[name] = Feed(PATHS[name])
+    f.start()
+    return f
@@ -0,0 +1,110 @@
+"""Parking fee engine built on FeeConfig.
+
+The active tariff is the most recently created FeeConfig row. It is cached
+(Django cache, key ``fees:active``) for FEES_CACHE_SECONDS and dropped by
+dashboard.signals whenever a FeeConfig is saved or deleted. The default
+cache is per process, so the signal only reaches the worker that saved;
+the others pick the new tariff up within FEES_CACHE_SECONDS.
+
+Fee for a stay of ``h`` started hours (partial hours round up, minimum 1):
+
+    base_fee                                   if h <= base_hours
+    base_fee + (h - base_hours) * succeeding   otherwise
+
+``compute`` evaluates that for whole arrays of entry/exit times in one NumPy
+pass; ``quote`` and ``quote_open_transactions`` are thin wrappers.
+"""
+import os
+from datetime import datetime, timezone
+
+import numpy as np
+from django.core.cache import cache
+
+from core.firebase import query_range
+from .models import FeeConfig, ParkingLog
+from .rollups import parse_time
+from .signals import FEES_CACHE_KEY as CACHE_KEY
+
+HOUR_MS = 3600 * 1000
+CACHE_SECONDS = int(os.environ.get("FEES_CACHE_SECONDS", "30") or 30)
+_MISSING = 'none'
+
+
+def active_config():
+    """Return (base_fee, base_hours, succeeding_fee) as floats, or None."""
+    cached = cache.get(CACHE_KEY)
+    if cached is None:
+        cfg = FeeConfig.objects.order_by('-id').first()
+        cached = (float(cfg.base_fee), int(cfg.base_hours), float(cfg.succeeding_fee)) if cfg else _MISSING
+        cache.set(CACHE_KEY, cached, CACHE_SECONDS)
+    return None if cached == _MISSING else tuple(cached)
+
+
+def compute(entry_ms, exit_ms, config=None):
+    """Vectorised fees for paired entry/exit epoch-ms arrays (NaN entry → NaN fee)."""
+    config = config or active_config()
+    if config is None:
+        raise ValueError("No FeeConfig configured")
+    base_fee, base_hours, succeeding = config
+    entry = np.asarray(entry_ms, dtype=np.float64)
+    exit_ = np.asarray(exit_ms, dtype=np.float64)
+    hours = np.maximum(np.ceil(np.maximum(exit_ - entry, 0.0) / HOUR_MS), 1.0)
+    fees = base_fee + np.maximum(hours - base_hours, 0.0) * succeeding
+    return np.round(fees, 2)
+
+
+def _ms(value):
+    dt = value if isinstance(value, datetime) else parse_time(value)
+    return dt.timestamp() * 1000.0 if dt else np.nan
+
+
+def quote(tx, now_ms=None, config=None):
+    """Fee for one RTDB transaction; open stays are priced up to now."""
+    now_ms = now_ms if now_ms is not None else datetime.now(timezone.utc).timestamp() * 1000.0
+    exit_ms = _ms(tx.get('timeOut')) if tx.get('timeOut') else now_ms
+    fee = compute([_ms(tx.get('timeIn'))], [exit_ms], config)[0]
+    return None if np.isnan(fee) else float(fee)
+
+
+def quote_open_transactions(now_ms=None, config=None):
+    """{txId: fee} for every ONGOING transaction, priced up to now in one pass."""
+    config = config or active_config()
+    if config is None:
+        return {}
+    txs = query_range('/transactions', 'status', 'ONGOING', 'ONGOING')
+    items = [(k, v) for k, v in txs.items() if isinstance(v, dict)]
+    if not items:
+        return {}
+    now_ms = now_ms if now_ms is not None else datetime.now(timezone.utc).timestamp() * 1000.0
+    entry = np.array([_ms(tx.get('timeIn')) for _, tx in items])
+    fees = compute(entry, np.full(len(items), now_ms), config)
+    return {k: float(f) for (k, _), f in zip(items, fees) if not np.isnan(f)}
+
+
+def recompute_history(start, end, config=None):
+    """Re-price completed ParkingLogs that exited in [start, end) under config.
+
+    Returns totals plus per-log differences; nothing is written back, since
+    amount_paid records what was actually charged.
+    """
+    config = config or active_config()
+    if config is None:
+        raise ValueError("No FeeConfig configured")
+    rows = list(
+        ParkingLog.objects
+        .filter(exit_time__gte=start, exit_time__lt=end)
+        .values_list('tx_id', 'entry_time', 'exit_time', 'amount_paid')
+    )
+    if not rows:
+        return {'count': 0, 'paid': 0.0, 'recomputed': 0.0, 'changed': []}
+    entry = np.array([r[1].timestamp() * 1000.0 for r in rows])
+    exit_ = np.array([r[2].timestamp() * 1000.0 for r in rows])
+    paid = np.array([float(r[3] or 0) for r in rows])
+    fees = compute(entry, exit_, config)
+    diff = np.flatnonzero(np.abs(fees - paid) >= 0.005)
+    return {
+        'count': len(rows),
+        'paid': round(float(paid.sum()), 2),
+        'recomputed': round(float(fees.sum()), 2),
+        'changed': [(rows[i][0], float(paid[i]), float(fees[i])) for i in diff],
+    }
@@ -0,0 +1,184 @@
+"""Entrance gate pipeline: capture → upload → OCR → RTDB.
+
+Runs on the ``gate`` job queue (see dashboard.jobs) so entrance_snapshot can
+answer the gate immediately; each stage is reported through ``job.stage``.
+"""
+import os
+import time
+from datetime import datetime, timedelta, timezone
+
+import requests
+
+from core.firebase import WriteBatch, rtdb
+from core.outbound import Deadline, DeadlineExceeded, client
+from . import closing, directory, plate_ocr, rollups
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # pragma: no cover - Python <3.9 fallback
+    ZoneInfo = None
+
+
+class GateError(Exception):
+    """A pipeline stage failed; ``payload`` is merged into the job result."""
+
+    def __init__(self, message, **payload):
+        super().__init__(message)
+        self.payload = payload
+
+
+# Per-stage wall-clock deadlines (seconds); attempts within a stage share them
+CAPTURE_DEADLINE = float(os.environ.get('GATE_CAPTURE_DEADLINE', '10') or 10)
+UPLOAD_DEADLINE = float(os.environ.get('GATE_UPLOAD_DEADLINE', '20') or 20)
+OCR_DEADLINE = float(os.environ.get('GATE_OCR_DEADLINE', '25') or 25)
+
+
+def capture(cam_url):
+    """Capture a JPEG from the OV2640 /capture with cache-buster and plain fallback."""
+    base_url = cam_url.rstrip('/') + '/capture'
+    http = client()
+    deadline = Deadline(CAPTURE_DEADLINE)
+    def _fetch_ts():
+        try:
+            ts = int(datetime.utcnow().timestamp() * 1000)
+        except Exception:
+            ts = 0
+        return http.get(f"{base_url}?ts={ts}", deadline=deadline, timeout=CAPTURE_DEADLINE / 2)
+    def _fetch_plain():
+        return http.get(base_url, deadline=deadline)
+
+    try:
+        # Attempt 1: cache-busted
+        cap_res = _fetch_ts()
+        # Attempt 2: retry ts after a short warm-up if suspicious
+        if cap_res.status_code != 200 or not cap_res.content or len(cap_res.content) < 1024:
+            time.sleep(0.25)
+            cap_res = _fetch_ts()
+        # Attempt 3: compatibility fallback without query
+        if cap_res.status_code != 200 or not cap_res.content or len(cap_res.content) < 1024:
+            cap_res = _fetch_plain()
+    except (DeadlineExceeded, requests.RequestException):
+        raise GateError("capture failed")
+    if cap_res.status_code != 200 or not cap_res.content:
+        raise GateError("capture failed")
+    return cap_res.content
+
+
+def upload(image):
+    """Upload to Cloudinary (unsigned) and return the secure URL."""
+    cloud = 'dy5kbbskp'
+    upload_preset = os.environ.get('CLOUDINARY_UPLOAD_PRESET', 'unsigned')
+    cld_url = f'https://api.cloudinary.com/v1_1/{cloud}/image/upload'
+    files = { 'file': ('plate.jpg', image, 'image/jpeg') }
+    data = { 'upload_preset': upload_preset, 'folder': 'cygo/entry' }
+    try:
+        cld_res = client().post(cld_url, files=files, data=data, deadline=Deadline(UPLOAD_DEADLINE))
+    except (DeadlineExceeded, requests.RequestException):
+        raise GateError("cloudinary upload failed")
+    try: cld_json = cld_res.json()
+    except Exception: cld_json = {}
+    if cld_res.status_code >= 300 or 'secure_url' not in cld_json:
+        raise GateError("cloudinary upload failed", status=cld_res.status_code)
+    return cld_json['secure_url']
+
+
+def ocr(image, secure_url):
+    """Read the plate with the engines selected by OCR_BACKEND (see dashboard.plate_ocr)."""
+    return plate_ocr.read_plate(image, secure_url, deadline=Deadline(OCR_DEADLINE))
+
+
+def write_plate(tx_id, plate_text, secure_url):
+    """Write per-transaction fields (no writes to users/lastPlate)."""
+    db = rtdb()
+    fields = {'plateImageUrl': secure_url}
+    if plate_text:
+        fields['plateNumber'] = plate_text
+    try:
+        db.reference(f'/transactions/{tx_id}').update(fields)
+        # Retry once after a short delay in case DevKit overwrote the node
+        try:
+            time.sleep(1.2)
+            db.reference(f'/transactions/{tx_id}').update(fields)
+        except Exception:
+            pass
+    except Exception as e:
+        raise GateError(f'RTDB write failed: {e}', url=secure_url)
+
+
+def write_closing_info(uid, tx_id):
+    """Establish closing deadline + notification schedule (Mall hours: 10:00–21:00 Asia/Manila)."""
+    try:
+        tz_ph = ZoneInfo("Asia/Manila") if ZoneInfo else timezone(timedelta(hours=8))
+    except Exception:
+        tz_ph = timezone(timedelta(hours=8))
+    now_ph = datetime.now(tz_ph)
+    closing_ph = now_ph.replace(hour=21, minute=0, second=0, microsecond=0)
+    if now_ph >= closing_ph:
+        closing_ph = closing_ph + timedelta(days=1)
+    deadline_ms = int(closing_ph.timestamp() * 1000)
+    now_ms = int(now_ph.timestamp() * 1000)
+    thresholds = {}
+    for minutes in (60, 30, 15, 5):
+        notify_at = deadline_ms - minutes * 60 * 1000
+        status = 'scheduled'
+        if notify_at <= now_ms:
+            status = 'due'
+        thresholds[str(minutes)] = {
+            'notifyAt': notify_at,
+            'status': status,
+        }
+    closing_info = {
+        'txId': tx_id,
+        'deadline': deadline_ms,
+        'deadlineIso': closing_ph.isoformat(),
+        'setAt': now_ms,
+        'thresholds': thresholds,
+        'timezone': 'Asia/Manila',
+        'mallOpenHour': 10,
+        'mallCloseHour': 21,
+    }
+    # closingInfo, the transaction's deadline, the scheduler's entry
+    # (see dashboard.closing) and the user's status index entry land together
+    try:
+        with WriteBatch() as batch:
+            batch.update(f'/transactions/{tx_id}', {'closingDeadline': deadline_ms})
+            batch.set(f'/users/{uid}/closingInfo', closing_info)
+            batch.set(f'{closing.ROOT}/{uid}', closing.schedule_entry(tx_id, deadline_ms, thresholds))
+            directory.stage_tx_status(batch, uid, 'ONGOING', tx_id, now_ms)
+    except Exception:
+        pass
+
+
+def run_entrance(job, uid, tx_id, cam_url):
+    """Job body for entrance_snapshot. Returns the same dict the view used to."""
+    # Count the entry once in the analytics rollups before anything can fail:
+    # the transaction exists whether or not the camera and upload work
+    try:
+        rollups.record_entry(tx_id, rtdb().reference(f'/transactions/{tx_id}/timeIn').get())
+    except Exception:
+        pass
+    try:
+        job.stage('capture')
+        image = capture(cam_url)
+        job.stage('upload')
+        secure_url = upload(image)
+        job.stage('ocr', url=secure_url)
+        plate_text = ocr(image, secure_url)
+        job.stage('rtdb', url=secure_url, plate=plate_text)
+        write_plate(tx_id, plate_text, secure_url)
+    except GateError as e:
+        return {'ok': False, 'error': str(e), **e.payload}
+
+    # Silent failure – closing info is advisory and should not break the flow
+    try:
+        if uid:
+            write_closing_info(uid, tx_id)
+    except Exception:
+        pass
+
+    # Read back current tx snapshot for debugging visibility
+    try:
+        tx_snapshot = rtdb().reference(f'/transactions/{tx_id}').get() or {}
+    except Exception:
+        tx_snapshot = {}
+    return { 'ok': True, 'url': secure_url, 'plate': plate_text, 'txId': tx_id, 'tx': tx_snapshot }
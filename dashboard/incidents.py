@@ -0,0 +1,216 @@
+"""Server-side auto-resolution of incidents awaiting user confirmation.
+
+resolve_incident (without finalize) puts an incident in PENDING_USER_CONFIRM
+with a confirmDeadline an hour out. In the same write it adds a
+deadline-ordered index entry:
+
+    /incidentDeadlines/<incidentId>   {deadline}
+
+IncidentSweeper asks that index for entries whose deadline has passed (one
+bounded orderByChild query, at most SWEEP_BATCH at a time). Each incident is
+flipped to RESOLVED by an RTDB transaction on /incidents/<id> that only
+succeeds while it is still PENDING_USER_CONFIRM past its deadline, so a user
+who confirms at the last moment is never overwritten. The /pastIncidents
+copies and the index deletes then go out in one WriteBatch. If the process
+dies in between, the index entry is still there and the next sweep writes
+the copy for the incident it auto-resolved (``autoResolved``). If the user
+has confirmed or the deadline was extended in the meantime, the index entry
+is simply dropped or moved.
+
+Between sweeps it sleeps until the next deadline in the index (capped at
+SWEEP_MAX_SLEEP). Lag from deadline to finalization is kept for
+``stats()`` and published to STATS_PATH in RTDB after every sweep, where the
+web workers read it for api/incidents/sweeper/.
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from core.firebase import WriteBatch, query_range, rtdb
+
+ROOT = '/incidentDeadlines'
+PENDING = 'PENDING_USER_CONFIRM'
+CONFIRM_WINDOW_MS = 3600 * 1000
+SWEEP_BATCH = int(os.environ.get("INCIDENT_SWEEP_BATCH", "100") or 100)
+SWEEP_MAX_SLEEP = float(os.environ.get("INCIDENT_SWEEP_MAX_SLEEP", "30") or 30)
+READ_CONCURRENCY = int(os.environ.get("INCIDENT_SWEEP_READ_CONCURRENCY", "8") or 8)
+STATS_PATH = '/sweeperStats/incidents'
+
+
+def stage_pending(batch, incident_id, now_ms):
+    """Ask the user to confirm; the sweeper auto-resolves after CONFIRM_WINDOW_MS."""
+    deadline = now_ms + CONFIRM_WINDOW_MS
+    batch.update(f"/incidents/{incident_id}", {
+        "status": PENDING,
+        "confirmRequestedAt": now_ms,
+        "confirmDeadline": deadline,
+    })
+    batch.set(f"{ROOT}/{incident_id}", {"deadline": deadline})
+    return deadline
+
+
+def stage_copy(batch, incident_id, snapshot, resolved_at):
+    """Copy the incident to /pastIncidents as RESOLVED and drop its deadline entry."""
+    copy_payload = dict(snapshot) if isinstance(snapshot, dict) else {}
+    copy_payload.pop("autoResolved", None)
+    copy_payload.update({"status": "RESOLVED", "resolvedAt": resolved_at, "incidentId": incident_id})
+    batch.set(f"/pastIncidents/{incident_id}", copy_payload)
+    batch.delete(f"{ROOT}/{incident_id}")
+    return copy_payload
+
+
+def stage_finalize(batch, incident_id, snapshot, now_ms):
+    """Copy the incident to /pastIncidents as RESOLVED and mark the live record."""
+    copy_payload = stage_copy(batch, incident_id, snapshot, now_ms)
+    batch.update(f"/incidents/{incident_id}", {"status": "RESOLVED", "resolvedAt": now_ms})
+    return copy_payload
+
+
+def resolve_if_overdue(incident_id, now_ms):
+    """Flip one incident to RESOLVED with a transaction, only while it is PENDING past its deadline.
+
+    Returns (outcome, record):
+        'finalized'  resolved now; record is the incident as it was
+        'copy'       auto-resolved by an earlier sweep whose copy may be missing
+        'moved'      still pending, deadline pushed out; record is current
+        'gone'       confirmed, resolved elsewhere, or deleted
+    """
+    result = {}
+
+    def _txn(current):
+        if not isinstance(current, dict):
+            result.update(outcome='gone', record=None)
+            return current
+        status = str(current.get('status') or '').upper()
+        deadline = current.get('confirmDeadline')
+        if status != PENDING:
+            auto = status == 'RESOLVED' and current.get('autoResolved')
+            result.update(outcome='copy' if auto else 'gone', record=current)
+            return current
+        if isinstance(deadline, (int, float)) and deadline > now_ms:
+            result.update(outcome='moved', record=current)
+            return current
+        result.update(outcome='finalized', record=dict(current))
+        return {**current, 'status': 'RESOLVED', 'resolvedAt': now_ms, 'autoResolved': True}
+
+    rtdb().reference(f"/incidents/{incident_id}").transaction(_txn)
+    return result.get('outcome', 'gone'), result.get('record')
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+class IncidentSweeper:
+    def __init__(self):
+        self.finalized = 0
+        self.dropped = 0
+        self.sweeps = 0
+        self.last_sweep_at = None
+        self.lags = deque(maxlen=512)
+        self._stop = threading.Event()
+
+    def _resolve_all(self, ids, now_ms):
+        with ThreadPoolExecutor(max_workers=max(1, min(READ_CONCURRENCY, len(ids)))) as pool:
+            return dict(zip(ids, pool.map(lambda i: resolve_if_overdue(i, now_ms), ids)))
+
+    def sweep(self, now_ms=None):
+        """Finalize up to SWEEP_BATCH overdue incidents; returns how many index entries were handled."""
+        now_ms = now_ms if now_ms is not None else _now_ms()
+        due = query_range(ROOT, 'deadline', end=now_ms, limit=SWEEP_BATCH)
+        self.sweeps += 1
+        self.last_sweep_at = now_ms
+        if not due:
+            self.publish()
+            return 0
+        outcomes = self._resolve_all(list(due), now_ms)
+        batch = WriteBatch()
+        lags = []
+        finalized = dropped = 0
+        for incident_id, entry in due.items():
+            outcome, record = outcomes[incident_id]
+            if outcome == 'finalized':
+                stage_copy(batch, incident_id, record, now_ms)
+                lags.append(now_ms - int((entry or {}).get('deadline') or now_ms))
+                finalized += 1
+            elif outcome == 'copy':
+                # Resolved by a sweep that died before writing the copy
+                stage_copy(batch, incident_id, record, record.get('resolvedAt') or now_ms)
+            elif outcome == 'moved':
+                # Deadline was pushed out since it was indexed
+                batch.set(f"{ROOT}/{incident_id}", {"deadline": int(record['confirmDeadline'])})
+                dropped += 1
+            else:
+                # Confirmed, resolved by an admin, or deleted: nothing left to do
+                batch.delete(f"{ROOT}/{incident_id}")
+                dropped += 1
+        batch.commit()
+        self.finalized += finalized
+        self.dropped += dropped
+        self.lags.extend(lags)
+        self.publish()
+        return len(due)
+
+    def next_deadline(self):
+        nxt = rtdb().reference(ROOT).order_by_child('deadline').limit_to_first(1).get() or {}
+        for entry in (nxt.values() if isinstance(nxt, dict) else []):
+            if isinstance(entry, dict) and isinstance(entry.get('deadline'), (int, float)):
+                return int(entry['deadline'])
+        return None
+
+    def run(self):
+        while not self._stop.is_set():
+            try:
+                if self.sweep() >= SWEEP_BATCH:
+                    continue  # more overdue entries waiting
+                nxt = self.next_deadline()
+            except Exception:
+                nxt = None
+            wait = SWEEP_MAX_SLEEP
+            if nxt is not None:
+                wait = min(wait, max(0.0, (nxt - _now_ms()) / 1000.0) + 0.05)
+            self._stop.wait(wait)
+
+    def stop(self):
+        self._stop.set()
+
+    def stats(self):
+        lags = sorted(self.lags)
+
+        def _pct(p):
+            return lags[min(len(lags) - 1, int(len(lags) * p / 100.0))] if lags else None
+
+        return {
+            'finalized': self.finalized,
+            'dropped': self.dropped,
+            'sweeps': self.sweeps,
+            'lastSweepAt': self.last_sweep_at,
+            'lagMs': {'p50': _pct(50), 'p95': _pct(95), 'max': lags[-1] if lags else None},
+        }
+
+    def publish(self):
+        try:
+            rtdb().reference(STATS_PATH).set(self.stats())
+        except Exception:
+            pass  # stats are advisory; the next sweep publishes again
+
+
+def reindex():
+    """Index every PENDING_USER_CONFIRM incident (one /incidents scan); returns the count."""
+    snapshot = rtdb().reference('/incidents').get() or {}
+    batch = WriteBatch()
+    for incident_id, inc in (snapshot.items() if isinstance(snapshot, dict) else []):
+        if not isinstance(inc, dict) or str(inc.get('status') or '').upper() != PENDING:
+            continue
+        deadline = inc.get('confirmDeadline')
+        if not isinstance(deadline, (int, float)):
+            deadline = int(inc.get('confirmRequestedAt') or 0) + CONFIRM_WINDOW_MS
+        batch.set(f"{ROOT}/{incident_id}", {"deadline": int(deadline)})
+    return batch.commit()
+
+
+def published_stats():
+    """The last stats run_incident_sweeper published (None if it never ran)."""
+    return rtdb().reference(STATS_PATH).get()
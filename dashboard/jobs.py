@@ -0,0 +1,111 @@
+"""Bounded background job queues with pollable status.
+
+Each queue runs jobs on a fixed-size thread pool and refuses new work once
+``limit`` jobs are queued or running, so a burst can't grow memory without
+bound. Job state lives in the Django cache under ``jobs:<queue>:<id>``; with a
+shared cache backend any worker can answer a status poll, with the default
+LocMemCache only the worker that accepted the job can.
+"""
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import cache
+
+JOB_TTL = 3600
+
+
+class QueueFull(Exception):
+    pass
+
+
+class Job:
+    """Handle passed to a job function for reporting progress."""
+
+    def __init__(self, queue, job_id):
+        self.queue = queue
+        self.id = job_id
+
+    def stage(self, name, **extra):
+        self.queue._update(self.id, status='running', stage=name, **extra)
+
+
+class JobQueue:
+    def __init__(self, name, workers=4, limit=64):
+        self.name = name
+        self.workers = workers
+        self.limit = limit
+        self._executor = None
+        self._futures = {}
+        self._lock = threading.Lock()
+
+    def _key(self, job_id):
+        return f"jobs:{self.name}:{job_id}"
+
+    def _update(self, job_id, **fields):
+        state = cache.get(self._key(job_id)) or {'id': job_id}
+        state.update(fields)
+        state['updatedAt'] = int(time.time() * 1000)
+        cache.set(self._key(job_id), state, JOB_TTL)
+        return state
+
+    def submit(self, fn, *args, **kwargs):
+        """Queue fn(job, *args, **kwargs) and return the job id at once."""
+        with self._lock:
+            self._futures = {k: f for k, f in self._futures.items() if not f.done()}
+            if len(self._futures) >= self.limit:
+                raise QueueFull(f"{self.name} queue is full ({self.limit} jobs)")
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"jobs-{self.name}")
+            job_id = uuid.uuid4().hex
+            now_ms = int(time.time() * 1000)
+            self._update(job_id, status='queued', stage='queued', createdAt=now_ms)
+            self._futures[job_id] = self._executor.submit(self._run, job_id, fn, args, kwargs)
+        return job_id
+
+    def _run(self, job_id, fn, args, kwargs):
+        try:
+            result = fn(Job(self, job_id), *args, **kwargs)
+            self._update(job_id, status='done', stage='done', result=result)
+            return result
+        except Exception as e:
+            self._update(job_id, status='failed', error=str(e))
+            raise
+
+    def status(self, job_id):
+        return cache.get(self._key(job_id))
+
+    def wait(self, job_id, timeout=None):
+        """Block until a job accepted by this worker finishes; return its state."""
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None:
+            try:
+                future.result(timeout=timeout)
+            except Exception:
+                pass
+        return self.status(job_id)
+
+    def stats(self):
+        with self._lock:
+            active = sum(1 for f in self._futures.values() if not f.done())
+        return {'workers': self.workers, 'limit': self.limit, 'active': active}
+
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def get_queue(name, workers=None, limit=None):
+    """Return the named queue, sized from JOBS_<NAME>_WORKERS/_LIMIT env vars."""
+    with _queues_lock:
+        if name not in _queues:
+            env = name.upper()
+            if workers is None:
+                workers = int(os.environ.get(f"JOBS_{env}_WORKERS", "4") or 4)
+            if limit is None:
+                limit = int(os.environ.get(f"JOBS_{env}_LIMIT", "64") or 64)
+            _queues[name] = JobQueue(name, workers=workers, limit=limit)
+        return _queues[name]
@@ -0,0 +1,346 @@
+"""Compact, shared model of /configurations/layout.
+
+A Layout is built once per layout version and then shared by every request
+in the worker:
+
+    ids        one tuple of interned slot ids; a slot's position in it is its index
+    positions  array('I') parallel to ids: the slot's index in its RTDB list
+    floors     floor -> {type: array('I') of slot indices}, in slotsByFloor order
+    names      override table {index: display name}, only for renamed slots
+
+A 5,000-slot garage is one tuple, a few dozen small arrays and however many
+renames there are, instead of a dict/list/tuple tree per request.
+
+Versions. Writers of slotsByFloor (register_slots, save_layout_labels) also
+stamp ``/configurations/layout/version``. ``current()`` reads only that stamp
+and rebuilds only when it changes. Layouts written before the stamp existed
+are versioned by a hash of slotsByFloor, which costs a full read, as before.
+The monitor template caches each floor's rendered grid under
+(version, floor), so an unchanged floor is rendered once per version.
+
+Writes. ``rename_slots`` uses the slot-path index (id -> floor key, type,
+list position) and writes only the renamed {id, name} items: a few hundred
+bytes for ten renames, and concurrent renames of other slots are left
+alone. Each item is renamed by an RTDB transaction on its own path that
+only applies while the item there still has the expected id, so a layout
+replaced between the index read and the write is never renamed by position.
+Bare-string items of older layouts are written back as {id, name}. Items
+that fail the id check are retried on a freshly read layout. The version is
+then advanced once. If nothing else stamped it meanwhile, the renaming
+worker patches its cached Layout in place and reads nothing back; other
+workers rebuild when they see the new version. Renames are refused while a
+provisioning run is writing the layout. Layout-wide replacements go
+through ``write_layout``: an ETag-guarded (If-Match) set that re-runs the
+change on the latest value after a conflict.
+"""
+import hashlib
+import json
+import sys
+import threading
+import time
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+
+from core.firebase import WriteBatch, read as mirror_read, rtdb, subscribe as mirror_subscribe
+
+ROOT = '/configurations/layout'
+WRITE_RETRIES = 5
+RENAME_CONCURRENCY = 8
+
+TYPES = ('Car', 'Motorcycle', 'PWD')
+PREFIXES = {'Car': 'C', 'Motorcycle': 'M', 'PWD': 'P'}
+
+
+def new_version():
+    return int(time.time() * 1000)
+
+
+def _floor_items(sbf):
+    items = sbf.items() if isinstance(sbf, dict) else enumerate(sbf or [])
+    out = []
+    for floor_key, types in items:
+        if types is None:
+            continue
+        try:
+            out.append((int(floor_key), str(floor_key), types))
+        except (TypeError, ValueError):
+            continue
+    return sorted(out, key=lambda ft: ft[0])
+
+
+def indexed(items):
+    """[(position, item)] of an RTDB list, which may come back as a {"0": ...} object."""
+    if isinstance(items, list):
+        return list(enumerate(items))
+    if isinstance(items, dict):
+        out = [(int(k), v) for k, v in items.items() if str(k).isdigit()]
+        return sorted(out, key=lambda pv: pv[0])
+    return []
+
+
+class Floor:
+    __slots__ = ('layout', 'number', 'key', 'by_type')
+
+    def __init__(self, layout, number, by_type, key=None):
+        self.layout, self.number, self.by_type = layout, number, by_type
+        self.key = str(number) if key is None else str(key)
+
+    def slots(self, type_):
+        """(name, id) pairs of type_ on this floor, generated on demand."""
+        ids, names = self.layout.ids, self.layout.names
+        for i in self.by_type.get(type_, ()):
+            yield names.get(i, ids[i]), ids[i]
+
+    @property
+    def groups(self):
+        return [(t, self.slots(t)) for t in TYPES]
+
+
+class Layout:
+    def __init__(self, version=None):
+        self.version = version
+        self.ids = ()
+        self.positions = array('I')
+        self.names = {}
+        self.floors = []
+        self._paths = None
+        self._index = None
+
+    def __bool__(self):
+        return bool(self.floors)
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_slots_by_floor(cls, sbf, version=None):
+        if version is None:
+            version = 'h' + hashlib.sha1(json.dumps(sbf, sort_keys=True, default=str).encode('utf-8')).hexdigest()[:16]
+        layout = cls(version)
+        ids, names, positions = [], {}, array('I')
+        for number, floor_key, types in _floor_items(sbf):
+            by_type = {}
+            for t in TYPES:
+                items = types.get(t) if isinstance(types, dict) else None
+                idx = array('I')
+                for pos, item in indexed(items):
+                    if item is None:
+                        continue
+                    if isinstance(item, dict):
+                        sid = str(item.get('id') or '')
+                        name = item.get('name') or sid
+                    else:
+                        sid = name = str(item)
+                    i = len(ids)
+                    ids.append(sys.intern(sid))
+                    positions.append(pos)
+                    if name != sid:
+                        names[i] = str(name)
+                    idx.append(i)
+                by_type[t] = idx
+            layout.floors.append(Floor(layout, number, by_type, floor_key))
+        layout.ids, layout.names, layout.positions = tuple(ids), names, positions
+        return layout
+
+    @classmethod
+    def generated(cls, floors, counts, version=None):
+        """Layout of register_slots' generated ids (C1-1, M1-1, P1-1, ...) from per-type counts."""
+        layout = cls(version if version is not None else f"g{floors}-" + '-'.join(str(counts.get(t, 0)) for t in TYPES))
+        ids = []
+        for number in range(1, floors + 1):
+            by_type = {}
+            for t in TYPES:
+                start = len(ids)
+                ids.extend(sys.intern(f"{PREFIXES[t]}{number}-{n + 1}") for n in range(int(counts.get(t, 0))))
+                by_type[t] = array('I', range(start, len(ids)))
+                layout.positions.extend(range(len(ids) - start))
+            layout.floors.append(Floor(layout, number, by_type))
+        layout.ids = tuple(ids)
+        return layout
+
+    def path(self, slot_id):
+        """RTDB path of slot_id's item under ROOT, e.g. 'slotsByFloor/1/Car/0', or None."""
+        if self._paths is None:
+            paths = {}
+            for floor in self.floors:
+                for t, idx in floor.by_type.items():
+                    for i in idx:
+                        paths.setdefault(self.ids[i], f"slotsByFloor/{floor.key}/{t}/{self.positions[i]}")
+            self._paths = paths
+        return self._paths.get(slot_id)
+
+    def name(self, slot_id):
+        """Display name of slot_id (its id unless overridden)."""
+        if self.path(slot_id) is None:
+            return None
+        if self._index is None:
+            self._index = {sid: i for i, sid in enumerate(self.ids)}
+        i = self._index[slot_id]
+        return self.names.get(i, slot_id)
+
+    def rename(self, slot_id, name):
+        """Set slot_id's display name in this model (after the RTDB write); False if unknown."""
+        if self.name(slot_id) is None:
+            return False
+        i = self._index[slot_id]
+        if name == slot_id:
+            self.names.pop(i, None)
+        else:
+            self.names[i] = name
+        return True
+
+    def to_slots_by_floor(self):
+        """The RTDB slotsByFloor value ({id, name} per slot)."""
+        out = {}
+        for floor in self.floors:
+            out[str(floor.number)] = {
+                t: [{'id': sid, 'name': name} for name, sid in floor.slots(t)] for t in TYPES
+            }
+        return out
+
+
+_current = None
+_lock = threading.Lock()
+
+
+class LayoutConflict(Exception):
+    """The layout kept changing underneath a write for WRITE_RETRIES attempts."""
+
+
+def current(fresh=False):
+    """This worker's Layout for the RTDB layout's current version.
+
+    fresh=True reads RTDB directly instead of the (possibly lagging) mirror.
+    """
+    global _current
+    if fresh:
+        read = lambda path: rtdb().reference(path).get()
+    else:
+        mirror_subscribe()
+        read = mirror_read
+    version = read(f'{ROOT}/version')
+    with _lock:
+        if _current is not None and version is not None and _current.version == version:
+            return _current
+    sbf = read(f'{ROOT}/slotsByFloor') or {}
+    layout = Layout.from_slots_by_floor(sbf, version)
+    with _lock:
+        if _current is not None and _current.version == layout.version:
+            return _current
+        _current = layout
+    return layout
+
+
+def invalidate():
+    global _current
+    with _lock:
+        _current = None
+
+
+def _rename_item(path, sid, name):
+    """Rename the item at path only while it is still slot sid; True if it was."""
+    done = {'ok': False}
+
+    def _txn(current):
+        if isinstance(current, dict) and str(current.get('id')) == sid:
+            done['ok'] = True
+            return {**current, 'name': name}
+        if isinstance(current, str) and current == sid:
+            # Legacy layouts store bare ids; the renamed item becomes {id, name}
+            done['ok'] = True
+            return {'id': sid, 'name': name}
+        done['ok'] = False
+        return current
+
+    rtdb().reference(f'{ROOT}/{path}').transaction(_txn)
+    return done['ok']
+
+
+def _stamp_version():
+    """Advance /version so every worker rebuilds; unstamped (legacy) layouts get their first stamp.
+
+    Returns (version written, version it replaced).
+    """
+    new = new_version()
+    seen = {'prior': None}
+
+    def _txn(value):
+        seen['prior'] = value
+        return max(new, value + 1) if isinstance(value, int) else new
+
+    stamped = rtdb().reference(f'{ROOT}/version').transaction(_txn)
+    return stamped, seen['prior']
+
+
+def _provisioning():
+    from . import provisioning
+    return provisioning.in_progress()
+
+
+def rename_slots(labels):
+    """Apply {slot id: new name} as guarded item writes; returns (renamed ids, unknown ids)."""
+    global _current
+    pending = {str(k): str(v) for k, v in labels.items()}
+    renamed, unknown, names = [], [], {}
+    layout = None
+    for _ in range(WRITE_RETRIES):
+        if _provisioning():
+            raise LayoutConflict("a new layout is being generated; rename once it finishes")
+        layout = current(fresh=True)
+        todo = []
+        for sid, name in pending.items():
+            path = layout.path(sid)
+            if path is None:
+                unknown.append(sid)
+            elif layout.name(sid) != name:
+                todo.append((sid, path, name))
+        pending = {}
+        if todo:
+            with ThreadPoolExecutor(max_workers=min(RENAME_CONCURRENCY, len(todo))) as pool:
+                results = list(pool.map(lambda t: _rename_item(t[1], t[0], t[2]), todo))
+            for (sid, _, name), ok in zip(todo, results):
+                if ok:
+                    renamed.append(sid)
+                    names[sid] = name
+                else:
+                    pending[sid] = name  # the layout moved under this item
+        if not pending:
+            break
+        invalidate()
+    if renamed and not _provisioning():
+        stamped, prior = _stamp_version()
+        with _lock:
+            if prior == layout.version and _current is layout:
+                # Nobody else wrote in between: patch this worker's model
+                # instead of reading slotsByFloor back
+                for sid, name in names.items():
+                    layout.rename(sid, name)
+                layout.version = stamped
+            else:
+                _current = None
+    if pending:
+        raise LayoutConflict("layout changed during rename; try again")
+    return renamed, unknown
+
+
+def write_layout(mutate, stamp=True):
+    """ETag-guarded read-modify-write of the whole layout.
+
+    mutate(current) returns the new layout value (or None to skip); it is
+    re-run on the latest value after a conflict. The new value is stamped
+    with a fresh version unless stamp=False (left unversioned, so readers
+    don't cache it). Returns the value written, or None.
+    """
+    ref = rtdb().reference(ROOT)
+    value, etag = ref.get(etag=True)
+    for _ in range(WRITE_RETRIES):
+        new = mutate(value if isinstance(value, dict) else {})
+        if new is None:
+            return None
+        if stamp:
+            new['version'] = new_version()
+        ok, value, etag = ref.set_if_unchanged(etag, new)
+        if ok:
+            invalidate()
+            return new
+    raise LayoutConflict("layout changed during write; try again")
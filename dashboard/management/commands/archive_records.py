@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard import archive
+
+
+class Command(BaseCommand):
+    help = "Move transactions, past incidents and audit entries older than the retention window into the archive."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dataset", action="append", choices=sorted(archive.DATASETS),
+                            help="Only archive this dataset (repeatable; default all)")
+        parser.add_argument("--retention-days", type=int, default=archive.RETENTION_DAYS)
+        parser.add_argument("--batch-size", type=int, default=archive.BATCH_SIZE)
+        parser.add_argument("--dry-run", action="store_true", help="Count what would move without writing or deleting")
+        parser.add_argument("--stats", action="store_true", help="List the archive files and exit")
+
+    def handle(self, *args, **options):
+        if options["stats"]:
+            for dataset, files in archive.stats().items():
+                for month, info in files.items():
+                    self.stdout.write(f"{dataset} {month}: {info['rows']} rows in {info['segments']} segments, {info['bytes']} bytes")
+            return
+        if options["retention_days"] < 1:
+            raise CommandError("--retention-days must be at least 1")
+        for dataset in options["dataset"] or list(archive.DATASETS):
+            try:
+                counts = archive.archive(
+                    dataset,
+                    retention_days=options["retention_days"],
+                    batch_size=max(1, options["batch_size"]),
+                    dry_run=options["dry_run"],
+                    log=lambda msg: self.stdout.write(f"  {msg}"),
+                )
+            except Exception as e:
+                raise CommandError(f"Archiving {dataset} failed: {e}")
+            verb = "Would archive" if options["dry_run"] else "Archived"
+            self.stdout.write(self.style.SUCCESS(
+                f"{verb} {counts['archived']} {dataset} records into {len(counts['months'])} months "
+                f"({counts['kept']} old records not eligible yet)."
+            ))
@@ -0,0 +1,49 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard import plate_ocr
+
+
+class Command(BaseCommand):
+    help = "Time an OCR backend over a folder of sample plate JPEGs."
+
+    def add_arguments(self, parser):
+        parser.add_argument("folder", help="Directory of .jpg/.jpeg/.png samples")
+        parser.add_argument("--backend", default="local", choices=sorted(plate_ocr.BACKENDS))
+        parser.add_argument("--repeat", type=int, default=1, help="Runs per image (first run warms templates)")
+
+    def handle(self, *args, **options):
+        folder = options["folder"]
+        if not os.path.isdir(folder):
+            raise CommandError(f"{folder} is not a directory")
+        files = sorted(
+            f for f in os.listdir(folder)
+            if f.lower().endswith((".jpg", ".jpeg", ".png"))
+        )
+        if not files:
+            raise CommandError(f"No images in {folder}")
+
+        backend = plate_ocr.BACKENDS[options["backend"]]()
+        timings, read = [], 0
+        for name in files:
+            with open(os.path.join(folder, name), "rb") as fh:
+                image = fh.read()
+            plate = ""
+            for _ in range(max(1, options["repeat"])):
+                started = time.perf_counter()
+                plate = plate_ocr.read_plate(image, backends=[backend])
+                timings.append((time.perf_counter() - started) * 1000.0)
+            read += bool(plate)
+            # File names like "ABC1234.jpg" double as the expected plate
+            expected = os.path.splitext(name)[0].upper().replace("_", " ")
+            mark = "ok" if plate.replace(" ", "") == expected.replace(" ", "") else "--"
+            self.stdout.write(f"{mark} {name:<32} {plate or '(none)':<10} {timings[-1]:7.1f} ms")
+
+        timings.sort()
+        p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+        self.stdout.write(self.style.SUCCESS(
+            f"{backend.name}: {len(files)} images, {read} read, "
+            f"mean {sum(timings) / len(timings):.1f} ms, p50 {timings[len(timings) // 2]:.1f} ms, p95 {p95:.1f} ms"
+        ))
@@ -0,0 +1,53 @@
+import os
+import subprocess
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Packages that should only load when a request actually needs them
+HEAVY = ("matplotlib", "numpy", "PIL", "requests", "firebase_admin", "google")
+
+
+class Command(BaseCommand):
+    help = "Measure cold import time of the URLconf (what a fresh worker pays) with -X importtime."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--module", default="dashboard.urls", help="Module to import after django.setup()")
+        parser.add_argument("--top", type=int, default=15, help="Number of slowest modules to list")
+
+    def handle(self, *args, **options):
+        module = options["module"]
+        code = f"import django; django.setup(); import {module}"
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get("DJANGO_SETTINGS_MODULE", "core.settings"))
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", code],
+            capture_output=True, text=True, env=env,
+        )
+        if proc.returncode != 0:
+            raise CommandError(proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else "import failed")
+
+        rows = []  # (cumulative_us, self_us, depth, name)
+        for line in proc.stderr.splitlines():
+            if not line.startswith("import time:") or "self [us]" in line:
+                continue
+            self_part, cumulative, raw = line.split("|", 2)
+            self_us = int(self_part.split(":")[1])
+            raw = raw.rstrip()
+            depth = (len(raw) - len(raw.lstrip()) - 1) // 2  # one leading space is padding
+            rows.append((int(cumulative), self_us, depth, raw.strip()))
+
+        total_ms = sum(r[1] for r in rows) / 1000.0
+        target = next((r for r in rows if r[3] == module), None)
+        self.stdout.write(f"Total import time: {total_ms:.1f} ms ({len(rows)} modules)")
+        if target:
+            self.stdout.write(f"{module}: {target[0] / 1000.0:.1f} ms cumulative")
+
+        self.stdout.write("\nSlowest imports (first three nesting levels):")
+        for cumulative, _, depth, name in sorted((r for r in rows if r[2] <= 2), reverse=True)[:options["top"]]:
+            self.stdout.write(f"  {cumulative / 1000.0:8.1f} ms  {name}")
+
+        loaded = {r[3].split(".")[0] for r in rows}
+        self.stdout.write("\nHeavy packages loaded at import:")
+        for pkg in HEAVY:
+            flag = self.style.WARNING("loaded") if pkg in loaded else self.style.SUCCESS("deferred")
+            self.stdout.write(f"  {pkg:<16} {flag}")
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard import rollups
+
+
+class Command(BaseCommand):
+    help = "Recompute the /rollups analytics buckets from a full /transactions scan and the archive."
+
+    def handle(self, *args, **options):
+        try:
+            tree = rollups.rebuild()
+        except Exception as e:
+            raise CommandError(f"Rollup rebuild failed: {e}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {len(tree['daily'])} daily, {len(tree['weekly'])} weekly and "
+            f"{len(tree['monthly'])} monthly buckets "
+            f"({len(tree['applied']['completions'])} completed transactions)."
+        ))
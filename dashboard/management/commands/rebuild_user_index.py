@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard import directory
+
+
+class Command(BaseCommand):
+    help = "Rebuild /userTxStatus (each user's latest transaction status) from one /transactions scan."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help="Entries per multi-path write (default 500).")
+
+    def handle(self, *args, **options):
+        try:
+            count = directory.rebuild_tx_status(chunk_size=max(1, options['chunk_size']))
+        except Exception as e:
+            raise CommandError(f"User index rebuild failed: {e}")
+        self.stdout.write(self.style.SUCCESS(f"Indexed {count} users."))
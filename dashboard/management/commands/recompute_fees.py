@@ -0,0 +1,32 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard import fees
+from dashboard.rollups import tz_ph
+
+
+class Command(BaseCommand):
+    help = "Re-price one month of completed ParkingLogs under the active FeeConfig (report only)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--month", required=True, metavar="YYYY-MM", help="Month of exit time (Asia/Manila)")
+        parser.add_argument("--show", type=int, default=20, help="Number of differing logs to list")
+
+    def handle(self, *args, **options):
+        try:
+            year, month = (int(p) for p in options["month"].split("-"))
+            start = datetime(year, month, 1, tzinfo=tz_ph())
+            end = datetime(year + month // 12, month % 12 + 1, 1, tzinfo=tz_ph())
+        except ValueError:
+            raise CommandError("--month must look like YYYY-MM")
+        try:
+            result = fees.recompute_history(start, end)
+        except Exception as e:
+            raise CommandError(f"Recompute failed: {e}")
+        self.stdout.write(
+            f"{result['count']} logs: paid ₱{result['paid']:,.2f}, "
+            f"recomputed ₱{result['recomputed']:,.2f}, {len(result['changed'])} differ."
+        )
+        for tx_id, paid, fee in result["changed"][:options["show"]]:
+            self.stdout.write(f"  {tx_id}: paid {paid:.2f} -> {fee:.2f}")
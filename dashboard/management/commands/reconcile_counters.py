@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard import counters
+
+
+class Command(BaseCommand):
+    help = "Rebuild /counters (user totals and PWD index) from a full /users scan."
+
+    def handle(self, *args, **options):
+        before = {}
+        try:
+            before = counters.read_totals()
+            tree = counters.rebuild()
+        except Exception as e:
+            raise CommandError(f"Counter rebuild failed: {e}")
+        totals = tree['totals']
+        self.stdout.write(self.style.SUCCESS(
+            f"Counted {totals['users']} users ({totals['pwdUsers']} PWD); "
+            f"previously {before.get('users', 0)} ({before.get('pwdUsers', 0)} PWD)."
+        ))
@@ -0,0 +1,39 @@
+import signal
+import threading
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard.closing import ClosingScheduler
+
+
+class Command(BaseCommand):
+    help = "Fire closingInfo 60/30/15/5-minute thresholds at notifyAt (run one per database)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--stats-every", type=float, default=300, metavar="SECONDS",
+                            help="Log scheduler stats every SECONDS (0 disables)")
+        parser.add_argument("--once", action="store_true", help="Recover, fire everything already due, and exit")
+
+    def handle(self, *args, **options):
+        scheduler = ClosingScheduler()
+        try:
+            if options["once"]:
+                pending = scheduler.recover()
+                fired = scheduler.run_once()
+                self.stdout.write(self.style.SUCCESS(f"Loaded {pending} thresholds, fired {fired}."))
+                return
+
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(sig, lambda *_: scheduler.stop())
+            stop_stats = threading.Event()
+            if options["stats_every"] > 0:
+                def _report():
+                    while not stop_stats.wait(options["stats_every"]):
+                        self.stdout.write(f"closing scheduler: {scheduler.stats()}")
+                threading.Thread(target=_report, daemon=True).start()
+            self.stdout.write("Closing scheduler running.")
+            scheduler.run()
+            stop_stats.set()
+            self.stdout.write(f"Stopped: {scheduler.stats()}")
+        except Exception as e:
+            raise CommandError(f"Closing scheduler failed: {e}")
@@ -0,0 +1,32 @@
+import signal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard import incidents
+
+
+class Command(BaseCommand):
+    help = "Finalize PENDING_USER_CONFIRM incidents into /pastIncidents once their confirmDeadline passes."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--once", action="store_true", help="Sweep everything already overdue, then exit")
+        parser.add_argument("--reindex", action="store_true",
+                            help="First index pending incidents created before the sweeper existed")
+
+    def handle(self, *args, **options):
+        sweeper = incidents.IncidentSweeper()
+        try:
+            if options["reindex"]:
+                self.stdout.write(f"Indexed {incidents.reindex()} pending incidents.")
+            if options["once"]:
+                while sweeper.sweep() >= incidents.SWEEP_BATCH:
+                    pass
+                self.stdout.write(self.style.SUCCESS(f"Swept: {sweeper.stats()}"))
+                return
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                signal.signal(sig, lambda *_: sweeper.stop())
+            self.stdout.write("Incident sweeper running.")
+            sweeper.run()
+            self.stdout.write(f"Stopped: {sweeper.stats()}")
+        except Exception as e:
+            raise CommandError(f"Incident sweeper failed: {e}")
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from dashboard import sync
+
+
+class Command(BaseCommand):
+    help = "Mirror RTDB /transactions and /payments into ParkingLog and Payment rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--full", action="store_true", help="Backfill everything in key-ordered pages")
+        parser.add_argument("--batch-size", type=int, default=sync.BATCH_SIZE)
+        parser.add_argument("--follow", type=float, default=0, metavar="SECONDS",
+                            help="Keep running incremental passes every SECONDS")
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options["batch_size"])
+        try:
+            if options["full"]:
+                counts = sync.backfill(batch_size, log=lambda msg: self.stdout.write(f"  {msg}"))
+                self.stdout.write(self.style.SUCCESS(f"Backfilled {counts['transactions']} transactions, {counts['payments']} payments."))
+            while True:
+                if not options["full"] or options["follow"]:
+                    counts = sync.incremental(batch_size)
+                    self.stdout.write(f"Synced {counts['transactions']} transactions, {counts['payments']} payments.")
+                if not options["follow"]:
+                    break
+                time.sleep(options["follow"])
+        except KeyboardInterrupt:
+            pass
+        except Exception as e:
+            raise CommandError(f"Sync failed: {e}")
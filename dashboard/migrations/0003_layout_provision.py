@@ -0,0 +1,38 @@
+# Generated by Django 5.2.4 on 2026-10-18 17:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('dashboard', '0002_rtdb_mirror'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LayoutProvision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('floors', models.PositiveIntegerField()),
+                ('car_slots', models.PositiveIntegerField(default=0)),
+                ('motor_slots', models.PositiveIntegerField(default=0)),
+                ('pwd_slots', models.PositiveIntegerField(default=0)),
+                ('status', models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=10)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('written', models.PositiveIntegerField(default=0)),
+                ('floor', models.PositiveIntegerField(default=0, help_text='Floor currently being uploaded')),
+                ('error', models.TextField(blank=True)),
+                ('version', models.BigIntegerField(blank=True, help_text='/configurations/layout/version once done', null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('created_by', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'created_at'], name='layoutprov_status_created_idx')],
+            },
+        ),
+    ]
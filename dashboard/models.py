@@ -16,17 +16,36 @@ class ParkingSlot(models.Model):
     def __str__(self):
         return f"{self.slot_id} ({self.get_slot_type_display()})"
 
-# 2. Parking Log (Entry/Exit)
+# 2. Parking Log (Entry/Exit) – mirrored from RTDB /transactions by dashboard.sync
 class ParkingLog(models.Model):
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
     slot = models.ForeignKey(ParkingSlot, on_delete=models.SET_NULL, null=True)
     entry_time = models.DateTimeField()
     exit_time = models.DateTimeField(null=True, blank=True)
     photo_url = models.URLField(blank=True)  # URL to Firebase Storage or similar
     payment_status = models.CharField(max_length=20, choices=[('unpaid', 'Unpaid'), ('paid', 'Paid')], default='unpaid')
+    tx_id = models.CharField(max_length=64, unique=True, null=True, blank=True, help_text="RTDB /transactions key")
+    uid = models.CharField(max_length=128, blank=True, help_text="Firebase uid of the driver")
+    status = models.CharField(max_length=20, blank=True)
+    vehicle_type = models.CharField(max_length=20, blank=True)
+    slot_name = models.CharField(max_length=40, blank=True)
+    plate_number = models.CharField(max_length=20, blank=True)
+    amount_paid = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+    synced_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['entry_time'], name='parkinglog_entry_idx'),
+            models.Index(fields=['exit_time'], name='parkinglog_exit_idx'),
+            models.Index(fields=['status', 'entry_time'], name='parkinglog_status_entry_idx'),
+            models.Index(fields=['status', 'exit_time'], name='parkinglog_status_exit_idx'),
+            models.Index(fields=['vehicle_type', 'exit_time'], name='parkinglog_vtype_exit_idx'),
+            models.Index(fields=['uid', 'entry_time'], name='parkinglog_uid_entry_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.user.username} - {self.slot} ({self.entry_time})"
+        who = self.user.username if self.user_id else (self.uid or '?')
+        return f"{who} - {self.slot or self.slot_name} ({self.entry_time})"
 
 # 3. PWD Request
 class PWDRequest(models.Model):
@@ -52,17 +71,27 @@ class FeeConfig(models.Model):
     def __str__(self):
         return f"₱{self.base_fee} for {self.base_hours}h, ₱{self.succeeding_fee}/h after"
 
-# 5. Payment
+# 5. Payment – mirrored from RTDB /payments by dashboard.sync
 class Payment(models.Model):
-    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
-    log = models.ForeignKey(ParkingLog, on_delete=models.CASCADE)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
+    log = models.ForeignKey(ParkingLog, on_delete=models.CASCADE, null=True, blank=True)
     amount = models.DecimalField(max_digits=8, decimal_places=2)
-    method = models.CharField(max_length=20, choices=[('gcash', 'GCash'), ('cash', 'Cash'), ('other', 'Other')])
+    method = models.CharField(max_length=20, choices=[('gcash', 'GCash'), ('cash', 'Cash'), ('mockpay', 'MockPay'), ('other', 'Other')])
     status = models.CharField(max_length=20, choices=[('pending', 'Pending'), ('completed', 'Completed'), ('failed', 'Failed')], default='pending')
     timestamp = models.DateTimeField(auto_now_add=True)
+    tx_id = models.CharField(max_length=64, unique=True, null=True, blank=True, help_text="RTDB /payments key (txId)")
+    reference_number = models.CharField(max_length=64, blank=True)
+    paid_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'paid_at'], name='payment_status_paid_idx'),
+            models.Index(fields=['method', 'paid_at'], name='payment_method_paid_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.user.username} - {self.amount} ({self.status})"
+        who = self.user.username if self.user_id else (self.tx_id or '?')
+        return f"{who} - {self.amount} ({self.status})"
 
 # 6. (Optional) Violation
 class Violation(models.Model):
@@ -73,4 +102,46 @@ class Violation(models.Model):
     timestamp = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"Violation by {self.user.username} at {self.timestamp}"
\ No newline at end of file
+        return f"Violation by {self.user.username} at {self.timestamp}"
+
+# 7. Sync watermarks for RTDB → SQL mirrors
+class SyncState(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    watermark = models.CharField(max_length=64, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} @ {self.watermark or '-'}"
+
+# 8. Layout provisioning runs (register_slots) – the generated layout's spec and upload progress
+class LayoutProvision(models.Model):
+    STATUS_CHOICES = [
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ]
+    floors = models.PositiveIntegerField()
+    car_slots = models.PositiveIntegerField(default=0)
+    motor_slots = models.PositiveIntegerField(default=0)
+    pwd_slots = models.PositiveIntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='queued')
+    total = models.PositiveIntegerField(default=0)
+    written = models.PositiveIntegerField(default=0)
+    floor = models.PositiveIntegerField(default=0, help_text="Floor currently being uploaded")
+    error = models.TextField(blank=True)
+    version = models.BigIntegerField(null=True, blank=True, help_text="/configurations/layout/version once done")
+    created_by = models.ForeignKey(settings.AUTH_USER_MODEL, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'created_at'], name='layoutprov_status_created_idx'),
+        ]
+
+    def counts(self):
+        return {'Car': self.car_slots, 'Motorcycle': self.motor_slots, 'PWD': self.pwd_slots}
+
+    def __str__(self):
+        return f"{self.floors} floors ({self.status}, {self.written}/{self.total})"
@@ -0,0 +1,240 @@
+"""Bulk moderation: PWD decisions, bans and slot releases for many ids at once.
+
+Every operation runs the same three steps:
+
+    validate  one pass over the ids: strip, dedupe, reject keys RTDB can't
+              store, and check each against data read once up front
+    commit    WriteBatch updates of at most CHUNK_SIZE items, so a failed
+              chunk only fails its own items and no update grows unbounded
+    report    one {'id', 'ok', 'error'?} result per requested id, in order
+
+Firebase Auth deletions for bans use ``auth.delete_users`` in groups of up
+to AUTH_GROUP_SIZE uids (the API maximum is 1000), with at most
+AUTH_CONCURRENCY groups in flight so a large ban list can't trip Auth
+quotas.
+"""
+import base64
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from core.firebase import WriteBatch, init_firebase, read as mirror_read, rtdb, subscribe as mirror_subscribe
+from . import closing, counters, directory, slots
+
+CHUNK_SIZE = int(os.environ.get("MODERATION_CHUNK_SIZE", "100") or 100)
+AUTH_GROUP_SIZE = min(1000, int(os.environ.get("MODERATION_AUTH_GROUP_SIZE", "100") or 100))
+AUTH_CONCURRENCY = int(os.environ.get("MODERATION_AUTH_CONCURRENCY", "4") or 4)
+READ_CONCURRENCY = int(os.environ.get("MODERATION_READ_CONCURRENCY", "16") or 16)
+MAX_ITEMS = int(os.environ.get("MODERATION_MAX_ITEMS", "2000") or 2000)
+
+_INVALID_KEY_CHARS = set(".#$[]/")
+
+
+def encode_ban_key(raw: str) -> str:
+    """
+    Convert emails or other identifiers to a Firebase RTDB-safe key using base64url (no padding).
+    Falls back to a simple sanitized string if encoding fails.
+    """
+    try:
+        encoded = base64.urlsafe_b64encode(raw.strip().lower().encode("utf-8")).decode("ascii")
+        return encoded.rstrip("=")
+    except Exception:
+        return raw.strip().lower().replace(".", "_").replace("@", "_at_")
+
+
+def stage_ban(batch, uid, profile, reason, banned_by, now_ms):
+    """Add the ban record, its email/contact lookups, the profile delete and the
+    cancellation of pending closing notifications to batch."""
+    profile = profile if isinstance(profile, dict) else {}
+    email = (profile.get('email') or '').strip()
+    contact = (profile.get('contactNumber') or '').strip()
+    display_name = (profile.get('displayName') or '').strip()
+    ban_reason = reason or 'No reason provided'
+
+    ban_payload = {
+        'uid': uid,
+        'email': email.lower(),
+        'contactNumber': contact,
+        'displayName': display_name,
+        'reason': ban_reason,
+        'bannedAt': now_ms,
+        'bannedAtIso': datetime.utcfromtimestamp(now_ms / 1000.0).isoformat() + 'Z',
+        'bannedBy': banned_by,
+    }
+    batch.set(f'/banned/users/{uid}', ban_payload)
+
+    index_payload = {
+        'uid': uid,
+        'reason': ban_reason,
+        'bannedAt': now_ms,
+        'bannedBy': banned_by,
+        'email': email.lower(),
+        'contactNumber': contact,
+    }
+    if email:
+        batch.set(f'/banned/index/email/{encode_ban_key(email)}', index_payload)
+    if contact and not _INVALID_KEY_CHARS.intersection(contact):
+        batch.set(f'/banned/index/contact/{contact}', index_payload)
+
+    batch.delete(f'/users/{uid}')
+    directory.stage_drop(batch, uid)
+    closing.stage_cancel(batch, uid)
+    return ban_payload
+
+
+def _clean(ids):
+    """Return (valid ids in order, {id: error}) after one validation pass."""
+    if not isinstance(ids, (list, tuple)):
+        raise ValueError("expected a list of ids")
+    if len(ids) > MAX_ITEMS:
+        raise ValueError(f"at most {MAX_ITEMS} items per request")
+    valid, errors, seen = [], {}, set()
+    for raw in ids:
+        key = str(raw or '').strip()
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        if _INVALID_KEY_CHARS.intersection(key):
+            errors[key] = "invalid key"
+        else:
+            valid.append(key)
+    return valid, errors
+
+
+def _commit_chunks(ids, stage, errors):
+    """Stage ids into WriteBatches of CHUNK_SIZE and commit each; returns committed ids."""
+    committed = []
+    for start in range(0, len(ids), CHUNK_SIZE):
+        chunk = ids[start:start + CHUNK_SIZE]
+        batch = WriteBatch()
+        try:
+            for key in chunk:
+                stage(batch, key)
+            batch.commit()
+            committed.extend(chunk)
+        except Exception as e:
+            for key in chunk:
+                errors[key] = f"write failed: {e}"
+    return committed
+
+
+def _report(ids, errors, extra=None):
+    results, seen = [], set()
+    for raw in ids:
+        key = str(raw or '').strip()
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        if key in errors:
+            results.append({'id': key, 'ok': False, 'error': errors[key]})
+        else:
+            results.append({'id': key, 'ok': True, **((extra or {}).get(key) or {})})
+    return {
+        'ok': not errors,
+        'processed': len(results),
+        'succeeded': sum(1 for r in results if r['ok']),
+        'failed': sum(1 for r in results if not r['ok']),
+        'results': results,
+    }
+
+
+def decide_pwd(uids, approve=True):
+    """Approve or decline many PWD requests; each must exist under /pwdRequests."""
+    valid, errors = _clean(uids)
+    mirror_subscribe()
+    requests_ = mirror_read('/pwdRequests') or {}
+    if not isinstance(requests_, dict):
+        requests_ = {}
+    for uid in valid:
+        if uid not in requests_:
+            errors[uid] = "no PWD request"
+    valid = [uid for uid in valid if uid not in errors]
+
+    status = 'approved' if approve else 'rejected'
+    user_fields = {'pwdStatus': 'approved', 'isPWD': True} if approve else {'pwdStatus': 'rejected', 'isPWD': False}
+
+    def _stage(batch, uid):
+        batch.update(f'/pwdRequests/{uid}', {'status': status})
+        batch.update(f'/users/{uid}', user_fields)
+
+    committed = _commit_chunks(valid, _stage, errors)
+    if committed:
+        try:
+            counters.add_pwds(committed) if approve else counters.remove_pwds(committed)
+        except Exception:
+            pass
+    return _report(uids, errors)
+
+
+def _fetch_profiles(uids):
+    db = rtdb()
+    with ThreadPoolExecutor(max_workers=max(1, min(READ_CONCURRENCY, len(uids) or 1))) as pool:
+        return dict(zip(uids, pool.map(lambda uid: db.reference(f'/users/{uid}').get(), uids)))
+
+
+def _delete_auth_users(uids, errors):
+    """Delete Auth accounts in groups, AUTH_CONCURRENCY groups at a time."""
+    if not uids:
+        return
+    init_firebase()
+    from firebase_admin import auth as firebase_auth
+
+    groups = [uids[i:i + AUTH_GROUP_SIZE] for i in range(0, len(uids), AUTH_GROUP_SIZE)]
+
+    def _delete(group):
+        try:
+            result = firebase_auth.delete_users(group)
+            return group, {group[err.index]: err.reason for err in result.errors}
+        except Exception as e:
+            return group, {uid: str(e) for uid in group}
+
+    with ThreadPoolExecutor(max_workers=max(1, min(AUTH_CONCURRENCY, len(groups)))) as pool:
+        for _, failed in pool.map(_delete, groups):
+            for uid, reason in failed.items():
+                errors[uid] = f"Firebase Auth delete failed: {reason}"
+
+
+def ban_users(uids, reason='', banned_by='admin'):
+    """Ban many users: ban records + profile deletes in chunks, then Auth deletes."""
+    valid, errors = _clean(uids)
+    profiles = _fetch_profiles(valid) if valid else {}
+    now_ms = int(time.time() * 1000)
+
+    def _stage(batch, uid):
+        stage_ban(batch, uid, profiles.get(uid), reason, banned_by, now_ms)
+
+    committed = _commit_chunks(valid, _stage, errors)
+    if committed:
+        try:
+            counters.remove_users(committed)
+        except Exception:
+            pass
+    _delete_auth_users(committed, errors)
+    return _report(uids, errors)
+
+
+def release_slots(slot_keys):
+    """Mark many /configurations/layout/occupied entries FREE."""
+    valid, errors = _clean(slot_keys)
+    mirror_subscribe()
+    occupied = mirror_read('/configurations/layout/occupied') or {}
+    if not isinstance(occupied, dict):
+        occupied = {}
+    previous = {}
+    for key in valid:
+        entry = occupied.get(key)
+        if not isinstance(entry, dict):
+            errors[key] = "unknown slot"
+        elif str(entry.get('status') or '').upper() == 'FREE':
+            errors[key] = "already free"
+        else:
+            previous[key] = {'uid': entry.get('uid') or '', 'txId': entry.get('txId') or ''}
+    valid = [key for key in valid if key not in errors]
+
+    def _stage(batch, key):
+        batch.set(f'/configurations/layout/occupied/{key}', {'status': 'FREE'})
+
+    for key in _commit_chunks(valid, _stage, errors):
+        slots.index().mark(key, free=True)
+    return _report(slot_keys, errors, extra={k: {'released': v} for k, v in previous.items()})
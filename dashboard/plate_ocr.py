@@ -0,0 +1,284 @@
+"""Selectable licence-plate OCR backends.
+
+``OCR_BACKEND`` picks the engines, tried in order until one returns a plate:
+
+    ocrspace        remote OCR.space API, Engine 2 then Engine 1 (default)
+    local           on-box segmentation + template matching (Pillow/NumPy)
+    local,ocrspace  local first, remote only when local finds nothing
+
+Free-text backends go through ``extract_plate``; backends that already emit a
+formatted 'LLL DDDD' reading skip it, so callers see the same plate format
+whichever engine answered.
+"""
+import io
+import os
+import re
+
+import numpy as np
+from PIL import Image, ImageFont, ImageDraw
+
+from core.outbound import Deadline, client, hedged
+
+LETTERS = "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
+DIGITS = "0123456789"
+
+# PH plates: 2-4 letters then 2-5 digits (LLL DDDD, LLL DDD, LL DDDDD …)
+PLATE_FORMATS = [(l, d) for l in (3, 2, 4) for d in (4, 3, 5, 2)]
+
+
+def extract_plate(raw: str) -> str:
+    s = (raw or '').upper().replace('\n', ' ').replace('\r',' ')
+    s = ' '.join(s.split())
+    # common confusions
+    s = s.replace('0', 'O') if s.count('0') <= 3 else s
+    s = s.replace('1', 'I') if s.count('1') <= 3 else s
+    # PH-like: ABC 123 or ABC 1234; also allow 2 letters + up to 4 digits
+    m = re.search(r'([A-Z]{2,4})\s*[- ]?\s*(\d{2,4})', s)
+    return (m.group(1) + ' ' + m.group(2)) if m else s if s else ''
+
+
+class OcrBackend:
+    name = ''
+    formatted = False
+
+    def read(self, image, url=None, deadline=None):
+        """Return raw recognised text for a JPEG (bytes) or its public URL."""
+        raise NotImplementedError
+
+
+class OcrSpaceBackend(OcrBackend):
+    """OCR.space, Engine 2 first. Engine 1 is fired as a hedge when Engine 2
+    hasn't answered within the host's p90 latency (or answers without a
+    plate); whichever answer carries a plate first wins."""
+    name = 'ocrspace'
+    api = 'https://api.ocr.space/parse/image'
+
+    def __init__(self, api_key=None, engines=(2, 1), timeout=25, hedge_pct=90):
+        self.api_key = api_key or os.environ.get('OCR_API_KEY')
+        self.engines = engines
+        self.timeout = timeout
+        self.hedge_pct = hedge_pct
+
+    def _call(self, engine, url, deadline):
+        resp = client().post(
+            self.api,
+            data={'apikey': self.api_key, 'language': 'eng', 'scale': 'true', 'OCREngine': engine, 'url': url},
+            deadline=deadline, timeout=self.timeout
+        )
+        js = resp.json()
+        if js.get('IsErroredOnProcessing'):
+            return ''
+        pars = js.get('ParsedResults') or []
+        return (pars[0].get('ParsedText') or '') if pars else ''
+
+    def read(self, image, url=None, deadline=None):
+        if not (self.api_key and url):
+            return ''
+        deadline = deadline or Deadline(self.timeout)
+        calls = [lambda e=engine: self._call(e, url, deadline) for engine in self.engines]
+        delay = client().budget(self.api, self.hedge_pct, default=self.timeout / 2)
+        raw = hedged(calls, delay, accept=lambda text: bool(extract_plate(text)), deadline=deadline)
+        return raw or ''
+
+
+# ───────────────────────────────────────────────────────────────
+#  Local engine
+# ───────────────────────────────────────────────────────────────
+TEMPLATE_SIZE = (20, 32)  # (w, h) every glyph is normalised to
+
+
+def _normalise(glyph):
+    """Flatten a 2-D foreground mask/intensity into a zero-mean unit vector."""
+    img = Image.fromarray((glyph * 255).astype(np.uint8)).resize(TEMPLATE_SIZE, Image.BILINEAR)
+    v = np.asarray(img, dtype=np.float32).ravel()
+    v -= v.mean()
+    n = np.linalg.norm(v)
+    return v / n if n else v
+
+
+def _crop_to_ink(mask):
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    if not len(rows) or not len(cols):
+        return mask
+    return mask[rows[0]:rows[-1] + 1, cols[0]:cols[-1] + 1]
+
+
+def _otsu(gray):
+    hist = np.bincount(gray.ravel(), minlength=256).astype(np.float64)
+    total = hist.sum()
+    if not total:
+        return 128
+    levels = np.arange(256)
+    w0 = np.cumsum(hist)
+    w1 = total - w0
+    m0 = np.cumsum(hist * levels)
+    mt = m0[-1]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        between = (mt * w0 / total - m0) ** 2 / (w0 * w1 / total)
+    between = np.nan_to_num(between)
+    return int(np.argmax(between))
+
+
+def _runs(active):
+    """Return [(start, end)) index runs where the boolean vector is True."""
+    padded = np.concatenate(([False], active, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    return list(zip(edges[::2], edges[1::2]))
+
+
+def _smooth(v, width):
+    width = max(1, int(width))
+    return np.convolve(v, np.ones(width) / width, mode='same')
+
+
+class LocalBackend(OcrBackend):
+    """CPU-only plate reader: locate plate band → binarise → split → match.
+
+    Templates are rendered from Pillow's bundled font unless
+    ``OCR_TEMPLATE_DIR`` holds ``<char>.png`` crops of real plate glyphs,
+    which noticeably improves accuracy on real plates.
+    """
+    name = 'local'
+    # Output is already a positional 'LLL DDDD' reading, so the generic
+    # O/0 and I/1 swaps in extract_plate must not be applied to it
+    formatted = True
+    MIN_MATCH = 0.45
+
+    def __init__(self, template_dir=None, max_width=640):
+        self.template_dir = template_dir or os.environ.get('OCR_TEMPLATE_DIR')
+        self.max_width = max_width
+        self._templates = None
+
+    # Templates ────────────────────────────────────────────────
+    def templates(self):
+        if self._templates is None:
+            chars = LETTERS + DIGITS
+            vectors = [self._template(c) for c in chars]
+            self._templates = (chars, np.stack(vectors))
+        return self._templates
+
+    def _template(self, char):
+        if self.template_dir:
+            path = os.path.join(self.template_dir, f"{char}.png")
+            if os.path.exists(path):
+                arr = np.asarray(Image.open(path).convert('L'))
+                return _normalise(_crop_to_ink(arr < _otsu(arr)).astype(np.float32))
+        font = ImageFont.load_default(size=48)
+        canvas = Image.new('L', (64, 72), 0)
+        ImageDraw.Draw(canvas).text((8, 4), char, fill=255, font=font)
+        return _normalise(_crop_to_ink(np.asarray(canvas) > 127).astype(np.float32))
+
+    # Pipeline ─────────────────────────────────────────────────
+    def _load(self, image):
+        img = Image.open(io.BytesIO(image)).convert('L')
+        if img.width > self.max_width:
+            img = img.resize((self.max_width, int(img.height * self.max_width / img.width)), Image.BILINEAR)
+        return np.asarray(img, dtype=np.int16)
+
+    def locate(self, gray):
+        """Return the crop most likely to hold the plate (dense vertical edges)."""
+        h, w = gray.shape
+        gx = np.abs(np.diff(gray, axis=1))
+        edges = gx > max(30, np.percentile(gx, 90))
+        rows = _smooth(edges.sum(axis=1), h / 20)
+        if not rows.max():
+            return gray
+        peak = int(np.argmax(rows))
+        band = _runs(rows > rows[peak] * 0.5)
+        top, bottom = next(((s, e) for s, e in band if s <= peak < e), (0, h))
+        cols = _smooth(edges[top:bottom].sum(axis=0), w / 10)
+        cpeak = int(np.argmax(cols))
+        span = _runs(cols > cols[cpeak] * 0.3)
+        left, right = next(((s, e) for s, e in span if s <= cpeak < e), (0, w - 1))
+        if bottom - top < 12 or right - left < 40:
+            return gray
+        pad_y, pad_x = (bottom - top) // 4, (right - left) // 20
+        return gray[max(0, top - pad_y):min(h, bottom + pad_y), max(0, left - pad_x):min(w, right + pad_x + 1)]
+
+    def segment(self, crop):
+        """Split a plate crop into per-character masks, left to right."""
+        binary = crop < _otsu(crop.astype(np.uint8))
+        if binary.mean() > 0.5:  # light text on dark plate
+            binary = ~binary
+        h, w = binary.shape
+        glyphs = []
+        for start, end in _runs(binary.sum(axis=0) > max(1, h * 0.05)):
+            part = binary[:, start:end]
+            rows = np.flatnonzero(part.sum(axis=1) > 0)
+            if not len(rows):
+                continue
+            gh, gw = rows[-1] - rows[0] + 1, end - start
+            if gh < h * 0.35 or gw > w * 0.4 or gh / max(gw, 1) > 10:
+                continue
+            if rows[0] == 0 and rows[-1] == h - 1:  # plate frame / bumper edge
+                continue
+            # Touching characters: split clearly over-wide blobs at the usual pitch
+            pieces = int(round(gw / (gh * 0.7))) if gw > gh * 1.1 else 1
+            step = gw / pieces
+            for i in range(pieces):
+                sub = part[:, int(i * step):int((i + 1) * step)]
+                if sub.any():
+                    glyphs.append(_crop_to_ink(sub))
+        return glyphs
+
+    def classify(self, glyphs):
+        """Best PH-format reading of the glyphs as 'LLL DDDD', or ''."""
+        if not glyphs:
+            return ''
+        chars, tmpl = self.templates()
+        scores = np.stack([_normalise(g.astype(np.float32)) for g in glyphs]) @ tmpl.T
+        letter_idx = np.arange(len(LETTERS))
+        digit_idx = np.arange(len(LETTERS), len(chars))
+        best, best_score = '', 0.0
+        for n_letters, n_digits in PLATE_FORMATS:
+            n = n_letters + n_digits
+            # Slide the format over the glyph run; stray blobs at the ends are
+            # dropped. Each glyph only adds to the score when it matches better
+            # than MIN_MATCH, so longer readings win only on real characters.
+            for off in range(0, len(glyphs) - n + 1):
+                window = scores[off:off + n]
+                lpart = window[:n_letters][:, letter_idx]
+                dpart = window[n_letters:][:, digit_idx]
+                score = (lpart.max(axis=1) - self.MIN_MATCH).sum() + (dpart.max(axis=1) - self.MIN_MATCH).sum()
+                if score > best_score:
+                    best_score = score
+                    best = (''.join(LETTERS[i] for i in lpart.argmax(axis=1)) + ' '
+                            + ''.join(DIGITS[i] for i in dpart.argmax(axis=1)))
+        return best
+
+    def read(self, image, url=None, deadline=None):
+        if not image:
+            return ''
+        gray = self._load(image)
+        return self.classify(self.segment(self.locate(gray)))
+
+
+BACKENDS = {
+    OcrSpaceBackend.name: OcrSpaceBackend,
+    LocalBackend.name: LocalBackend,
+}
+
+_configured = None
+
+
+def get_backends():
+    """Instantiate the engines named in OCR_BACKEND (comma-separated), once."""
+    global _configured
+    if _configured is None:
+        names = [n.strip() for n in os.environ.get('OCR_BACKEND', 'ocrspace').split(',') if n.strip()]
+        _configured = [BACKENDS[n]() for n in names if n in BACKENDS]
+    return _configured
+
+
+def read_plate(image, url=None, backends=None, deadline=None):
+    """Run the configured engines in order; return the first extracted plate."""
+    for backend in backends if backends is not None else get_backends():
+        try:
+            raw = backend.read(image, url, deadline=deadline)
+            plate = raw if backend.formatted else extract_plate(raw)
+        except Exception:
+            plate = ''
+        if plate:
+            return plate
+    return ''
@@ -0,0 +1,172 @@
+"""Layout provisioning for register_slots: lazy generation, chunked upload, progress.
+
+A run is a LayoutProvision row (the durable record of the generated layout's
+spec, which used to live in the session) plus a job on the 'layout' queue:
+
+    header  plain set of /configurations/layout to {floors, provisioning}:
+            drops the old slots, occupancy and version without reading
+            them first, so readers rebuild rather than cache a
+            half-written layout
+    upload  slots are generated one at a time and sent as WriteBatch
+            updates of LAYOUT_CHUNK_SIZE items at
+            slotsByFloor/<floor>/<type>/<n>; the row's written/floor
+            fields are updated after every chunk
+    finish  one update stamps the new version and clears provisioning
+
+No step holds more than one chunk in memory, and no single RTDB request
+carries more than one chunk. Only one run may be active at a time; a run
+whose row hasn't moved for LAYOUT_STALE_SECONDS is treated as abandoned.
+A failed run clears its marker on the way out. ``in_progress`` also clears
+a marker whose run is no longer active, such as one left by a killed
+worker.
+"""
+import itertools
+import os
+from datetime import timedelta
+
+from django.utils import timezone
+
+from core.firebase import WriteBatch, rtdb
+from . import jobs, layout
+from .models import LayoutProvision
+
+CHUNK_SIZE = int(os.environ.get("LAYOUT_CHUNK_SIZE", "500") or 500)
+MAX_SLOTS = int(os.environ.get("LAYOUT_MAX_SLOTS", "200000") or 200000)
+STALE_SECONDS = int(os.environ.get("LAYOUT_STALE_SECONDS", "600") or 600)
+
+
+class ProvisionError(Exception):
+    """The run can't be started; ``status`` is the HTTP code to return."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def iter_items(floors, counts):
+    """(floor, path under the layout, {id, name}) for every slot, generated lazily."""
+    for floor in range(1, floors + 1):
+        for t in layout.TYPES:
+            for n in range(int(counts.get(t, 0))):
+                sid = f"{layout.PREFIXES[t]}{floor}-{n + 1}"
+                yield floor, f"slotsByFloor/{floor}/{t}/{n}", {'id': sid, 'name': sid}
+
+
+def active():
+    cutoff = timezone.now() - timedelta(seconds=STALE_SECONDS)
+    return LayoutProvision.objects.filter(status__in=('queued', 'running'), updated_at__gte=cutoff).first()
+
+
+def _marker_id(marker):
+    return marker.get('id') if isinstance(marker, dict) else None
+
+
+def in_progress():
+    """True while an active run owns /configurations/layout/provisioning.
+
+    A marker left by a run that failed, was killed or went stale is
+    cleared here, so it can't block layout writes forever.
+    """
+    marker = rtdb().reference(f"{layout.ROOT}/provisioning").get()
+    if marker is None:
+        return False
+    run = active()
+    if run is not None and _marker_id(marker) == run.pk:
+        return True
+    clear_marker(_marker_id(marker))
+    return False
+
+
+def clear_marker(run_id):
+    """Remove the provisioning marker if it still belongs to run_id."""
+    rtdb().reference(f"{layout.ROOT}/provisioning").transaction(
+        lambda current: None if current is not None and _marker_id(current) == run_id else current
+    )
+
+
+def latest():
+    """The most recent completed run, or None."""
+    return LayoutProvision.objects.filter(status='done').order_by('-created_at').first()
+
+
+def start(floors, counts, user=None):
+    """Record a run and queue its upload; returns the LayoutProvision."""
+    if floors < 1 or any(int(v) < 0 for v in counts.values()):
+        raise ProvisionError("floors must be at least 1 and slot counts non-negative")
+    total = floors * sum(int(v) for v in counts.values())
+    if total > MAX_SLOTS:
+        raise ProvisionError(f"at most {MAX_SLOTS} slots per layout")
+    if active() is not None:
+        raise ProvisionError("a layout is already being generated", status=409)
+    run = LayoutProvision.objects.create(
+        floors=floors,
+        car_slots=counts.get('Car', 0),
+        motor_slots=counts.get('Motorcycle', 0),
+        pwd_slots=counts.get('PWD', 0),
+        total=total,
+        created_by_id=getattr(user, 'pk', None) if getattr(user, 'is_authenticated', False) else None,
+    )
+    try:
+        jobs.get_queue('layout', workers=1, limit=4).submit(upload, run.pk)
+    except jobs.QueueFull as e:
+        LayoutProvision.objects.filter(pk=run.pk).update(status='failed', error=str(e))
+        raise ProvisionError(str(e), status=503)
+    return run
+
+
+def upload(job, run_id):
+    run = LayoutProvision.objects.get(pk=run_id)
+    LayoutProvision.objects.filter(pk=run_id).update(status='running', updated_at=timezone.now())
+    try:
+        job.stage('header')
+        # A replace, not a read-modify-write: the old tree is discarded, so
+        # there is nothing to download (only one run is active at a time)
+        rtdb().reference(layout.ROOT).set({
+            'floors': run.floors,
+            'provisioning': {'id': run.pk, 'total': run.total},
+        })
+        layout.invalidate()
+
+        written = 0
+        items = iter_items(run.floors, run.counts())
+        while True:
+            chunk = list(itertools.islice(items, CHUNK_SIZE))
+            if not chunk:
+                break
+            batch = WriteBatch()
+            for _, path, item in chunk:
+                batch.set(f"{layout.ROOT}/{path}", item)
+            batch.commit()
+            written += len(chunk)
+            floor = chunk[-1][0]
+            LayoutProvision.objects.filter(pk=run_id).update(written=written, floor=floor, updated_at=timezone.now())
+            job.stage('upload', written=written, total=run.total, floor=floor)
+
+        job.stage('finish')
+        version = layout.new_version()
+        with WriteBatch() as batch:
+            batch.set(f"{layout.ROOT}/version", version)
+            batch.delete(f"{layout.ROOT}/provisioning")
+        layout.invalidate()
+        LayoutProvision.objects.filter(pk=run_id).update(status='done', version=version, updated_at=timezone.now())
+        return {'id': run_id, 'written': written, 'version': version}
+    except Exception as e:
+        LayoutProvision.objects.filter(pk=run_id).update(status='failed', error=str(e), updated_at=timezone.now())
+        try:
+            clear_marker(run_id)
+        except Exception:
+            pass  # in_progress() clears it once the run is no longer active
+        raise
+
+
+def progress(run):
+    return {
+        'id': run.pk,
+        'status': run.status,
+        'floors': run.floors,
+        'floor': run.floor,
+        'written': run.written,
+        'total': run.total,
+        'percent': round(100.0 * run.written / run.total, 1) if run.total else 100.0,
+        'error': run.error,
+    }
@@ -0,0 +1,255 @@
+"""Incrementally maintained analytics rollups stored in RTDB under /rollups.
+
+Layout:
+    /rollups/daily/<YYYY-MM-DD>     earnings, car/motorcycle split, transactions,
+                                    stay sums, entries and entries-by-hour
+    /rollups/weekly/<YYYY-Www>      ISO week buckets (earnings, counts, stay sums,
+                                    entries)
+    /rollups/monthly/<YYYY-MM>      month buckets (earnings, counts, stay sums)
+    /rollups/totals                 all-time stay sums
+    /rollups/applied/<kind>/<txId>  markers so each transaction is counted once
+
+Buckets are keyed in Asia/Manila time so the keys sort lexicographically and a
+window of N buckets is a single bounded orderByKey query.
+
+A transaction's increments and its applied marker go out in one multi-path
+update of server-side increments ({".sv": {"increment": n}}), so either all
+of its buckets move or none do.
+
+Writers. The gate records entries and mockpay_complete records completions
+as they happen. Everything else that opens or closes a transaction is
+picked up by dashboard.sync, which records each entry and completion it sees
+for the first time. Markers make the overlap harmless.
+"""
+import time
+from datetime import datetime, timedelta, timezone
+
+from core.firebase import WriteBatch, rtdb
+
+try:
+    from zoneinfo import ZoneInfo
+except ImportError:  # pragma: no cover - Python <3.9 fallback
+    ZoneInfo = None
+
+ROOT = '/rollups'
+EARNING_FIELDS = ('total', 'car', 'motorcycle', 'transactions', 'staySum', 'stayN')
+PENDING_TTL_MS = 60000
+
+
+def tz_ph():
+    try:
+        return ZoneInfo("Asia/Manila")
+    except Exception:
+        return timezone(timedelta(hours=8))
+
+
+def parse_time(val):
+    """timeIn/timeOut can be an ISO string or, in older data, a ms epoch."""
+    try:
+        if isinstance(val, (int, float)):
+            return datetime.fromtimestamp(float(val) / 1000.0, tz=timezone.utc)
+        dt = datetime.fromisoformat(str(val).replace('Z', '+00:00'))
+        return dt if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+    except Exception:
+        return None
+
+
+def day_key(dt_ph):
+    return dt_ph.strftime('%Y-%m-%d')
+
+
+def week_key(dt_ph):
+    iso = dt_ph.isocalendar()
+    return f"{iso[0]:04d}-W{iso[1]:02d}"
+
+
+def month_key(dt_ph):
+    return dt_ph.strftime('%Y-%m')
+
+
+def hour_key(hour):
+    # Prefixed so RTDB never coerces the hour map into an array
+    return f"h{int(hour):02d}"
+
+
+def completion_delta(tx):
+    """Return the bucket increments for a completed transaction, or None."""
+    if not isinstance(tx, dict):
+        return None
+    t_out = parse_time(tx.get('timeOut'))
+    if not t_out:
+        return None
+    t_in = parse_time(tx.get('timeIn'))
+    try:
+        amt_paid = float(tx.get('amountPaid') or 0)
+    except (TypeError, ValueError):
+        amt_paid = 0.0
+    is_motor = str(tx.get('vehicleType', '')).upper() == 'MOTORCYCLE'
+    stay = (t_out - t_in).total_seconds() / 60.0 if t_in else 0.0
+    return t_out.astimezone(tz_ph()), {
+        'total': amt_paid,
+        'car': 0.0 if is_motor else amt_paid,
+        'motorcycle': amt_paid if is_motor else 0.0,
+        'transactions': 1,
+        'staySum': stay if stay > 0 else 0.0,
+        'stayN': 1 if stay > 0 else 0,
+    }
+
+
+def entry_delta(time_in):
+    """Return (PH datetime, increments) for a transaction entry, or None."""
+    t_in = parse_time(time_in)
+    if not t_in:
+        return None
+    # The hourly histogram has always been bucketed by UTC hour
+    return t_in.astimezone(tz_ph()), {'entries': 1, 'hours': {hour_key(t_in.astimezone(timezone.utc).hour): 1}}
+
+
+def _merge(current, delta):
+    out = dict(current) if isinstance(current, dict) else {}
+    for k, v in delta.items():
+        if isinstance(v, dict):
+            out[k] = _merge(out.get(k), v)
+        else:
+            out[k] = (out.get(k) or 0) + v
+    return out
+
+
+def _increments(path, delta, out):
+    """Flatten a (nested) delta into {path: server-side increment} for a multi-path update."""
+    for k, v in delta.items():
+        if isinstance(v, dict):
+            _increments(f"{path}/{k}", v, out)
+        else:
+            out[f"{path}/{k}"] = {'.sv': {'increment': v}}
+    return out
+
+
+def _claim(db, kind, tx_id):
+    """Atomically mark tx_id as being applied for kind; False if it already is.
+
+    The marker holds {'pending': ms} until _apply swaps it for True in the
+    same update as the increments, so a writer that dies in between leaves a
+    marker that can be claimed again once it is PENDING_TTL_MS old.
+    """
+    claimed = {'ok': False}
+    now_ms = int(time.time() * 1000)
+
+    def _txn(current):
+        pending = current.get('pending') if isinstance(current, dict) else None
+        if current and not (isinstance(pending, (int, float)) and pending < now_ms - PENDING_TTL_MS):
+            claimed['ok'] = False
+            return current
+        claimed['ok'] = True
+        return {'pending': now_ms}
+
+    db.reference(f'{ROOT}/applied/{kind}/{tx_id}').transaction(_txn)
+    return claimed['ok']
+
+
+def _apply(db, kind, tx_id, increments):
+    """Write every bucket increment and the applied marker in one atomic update."""
+    marker = f'{ROOT}/applied/{kind}/{tx_id}'
+    batch = WriteBatch()
+    for path, value in increments.items():
+        batch.set(path, value)
+    batch.set(marker, True)
+    try:
+        batch.commit()
+    except Exception:
+        # Nothing was applied; let the next attempt claim it straight away
+        try:
+            db.reference(marker).delete()
+        except Exception:
+            pass
+        raise
+
+
+def record_completion(tx_id, tx):
+    """Fold a completed transaction into the daily/weekly/monthly buckets once."""
+    computed = completion_delta(tx)
+    if not tx_id or computed is None:
+        return False
+    db = rtdb()
+    if not _claim(db, 'completions', tx_id):
+        return False
+    out_ph, delta = computed
+    increments = {}
+    _increments(f'{ROOT}/daily/{day_key(out_ph)}', delta, increments)
+    _increments(f'{ROOT}/weekly/{week_key(out_ph)}', delta, increments)
+    _increments(f'{ROOT}/monthly/{month_key(out_ph)}', delta, increments)
+    _increments(f'{ROOT}/totals', {'staySum': delta['staySum'], 'stayN': delta['stayN']}, increments)
+    _apply(db, 'completions', tx_id, increments)
+    return True
+
+
+def record_entry(tx_id, time_in):
+    """Count a transaction entry (timeIn) in its daily and weekly buckets once."""
+    computed = entry_delta(time_in)
+    if not tx_id or computed is None:
+        return False
+    db = rtdb()
+    if not _claim(db, 'entries', tx_id):
+        return False
+    in_ph, delta = computed
+    increments = {}
+    _increments(f'{ROOT}/daily/{day_key(in_ph)}', delta, increments)
+    _increments(f'{ROOT}/weekly/{week_key(in_ph)}', {'entries': 1}, increments)
+    _apply(db, 'entries', tx_id, increments)
+    return True
+
+
+def build_from_transactions(txs):
+    """Compute the full /rollups tree from a /transactions snapshot."""
+    tree = {'daily': {}, 'weekly': {}, 'monthly': {}, 'totals': {}, 'applied': {'completions': {}, 'entries': {}}}
+    items = txs.items() if isinstance(txs, dict) else enumerate(txs or [])
+    for tx_id, tx in items:
+        if not isinstance(tx, dict):
+            continue
+        tx_id = str(tx_id)
+        entry = entry_delta(tx.get('timeIn'))
+        if entry is not None:
+            in_ph, delta = entry
+            dk = day_key(in_ph)
+            tree['daily'][dk] = _merge(tree['daily'].get(dk), delta)
+            wk = week_key(in_ph)
+            tree['weekly'][wk] = _merge(tree['weekly'].get(wk), {'entries': 1})
+            tree['applied']['entries'][tx_id] = True
+        done = completion_delta(tx)
+        if done is not None:
+            out_ph, delta = done
+            for bucket, key in (('daily', day_key(out_ph)), ('weekly', week_key(out_ph)), ('monthly', month_key(out_ph))):
+                tree[bucket][key] = _merge(tree[bucket].get(key), delta)
+            tree['totals'] = _merge(tree['totals'], {'staySum': delta['staySum'], 'stayN': delta['stayN']})
+            tree['applied']['completions'][tx_id] = True
+    return tree
+
+
+def rebuild():
+    """Recompute /rollups from scratch with one full /transactions scan plus the
+    archived months (dashboard.archive)."""
+    from . import archive
+
+    db = rtdb()
+    txs = archive.every('transactions')
+    tree = build_from_transactions(txs)
+    db.reference(ROOT).set(tree)
+    return tree
+
+
+def read_range(bucket, start_key, end_key):
+    """Return {key: bucket} for keys in [start_key, end_key] with one bounded query."""
+    db = rtdb()
+    data = (
+        db.reference(f'{ROOT}/{bucket}')
+        .order_by_key()
+        .start_at(start_key)
+        .end_at(end_key)
+        .get()
+    ) or {}
+    return data if isinstance(data, dict) else {}
+
+
+def read_totals():
+    data = rtdb().reference(f'{ROOT}/totals').get() or {}
+    return data if isinstance(data, dict) else {}
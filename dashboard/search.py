@@ -0,0 +1,267 @@
+"""In-memory search over users (name, email, contact) and plate numbers.
+
+Each worker keeps one SearchIndex per source:
+
+    users          /users          displayName, email, contactNumber
+    transactions   /transactions   plateNumber
+
+A SearchIndex attaches one listener to its path and primes from the
+listener's initial snapshot, so the path is downloaded once rather than
+read and then streamed again. Callers of ``start`` block until that first
+snapshot is applied (at most SEARCH_START_TIMEOUT seconds). After that,
+every change re-indexes only the records it touches. Only the fields a result row needs are kept (see SOURCES), as one
+tuple per record.
+
+Matching. Field values are folded with ``fold``: lower case, letters and
+digits only, and 0/1 read as o/i. So "ABC 1O23", "abc-1023" and "ABCI023"
+all fold to the same text, the same way ``plate_ocr.extract_plate`` swaps
+them. For every field the index posts:
+
+    "^a", "^ab"    the first one and two characters of each word and of the field
+    "abc", ...     every trigram of the folded field
+
+Queries of one or two characters look up their "^" posting. Longer queries
+take the rarest of their trigrams' postings and check the candidates'
+folded fields for the whole query, newest record first, until enough have
+matched. Field-prefix matches rank ahead of matches further in.
+
+Postings are array('I') lists of document ids. They are append-only: a
+changed record gets a new document and the old one is marked dead. Once
+dead documents outnumber live ones (and there are at least COMPACT_MIN),
+the postings are rebuilt from the kept records.
+"""
+import os
+import re
+import threading
+from array import array
+
+from core.firebase import _split, rtdb
+
+LIMIT = int(os.environ.get("SEARCH_LIMIT", "20") or 20)
+MAX_LIMIT = 100
+RANK_WINDOW = 4            # candidates gathered per result before ranking stops
+COMPACT_MIN = int(os.environ.get("SEARCH_COMPACT_MIN", "5000") or 5000)
+START_TIMEOUT = float(os.environ.get("SEARCH_START_TIMEOUT", "30") or 30)
+
+_FOLD = str.maketrans({'0': 'o', '1': 'i'})
+_SEPARATORS = re.compile(r'[\W_]+')
+
+
+def fold(value):
+    """Comparable form of a searchable value: lower-case alphanumerics with 0/1 as o/i."""
+    return _SEPARATORS.sub('', str(value or '').lower()).translate(_FOLD)
+
+
+def grams(values):
+    """Posting keys for a record's searchable values (see the module docstring)."""
+    out = set()
+    for value in values:
+        words = _SEPARATORS.split(str(value or '').lower().translate(_FOLD))
+        folded = ''.join(words)
+        if not folded:
+            continue
+        for word in words + [folded]:
+            if word:
+                out.add('^' + word[:1])
+                out.add('^' + word[:2])
+        out.update(folded[i:i + 3] for i in range(len(folded) - 2))
+    return out
+
+
+class SearchIndex:
+    def __init__(self, kind, path, fields, extra, key_name):
+        self.kind, self.path, self.key_name = kind, path, key_name
+        self.fields = fields
+        self.columns = fields + extra
+        self._column = {c: i for i, c in enumerate(self.columns)}
+        self._records = {}         # key -> tuple of self.columns
+        self._docs = []            # doc id -> (key, folded fields), None once replaced
+        self._doc_of = {}          # key -> live doc id
+        self._postings = {}        # gram -> array('I') of doc ids, ascending
+        self._dead = 0
+        self._lock = threading.Lock()
+        self._listener = None
+        self._started = False
+        self._ready = threading.Event()    # set once the initial snapshot is applied
+
+    # -- upstream ------------------------------------------------------------
+
+    def start(self, timeout=None):
+        """Attach the listener (once per worker) and wait for its initial snapshot."""
+        with self._lock:
+            owner = not self._started
+            self._started = True
+            ready = self._ready
+        if owner:
+            try:
+                self._listener = rtdb().reference(self.path).listen(self._on_event)
+            except Exception:
+                with self._lock:
+                    self._started = False
+                raise
+        if not ready.wait(START_TIMEOUT if timeout is None else timeout):
+            raise TimeoutError(f"{self.kind} search index is still loading")
+
+    def stop(self):
+        if self._listener is not None:
+            self._listener.close()
+            self._listener = None
+        with self._lock:
+            self._started = False
+            self._ready = threading.Event()
+
+    def _on_event(self, event):
+        parts = _split(getattr(event, 'path', '/'))
+        data = getattr(event, 'data', None)
+        if getattr(event, 'event_type', 'put') == 'patch' and isinstance(data, dict):
+            writes = [(parts + _split(k), v) for k, v in data.items()]
+        else:
+            writes = [(parts, data)]
+        self.apply(writes)
+        self._ready.set()
+
+    def _record(self, value):
+        if not isinstance(value, dict):
+            return None
+        return tuple(value.get(c) for c in self.columns)
+
+    def apply(self, writes):
+        """Apply [(parts, value)] below self.path; only records whose kept columns change are re-indexed."""
+        with self._lock:
+            for parts, value in writes:
+                if not parts:
+                    data = value if isinstance(value, dict) else {}
+                    for key in set(self._records) - set(data):
+                        self._put(key, None)
+                    for key, record in data.items():
+                        self._put(str(key), self._record(record))
+                elif len(parts) == 1:
+                    self._put(parts[0], self._record(value))
+                elif len(parts) == 2 and parts[1] in self._column:
+                    record = list(self._records.get(parts[0]) or (None,) * len(self.columns))
+                    record[self._column[parts[1]]] = value
+                    self._put(parts[0], tuple(record))
+            if self._dead >= COMPACT_MIN and self._dead > len(self._doc_of):
+                self._compact()
+
+    def _put(self, key, record):
+        if self._records.get(key) == record:
+            return
+        doc = self._doc_of.pop(key, None)
+        if doc is not None:
+            self._docs[doc] = None
+            self._dead += 1
+        if record is None:
+            self._records.pop(key, None)
+            return
+        self._records[key] = record
+        self._index(key, record)
+
+    def _index(self, key, record):
+        values = record[:len(self.fields)]
+        folded = tuple(fold(v) for v in values)
+        if not any(folded):
+            return
+        doc = len(self._docs)
+        self._docs.append((key, folded))
+        self._doc_of[key] = doc
+        for gram in grams(values):
+            posting = self._postings.get(gram)
+            if posting is None:
+                posting = self._postings[gram] = array('I')
+            posting.append(doc)
+
+    def _compact(self):
+        self._docs, self._doc_of, self._postings, self._dead = [], {}, {}, 0
+        for key, record in self._records.items():
+            self._index(key, record)
+
+    # -- readers -------------------------------------------------------------
+
+    def row(self, key, record=None):
+        record = self._records.get(key) if record is None else record
+        if record is None:
+            return None
+        return {self.key_name: key, **dict(zip(self.columns, record))}
+
+    def get(self, key):
+        with self._lock:
+            return self.row(key)
+
+    def search(self, query, limit=LIMIT):
+        """Rows matching query, best first (see the module docstring)."""
+        q = fold(query)
+        if not q:
+            return []
+        limit = max(1, min(MAX_LIMIT, int(limit)))
+        prefix_only = len(q) < 3
+        keys = {'^' + q} if prefix_only else {q[i:i + 3] for i in range(len(q) - 2)}
+        with self._lock:
+            postings = [self._postings.get(k) for k in keys]
+            if not postings or any(p is None for p in postings):
+                return []
+            hits = []
+            for doc in reversed(min(postings, key=len)):
+                entry = self._docs[doc]
+                if entry is None:
+                    continue
+                key, folded = entry
+                if prefix_only:
+                    rank = 0 if any(f.startswith(q) for f in folded) else 1
+                elif any(f.startswith(q) for f in folded):
+                    rank = 0
+                elif any(q in f for f in folded):
+                    rank = 1
+                else:
+                    continue
+                hits.append((rank, key))
+                if len(hits) >= limit * RANK_WINDOW:
+                    break
+            hits.sort(key=lambda h: h[0])
+            return [self.row(key) for _, key in hits[:limit]]
+
+    def stats(self):
+        with self._lock:
+            return {
+                'path': self.path,
+                'records': len(self._records),
+                'documents': len(self._doc_of),
+                'dead': self._dead,
+                'grams': len(self._postings),
+            }
+
+
+SOURCES = {
+    'users': ('/users', ('displayName', 'email', 'contactNumber'),
+              ('isPWD', 'pwdStatus', 'activeTransaction'), 'uid'),
+    'transactions': ('/transactions', ('plateNumber',),
+                     ('uid', 'vehicleType', 'slot', 'timeIn', 'timeOut', 'status', 'amountPaid'), 'txId'),
+}
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def index(kind):
+    """This worker's SearchIndex for kind (see SOURCES), started on first use."""
+    with _indexes_lock:
+        idx = _indexes.get(kind)
+        if idx is None:
+            path, fields, extra, key_name = SOURCES[kind]
+            idx = _indexes[kind] = SearchIndex(kind, path, fields, extra, key_name)
+    idx.start()
+    return idx
+
+
+def search(query, kinds=tuple(SOURCES), limit=LIMIT):
+    """{kind: [row, ...]}; transaction rows also carry the user's displayName."""
+    for kind in kinds:
+        if kind not in SOURCES:
+            raise ValueError(f"kind must be one of {', '.join(SOURCES)}")
+    out = {kind: index(kind).search(query, limit) for kind in kinds}
+    if out.get('transactions'):
+        users = index('users')
+        for row in out['transactions']:
+            user = users.get(str(row.get('uid') or '')) or {}
+            row['displayName'] = user.get('displayName') or ''
+    return out
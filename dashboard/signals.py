@@ -0,0 +1,15 @@
+from django.core.cache import cache
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import FeeConfig
+
+# Kept here rather than in dashboard.fees so registering the receiver at
+# startup doesn't import NumPy.
+FEES_CACHE_KEY = 'fees:active'
+
+
+@receiver(post_save, sender=FeeConfig)
+@receiver(post_delete, sender=FeeConfig)
+def invalidate_fee_config(sender, **kwargs):
+    cache.delete(FEES_CACHE_KEY)
@@ -0,0 +1,365 @@
+"""In-memory free-slot allocator over /configurations/layout.
+
+SlotIndex keeps one bitset per (floor, vehicle type), built from
+``slotsByFloor``. The bitset is a Python int where bit i is set while slot i
+of that pool is free. Alongside it sits a name -> (pool, bit) map, so:
+
+    next_free(type)     lowest set bit of the first pool with one: (b & -b)
+    assign / release    flip one bit, found through the name map
+
+Occupancy keys follow monitor.js (``slot_key``): the slot's display name with
+RTDB-illegal characters replaced.
+
+Concurrency. Inside a process, every bit flip happens under one lock, so two
+requests can't pick the same slot. Across processes, an assignment first
+claims ``occupied/<key>`` with an RTDB transaction that only succeeds while
+the slot is free (status RESERVED, a few milliseconds). The transaction's
+``slot`` is then claimed the same way, so two assigns for one txId can't
+both win. After that, the full occupancy record and the transaction's floor
+go out in one atomic multi-path update. If the slot claim loses a race, the
+slot is marked taken locally and the next free one is tried. Changes made
+elsewhere (releases, other workers) are picked up by re-reading occupancy at
+most every SLOT_INDEX_REFRESH seconds, and straight away after a lost claim.
+
+A RESERVED record whose ``reservedAt`` is more than SLOT_RESERVE_TTL_MS old
+was left by an assign that died half-way; it counts as free, and the next
+refresh settles it (see ``_expire``).
+"""
+import json
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from core.firebase import WriteBatch, read as mirror_read, rtdb, subscribe as mirror_subscribe
+from .layout import indexed
+
+TYPES = ('Car', 'Motorcycle', 'PWD')
+VEHICLE_TYPES = {'Car': 'CAR', 'Motorcycle': 'MOTORCYCLE', 'PWD': 'PWD'}
+REFRESH_SECONDS = float(os.environ.get("SLOT_INDEX_REFRESH", "5") or 5)
+RESERVE_TTL_MS = int(os.environ.get("SLOT_RESERVE_TTL_MS", "10000") or 10000)
+MAX_ATTEMPTS = 8
+
+
+class SlotError(Exception):
+    """Assignment or release could not be done; ``status`` is the HTTP code to return."""
+
+    def __init__(self, message, status=409):
+        super().__init__(message)
+        self.status = status
+
+
+def slot_key(name):
+    """RTDB key for a slot name, matching monitor.js safeKey()."""
+    return (str(name).replace('/', '_').replace('.', '_').replace('#', '_')
+            .replace('[', '(').replace(']', ')').replace('$', '_'))
+
+
+def normalize_type(value):
+    value = str(value or 'Car').strip().upper()
+    for t in TYPES:
+        if value in (t.upper(), VEHICLE_TYPES[t]):
+            return t
+    raise SlotError(f"unknown slot type: {value}", status=400)
+
+
+def _floors(sbf):
+    items = sbf.items() if isinstance(sbf, dict) else enumerate(sbf or [])
+    out = []
+    for floor_key, types in items:
+        if isinstance(types, dict):
+            try:
+                out.append((int(floor_key), types))
+            except (TypeError, ValueError):
+                continue
+    return sorted(out, key=lambda ft: ft[0])
+
+
+def _now_ms():
+    return int(time.time() * 1000)
+
+
+def _is_stale(entry, now_ms=None):
+    """A RESERVED record older than RESERVE_TTL_MS (its assign never finished)."""
+    if not isinstance(entry, dict) or str(entry.get('status') or '').upper() != 'RESERVED':
+        return False
+    reserved_at = entry.get('reservedAt')
+    if not isinstance(reserved_at, (int, float)):
+        return True
+    return reserved_at < (now_ms if now_ms is not None else _now_ms()) - RESERVE_TTL_MS
+
+
+def _is_taken(entry, now_ms=None):
+    if not isinstance(entry, dict):
+        return False
+    status = str(entry.get('status') or '').upper()
+    return status == 'OCCUPIED' or (status == 'RESERVED' and not _is_stale(entry, now_ms))
+
+
+class _Pool:
+    __slots__ = ('floor', 'type', 'names', 'free')
+
+    def __init__(self, floor, type_, names):
+        self.floor, self.type, self.names = floor, type_, names
+        self.free = (1 << len(names)) - 1
+
+
+class SlotIndex:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools = {t: [] for t in TYPES}   # type -> [_Pool] in floor order
+        self._by_key = {}                      # slot key -> (_Pool, bit)
+        self._inflight = set()                 # reserved here, not yet claimed in RTDB
+        self._signature = None
+        self._refreshed_at = 0.0
+
+    # -- building ------------------------------------------------------------
+
+    def build(self, layout):
+        """(Re)build pools from a /configurations/layout value."""
+        layout = layout if isinstance(layout, dict) else {}
+        sbf = layout.get('slotsByFloor') or {}
+        signature = json.dumps(sbf, sort_keys=True, default=str)
+        occupied = layout.get('occupied') or {}
+        with self._lock:
+            if signature != self._signature:
+                pools = {t: [] for t in TYPES}
+                by_key = {}
+                for floor, types in _floors(sbf):
+                    for t in TYPES:
+                        names = [
+                            (item.get('name') or item.get('id') or '') if isinstance(item, dict) else str(item)
+                            for _, item in indexed(types.get(t)) if item is not None
+                        ]
+                        pool = _Pool(floor, t, names)
+                        pools[t].append(pool)
+                        for bit, name in enumerate(names):
+                            if name:
+                                by_key[slot_key(name)] = (pool, bit)
+                self._pools, self._by_key, self._signature = pools, by_key, signature
+            self._apply_occupied(occupied if isinstance(occupied, dict) else {})
+            self._refreshed_at = time.monotonic()
+
+    def _apply_occupied(self, occupied):
+        for pools in self._pools.values():
+            for pool in pools:
+                pool.free = (1 << len(pool.names)) - 1
+        now_ms = _now_ms()
+        taken = [key for key, entry in occupied.items() if _is_taken(entry, now_ms)]
+        for key in taken + list(self._inflight):
+            if key in self._by_key:
+                pool, bit = self._by_key[key]
+                pool.free &= ~(1 << bit)
+
+    def refresh(self, force=False):
+        if not force and self._signature is not None and time.monotonic() - self._refreshed_at < REFRESH_SECONDS:
+            return
+        mirror_subscribe()
+        layout = mirror_read('/configurations/layout') or {}
+        self.build(layout)
+        occupied = layout.get('occupied') if isinstance(layout, dict) else None
+        now_ms = _now_ms()
+        for key, entry in (occupied.items() if isinstance(occupied, dict) else []):
+            if _is_stale(entry, now_ms):
+                _expire(key, entry)
+
+    # -- O(1) operations -----------------------------------------------------
+
+    def next_free(self, type_, floor=None):
+        """(pool, bit) of the lowest free slot of type_ (optionally on floor), or None."""
+        for pool in self._pools.get(type_, []):
+            if floor is not None and pool.floor != floor:
+                continue
+            if pool.free:
+                return pool, (pool.free & -pool.free).bit_length() - 1
+        return None
+
+    def reserve(self, type_, floor=None, name=None):
+        """Take a slot out of the free set; returns (key, name, floor, type)."""
+        with self._lock:
+            if name is not None:
+                found = self._by_key.get(slot_key(name))
+                if found is None:
+                    raise SlotError(f"unknown slot: {name}", status=404)
+                pool, bit = found
+                if not pool.free >> bit & 1:
+                    raise SlotError(f"slot {name} is not free")
+            else:
+                found = self.next_free(type_, floor)
+                if found is None:
+                    raise SlotError(f"no free {type_} slot" + (f" on floor {floor}" if floor is not None else ''))
+                pool, bit = found
+            pool.free &= ~(1 << bit)
+            name = pool.names[bit]
+            self._inflight.add(slot_key(name))
+            return slot_key(name), name, pool.floor, pool.type
+
+    def settle(self, key):
+        """Forget an in-flight reservation once RTDB reflects the outcome."""
+        with self._lock:
+            self._inflight.discard(key)
+
+    def mark(self, key, free):
+        with self._lock:
+            found = self._by_key.get(key)
+            if found is None:
+                return False
+            pool, bit = found
+            if free:
+                pool.free |= 1 << bit
+            else:
+                pool.free &= ~(1 << bit)
+            return True
+
+    def peek(self, type_, floor=None):
+        with self._lock:
+            found = self.next_free(type_, floor)
+            if found is None:
+                return None
+            pool, bit = found
+            name = pool.names[bit]
+            return {'slot': name, 'key': slot_key(name), 'floor': pool.floor, 'type': pool.type}
+
+    def summary(self):
+        with self._lock:
+            return {
+                t: {str(p.floor): {'free': bin(p.free).count('1'), 'total': len(p.names)} for p in pools}
+                for t, pools in self._pools.items()
+            }
+
+
+_index = SlotIndex()
+
+
+def index():
+    return _index
+
+
+def _claim(key, record):
+    """RTDB compare-and-set: write record at occupied/<key> only if the slot is free."""
+    won = {'ok': False}
+
+    def _txn(current):
+        if _is_taken(current) and (current or {}).get('txId') != record.get('txId'):
+            won['ok'] = False
+            return current
+        won['ok'] = True
+        return record
+
+    rtdb().reference(f'/configurations/layout/occupied/{key}').transaction(_txn)
+    return won['ok']
+
+
+def _expire(key, entry):
+    """Settle a stale RESERVED record, unless it changed meanwhile.
+
+    If the assign got as far as claiming the transaction's slot, the record
+    becomes OCCUPIED (the transaction already points at it); otherwise FREE.
+    """
+    tx_id = entry.get('txId')
+    kept = bool(tx_id) and rtdb().reference(f'/transactions/{tx_id}/slot').get() == entry.get('slotName')
+
+    def _txn(current):
+        if not _is_stale(current) or current.get('txId') != tx_id:
+            return current
+        if kept:
+            return {**{k: v for k, v in current.items() if k != 'reservedAt'}, 'status': 'OCCUPIED'}
+        return {'status': 'FREE'}
+
+    rtdb().reference(f'/configurations/layout/occupied/{key}').transaction(_txn)
+
+
+def _claim_tx(tx_id, name):
+    """RTDB compare-and-set on /transactions/<txId>/slot; returns the slot it already had, if any."""
+    held = {'slot': None}
+
+    def _txn(current):
+        if current and current != name:
+            held['slot'] = current
+            return current
+        held['slot'] = None
+        return name
+
+    rtdb().reference(f'/transactions/{tx_id}/slot').transaction(_txn)
+    return held['slot']
+
+
+def assign(tx_id, type_=None, floor=None, slot=None, uid=None):
+    """Assign a free slot to an ONGOING transaction; returns the occupancy record."""
+    if not tx_id:
+        raise SlotError("txId required", status=400)
+    tx = rtdb().reference(f'/transactions/{tx_id}').get()
+    if not isinstance(tx, dict):
+        raise SlotError("transaction not found", status=404)
+    if str(tx.get('status') or '').upper() != 'ONGOING':
+        raise SlotError(f"transaction is {tx.get('status') or 'not open'}, not ONGOING")
+    if tx.get('slot'):
+        raise SlotError(f"transaction already has slot {tx.get('slot')}")
+    uid = uid or tx.get('uid') or ''
+    type_ = normalize_type(type_ or tx.get('vehicleType'))
+
+    idx = index()
+    idx.refresh()
+    for _ in range(MAX_ATTEMPTS):
+        key, name, slot_floor, slot_type = idx.reserve(type_, floor, slot)
+        now = datetime.now(timezone.utc)
+        record = {
+            'uid': uid,
+            'txId': tx_id,
+            'status': 'OCCUPIED',
+            'timeIn': now.isoformat().replace('+00:00', 'Z'),
+            'vehicleType': VEHICLE_TYPES[slot_type],
+            'slotName': name,
+            'floor': slot_floor,
+        }
+        try:
+            claimed = _claim(key, {**record, 'status': 'RESERVED', 'reservedAt': int(now.timestamp() * 1000)})
+        except Exception:
+            idx.settle(key)
+            idx.mark(key, free=True)
+            raise
+        if not claimed:
+            # Taken by another worker since our last refresh
+            idx.settle(key)
+            idx.refresh(force=True)
+            idx.mark(key, free=False)
+            if slot is not None:
+                raise SlotError(f"slot {name} is not free")
+            continue
+        try:
+            held = _claim_tx(tx_id, name)
+        except Exception:
+            rtdb().reference(f'/configurations/layout/occupied/{key}').set({'status': 'FREE'})
+            idx.mark(key, free=True)
+            idx.settle(key)
+            raise
+        if held is not None:
+            # Another assign for this txId got there first
+            rtdb().reference(f'/configurations/layout/occupied/{key}').set({'status': 'FREE'})
+            idx.mark(key, free=True)
+            idx.settle(key)
+            raise SlotError(f"transaction already has slot {held}")
+        try:
+            with WriteBatch() as batch:
+                batch.set(f'/configurations/layout/occupied/{key}', record)
+                batch.set(f'/transactions/{tx_id}/floor', slot_floor)
+        except Exception:
+            with WriteBatch() as batch:
+                batch.set(f'/configurations/layout/occupied/{key}', {'status': 'FREE'})
+                batch.delete(f'/transactions/{tx_id}/slot')
+            idx.mark(key, free=True)
+            raise
+        finally:
+            idx.settle(key)
+        return {**record, 'key': key}
+    raise SlotError(f"no free {type_} slot after {MAX_ATTEMPTS} attempts")
+
+
+def release(name=None, key=None):
+    """Free a slot (force remove); the slot's transaction keeps its history."""
+    key = key or (slot_key(name) if name else None)
+    if not key:
+        raise SlotError("slot or key required", status=400)
+    rtdb().reference(f'/configurations/layout/occupied/{key}').set({'status': 'FREE'})
+    index().mark(key, free=True)
+    return key
@@ -4,6 +4,9 @@ const cfgEl = document.getElementById('cfg');
 const canEdit = (cfgEl?.dataset?.canEdit || 'false') === 'true';
 const canAssign = (cfgEl?.dataset?.canAssign || 'false') === 'true';
 const saveUrl = cfgEl?.dataset?.saveUrl || '';
+const assignUrl = cfgEl?.dataset?.assignUrl || '';
+const candidatesUrl = cfgEl?.dataset?.candidatesUrl || '';
+const streamUrl = cfgEl?.dataset?.streamUrl || '';
 
 const menu = document.getElementById('custom-context-menu');
 const saveBtn = document.getElementById('save-layout-btn');
@@ -287,38 +290,59 @@ function clearSelection() {
 
 window.clearMonitorSelection = clearSelection;
 
+function renderOccupancy(occ) {
+  const byName = {};
+  const activeUids = new Set();
+  Object.entries(occ || {}).forEach(([k, v]) => {
+    const slotKey = v?.slotName || k;
+    if (slotKey) byName[slotKey] = v;
+    const uid = v?.uid;
+    if (uid) activeUids.add(uid.toString());
+  });
+  Array.from(closingCache.keys()).forEach((uidKey) => {
+    if (!activeUids.has(uidKey)) {
+      closingCache.delete(uidKey);
+    }
+  });
+  document.querySelectorAll('.slot-box').forEach(box => {
+    const name = box.dataset.slot;
+    const o = byName[name];
+    const isOcc = o && ((o.status || '').toString().toUpperCase() === 'OCCUPIED');
+    box.style.background = isOcc ? '#ffdddd' : '#d5f5d5';
+    box.style.borderColor = isOcc ? '#d33' : '#7ac27a';
+  });
+  window.__occByName = byName;
+  computeAndRenderSummary(byName);
+}
+
+// Occupancy comes from the server's shared feed: one snapshot, then per-slot deltas.
+// EventSource resends the last event id on reconnect, so only missed changes are replayed.
+function streamOccupancy() {
+  let occ = {};
+  const es = new EventSource(streamUrl);
+  es.addEventListener('snapshot', (e) => {
+    try { occ = JSON.parse(e.data).data || {}; renderOccupancy(occ); } catch (_) {}
+  });
+  es.addEventListener('delta', (e) => {
+    try {
+      const changes = JSON.parse(e.data).data || {};
+      Object.entries(changes).forEach(([k, v]) => { if (v == null) delete occ[k]; else occ[k] = v; });
+      renderOccupancy(occ);
+    } catch (_) {}
+  });
+}
+
 (async () => {
   try {
-    const appMod = await import('https://www.gstatic.com/firebasejs/11.0.1/firebase-app.js');
-    const dbMod = await import('https://www.gstatic.com/firebasejs/11.0.1/firebase-database.js');
-    const app = appMod.initializeApp(firebaseConfig);
-    const db = dbMod.getDatabase(app);
-    const occRef = dbMod.ref(db, '/configurations/layout/occupied');
-    dbMod.onValue(occRef, (snap) => {
-      const occ = snap.val() || {};
-      const byName = {};
-      const activeUids = new Set();
-      Object.entries(occ).forEach(([k, v]) => {
-        const slotKey = v?.slotName || k;
-        if (slotKey) byName[slotKey] = v;
-        const uid = v?.uid;
-        if (uid) activeUids.add(uid.toString());
-      });
-      Array.from(closingCache.keys()).forEach((uidKey) => {
-        if (!activeUids.has(uidKey)) {
-          closingCache.delete(uidKey);
-        }
-      });
-      document.querySelectorAll('.slot-box').forEach(box => {
-        const name = box.dataset.slot;
-        const o = byName[name];
-        const isOcc = o && ((o.status || '').toString().toUpperCase() === 'OCCUPIED');
-        box.style.background = isOcc ? '#ffdddd' : '#d5f5d5';
-        box.style.borderColor = isOcc ? '#d33' : '#7ac27a';
-      });
-      window.__occByName = byName;
-      computeAndRenderSummary(byName);
-    });
+    if (streamUrl && window.EventSource) {
+      streamOccupancy();
+    } else {
+      const appMod = await import('https://www.gstatic.com/firebasejs/11.0.1/firebase-app.js');
+      const dbMod = await import('https://www.gstatic.com/firebasejs/11.0.1/firebase-database.js');
+      const app = appMod.initializeApp(firebaseConfig);
+      const db = dbMod.getDatabase(app);
+      dbMod.onValue(dbMod.ref(db, '/configurations/layout/occupied'), (snap) => renderOccupancy(snap.val() || {}));
+    }
   } catch (_) {}
   // Ensure hover card is attached to <body> to avoid clipping/stacking issues
   try {
@@ -403,23 +427,10 @@ if (assignBtn) {
       if (!selectedSlot || !assignOverlay) return;
       const slotName = selectedSlot.dataset.slot;
       assignSlotName && (assignSlotName.textContent = slotName);
-      // load candidates
-      const appMod = await import('https://www.gstatic.com/firebasejs/11.0.1/firebase-app.js');
-      const dbMod = await import('https://www.gstatic.com/firebasejs/11.0.1/firebase-database.js');
-      const app = appMod.getApps && appMod.getApps().length ? appMod.getApp() : appMod.initializeApp(firebaseConfig);
-      const db = dbMod.getDatabase(app);
-      const [usersSnap, txSnap] = await Promise.all([
-        dbMod.get(dbMod.ref(db, '/users')),
-        dbMod.get(dbMod.ref(db, '/transactions')),
-      ]);
-      const users = usersSnap.exists() ? usersSnap.val() || {} : {};
-      const txs = txSnap.exists() ? txSnap.val() || {} : {};
-      const candidates = [];
-      Object.entries(users).forEach(([uid, u]) => {
-        const txId = u?.activeTransaction; if (!txId) return;
-        const t = txs[txId]; const hasSlot = !!(t && t.slot);
-        if (!hasSlot) candidates.push({ uid, txId, name: u.displayName || u.email || uid });
-      });
+      // load candidates (ONGOING transactions without a slot, resolved server-side)
+      const res = await fetch(candidatesUrl);
+      const data = await res.json();
+      const candidates = (data && data.ok && Array.isArray(data.candidates)) ? data.candidates : [];
       assignSelect.innerHTML = '';
       if (!candidates.length) {
         const opt = document.createElement('option'); opt.value=''; opt.textContent='No eligible users'; assignSelect.appendChild(opt);
@@ -434,11 +445,13 @@ if (assignBtn) {
         try {
           const v = assignSelect.value; if (!v) { close(); return; }
           const chosen = JSON.parse(v);
-          await dbMod.update(dbMod.ref(db, '/transactions/' + chosen.txId), { slot: slotName });
-          const safeKey = slotName.replaceAll('/', '_').replaceAll('.', '_').replaceAll('#','_').replaceAll('[','(').replaceAll(']',')');
-          await dbMod.set(dbMod.ref(db, '/configurations/layout/occupied/' + safeKey), {
-            uid: chosen.uid, txId: chosen.txId, status: 'OCCUPIED', timeIn: new Date().toISOString(), vehicleType: 'CAR', slotName
+          // Server claims the slot and writes transaction + occupancy atomically
+          const res = await fetch(assignUrl, {
+            method: 'POST', headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ txId: chosen.txId, uid: chosen.uid, slot: slotName, type: selectedSlot?.dataset?.type || 'Car' })
           });
+          const out = await res.json().catch(() => ({}));
+          if (!res.ok || !out.ok) alert(out.error || 'Failed to assign.');
         } catch(_) { alert('Failed to assign.'); }
         close();
       }, { once:true });
@@ -449,17 +462,20 @@ if (assignBtn) {
 
 saveBtn?.addEventListener('click', async () => {
   if (!hasUnsaved || !saveUrl) return;
+  // Send only renamed slots, keyed by slot id; the server writes just those items
   const labels = {};
+  const renamed = [];
   document.querySelectorAll('.slot-box').forEach(el => {
-    const slotId = el.dataset.slot;
+    const slotId = el.dataset.slotId || el.dataset.slot;
     const name = el.textContent.trim();
-    if (slotId && name) labels[slotId] = name;
+    if (slotId && name && name !== el.dataset.slot) { labels[slotId] = name; renamed.push([el, name]); }
   });
   try {
     const res = await fetch(saveUrl, { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ labels }) });
     let ok = res.ok; try { const j = await res.json(); if (j && j.ok === false) ok = false; } catch(_){ }
     const toast = document.getElementById('save-toast');
     if (toast) { toast.textContent = ok ? 'Changes saved to Firebase' : 'Save failed'; toast.style.display = 'block'; setTimeout(() => { toast.style.display = 'none'; }, 1600); }
+    if (ok) renamed.forEach(([el, name]) => { el.dataset.slot = name; });
     if (ok) { hasUnsaved = false; saveBtn.style.opacity = '.6'; saveBtn.style.cursor = 'not-allowed'; saveBtn.disabled = true; }
   } catch(_){ }
 });
@@ -3,9 +3,11 @@ import { firebaseConfig } from './firebaseConfig.js';
 const cfg = document.getElementById('cfg');
 const isAdmin = (cfg && cfg.dataset && cfg.dataset.isAdmin === 'true');
 const resolveUrl = (cfg && cfg.dataset && cfg.dataset.resolveUrl) ? cfg.dataset.resolveUrl : '';
+const pastUrl = (cfg && cfg.dataset && cfg.dataset.pastUrl) ? cfg.dataset.pastUrl : '';
 
 const tbody = document.getElementById('incidentsBody');
 const pastBody = document.getElementById('pastIncidentsBody');
+const pastMoreBtn = document.getElementById('pastMoreBtn');
 const tabBtnCurrent = document.getElementById('tabBtnCurrent');
 const tabBtnPast = document.getElementById('tabBtnPast');
 const tabCurrent = document.getElementById('tabCurrent');
@@ -14,6 +16,65 @@ const overlay = document.getElementById('imgOverlay');
 const imgFull = document.getElementById('imgFull');
 
 let app, db, appMod, dbMod;
+let pastRows = [];
+let pastNext = null;
+const nameByUid = {};
+
+async function loadPast(reset){
+  if (!pastBody || !pastUrl) return;
+  if (reset) { pastRows = []; pastNext = null; }
+  const params = new URLSearchParams({ limit: '50' });
+  if (pastNext) params.set('before', String(pastNext));
+  if (pastMoreBtn) pastMoreBtn.disabled = true;
+  try {
+    const res = await fetch(`${pastUrl}?${params}`, { headers: { 'Accept': 'application/json' } });
+    const js = await res.json().catch(()=>({}));
+    if (!res.ok || js.ok === false) throw new Error(js.error || 'Request failed');
+    pastRows = pastRows.concat(js.rows || []);
+    pastNext = js.next || null;
+    // Names for reporters not seen on earlier pages
+    const uids = new Set(pastRows.map(r => r?.uid).filter(uid => uid && !(uid in nameByUid)));
+    for (const uid of uids) {
+      try {
+        const us = await dbMod.get(dbMod.ref(db, `/users/${uid}/displayName`));
+        nameByUid[uid] = us.exists() ? (us.val() || '') : '';
+      } catch { nameByUid[uid] = ''; }
+    }
+    renderPast();
+  } catch (err) {
+    console.error('[reports] past incidents', err);
+  } finally {
+    if (pastMoreBtn) {
+      pastMoreBtn.disabled = false;
+      pastMoreBtn.style.display = pastNext ? '' : 'none';
+    }
+  }
+}
+
+function renderPast(){
+  const rows = pastRows.map((r)=>{
+    const imgUrl = r?.imageUrl || '';
+    const img = imgUrl ? `<img src="${imgUrl}" data-full="${imgUrl}" class="incident-thumb" style="height:90px;width:120px;border-radius:4px;cursor:pointer;"/>` : '';
+    const cat = (r?.categoryTitle || '').toString().replace(/</g,'&lt;');
+    const descOnly = (r?.description || '').toString().replace(/</g,'&lt;');
+    const desc = cat ? `<strong>${cat}</strong><br/>${descOnly}` : descOnly;
+    const reporter = nameByUid[r?.uid] || r?.uid || '';
+    const ts = r?.timestamp || '';
+    const rs = r?.resolvedAt ? new Date(Number(r.resolvedAt)).toLocaleString() : '';
+    return `<tr>
+      <td style="padding:2px;text-align:center;">${img}</td>
+      <td>${desc}</td>
+      <td style="white-space:nowrap;">${(r?.priority||'').toString().toUpperCase()}</td>
+      <td>${reporter}</td>
+      <td>${ts}</td>
+      <td>${rs}</td>
+    </tr>`;
+  });
+  pastBody.innerHTML = rows.length ? rows.join('') : `<tr><td colspan="6" style="text-align:center;color:#777;">No past reports.</td></tr>`;
+}
+
+pastMoreBtn?.addEventListener('click', ()=> loadPast(false));
+
 (async () => {
   try { console.log('[reports] init start', { isAdmin, resolveUrl }); } catch {}
   appMod = await import('https://www.gstatic.com/firebasejs/11.0.1/firebase-app.js');
@@ -43,18 +104,7 @@ let app, db, appMod, dbMod;
       return tb.localeCompare(ta);
     });
 
-    // Auto-finalize items pending user confirmation past deadline if admin
-    try {
-      const now = Date.now();
-      for (const [id, r] of entries) {
-        const st = String(r.status || '').toUpperCase();
-        const dl = Number(r.confirmDeadline || 0);
-        const rid = (r.incidentId && String(r.incidentId).length) ? r.incidentId : id;
-        if (isAdmin && resolveUrl && st === 'PENDING_USER_CONFIRM' && dl > 0 && dl <= now) {
-          fetch(resolveUrl, { method: 'POST', headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ incidentId: rid, finalize: true }) }).catch(()=>{});
-        }
-      }
-    } catch {}
+    // Expired PENDING_USER_CONFIRM incidents are finalized server-side (manage.py run_incident_sweeper)
     const uidSet = new Set(entries.map(([id, r]) => r.uid).filter(Boolean));
     const nameByUid = {};
     for (const uid of uidSet) {
@@ -93,46 +143,9 @@ let app, db, appMod, dbMod;
     try { console.log('[reports] render rows', { count: rows.length }); } catch {}
   });
 
-  // Load past incidents into the Past Reports tab
-  dbMod.onValue(dbMod.ref(db, '/pastIncidents'), async (snap) => {
-    if (!pastBody) return;
-    const data = snap.val() || {};
-    let entries = Object.entries(data || {});
-    // Sort by resolvedAt desc
-    entries.sort((a,b)=>{
-      const ta = Number(a[1]?.resolvedAt||0);
-      const tb = Number(b[1]?.resolvedAt||0);
-      return tb - ta;
-    });
-    // Preload names
-    const uidSet = new Set(entries.map(([id, r]) => r?.uid).filter(Boolean));
-    const nameByUid = {};
-    for (const uid of uidSet) {
-      try {
-        const us = await dbMod.get(dbMod.ref(db, `/users/${uid}/displayName`));
-        nameByUid[uid] = us.exists() ? (us.val() || '') : '';
-      } catch { nameByUid[uid] = ''; }
-    }
-    const rows = entries.map(([id, r])=>{
-      const imgUrl = r?.imageUrl || '';
-      const img = imgUrl ? `<img src="${imgUrl}" data-full="${imgUrl}" class="incident-thumb" style="height:90px;width:120px;border-radius:4px;cursor:pointer;"/>` : '';
-      const cat = (r?.categoryTitle || '').toString().replace(/</g,'&lt;');
-      const descOnly = (r?.description || '').toString().replace(/</g,'&lt;');
-      const desc = cat ? `<strong>${cat}</strong><br/>${descOnly}` : descOnly;
-      const reporter = nameByUid[r?.uid] || r?.uid || '';
-      const ts = r?.timestamp || '';
-      const rs = r?.resolvedAt ? new Date(Number(r.resolvedAt)).toLocaleString() : '';
-      return `<tr>
-        <td style="padding:2px;text-align:center;">${img}</td>
-        <td>${desc}</td>
-        <td style="white-space:nowrap;">${(r?.priority||'').toString().toUpperCase()}</td>
-        <td>${reporter}</td>
-        <td>${ts}</td>
-        <td>${rs}</td>
-      </tr>`;
-    });
-    pastBody.innerHTML = rows.length ? rows.join('') : `<tr><td colspan="6" style="text-align:center;color:#777;">No past reports.</td></tr>`;
-  });
+  // Past reports come from the server a page at a time, newest first; older pages
+  // reach into the archived months transparently
+  loadPast(true);
 })();
 
 tbody.addEventListener('click', async (e) => {
@@ -185,7 +198,7 @@ function showTab(which){
   }
 }
 tabBtnCurrent?.addEventListener('click', ()=> showTab('current'));
-tabBtnPast?.addEventListener('click', ()=> showTab('past'));
+tabBtnPast?.addEventListener('click', ()=> { showTab('past'); if (dbMod) loadPast(true); });
 showTab('current');
 
 
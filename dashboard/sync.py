@@ -0,0 +1,260 @@
+"""Mirror RTDB /transactions and /payments into ParkingLog / Payment.
+
+Rows are upserted on tx_id with ``bulk_create(update_conflicts=True)`` so a
+re-run never duplicates. Two modes:
+
+    backfill()     pages through every record by key, ``batch_size`` at a time
+    incremental()  resumes from SyncState watermarks: transactions whose
+                   timeIn is at or after the last one seen, payments whose
+                   createdAt is at or after the last one seen, plus a
+                   re-read of logs still open in SQL so completions land.
+
+RTDB sorts numbers before strings, so epoch-ms and ISO-string timeIn values
+are separate ranges with a watermark each (``transactions.timeIn`` and
+``transactions.timeInIso``). Both are read in bounded pages. Open logs are
+refreshed from one indexed status=ONGOING query; only the ones that have
+left ONGOING are fetched one by one, READ_CONCURRENCY at a time. A log is
+open while its status is ONGOING and it has no exit time. So a transaction
+that leaves ONGOING without a timeOut (CANCELLED) is re-read once, and so is
+one deleted from RTDB (marked REMOVED). After that the per-pass cost is the
+transactions that are actually open.
+
+Rollups. Sync sees every transaction whoever wrote it (the app, attendants,
+incident finalization), so it also feeds dashboard.rollups: a transaction
+not yet in SQL is counted as an entry, and one whose exit time first shows
+up as a completion. The applied markers make this a no-op for the ones the
+gate and mockpay already recorded, so the analytics buckets trail RTDB by
+at most one sync interval (``sync_parking_logs --follow``).
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from decimal import Decimal, InvalidOperation
+
+from core.firebase import query_pages, query_range, rtdb
+from . import rollups
+from .models import ParkingLog, Payment, SyncState
+from .rollups import parse_time
+
+BATCH_SIZE = 500
+READ_CONCURRENCY = 16
+MAX_NUMBER = 2 ** 53                # above any epoch-ms time, below every string
+REMOVED = 'REMOVED'                 # status of a log whose transaction left RTDB while open
+
+LOG_FIELDS = [
+    'uid', 'status', 'vehicle_type', 'slot_name', 'plate_number', 'amount_paid',
+    'entry_time', 'exit_time', 'photo_url', 'payment_status', 'synced_at',
+]
+PAYMENT_FIELDS = ['log', 'amount', 'method', 'status', 'reference_number', 'paid_at']
+
+METHODS = {'GCASH': 'gcash', 'CASH': 'cash', 'MOCKPAY': 'mockpay'}
+PAYMENT_STATUSES = {'PAID': 'completed', 'COMPLETED': 'completed', 'FAILED': 'failed'}
+
+
+def _decimal(value):
+    try:
+        return Decimal(str(value or 0)).quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        return Decimal('0.00')
+
+
+def _items(snapshot):
+    if isinstance(snapshot, dict):
+        return list(snapshot.items())
+    if isinstance(snapshot, list):
+        return [(str(i), v) for i, v in enumerate(snapshot) if v is not None]
+    return []
+
+
+def log_from_tx(tx_id, tx, now=None):
+    """Build an unsaved ParkingLog for a transaction, or None if it has no timeIn."""
+    if not isinstance(tx, dict):
+        return None
+    entry = parse_time(tx.get('timeIn'))
+    if entry is None:
+        return None
+    status = str(tx.get('status') or '').upper()
+    return ParkingLog(
+        tx_id=str(tx_id),
+        uid=str(tx.get('uid') or '')[:128],
+        status=status[:20],
+        vehicle_type=str(tx.get('vehicleType') or '').upper()[:20],
+        slot_name=str(tx.get('slot') or '')[:40],
+        plate_number=str(tx.get('plateNumber') or '')[:20],
+        amount_paid=_decimal(tx.get('amountPaid')),
+        entry_time=entry,
+        exit_time=parse_time(tx.get('timeOut')),
+        photo_url=str(tx.get('plateImageUrl') or '')[:200],
+        payment_status='paid' if status == 'COMPLETED' else 'unpaid',
+        synced_at=now or datetime.now(timezone.utc),
+    )
+
+
+def _record_rollups(pairs):
+    """Count entries seen for the first time and completions closed since the last sync."""
+    closed = dict(ParkingLog.objects.filter(tx_id__in=[log.tx_id for log, _ in pairs])
+                  .values_list('tx_id', 'exit_time'))
+    calls = []
+    for log, tx in pairs:
+        if log.tx_id not in closed:
+            calls.append((rollups.record_entry, log.tx_id, tx.get('timeIn')))
+        if log.exit_time is not None and closed.get(log.tx_id) is None:
+            calls.append((rollups.record_completion, log.tx_id, tx))
+    if calls:
+        with ThreadPoolExecutor(max_workers=min(READ_CONCURRENCY, len(calls))) as pool:
+            list(pool.map(lambda c: c[0](c[1], c[2]), calls))
+
+
+def upsert_transactions(items, batch_size=BATCH_SIZE):
+    """Upsert (tx_id, tx) pairs; returns the number of rows written.
+
+    New entries and completions are folded into /rollups first, so a failed
+    rollup write leaves the row to be retried by the next pass.
+    """
+    now = datetime.now(timezone.utc)
+    pairs = [(log, tx) for log, tx in ((log_from_tx(k, v, now), v) for k, v in items) if log is not None]
+    for start in range(0, len(pairs), batch_size):
+        chunk = pairs[start:start + batch_size]
+        _record_rollups(chunk)
+        ParkingLog.objects.bulk_create(
+            [log for log, _ in chunk],
+            update_conflicts=True, unique_fields=['tx_id'], update_fields=LOG_FIELDS,
+        )
+    return len(pairs)
+
+
+def upsert_payments(items, batch_size=BATCH_SIZE):
+    rows = [(str(k), v) for k, v in items if isinstance(v, dict)]
+    log_ids = dict(ParkingLog.objects.filter(tx_id__in=[k for k, _ in rows]).values_list('tx_id', 'id'))
+    payments = [
+        Payment(
+            tx_id=tx_id,
+            log_id=log_ids.get(tx_id),
+            amount=_decimal(p.get('amount')),
+            method=METHODS.get(str(p.get('method') or '').upper(), 'other'),
+            status=PAYMENT_STATUSES.get(str(p.get('status') or '').upper(), 'pending'),
+            reference_number=str(p.get('referenceNumber') or '')[:64],
+            paid_at=parse_time(p.get('createdAt')),
+        )
+        for tx_id, p in rows
+    ]
+    for start in range(0, len(payments), batch_size):
+        Payment.objects.bulk_create(
+            payments[start:start + batch_size],
+            update_conflicts=True, unique_fields=['tx_id'], update_fields=PAYMENT_FIELDS,
+        )
+    return len(payments)
+
+
+def _pages(path, batch_size):
+    """Yield key-ordered pages of path without downloading it in one go."""
+    ref = rtdb().reference(path)
+    last_key = None
+    while True:
+        query = ref.order_by_key()
+        if last_key is not None:
+            query = query.start_at(last_key)
+        page = _items(query.limit_to_first(batch_size + (1 if last_key is not None else 0)).get())
+        if last_key is not None:
+            page = [(k, v) for k, v in page if k != last_key]
+        if not page:
+            return
+        yield page
+        last_key = page[-1][0]
+        if len(page) < batch_size:
+            return
+
+
+def _watermark(name):
+    state = SyncState.objects.filter(name=name).first()
+    return state.watermark if state else ''
+
+
+def _set_watermark(name, value):
+    SyncState.objects.update_or_create(name=name, defaults={'watermark': str(value)})
+
+
+def _max_time_in_ms(items, current):
+    best = current
+    for _, tx in items:
+        t_in = tx.get('timeIn') if isinstance(tx, dict) else None
+        if isinstance(t_in, (int, float)) and t_in > best:
+            best = int(t_in)
+    return best
+
+
+def _max_time_in_iso(items, current):
+    values = [tx.get('timeIn') for _, tx in items if isinstance(tx, dict) and isinstance(tx.get('timeIn'), str)]
+    return max([current] + values)
+
+
+def _max_created_at(items, current):
+    values = [str(p.get('createdAt')) for _, p in items if isinstance(p, dict) and p.get('createdAt')]
+    return max([current] + values) if values else current
+
+
+def backfill(batch_size=BATCH_SIZE, log=None):
+    """Full copy of both trees in key-ordered pages; also resets the watermarks."""
+    tx_total = pay_total = 0
+    max_in, max_iso = 0, ''
+    for page in _pages('/transactions', batch_size):
+        tx_total += upsert_transactions(page, batch_size)
+        max_in = _max_time_in_ms(page, max_in)
+        max_iso = _max_time_in_iso(page, max_iso)
+        if log:
+            log(f"transactions: {tx_total}")
+    max_created = ''
+    for page in _pages('/payments', batch_size):
+        pay_total += upsert_payments(page, batch_size)
+        max_created = _max_created_at(page, max_created)
+        if log:
+            log(f"payments: {pay_total}")
+    _set_watermark('transactions.timeIn', max_in)
+    _set_watermark('transactions.timeInIso', max_iso)
+    _set_watermark('payments.createdAt', max_created)
+    return {'transactions': tx_total, 'payments': pay_total}
+
+
+def _read_many(paths):
+    if not paths:
+        return {}
+    db = rtdb()
+    with ThreadPoolExecutor(max_workers=max(1, min(READ_CONCURRENCY, len(paths)))) as pool:
+        return dict(zip(paths, pool.map(lambda p: db.reference(p).get(), paths)))
+
+
+def incremental(batch_size=BATCH_SIZE):
+    """Sync records added or closed since the stored watermarks."""
+    tx_count, seen = 0, set()
+    wm_in = int(_watermark('transactions.timeIn') or 0)
+    for page in query_pages('/transactions', 'timeIn', wm_in, MAX_NUMBER, batch_size):
+        tx_count += upsert_transactions(page, batch_size)
+        seen.update(k for k, _ in page)
+        wm_in = _max_time_in_ms(page, wm_in)
+        _set_watermark('transactions.timeIn', wm_in)
+    wm_iso = _watermark('transactions.timeInIso')
+    for page in query_pages('/transactions', 'timeIn', wm_iso, None, batch_size):
+        tx_count += upsert_transactions(page, batch_size)
+        seen.update(k for k, _ in page)
+        wm_iso = _max_time_in_iso(page, wm_iso)
+        _set_watermark('transactions.timeInIso', wm_iso)
+
+    # Open logs may have been completed since the last pass
+    ongoing = query_range('/transactions', 'status', 'ONGOING', 'ONGOING')
+    open_ids = set(ParkingLog.objects.filter(status='ONGOING', exit_time__isnull=True, tx_id__isnull=False)
+                   .values_list('tx_id', flat=True)) - seen
+    refreshed = [(k, v) for k, v in ongoing.items() if k in open_ids]
+    closed = sorted(open_ids - set(ongoing))
+    fetched = _read_many([f'/transactions/{tx_id}' for tx_id in closed])
+    refreshed += [(tx_id, fetched.get(f'/transactions/{tx_id}')) for tx_id in closed]
+    tx_count += upsert_transactions([(k, v) for k, v in refreshed if v], batch_size)
+    gone = [tx_id for tx_id in closed if not isinstance(fetched.get(f'/transactions/{tx_id}'), dict)]
+    if gone:
+        ParkingLog.objects.filter(tx_id__in=gone).update(status=REMOVED, synced_at=datetime.now(timezone.utc))
+
+    pay_count = 0
+    wm_created = _watermark('payments.createdAt')
+    for page in query_pages('/payments', 'createdAt', wm_created or None, None, batch_size):
+        pay_count += upsert_payments(page, batch_size)
+        wm_created = _max_created_at(page, wm_created)
+        _set_watermark('payments.createdAt', wm_created)
+    return {'transactions': tx_count, 'payments': pay_count}
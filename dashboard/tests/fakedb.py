@@ -0,0 +1,180 @@
+"""In-memory stand-in for the firebase_admin RTDB client, for unit tests.
+
+Supports what dashboard and core use: get (shallow/etag), set, update
+(multi-path, including {".sv": {"increment": n}}), delete, push,
+transaction, set_if_unchanged, and orderByChild/orderByKey queries with
+start/end/equal and limits, ordered the way RTDB orders values (null,
+false, true, numbers, strings, objects; ties by key).
+"""
+import copy
+import itertools
+import sys
+from types import SimpleNamespace
+from unittest import mock
+
+_ids = itertools.count()
+
+
+def _parts(path):
+    return [p for p in str(path or '').split('/') if p]
+
+
+class FakeDB:
+    def __init__(self, tree=None):
+        self.tree = copy.deepcopy(tree) if tree else {}
+        self.calls = []
+
+    def reference(self, path='/'):
+        return Ref(self, _parts(path))
+
+    def _get(self, parts):
+        node = self.tree
+        for p in parts:
+            if isinstance(node, list) and p.isdigit() and int(p) < len(node):
+                node = node[int(p)]
+                continue
+            if not isinstance(node, dict) or p not in node:
+                return None
+            node = node[p]
+        return node
+
+    def _set(self, parts, value):
+        if not parts:
+            self.tree = value if isinstance(value, dict) else {}
+            return
+        node = self.tree
+        for p in parts[:-1]:
+            if isinstance(node.get(p), list):
+                node[p] = {str(i): v for i, v in enumerate(node[p]) if v is not None}
+            if not isinstance(node.get(p), dict):
+                node[p] = {}
+            node = node[p]
+        if value is None:
+            node.pop(parts[-1], None)
+        else:
+            node[parts[-1]] = copy.deepcopy(value)
+
+
+class Ref:
+    def __init__(self, db, parts, order=None, filters=None):
+        self.db, self.parts = db, parts
+        self.order, self.filters = order, filters or []
+        self.key = parts[-1] if parts else None
+        self.path = '/' + '/'.join(parts)
+
+    def child(self, p):
+        return Ref(self.db, self.parts + _parts(p))
+
+    def get(self, shallow=False, etag=False):
+        self.db.calls.append(('get', self.path, self.order, tuple(self.filters), shallow))
+        v = copy.deepcopy(self.db._get(self.parts))
+        if self.order is not None and isinstance(v, dict):
+            v = self._query(v)
+        if shallow and isinstance(v, dict):
+            v = {k: True for k in v}
+        if etag:
+            return v, str(hash(repr(v)))
+        return v
+
+    @staticmethod
+    def _rank(x):
+        if x is None:
+            return (0, 0)
+        if isinstance(x, bool):
+            return (1, int(x))
+        if isinstance(x, (int, float)):
+            return (2, x)
+        if isinstance(x, str):
+            return (3, x)
+        return (4, '')
+
+    def _sortval(self, k, v):
+        if self.order == '$key':
+            return (3, k)
+        return self._rank(v.get(self.order) if isinstance(v, dict) else None)
+
+    def _query(self, v):
+        items = sorted(v.items(), key=lambda kv: (self._sortval(*kv), kv[0]))
+        for op, arg in self.filters:
+            bound = (3, str(arg)) if self.order == '$key' else self._rank(arg)
+            if op == 'start':
+                items = [kv for kv in items if self._sortval(*kv) >= bound]
+            elif op == 'end':
+                items = [kv for kv in items if self._sortval(*kv) <= bound]
+            elif op == 'eq':
+                items = [kv for kv in items if self._sortval(*kv) == bound]
+            elif op == 'first':
+                items = items[:arg]
+            elif op == 'last':
+                items = items[-arg:]
+        return dict(items)
+
+    def order_by_child(self, c):
+        return Ref(self.db, self.parts, c, self.filters)
+
+    def order_by_key(self):
+        return Ref(self.db, self.parts, '$key', self.filters)
+
+    def _f(self, op, arg):
+        return Ref(self.db, self.parts, self.order, self.filters + [(op, arg)])
+
+    def start_at(self, a): return self._f('start', a)
+    def end_at(self, a): return self._f('end', a)
+    def equal_to(self, a): return self._f('eq', a)
+    def limit_to_first(self, n): return self._f('first', n)
+    def limit_to_last(self, n): return self._f('last', n)
+
+    def set(self, value):
+        self.db.calls.append(('set', self.path))
+        self.db._set(self.parts, value)
+
+    def set_if_unchanged(self, etag, value):
+        cur = self.db._get(self.parts)
+        if str(hash(repr(cur))) != etag:
+            return False, cur, str(hash(repr(cur)))
+        self.set(value)
+        return True, value, str(hash(repr(value)))
+
+    def update(self, values):
+        self.db.calls.append(('update', self.path, tuple(sorted(values))))
+        for k, v in values.items():
+            if isinstance(v, dict) and '.sv' in v:
+                v = (self.db._get(self.parts + _parts(k)) or 0) + v['.sv']['increment']
+            self.db._set(self.parts + _parts(k), v)
+
+    def delete(self):
+        self.db.calls.append(('delete', self.path))
+        self.db._set(self.parts, None)
+
+    def push(self, value=None):
+        key = f"-k{next(_ids):08d}"
+        ref = self.child(key)
+        if value is not None:
+            ref.set(value)
+        return ref
+
+    def transaction(self, fn):
+        self.db.calls.append(('txn', self.path))
+        new = fn(copy.deepcopy(self.db._get(self.parts)))
+        self.db._set(self.parts, new)
+        return new
+
+    def listen(self, cb):
+        """Deliver the initial put at '/' like RTDB does; later writes aren't streamed."""
+        self.db.calls.append(('listen', self.path))
+        cb(SimpleNamespace(event_type='put', path='/', data=copy.deepcopy(self.db._get(self.parts))))
+
+        class L:
+            def close(self): pass
+        return L()
+
+
+def install(testcase, tree=None):
+    """Point every loaded core/dashboard module's ``rtdb`` at a FakeDB for this test."""
+    db = FakeDB(tree)
+    for name, mod in list(sys.modules.items()):
+        if mod is not None and name.split('.')[0] in ('core', 'dashboard') and callable(getattr(mod, 'rtdb', None)):
+            patcher = mock.patch.object(mod, 'rtdb', lambda: db)
+            patcher.start()
+            testcase.addCleanup(patcher.stop)
+    return db
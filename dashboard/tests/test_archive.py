@@ -0,0 +1,130 @@
+import json
+import os
+import tempfile
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from dashboard import archive
+
+from . import fakedb
+
+DAY = 86400000
+NOW = 1_790_000_000_000          # 2026-09-21 14:13 UTC
+
+
+class ArchiveTestCase(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        patcher = mock.patch.object(archive, 'ARCHIVE_DIR', tmp.name)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.dir = tmp.name
+
+
+class SegmentTests(ArchiveTestCase):
+    rows = [
+        ('t1', NOW - 3 * DAY, {'timeIn': NOW - 3 * DAY, 'uid': 'u1', 'amountPaid': 40, 'status': 'PAID'}),
+        ('t2', NOW - 2 * DAY, {'timeIn': NOW - 2 * DAY, 'uid': 'u2', 'timeOut': NOW, 'status': 'PAID'}),
+    ]
+
+    def path(self):
+        return os.path.join(self.dir, 'transactions', '2026-09.cga')
+
+    def test_append_and_scan(self):
+        archive.append('transactions', '2026-09', self.rows)
+        f = archive.ArchiveFile(self.path())
+        self.addCleanup(f.close)
+        self.assertEqual(len(f.segments), 1)
+        self.assertEqual(f.segments[0][0]['rows'], 2)
+        got = list(f.scan(columns=('record', 'uid', 'amountPaid')))
+        self.assertEqual([k for k, _, _ in got], ['t1', 't2'])
+        self.assertEqual(got[0][2]['uid'], 'u1')
+        self.assertEqual(got[0][2]['amountPaid'], 40.0)
+        self.assertEqual(json.loads(got[1][2]['record'])['uid'], 'u2')
+
+    def test_scan_window(self):
+        archive.append('transactions', '2026-09', self.rows)
+        f = archive.ArchiveFile(self.path())
+        self.addCleanup(f.close)
+        self.assertEqual([k for k, _, _ in f.scan(NOW - 2 * DAY, NOW)], ['t2'])
+        self.assertEqual(list(f.scan(NOW - DAY, NOW)), [])
+
+    def test_truncated_tail_is_ignored_and_cut_off(self):
+        archive.append('transactions', '2026-09', self.rows[:1])
+        size = os.path.getsize(self.path())
+        with open(self.path(), 'ab') as fh:
+            fh.write(archive.encode_segment(archive.DATASETS['transactions'], self.rows[1:])[:-5])
+        f = archive.ArchiveFile(self.path())
+        self.addCleanup(f.close)
+        self.assertEqual(len(f.segments), 1)
+
+        archive.append('transactions', '2026-09', self.rows[1:])
+        segment = archive.encode_segment(archive.DATASETS['transactions'], self.rows[1:])
+        self.assertEqual(os.path.getsize(self.path()), size + len(segment))
+        self.assertEqual(dict(archive.archived('transactions')).keys(), {'t1', 't2'})
+
+    def test_last_copy_wins(self):
+        archive.append('transactions', '2026-09', self.rows[:1])
+        archive.append('transactions', '2026-09', [('t1', NOW - 3 * DAY, {'timeIn': NOW - 3 * DAY, 'status': 'REFUNDED'})])
+        self.assertEqual(dict(archive.archived('transactions'))['t1']['status'], 'REFUNDED')
+
+
+class ArchiveRunTests(ArchiveTestCase):
+    def tree(self):
+        old, new = NOW - 200 * DAY, NOW - 10 * DAY
+        iso = archive._iso
+        return {
+            'transactions': {
+                'num-old': {'timeIn': old, 'status': 'PAID'},
+                'iso-old': {'timeIn': iso(old + 1000), 'status': 'PAID'},
+                'iso-offset-old': {'timeIn': iso(old + 2000).replace('Z', '+08:00'), 'status': 'PAID'},
+                'open-old': {'timeIn': iso(old + 3000), 'status': 'ONGOING'},
+                'num-new': {'timeIn': new, 'status': 'PAID'},
+                'iso-new': {'timeIn': iso(new), 'status': 'PAID'},
+            },
+            'rollups': {'applied': {
+                'completions': {'num-old': True, 'iso-old': True, 'num-new': True},
+                'entries': {'num-old': True, 'iso-old': True, 'num-new': True},
+            }},
+        }
+
+    def test_moves_numeric_and_iso_times(self):
+        tree = self.tree()
+        db = fakedb.install(self, tree)
+        counts = archive.archive('transactions', retention_days=180, batch_size=2, now_ms=NOW)
+
+        self.assertEqual(counts['archived'], 3)
+        self.assertEqual(counts['kept'], 1)
+        self.assertEqual(set(db.tree['transactions']), {'open-old', 'num-new', 'iso-new'})
+        self.assertEqual(set(db.tree['rollups']['applied']['completions']), {'num-new'})
+        self.assertEqual(archive.every('transactions'), tree['transactions'])
+
+    def test_dry_run_writes_nothing(self):
+        db = fakedb.install(self, self.tree())
+        counts = archive.archive('transactions', retention_days=180, now_ms=NOW, dry_run=True)
+        self.assertEqual(counts['archived'], 3)
+        self.assertEqual(len(db.tree['transactions']), 6)
+        self.assertEqual(archive.months('transactions'), [])
+
+    def test_between_merges_tiers(self):
+        tree = self.tree()
+        fakedb.install(self, tree)
+        archive.archive('transactions', retention_days=180, now_ms=NOW)
+        got = archive.between('transactions', NOW - 250 * DAY, NOW - 5 * DAY)
+        self.assertEqual(got, tree['transactions'])
+        got = archive.between('transactions', NOW - 20 * DAY, NOW)
+        self.assertEqual(set(got), {'num-new', 'iso-new'})
+
+    def test_recent_pages_across_tiers(self):
+        incidents = {f'i{n:03d}': {'resolvedAt': NOW - n * DAY, 'uid': 'u'} for n in range(300)}
+        fakedb.install(self, {'pastIncidents': incidents})
+        archive.archive('pastIncidents', retention_days=180, now_ms=NOW)
+        keys, before = [], None
+        while True:
+            rows, before = archive.recent('pastIncidents', before, 40)
+            keys += [k for k, _ in rows]
+            if before is None:
+                break
+        self.assertEqual(keys, sorted(incidents))
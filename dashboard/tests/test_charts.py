@@ -0,0 +1,84 @@
+import os
+import tempfile
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from dashboard import charts
+
+PARAMS = {'width': 10, 'height': 6, 'dpi': 100, 'format': 'png'}
+
+
+class ChartCacheTests(SimpleTestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.data_dir = os.path.join(tmp.name, 'data')
+        self.cache_dir = os.path.join(tmp.name, 'cache')
+        os.makedirs(self.data_dir)
+        self.write_csv('Day,Entries\nMon,3\n')
+        for name, value in (('DATA_DIR', self.data_dir), ('_cache', charts.RenderCache(directory=self.cache_dir))):
+            patcher = mock.patch.object(charts, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def write_csv(self, text, mtime=None):
+        path = os.path.join(self.data_dir, 'parking_entries.csv')
+        with open(path, 'w') as fh:
+            fh.write(text)
+        if mtime is not None:
+            os.utime(path, (mtime, mtime))
+
+    def test_etag_revalidates_and_follows_the_csv(self):
+        with mock.patch.object(charts, 'render', return_value=b'png-1') as render:
+            first = self.client.get('/entries-graph/')
+            etag = first['ETag']
+            self.assertEqual(first.content, b'png-1')
+            self.assertEqual(self.client.get('/entries-graph/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            self.assertNotEqual(self.client.get('/entries-graph/?format=svg')['ETag'], etag)
+
+            self.write_csv('Day,Entries\nMon,3\nTue,4\n', mtime=time.time() + 5)
+            render.return_value = b'png-2'
+            changed = self.client.get('/entries-graph/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(changed.content, b'png-2')
+        self.assertEqual(render.call_count, 3)
+
+    def test_disk_tier_is_shared_between_caches(self):
+        key = charts.cache_key('entries', PARAMS)
+        with mock.patch.object(charts, 'render', return_value=b'body') as render:
+            charts.cache().get_or_render('entries', PARAMS, key)
+            other = charts.RenderCache(directory=self.cache_dir)
+            self.assertEqual(other.get_or_render('entries', PARAMS, key), b'body')
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual((other.disk_hits, other.misses), (1, 0))
+
+    def test_prune_drops_expired_then_least_recently_used(self):
+        cache = charts.RenderCache(directory=self.cache_dir, max_bytes=25, max_age_hours=1)
+        os.makedirs(self.cache_dir)
+        now = time.time()
+        for name, age in (('old.png', 7200), ('a.png', 300), ('b.png', 200), ('c.png', 100)):
+            path = os.path.join(self.cache_dir, name)
+            with open(path, 'wb') as fh:
+                fh.write(b'x' * 10)
+            os.utime(path, (now - age, now - age))
+        cache.prune()
+        self.assertEqual(sorted(os.listdir(self.cache_dir)), ['b.png', 'c.png'])
+
+    def test_disk_hit_marks_the_file_used(self):
+        key = charts.cache_key('entries', PARAMS)
+        with mock.patch.object(charts, 'render', return_value=b'x' * 10):
+            charts.cache().get_or_render('entries', PARAMS, key)
+            path = os.path.join(self.cache_dir, f'{key}.png')
+            os.utime(path, (0, 0))
+            charts.RenderCache(directory=self.cache_dir).get_or_render('entries', PARAMS, key)
+        self.assertGreater(os.path.getmtime(path), time.time() - 60)
+
+    def test_writes_prune_the_disk_tier(self):
+        cache = charts.RenderCache(directory=self.cache_dir, max_bytes=15)
+        with mock.patch.object(charts, 'render', return_value=b'x' * 10):
+            for dpi in (100, 200):
+                params = {**PARAMS, 'dpi': dpi}
+                cache.get_or_render('entries', params, charts.cache_key('entries', params))
+        self.assertEqual(len(os.listdir(self.cache_dir)), 1)
@@ -0,0 +1,84 @@
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from core.firebase import WriteBatch
+from dashboard import closing, moderation
+
+from . import fakedb
+
+NOW = 1_790_000_000_000
+MIN = 60000
+
+
+def thresholds(deadline):
+    return {str(m): {'status': 'scheduled', 'notifyAt': deadline - m * MIN} for m in closing.THRESHOLDS}
+
+
+def user(tx_id, deadline):
+    return {'displayName': 'Ana', 'closingInfo': {'txId': tx_id, 'deadline': deadline, 'thresholds': thresholds(deadline)}}
+
+
+class SchedulerTests(SimpleTestCase):
+    def setUp(self):
+        deadline = NOW + 20 * MIN
+        self.db = fakedb.install(self, {
+            'users': {'u1': user('t1', deadline), 'u2': user('t2', deadline + 60 * MIN)},
+            'closingSchedule': {
+                'u1': closing.schedule_entry('t1', deadline, thresholds(deadline)),
+                'u2': closing.schedule_entry('t2', deadline + 60 * MIN, thresholds(deadline + 60 * MIN)),
+            },
+        })
+        self.scheduler = closing.ClosingScheduler()
+        with mock.patch.object(closing, '_now_ms', return_value=NOW):
+            self.scheduler.recover()
+
+    def statuses(self, uid):
+        return {m: t['status'] for m, t in self.db.tree['users'][uid]['closingInfo']['thresholds'].items()}
+
+    def test_fires_everything_due_in_one_batch(self):
+        self.assertEqual(self.scheduler.run_once(NOW), 2)          # u1's 60 and 30
+        self.assertEqual(self.statuses('u1'), {'60': 'due', '30': 'due', '15': 'scheduled', '5': 'scheduled'})
+        self.assertEqual(set(self.db.tree['closingSchedule']['u1']['pending']), {'15', '5'})
+        self.assertEqual(len([c for c in self.db.calls if c[0] == 'update']), 1)
+        self.assertEqual(self.scheduler.run_once(NOW), 0)
+
+        self.assertEqual(self.scheduler.run_once(NOW + 20 * MIN), 3)   # u1's 15 and 5, u2's 60
+        self.assertNotIn('u1', self.db.tree['closingSchedule'])
+        self.assertEqual(self.statuses('u2')['60'], 'due')
+        self.assertEqual(self.scheduler.stats()['scheduled'], 3)
+
+    def test_cancelled_entry_is_not_fired(self):
+        batch = WriteBatch()
+        closing.stage_cancel(batch, 'u1')
+        batch.commit()
+        self.scheduler._on_event(SimpleNamespace(event_type='put', path='/u1', data=None))
+        self.assertEqual(self.scheduler.run_once(NOW + 20 * MIN), 1)   # u2's 60 only
+        self.assertEqual(set(self.statuses('u1').values()), {'scheduled'})
+
+    def test_deleted_user_is_dropped_without_a_stub(self):
+        del self.db.tree['users']['u1']
+        self.assertEqual(self.scheduler.run_once(NOW), 0)
+        self.assertNotIn('u1', self.db.tree['users'])
+        self.assertNotIn('u1', self.db.tree['closingSchedule'])
+        self.assertEqual(self.scheduler.stats()['scheduled'], 4)
+
+    def test_failed_write_is_retried(self):
+        with mock.patch.object(closing.WriteBatch, 'commit', side_effect=RuntimeError('offline')):
+            with self.assertRaises(RuntimeError):
+                self.scheduler.run_once(NOW)
+        self.assertEqual(self.scheduler.run_once(NOW), 2)
+
+
+class BanCancelsScheduleTests(SimpleTestCase):
+    def test_stage_ban_cancels_pending_thresholds(self):
+        db = fakedb.install(self, {
+            'users': {'u1': user('t1', NOW)},
+            'closingSchedule': {'u1': closing.schedule_entry('t1', NOW, thresholds(NOW))},
+        })
+        batch = WriteBatch()
+        moderation.stage_ban(batch, 'u1', db.tree['users']['u1'], 'abuse', 'admin', NOW)
+        batch.commit()
+        self.assertEqual(db.tree['closingSchedule'], {})
+        self.assertEqual(db.tree['users'], {})
@@ -0,0 +1,81 @@
+import json
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+
+from dashboard import counters, moderation, views
+
+from . import fakedb
+
+
+def profiles(**users):
+    return {uid: {'displayName': uid, 'isPWD': pwd} for uid, pwd in users.items()}
+
+
+class CountersViewTests(TestCase):
+    def setUp(self):
+        users = profiles(u1=False, u2=True, u3=True)
+        self.db = fakedb.install(self, {
+            'users': users,
+            'pwdRequests': {'u2': {'status': 'approved'}, 'u3': {'status': 'approved'}},
+            'counters': counters.build_from_users({k: v for k, v in users.items() if k != 'u1'}),
+        })
+        for target in ('views.init_firebase', 'moderation.init_firebase'):
+            patcher = mock.patch(f'dashboard.{target}')
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        admin = get_user_model().objects.create_user('admin', password='x', is_admin=True)
+        self.client.force_login(admin)
+
+    def post(self, name, body, **headers):
+        return self.client.post(f'/api/{name}/', json.dumps(body), content_type='application/json', headers=headers)
+
+    def totals(self):
+        return self.db.tree['counters']['totals']
+
+    def index(self, kind):
+        return set(self.db.tree['counters']['index'].get(kind) or {})
+
+    def test_registration_needs_the_users_own_token(self):
+        self.assertEqual(self.post('user-registered', {'uid': 'u1'}).status_code, 401)
+        with mock.patch('firebase_admin.auth.verify_id_token', return_value={'uid': 'u2'}):
+            self.assertEqual(self.post('user-registered', {'uid': 'u1'}, Authorization='Bearer t').status_code, 403)
+        with mock.patch('firebase_admin.auth.verify_id_token', side_effect=ValueError('bad')):
+            self.assertEqual(self.post('user-registered', {'uid': 'u1'}, Authorization='Bearer t').status_code, 401)
+        self.assertEqual(self.totals(), {'users': 2, 'pwdUsers': 2})
+
+    def test_registration_counts_once(self):
+        with mock.patch('firebase_admin.auth.verify_id_token', return_value={'uid': 'u1'}) as verify, \
+                mock.patch.object(views.directory, 'ensure_tx_status'):
+            first = self.post('user-registered', {'uid': 'u1'}, Authorization='Bearer tok').json()
+            again = self.post('user-registered', {'uid': 'u1'}, Authorization='Bearer tok').json()
+        verify.assert_called_with('tok')
+        self.assertEqual((first['counted'], again['counted']), (True, False))
+        self.assertEqual(self.totals(), {'users': 3, 'pwdUsers': 2})
+        self.assertEqual(self.index('users'), {'u1', 'u2', 'u3'})
+
+    def test_decline_uncounts_in_the_status_update(self):
+        self.db.calls.clear()
+        self.assertTrue(self.post('decline-pwd', {'uid': 'u2'}).json()['ok'])
+        self.assertEqual([c[0] for c in self.db.calls], ['get', 'update'])
+        self.assertEqual(self.totals(), {'users': 2, 'pwdUsers': 1})
+        self.assertEqual(self.index('pwd'), {'u3'})
+        self.assertEqual(self.db.tree['users']['u2']['pwdStatus'], 'rejected')
+        self.assertFalse(self.db.tree['users']['u2']['isPWD'])
+
+        self.assertTrue(self.post('decline-pwd', {'uid': 'u2'}).json()['ok'])
+        self.assertEqual(self.totals()['pwdUsers'], 1)
+
+    def test_bulk_decline_uncounts(self):
+        got = moderation.decide_pwd(['u2', 'u3', 'u9'], approve=False)
+        self.assertEqual((got['succeeded'], got['failed']), (2, 1))
+        self.assertEqual(self.totals(), {'users': 2, 'pwdUsers': 0})
+        self.assertEqual(self.index('pwd'), set())
+
+    def test_ban_uncounts_the_user_and_the_pwd_marker(self):
+        with mock.patch('firebase_admin.auth.delete_user'):
+            self.assertTrue(self.post('ban-user', {'uid': 'u2', 'reason': 'abuse'}).json()['ok'])
+        self.assertEqual(self.totals(), {'users': 1, 'pwdUsers': 1})
+        self.assertEqual((self.index('users'), self.index('pwd')), ({'u3'}, {'u3'}))
+        self.assertNotIn('u2', self.db.tree['users'])
@@ -0,0 +1,130 @@
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase
+
+from dashboard import directory
+from dashboard.models import ParkingLog
+
+from . import fakedb
+
+
+def users(n):
+    return {f'u{i:02d}': {'displayName': f'User {i}', 'isPWD': i % 3 == 0} for i in range(n)}
+
+
+def statuses(n):
+    return {f'u{i:02d}': directory.tx_status_entry(f'u{i:02d}', 'ONGOING' if i % 2 else 'NONE') for i in range(n)}
+
+
+class ListUsersTests(SimpleTestCase):
+    def pages(self, **filters):
+        out, cursor = [], None
+        while True:
+            page = directory.list_users(cursor=cursor, **filters)
+            out.append([row['uid'] for row in page['rows']])
+            cursor = page['next']
+            if cursor is None:
+                return out
+
+    def test_pages_by_key(self):
+        fakedb.install(self, {'users': users(7), 'userTxStatus': statuses(7)})
+        self.assertEqual(self.pages(limit=3), [['u00', 'u01', 'u02'], ['u03', 'u04', 'u05'], ['u06']])
+        page = directory.list_users(limit=3)
+        self.assertEqual(page['rows'][1]['txStatus'], 'ONGOING')
+        self.assertEqual(page['rows'][0]['userType'], 'pwd')
+
+    def test_last_full_page_has_no_next(self):
+        fakedb.install(self, {'users': users(6), 'userTxStatus': statuses(6)})
+        self.assertEqual(self.pages(limit=3), [['u00', 'u01', 'u02'], ['u03', 'u04', 'u05']])
+
+    def test_status_reads_the_sorted_index(self):
+        tx = statuses(7)
+        tx['u09'] = directory.tx_status_entry('u09', 'ONGOING')      # profile deleted
+        db = fakedb.install(self, {'users': users(7), 'userTxStatus': tx})
+        self.assertEqual(self.pages(status='ongoing', limit=2), [['u01', 'u03'], ['u05']])
+        self.assertFalse(any(c[1] == '/users' for c in db.calls))
+
+    def test_pwd_filter_and_scan_limit(self):
+        index = {uid: True for uid, p in users(12).items() if p['isPWD']}
+        index['u13'] = True                                          # profile deleted
+        fakedb.install(self, {'users': users(12), 'userTxStatus': statuses(12), 'counters': {'index': {'pwd': index}}})
+        self.assertEqual(self.pages(pwd=True, limit=2), [['u00', 'u03'], ['u06', 'u09'], []])
+
+        fakedb.install(self, {'users': users(12), 'userTxStatus': statuses(12)})
+        with mock.patch.object(directory, 'MAX_SCAN_PAGES', 2):
+            page = directory.list_users(status='PAID', limit=2)
+        self.assertEqual(page, {'rows': [], 'next': None})
+        with mock.patch.object(directory, 'MAX_SCAN_PAGES', 1):
+            page = directory.list_users(pwd=False, limit=2)
+        # A short page still hands back a cursor past everything it scanned
+        self.assertEqual([r['uid'] for r in page['rows']], ['u01'])
+        self.assertEqual(page['next'], 'u01')
+        with mock.patch.object(directory, 'MAX_SCAN_PAGES', 1):
+            page = directory.list_users(pwd=False, limit=3, cursor='u01')
+        self.assertEqual([r['uid'] for r in page['rows']], ['u02', 'u04'])
+        self.assertEqual(page['next'], 'u04')
+
+    def test_banned_rows_carry_the_ban(self):
+        fakedb.install(self, {'users': users(2), 'banned': {'users': {
+            'u01': {'reason': 'abuse', 'bannedAt': 1}, 'gone': {'reason': 'x', 'email': 'g@x'},
+        }}})
+        rows = directory.list_users(banned=True)['rows']
+        self.assertEqual([r['uid'] for r in rows], ['gone', 'u01'])
+        self.assertEqual(rows[0]['email'], 'g@x')
+        self.assertEqual(rows[1]['banned']['reason'], 'abuse')
+
+    def test_unknown_status(self):
+        with self.assertRaises(ValueError):
+            directory.list_users(status='LOST')
+
+
+class TxStatusTests(SimpleTestCase):
+    def test_ongoing_beats_paid(self):
+        got = directory.compute_tx_statuses({
+            'a': {'uid': 'u1', 'status': 'PAID', 'timeIn': 5},
+            'b': {'uid': 'u1', 'status': 'ONGOING', 'timeIn': 1},
+            'c': {'uid': 'u2', 'status': 'COMPLETED', 'timeIn': 1},
+            'd': {'uid': 'u2', 'status': 'PAID', 'timeIn': 3},
+            'e': {'uid': 'u3', 'status': 'CANCELLED', 'timeIn': 3},
+        })
+        self.assertEqual(got, {'u1': ('ONGOING', 'b', 1), 'u2': ('PAID', 'd', 3)})
+
+
+class ListTransactionsTests(TestCase):
+    def test_newest_first_keyset_pages(self):
+        at = datetime(2026, 9, 21, 8, tzinfo=timezone.utc)
+        for n in range(5):
+            # Two logs share each entry time, so the pk breaks ties
+            ParkingLog.objects.create(tx_id=f't{n}', uid='u1', status='PAID' if n else 'ONGOING',
+                                      entry_time=at + timedelta(hours=n // 2))
+        fakedb.install(self, {'users': {'u1': {'displayName': 'Ana'}}})
+        keys, cursor = [], None
+        while True:
+            page = directory.list_transactions(cursor=cursor, limit=2)
+            keys.append([row['txId'] for row in page['rows']])
+            cursor = page['next']
+            if cursor is None:
+                break
+        self.assertEqual(keys, [['t4', 't3'], ['t2', 't1'], ['t0']])
+        self.assertEqual(page['rows'][0]['name'], 'Ana')
+        self.assertEqual([r['txId'] for r in directory.list_transactions(status='paid')['rows']], ['t4', 't3', 't2', 't1'])
+        for cursor in ('bogus', '9' * 30 + '.1'):
+            with self.assertRaises(ValueError):
+                directory.list_transactions(cursor=cursor)
+
+    def test_sub_millisecond_entry_times_page_exactly(self):
+        at = datetime(2026, 9, 21, 8, tzinfo=timezone.utc)
+        # Same millisecond, different microseconds; pk order runs against time order
+        for n, us in enumerate((900, 100, 500)):
+            ParkingLog.objects.create(tx_id=f't{n}', uid='u1', status='PAID',
+                                      entry_time=at + timedelta(microseconds=us))
+        fakedb.install(self, {})
+        keys, cursor = [], None
+        while True:
+            page = directory.list_transactions(cursor=cursor, limit=1)
+            keys += [row['txId'] for row in page['rows']]
+            cursor = page['next']
+            if cursor is None:
+                break
+        self.assertEqual(keys, ['t0', 't2', 't1'])
@@ -0,0 +1,110 @@
+import csv
+import io
+import re
+import zipfile
+from datetime import date, datetime, timezone
+from decimal import Decimal
+from unittest import mock
+from xml.etree import ElementTree
+
+from django.test import SimpleTestCase, TestCase
+
+from dashboard import exports
+from dashboard.models import ParkingLog
+
+NS = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+ROWS = [['t1', 'Ana, "A"', Decimal('40.50'), None, 3], ['t2', 'b\x01ad <x>', 0.5, True, -1]]
+HEADER = ['txId', 'name', 'amount', 'note', 'n']
+
+
+def sheet_rows(data):
+    with zipfile.ZipFile(io.BytesIO(data)) as zf:
+        root = ElementTree.fromstring(zf.read('xl/worksheets/sheet1.xml'))
+        names = zf.namelist()
+    rows = []
+    for row in root.iterfind('.//s:row', NS):
+        cells = []
+        for c in row:
+            text = c.find('.//s:t', NS)
+            value = c.find('s:v', NS)
+            cells.append(text.text if text is not None else value.text if value is not None else None)
+        rows.append(cells)
+    return names, rows
+
+
+class WriterTests(SimpleTestCase):
+    def test_csv(self):
+        with mock.patch.object(exports, 'CHUNK_SIZE', 1):
+            parts = list(exports.csv_chunks(HEADER, iter(ROWS)))
+        self.assertEqual(len(parts), 3)
+        text = b''.join(parts).decode('utf-8')
+        self.assertTrue(text.startswith('﻿'))
+        got = list(csv.reader(io.StringIO(text[1:])))
+        self.assertEqual(got, [HEADER, ['t1', 'Ana, "A"', '40.5', '', '3'], ['t2', 'b\x01ad <x>', '0.5', 'True', '-1']])
+
+    def test_xlsx(self):
+        with mock.patch.object(exports, 'CHUNK_SIZE', 1):
+            parts = list(exports.xlsx_chunks(HEADER, iter(ROWS)))
+        self.assertGreater(len(parts), 2)
+        names, rows = sheet_rows(b''.join(parts))
+        self.assertIn('xl/workbook.xml', names)
+        self.assertEqual(rows, [HEADER, ['t1', 'Ana, "A"', '40.5', None, '3'], ['t2', 'bad <x>', '0.5', 'True', '-1']])
+
+    def test_empty_xlsx_is_a_valid_workbook(self):
+        _, rows = sheet_rows(b''.join(exports.xlsx_chunks(['a'], iter([]))))
+        self.assertEqual(rows, [['a']])
+
+
+class ReportParamsTests(SimpleTestCase):
+    def test_from_params(self):
+        report = exports.Report.from_params({'start': '2026-09-01', 'end': '2026-09-30',
+                                             'group': 'vehicle_type, month,month', 'basis': 'exit'})
+        self.assertEqual((report.start, report.end), (date(2026, 9, 1), date(2026, 9, 30)))
+        self.assertEqual(report.group, ('vehicle_type', 'month'))
+        self.assertEqual(report.field, 'exit_time')
+        self.assertEqual(report.header(), ['vehicleType', 'month'] + exports.SUMMARY_COLUMNS)
+        self.assertEqual(report.filename('csv'), 'report-2026-09-01-2026-09-30-by-vehicle_type-month.csv')
+
+    def test_bad_params(self):
+        for params in ({'start': 'x', 'end': '2026-09-01'},
+                       {'start': '2026-09-02', 'end': '2026-09-01'},
+                       {'start': '2020-01-01', 'end': '2026-09-01'},
+                       {'start': '2026-09-01', 'end': '2026-09-01', 'group': 'day,week'},
+                       {'start': '2026-09-01', 'end': '2026-09-01', 'group': 'plate'},
+                       {'start': '2026-09-01', 'end': '2026-09-01', 'basis': 'paid'}):
+            with self.assertRaises(exports.ExportError, msg=params):
+                exports.Report.from_params(params)
+        with self.assertRaises(exports.ExportError):
+            exports.chunks(exports.Report(date(2026, 9, 1), date(2026, 9, 1)), 'pdf')
+
+
+class ReportRowsTests(TestCase):
+    def setUp(self):
+        def log(tx_id, start, minutes, vehicle, status, amount):
+            end = start.replace(minute=minutes) if minutes is not None else None
+            ParkingLog.objects.create(tx_id=tx_id, vehicle_type=vehicle, status=status,
+                                      entry_time=start, exit_time=end, amount_paid=amount)
+
+        utc = timezone.utc
+        log('a', datetime(2026, 9, 1, 2, 0, tzinfo=utc), 30, 'CAR', 'PAID', 40)
+        log('b', datetime(2026, 9, 1, 3, 0, tzinfo=utc), 50, 'CAR', 'COMPLETED', 60)
+        log('c', datetime(2026, 9, 1, 4, 0, tzinfo=utc), None, 'MOTORCYCLE', 'ONGOING', 0)
+        # 2026-09-02 in Manila, outside a range that ends on 2026-09-01
+        log('d', datetime(2026, 9, 1, 16, 30, tzinfo=utc), 45, 'CAR', 'PAID', 40)
+
+    def test_detail_rows(self):
+        rows = list(exports.Report(date(2026, 9, 1), date(2026, 9, 1)).rows())
+        self.assertEqual([r[0] for r in rows], ['a', 'b', 'c'])
+        self.assertEqual(rows[0][6], '2026-09-01T10:00:00+08:00')
+        self.assertEqual((rows[0][8], rows[0][9]), (30.0, 40.0))
+        self.assertIsNone(rows[2][7])
+
+    def test_grouped_rows(self):
+        report = exports.Report(date(2026, 9, 1), date(2026, 9, 2), group=('day', 'vehicle_type'))
+        self.assertEqual(list(report.rows()), [
+            ['2026-09-01', 'CAR', 2, 2, 100.0, 40.0],
+            ['2026-09-01', 'MOTORCYCLE', 1, 0, 0.0, None],
+            ['2026-09-02', 'CAR', 1, 1, 40.0, 15.0],
+        ])
+        csv_text = b''.join(exports.chunks(report, 'csv')).decode('utf-8')
+        self.assertTrue(re.match('﻿day,vehicleType,transactions', csv_text))
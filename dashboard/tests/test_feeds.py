@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+from django.test import SimpleTestCase
+
+from dashboard import feeds
+
+from . import fakedb
+
+PATH = '/configurations/layout/occupied'
+
+
+class FeedTestCase(SimpleTestCase):
+    def setUp(self):
+        fakedb.install(self, {'configurations': {'layout': {'occupied': {
+            'C1-1': {'status': 'OCCUPIED'}, 'C1-2': {'status': 'FREE'},
+        }}}})
+        self.feed = feeds.Feed(PATH, log_size=3)
+        self.feed.start()
+        self.addCleanup(self.feed.stop)
+
+
+class FeedTests(FeedTestCase):
+    def test_foreign_or_unknown_cursor_gets_a_snapshot(self):
+        for cursor in (None, '', 'abc-0', f'{self.feed.epoch}-x', f'{self.feed.epoch}-9'):
+            kind, cursor_, data = self.feed.since(cursor)
+            self.assertEqual(kind, 'snapshot')
+            self.assertEqual(cursor_, f'{self.feed.epoch}-0')
+            self.assertEqual(set(data), {'C1-1', 'C1-2'})
+
+    def test_delta_merges_changes_since_the_cursor(self):
+        start = self.feed.cursor()
+        self.feed.apply([(['C1-2', 'status'], 'RESERVED')])
+        middle = self.feed.cursor()
+        self.feed.apply([(['C1-1'], None)])
+        self.feed.apply([(['C1-2'], {'status': 'OCCUPIED'})])
+
+        kind, cursor, data = self.feed.since(start)
+        self.assertEqual((kind, cursor), ('delta', f'{self.feed.epoch}-3'))
+        self.assertEqual(data, {'C1-1': None, 'C1-2': {'status': 'OCCUPIED'}})
+        self.assertEqual(self.feed.since(middle)[2], data)
+        self.assertEqual(self.feed.since(cursor), ('delta', cursor, {}))
+
+    def test_no_op_writes_are_not_logged(self):
+        self.assertIsNone(self.feed.apply([(['C1-1', 'status'], 'OCCUPIED')]))
+        self.assertEqual(self.feed.seq, 0)
+
+    def test_cursor_older_than_the_log_gets_a_snapshot(self):
+        start = self.feed.cursor()
+        for n in range(4):
+            self.feed.apply([([f'X{n}'], {'status': 'OCCUPIED'})])
+        kind, _, data = self.feed.since(start)
+        self.assertEqual(kind, 'snapshot')
+        self.assertEqual(len(data), 6)
+        self.assertEqual(self.feed.since(f'{self.feed.epoch}-1')[0], 'delta')
+
+    def test_listener_events(self):
+        start = self.feed.cursor()
+        self.feed._on_event(SimpleNamespace(event_type='patch', path='/', data={'C1-2/status': 'OCCUPIED', 'C1-3': {}}))
+        self.feed._on_event(SimpleNamespace(event_type='put', path='/', data={'C1-3': {'status': 'RESERVED'}}))
+        self.assertEqual(self.feed.since(start)[2], {
+            'C1-1': None, 'C1-2': None, 'C1-3': {'status': 'RESERVED'},
+        })
+        self.assertEqual(self.feed.since(None)[2], {'C1-3': {'status': 'RESERVED'}})
+
+
+class PollTests(FeedTestCase):
+    def test_snapshot_is_full_and_coded(self):
+        self.feed.apply([(['C1-3'], {'status': 'RESERVED'})])
+        self.assertEqual(feeds.poll(self.feed, ''), {
+            'v': self.feed.cursor(), 'full': 1, 's': {'C1-1': 'O', 'C1-2': 'F', 'C1-3': 'R'},
+        })
+
+    def test_current_cursor_gets_only_the_version(self):
+        cursor = self.feed.cursor()
+        self.assertEqual(feeds.poll(self.feed, cursor), {'v': cursor})
+        self.feed.apply([(['C1-1'], None), (['C1-2', 'status'], 'occupied')])
+        self.assertEqual(feeds.poll(self.feed, cursor), {
+            'v': self.feed.cursor(), 's': {'C1-1': None, 'C1-2': 'O'},
+        })
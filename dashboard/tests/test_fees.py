@@ -0,0 +1,75 @@
+from datetime import datetime, timezone
+from unittest import mock
+
+import numpy as np
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+
+from dashboard import fees
+from dashboard.models import FeeConfig, ParkingLog
+
+from . import fakedb
+
+HOUR = fees.HOUR_MS
+T0 = 1_790_000_000_000
+CONFIG = (40.0, 3, 20.0)
+
+
+class ComputeTests(SimpleTestCase):
+    def test_started_hours_round_up(self):
+        entry = [T0] * 6
+        exit_ = [T0 - HOUR, T0, T0 + 1, T0 + 3 * HOUR, T0 + 3 * HOUR + 1, T0 + 5 * HOUR]
+        self.assertEqual(fees.compute(entry, exit_, CONFIG).tolist(), [40, 40, 40, 40, 60, 80])
+
+    def test_missing_entry_has_no_fee(self):
+        got = fees.compute([np.nan, T0], [T0, T0 + HOUR], CONFIG)
+        self.assertTrue(np.isnan(got[0]))
+        self.assertEqual(got[1], 40)
+        self.assertIsNone(fees.quote({'timeIn': None}, T0, CONFIG))
+
+    def test_quote(self):
+        tx = {'timeIn': '2026-09-21T14:13:20Z', 'timeOut': T0 + 4 * HOUR}
+        self.assertEqual(fees.quote(tx, config=CONFIG), 60.0)
+        self.assertEqual(fees.quote({'timeIn': T0}, T0 + 5 * HOUR, CONFIG), 80.0)
+
+    def test_open_transactions(self):
+        fakedb.install(self, {'transactions': {
+            'a': {'status': 'ONGOING', 'timeIn': T0},
+            'b': {'status': 'ONGOING', 'timeIn': T0 - 4 * HOUR},
+            'c': {'status': 'PAID', 'timeIn': T0},
+            'd': {'status': 'ONGOING'},
+        }})
+        self.assertEqual(fees.quote_open_transactions(T0 + HOUR, CONFIG), {'a': 40.0, 'b': 80.0})
+
+
+class ActiveConfigTests(TestCase):
+    def setUp(self):
+        cache.delete(fees.CACHE_KEY)
+        self.addCleanup(cache.delete, fees.CACHE_KEY)
+
+    def test_latest_row_is_cached_until_saved(self):
+        self.assertIsNone(fees.active_config())
+        with self.assertRaises(ValueError):
+            fees.compute([T0], [T0])
+
+        FeeConfig.objects.create(base_fee=30, base_hours=2, succeeding_fee=10)
+        self.assertEqual(fees.active_config(), (30.0, 2, 10.0))
+        with mock.patch.object(cache, 'set', wraps=cache.set) as cache_set:
+            cache.delete(fees.CACHE_KEY)
+            fees.active_config()
+        self.assertEqual(cache_set.call_args.args[2], fees.CACHE_SECONDS)
+        with self.assertNumQueries(0):
+            fees.active_config()
+
+        FeeConfig.objects.create(base_fee=50, base_hours=1, succeeding_fee=25)
+        self.assertEqual(fees.active_config(), (50.0, 1, 25.0))
+
+    def test_recompute_history_writes_nothing(self):
+        at = datetime(2026, 9, 21, 8, tzinfo=timezone.utc)
+        ParkingLog.objects.create(tx_id='a', entry_time=at, exit_time=at.replace(hour=9), amount_paid=40)
+        ParkingLog.objects.create(tx_id='b', entry_time=at, exit_time=at.replace(hour=12), amount_paid=40)
+        got = fees.recompute_history(at, at.replace(hour=23), CONFIG)
+        self.assertEqual(got['count'], 2)
+        self.assertEqual((got['paid'], got['recomputed']), (80.0, 100.0))
+        self.assertEqual(got['changed'], [('b', 40.0, 60.0)])
+        self.assertEqual(ParkingLog.objects.get(tx_id='b').amount_paid, 40)
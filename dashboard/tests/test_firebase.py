@@ -0,0 +1,69 @@
+from django.test import SimpleTestCase
+
+from core.firebase import WriteBatch, query_pages
+
+from . import fakedb
+
+
+class WriteBatchTests(SimpleTestCase):
+    def test_commit_sends_one_update(self):
+        db = fakedb.install(self, {'a': {'x': 1}, 'b': 2})
+        batch = WriteBatch().set('/a/y', 3).update('/c', {'p': 1, 'q': 2}).delete('b')
+        self.assertEqual(batch.commit(), 4)
+        self.assertEqual(db.tree, {'a': {'x': 1, 'y': 3}, 'c': {'p': 1, 'q': 2}})
+        self.assertEqual([c for c in db.calls if c[0] == 'update'],
+                         [('update', '/', ('a/y', 'b', 'c/p', 'c/q'))])
+        self.assertEqual(len(batch), 0)
+        self.assertEqual(batch.commit(), 0)
+
+    def test_write_below_a_pending_path_folds_into_it(self):
+        batch = WriteBatch().set('/a', {'x': 1}).set('/a/y/z', 2).delete('/a/x')
+        self.assertEqual(batch.updates, {'/a': {'y': {'z': 2}}})
+        batch = WriteBatch().delete('/a').set('/a/b', 1)
+        self.assertEqual(batch.updates, {'/a': {'b': 1}})
+
+    def test_values_are_copied(self):
+        value = {'x': 1}
+        batch = WriteBatch().set('/a', value)
+        value['x'] = 2
+        batch.set('/a/y', 3)
+        self.assertEqual(batch.updates, {'/a': {'x': 1, 'y': 3}})
+        self.assertEqual(value, {'x': 2})
+
+    def test_write_above_a_pending_path_is_refused(self):
+        batch = WriteBatch().set('/a/b', 1)
+        with self.assertRaises(ValueError):
+            batch.set('/a', {'c': 1})
+        self.assertEqual(batch.updates, {'/a/b': 1})
+
+    def test_same_path_is_replaced_and_siblings_do_not_overlap(self):
+        batch = WriteBatch().set('/a/b', 1).set('/a/bc', 2).set('a/b/', 3)
+        self.assertEqual(batch.updates, {'/a/b': 3, '/a/bc': 2})
+
+    def test_root_is_refused(self):
+        with self.assertRaises(ValueError):
+            WriteBatch().set('/', {})
+
+    def test_context_manager_commits_only_on_success(self):
+        db = fakedb.install(self, {})
+        with WriteBatch() as batch:
+            batch.set('/a', 1)
+        with self.assertRaises(RuntimeError):
+            with WriteBatch() as batch:
+                batch.set('/b', 1)
+                raise RuntimeError
+        self.assertEqual(db.tree, {'a': 1})
+
+
+class QueryPagesTests(SimpleTestCase):
+    def test_pages_in_child_order_across_ties(self):
+        fakedb.install(self, {'t': {f'k{n}': {'v': n // 4} for n in range(10)}})
+        pages = list(query_pages('/t', 'v', 0, 2, 3))
+        keys = [k for page in pages for k, _ in page]
+        self.assertEqual(keys, [f'k{n}' for n in range(10)])
+        self.assertTrue(all(pages))
+
+    def test_window_bounds(self):
+        fakedb.install(self, {'t': {'a': {'v': 1}, 'b': {'v': 'x'}, 'c': {'v': 5}}})
+        self.assertEqual([k for page in query_pages('/t', 'v', 2, 10, 2) for k, _ in page], ['c'])
+        self.assertEqual([k for page in query_pages('/t', 'v', '', None, 2) for k, _ in page], ['b'])
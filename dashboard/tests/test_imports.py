@@ -0,0 +1,26 @@
+import io
+import os
+import subprocess
+import sys
+
+from django.core.management import call_command
+from django.test import SimpleTestCase
+
+HEAVY = ('matplotlib', 'numpy', 'PIL', 'requests', 'firebase_admin')
+
+
+class DeferredImportTests(SimpleTestCase):
+    def test_urlconf_loads_no_heavy_packages(self):
+        code = ("import sys, django; django.setup(); import dashboard.urls; "
+                f"print(','.join(m for m in {HEAVY!r} if m in sys.modules))")
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE='core.settings')
+        proc = subprocess.run([sys.executable, '-c', code], capture_output=True, text=True, env=env, check=True)
+        self.assertEqual(proc.stdout.strip(), '')
+
+    def test_import_report(self):
+        out = io.StringIO()
+        call_command('import_report', '--top', '3', stdout=out, no_color=True)
+        report = out.getvalue()
+        self.assertIn('dashboard.urls:', report)
+        for pkg in HEAVY:
+            self.assertRegex(report, rf'\n  {pkg} +deferred')
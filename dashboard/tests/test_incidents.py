@@ -0,0 +1,65 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from dashboard import incidents
+
+from . import fakedb
+
+NOW = 1_790_000_000_000
+
+
+def pending(deadline, **extra):
+    return {'status': incidents.PENDING, 'confirmDeadline': deadline, 'uid': 'u1', **extra}
+
+
+class SweepTests(SimpleTestCase):
+    def test_finalizes_overdue_and_publishes_stats(self):
+        db = fakedb.install(self, {
+            'incidents': {'a': pending(NOW - 5000), 'b': pending(NOW + 60000)},
+            'incidentDeadlines': {'a': {'deadline': NOW - 5000}, 'b': {'deadline': NOW + 60000}},
+        })
+        sweeper = incidents.IncidentSweeper()
+        self.assertEqual(sweeper.sweep(NOW), 1)
+
+        self.assertEqual(db.tree['incidents']['a']['status'], 'RESOLVED')
+        self.assertEqual(db.tree['pastIncidents']['a']['resolvedAt'], NOW)
+        self.assertNotIn('autoResolved', db.tree['pastIncidents']['a'])
+        self.assertEqual(set(db.tree['incidentDeadlines']), {'b'})
+        stats = incidents.published_stats()
+        self.assertEqual(stats['finalized'], 1)
+        self.assertEqual(stats['lagMs']['max'], 5000)
+
+    def test_confirmed_incident_is_not_overwritten(self):
+        db = fakedb.install(self, {
+            'incidents': {'a': {'status': 'CONFIRMED', 'uid': 'u1'}},
+            'incidentDeadlines': {'a': {'deadline': NOW - 5000}},
+        })
+        incidents.IncidentSweeper().sweep(NOW)
+        self.assertEqual(db.tree['incidents']['a']['status'], 'CONFIRMED')
+        self.assertNotIn('pastIncidents', db.tree)
+        self.assertEqual(db.tree['incidentDeadlines'], {})
+
+    def test_extended_deadline_moves_the_index_entry(self):
+        db = fakedb.install(self, {
+            'incidents': {'a': pending(NOW + 60000)},
+            'incidentDeadlines': {'a': {'deadline': NOW - 5000}},
+        })
+        incidents.IncidentSweeper().sweep(NOW)
+        self.assertEqual(db.tree['incidents']['a']['status'], incidents.PENDING)
+        self.assertEqual(db.tree['incidentDeadlines']['a'], {'deadline': NOW + 60000})
+
+    def test_copy_written_after_a_failed_batch(self):
+        db = fakedb.install(self, {
+            'incidents': {'a': pending(NOW - 5000)},
+            'incidentDeadlines': {'a': {'deadline': NOW - 5000}},
+        })
+        with mock.patch.object(incidents.WriteBatch, 'commit', side_effect=RuntimeError('offline')):
+            with self.assertRaises(RuntimeError):
+                incidents.IncidentSweeper().sweep(NOW)
+        self.assertEqual(db.tree['incidents']['a']['status'], 'RESOLVED')
+        self.assertNotIn('pastIncidents', db.tree)
+
+        incidents.IncidentSweeper().sweep(NOW + 1000)
+        self.assertEqual(db.tree['pastIncidents']['a']['resolvedAt'], NOW)
+        self.assertEqual(db.tree['incidentDeadlines'], {})
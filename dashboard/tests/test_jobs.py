@@ -0,0 +1,81 @@
+import json
+import threading
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from dashboard import gate, jobs
+
+from . import fakedb
+
+
+class JobQueueTests(SimpleTestCase):
+    def test_done_and_failed_jobs_report_their_state(self):
+        queue = jobs.JobQueue('test-state', workers=1, limit=4)
+
+        def ok(job, n):
+            job.stage('working', n=n)
+            return {'n': n}
+
+        def boom(job):
+            raise RuntimeError('offline')
+
+        done = queue.wait(queue.submit(ok, 3), timeout=5)
+        self.assertEqual((done['status'], done['stage'], done['result'], done['n']), ('done', 'done', {'n': 3}, 3))
+        failed = queue.wait(queue.submit(boom), timeout=5)
+        self.assertEqual((failed['status'], failed['error']), ('failed', 'offline'))
+        self.assertIsNone(queue.status('nope'))
+
+    def test_full_queue_refuses_work(self):
+        queue = jobs.JobQueue('test-full', workers=1, limit=1)
+        release = threading.Event()
+        job_id = queue.submit(lambda job: release.wait(5))
+        with self.assertRaises(jobs.QueueFull):
+            queue.submit(lambda job: None)
+        self.assertEqual(queue.stats()['active'], 1)
+        release.set()
+        queue.wait(job_id, timeout=5)
+        queue.wait(queue.submit(lambda job: None), timeout=5)
+
+
+class EntrancePipelineTests(SimpleTestCase):
+    def setUp(self):
+        self.db = fakedb.install(self, {'transactions': {'t1': {'uid': 'u1', 'timeIn': 1_790_000_000_000}}})
+        for name, value in (('capture', b'jpeg'), ('upload', 'https://cdn/x.jpg'), ('ocr', 'ABC 1234'),
+                            ('write_closing_info', None)):
+            patcher = mock.patch.object(gate, name, return_value=value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(gate.time, 'sleep')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        patcher = mock.patch.object(gate.rollups, 'record_entry')
+        self.record_entry = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_stages_and_result(self):
+        job = mock.Mock()
+        result = gate.run_entrance(job, 'u1', 't1', 'http://cam')
+        self.assertEqual([c.args[0] for c in job.stage.call_args_list], ['capture', 'upload', 'ocr', 'rtdb'])
+        self.assertEqual((result['ok'], result['plate'], result['url']), (True, 'ABC 1234', 'https://cdn/x.jpg'))
+        self.assertEqual(self.db.tree['transactions']['t1']['plateNumber'], 'ABC 1234')
+        self.record_entry.assert_called_once_with('t1', 1_790_000_000_000)
+
+    def test_failed_stage_ends_the_job_with_its_payload(self):
+        with mock.patch.object(gate, 'upload', side_effect=gate.GateError('cloudinary upload failed', status=500)):
+            result = gate.run_entrance(mock.Mock(), 'u1', 't1', 'http://cam')
+        self.assertEqual(result, {'ok': False, 'error': 'cloudinary upload failed', 'status': 500})
+        self.assertNotIn('plateNumber', self.db.tree['transactions']['t1'])
+
+    def test_view_queues_and_reports_status(self):
+        queue = jobs.JobQueue('gate', workers=1, limit=4)
+        with mock.patch.dict(jobs._queues, {'gate': queue}):
+            response = self.client.post('/api/entrance-snapshot/', json.dumps(
+                {'uid': 'u1', 'txId': 't1', 'cameraUrl': 'http://cam'}), content_type='application/json')
+            self.assertEqual(response.status_code, 202)
+            job_id = response.json()['jobId']
+            queue.wait(job_id, timeout=5)
+            status = self.client.get(f'/api/entrance-snapshot/{job_id}/').json()
+            self.assertEqual((status['status'], status['result']['plate']), ('done', 'ABC 1234'))
+            self.assertEqual(self.client.get('/api/entrance-snapshot/nope/').status_code, 404)
+            self.assertEqual(self.client.post('/api/entrance-snapshot/', '{}', content_type='application/json').status_code, 400)
@@ -0,0 +1,209 @@
+from array import array
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.test import SimpleTestCase, TestCase
+
+from dashboard import layout
+
+from . import fakedb
+
+
+def slots(*ids):
+    return [{'id': sid, 'name': sid} for sid in ids]
+
+
+def tree(version=5, **extra):
+    return {'configurations': {'layout': {
+        'floors': 1,
+        'version': version,
+        'slotsByFloor': {'1': {'Car': slots('C1-1', 'C1-2'), 'Motorcycle': slots('M1-1')}},
+        **extra,
+    }}}
+
+
+class LayoutModelTests(SimpleTestCase):
+    def test_from_slots_by_floor(self):
+        sbf = [None, {'Car': {'1': {'id': 'C1-2', 'name': 'Gate'}, '0': 'C1-1'}},
+               {'PWD': [{'id': 'P2-1', 'name': 'P2-1'}, None]}]
+        model = layout.Layout.from_slots_by_floor(sbf, version=9)
+        self.assertEqual(model.ids, ('C1-1', 'C1-2', 'P2-1'))
+        self.assertEqual(model.names, {1: 'Gate'})
+        self.assertEqual([f.key for f in model.floors], ['1', '2'])
+        self.assertEqual(model.floors[0].by_type, {'Car': array('I', [0, 1]), 'Motorcycle': array('I'), 'PWD': array('I')})
+        self.assertEqual(list(model.floors[0].slots('Car')), [('C1-1', 'C1-1'), ('Gate', 'C1-2')])
+        self.assertEqual((model.path('C1-2'), model.path('P2-1'), model.path('X')),
+                         ('slotsByFloor/1/Car/1', 'slotsByFloor/2/PWD/0', None))
+        self.assertEqual((model.name('C1-2'), model.name('X')), ('Gate', None))
+
+    def test_unversioned_layouts_are_versioned_by_content(self):
+        sbf = {'1': {'Car': slots('C1-1')}}
+        a = layout.Layout.from_slots_by_floor(sbf)
+        self.assertTrue(a.version.startswith('h'))
+        self.assertEqual(a.version, layout.Layout.from_slots_by_floor({'1': {'Car': slots('C1-1')}}).version)
+        self.assertNotEqual(a.version, layout.Layout.from_slots_by_floor({'1': {'Car': slots('C1-2')}}).version)
+
+    def test_generated_matches_the_written_layout(self):
+        model = layout.Layout.generated(2, {'Car': 2, 'PWD': 1})
+        self.assertEqual(model.version, 'g2-2-0-1')
+        self.assertEqual(len(model), 6)
+        self.assertEqual(model.path('P2-1'), 'slotsByFloor/2/PWD/0')
+        sbf = model.to_slots_by_floor()
+        self.assertEqual(sbf['1']['Car'], slots('C1-1', 'C1-2'))
+        self.assertEqual(layout.Layout.from_slots_by_floor(sbf).ids, model.ids)
+
+    def test_current_rebuilds_only_on_a_new_version(self):
+        layout.invalidate()
+        self.addCleanup(layout.invalidate)
+        db = fakedb.install(self, tree())
+        first = layout.current()
+        self.assertIs(layout.current(), first)
+        self.assertEqual([c[1] for c in db.calls if c[0] == 'get'].count('/configurations/layout/slotsByFloor'), 1)
+        db.tree['configurations']['layout']['version'] = 6
+        self.assertIsNot(layout.current(), first)
+
+
+class MonitorTests(TestCase):
+    def test_floor_fragments_are_cached_per_version(self):
+        fakedb.install(self, tree())
+        layout.invalidate()
+        self.addCleanup(layout.invalidate)
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.client.force_login(get_user_model().objects.create_user('admin', password='x', is_admin=True))
+        response = self.client.get('/monitor/')
+        self.assertContains(response, 'data-slot-id="M1-1"')
+        self.assertIsNotNone(cache.get(make_template_fragment_key('monitor_floor', [5, 1])))
+        self.assertIsNone(cache.get(make_template_fragment_key('monitor_floor', [6, 1])))
+
+
+class RenameSlotsTests(SimpleTestCase):
+    def setUp(self):
+        layout.invalidate()
+        self.addCleanup(layout.invalidate)
+
+    def items(self, db, t='Car'):
+        return [item for _, item in layout.indexed(db.tree['configurations']['layout']['slotsByFloor']['1'][t])]
+
+    def test_renames_only_the_given_items_and_bumps_the_version(self):
+        db = fakedb.install(self, tree())
+        renamed, unknown = layout.rename_slots({'C1-2': 'B', 'M1-1': 'M1-1', 'X9': 'Z'})
+        self.assertEqual(renamed, ['C1-2'])
+        self.assertEqual(unknown, ['X9'])
+        self.assertEqual(self.items(db), [{'id': 'C1-1', 'name': 'C1-1'}, {'id': 'C1-2', 'name': 'B'}])
+        self.assertGreater(db.tree['configurations']['layout']['version'], 5)
+        self.assertEqual(layout.current(fresh=True).name('C1-2'), 'B')
+
+    def test_legacy_string_items_are_renamed(self):
+        db = fakedb.install(self, {'configurations': {'layout': {
+            'floors': 1, 'slotsByFloor': {'1': {'Car': ['C1-1', 'C1-2']}},
+        }}})
+        renamed, unknown = layout.rename_slots({'C1-2': 'B'})
+        self.assertEqual((renamed, unknown), (['C1-2'], []))
+        self.assertEqual(self.items(db), ['C1-1', {'id': 'C1-2', 'name': 'B'}])
+        self.assertEqual(layout.current(fresh=True).name('C1-2'), 'B')
+
+    def test_cached_layout_is_patched_in_place(self):
+        db = fakedb.install(self, tree())
+        before = layout.current(fresh=True)
+        layout.rename_slots({'C1-1': 'A'})
+        db.calls.clear()
+        after = layout.current(fresh=True)
+        self.assertIs(after, before)
+        self.assertEqual(after.version, db.tree['configurations']['layout']['version'])
+        self.assertEqual(after.name('C1-1'), 'A')
+        self.assertFalse([c for c in db.calls if c[1].endswith('/slotsByFloor')])
+
+        layout.rename_slots({'C1-1': 'C1-1'})
+        self.assertEqual(layout.current(fresh=True).name('C1-1'), 'C1-1')
+        self.assertEqual(layout.current(fresh=True).names, {})
+
+    def test_foreign_stamp_drops_the_cached_layout(self):
+        db = fakedb.install(self, tree())
+        before = layout.current(fresh=True)
+        real = layout._rename_item
+
+        def rename_item(path, sid, name):
+            db.tree['configurations']['layout']['version'] = 9   # another writer stamped meanwhile
+            return real(path, sid, name)
+
+        with mock.patch.object(layout, '_rename_item', rename_item):
+            layout.rename_slots({'C1-1': 'A'})
+        after = layout.current(fresh=True)
+        self.assertIsNot(after, before)
+        self.assertEqual(after.name('C1-1'), 'A')
+
+    def test_refused_while_provisioning(self):
+        from dashboard import provisioning
+
+        fakedb.install(self, tree(provisioning={'id': 1, 'total': 3}))
+        with mock.patch.object(provisioning, 'active', return_value=mock.Mock(pk=1)), \
+                self.assertRaises(layout.LayoutConflict):
+            layout.rename_slots({'C1-1': 'A'})
+
+    def test_stale_provisioning_marker_is_cleared(self):
+        from dashboard import provisioning
+
+        db = fakedb.install(self, tree(provisioning={'id': 1, 'total': 3}))
+        with mock.patch.object(provisioning, 'active', return_value=None):
+            renamed, _ = layout.rename_slots({'C1-1': 'A'})
+        self.assertEqual(renamed, ['C1-1'])
+        self.assertNotIn('provisioning', db.tree['configurations']['layout'])
+
+    def test_layout_replaced_mid_rename_is_not_renamed_by_position(self):
+        db = fakedb.install(self, tree())
+        real = layout._rename_item
+        calls = []
+
+        def rename_item(path, sid, name):
+            if not calls:
+                # Another writer swaps the Car list between the index read and the write
+                db.tree['configurations']['layout']['slotsByFloor']['1']['Car'] = slots('C1-2', 'C1-1')
+                db.tree['configurations']['layout']['version'] = 6
+            calls.append(path)
+            return real(path, sid, name)
+
+        with mock.patch.object(layout, '_rename_item', rename_item):
+            renamed, _ = layout.rename_slots({'C1-1': 'A'})
+
+        self.assertEqual(calls, ['slotsByFloor/1/Car/0', 'slotsByFloor/1/Car/1'])
+        self.assertEqual(renamed, ['C1-1'])
+        self.assertEqual(self.items(db), [{'id': 'C1-2', 'name': 'C1-2'}, {'id': 'C1-1', 'name': 'A'}])
+
+
+class ProvisioningTests(SimpleTestCase):
+    def test_header_replaces_the_layout_without_reading_it(self):
+        from dashboard import provisioning
+        from dashboard.models import LayoutProvision
+
+        db = fakedb.install(self, tree(occupied={'C1-1': {'status': 'OCCUPIED'}}))
+        run = LayoutProvision(pk=7, floors=2, car_slots=2, motor_slots=1, pwd_slots=0, total=6)
+        job = mock.Mock()
+        with mock.patch.object(LayoutProvision.objects, 'get', return_value=run), \
+                mock.patch.object(LayoutProvision.objects, 'filter'), \
+                mock.patch.object(provisioning, 'CHUNK_SIZE', 4):
+            result = provisioning.upload(job, 7)
+
+        self.assertEqual(result['written'], 6)
+        self.assertNotIn(('get', '/configurations/layout', None, (), False), db.calls)
+        value = db.tree['configurations']['layout']
+        self.assertEqual(set(value), {'floors', 'slotsByFloor', 'version'})
+        self.assertEqual(len(layout.current(fresh=True).ids), 6)
+
+    def test_failed_upload_clears_its_marker(self):
+        from dashboard import provisioning
+        from dashboard.models import LayoutProvision
+
+        db = fakedb.install(self, tree())
+        run = LayoutProvision(pk=7, floors=1, car_slots=2, motor_slots=0, pwd_slots=0, total=2)
+        job = mock.Mock()
+        with mock.patch.object(LayoutProvision.objects, 'get', return_value=run), \
+                mock.patch.object(LayoutProvision.objects, 'filter') as rows, \
+                mock.patch.object(provisioning.WriteBatch, 'commit', side_effect=RuntimeError('offline')):
+            with self.assertRaises(RuntimeError):
+                provisioning.upload(job, 7)
+
+        self.assertEqual(rows.return_value.update.call_args.kwargs['status'], 'failed')
+        self.assertEqual(db.tree['configurations']['layout'], {'floors': 1})
@@ -0,0 +1,110 @@
+import json
+from types import SimpleNamespace
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+
+from dashboard import counters, moderation
+
+from . import fakedb
+
+
+def users(*uids):
+    return {uid: {'displayName': uid, 'email': f'{uid}@x.com'} for uid in uids}
+
+
+class CleanTests(SimpleTestCase):
+    def test_one_pass_validation(self):
+        valid, errors = moderation._clean([' u1 ', 'u2', 'u1', '', None, 'a/b', 'x.y'])
+        self.assertEqual(valid, ['u1', 'u2'])
+        self.assertEqual(errors, {'a/b': 'invalid key', 'x.y': 'invalid key'})
+        with self.assertRaises(ValueError):
+            moderation._clean('u1')
+        with mock.patch.object(moderation, 'MAX_ITEMS', 2), self.assertRaises(ValueError):
+            moderation._clean(['a', 'b', 'c'])
+
+
+class BulkTests(SimpleTestCase):
+    def setUp(self):
+        self.db = fakedb.install(self, {
+            'users': users('u1', 'u2', 'u3'),
+            'pwdRequests': {uid: {'status': 'pending'} for uid in ('u1', 'u2', 'u3')},
+            'configurations': {'layout': {'occupied': {
+                'k1': {'status': 'OCCUPIED', 'uid': 'u1', 'txId': 't1'},
+                'k2': {'status': 'FREE'},
+            }}},
+        })
+        patcher = mock.patch.object(moderation, 'CHUNK_SIZE', 2)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def updates(self):
+        return [c for c in self.db.calls if c[0] == 'update']
+
+    def test_pwd_approvals_commit_in_chunks_and_report_in_order(self):
+        got = moderation.decide_pwd(['u3', 'nobody', 'u1', 'u2', 'u1'])
+        self.assertEqual([(r['id'], r['ok']) for r in got['results']],
+                         [('u3', True), ('nobody', False), ('u1', True), ('u2', True)])
+        self.assertEqual((got['processed'], got['succeeded'], got['failed']), (4, 3, 1))
+        self.assertEqual(len(self.updates()), 2 + 1)     # two chunks, then the counter index
+        self.assertEqual({self.db.tree['users'][u]['pwdStatus'] for u in ('u1', 'u2', 'u3')}, {'approved'})
+        self.assertEqual(counters.pwd_uids(), {'u1', 'u2', 'u3'})
+
+    def test_failed_chunk_only_fails_its_items(self):
+        real = moderation.WriteBatch.commit
+        calls = []
+
+        def commit(batch):
+            calls.append(len(batch))
+            if len(calls) == 1:
+                raise RuntimeError('offline')
+            return real(batch)
+
+        with mock.patch.object(moderation.WriteBatch, 'commit', commit):
+            got = moderation.decide_pwd(['u1', 'u2', 'u3'])
+        self.assertEqual([r['ok'] for r in got['results']], [False, False, True])
+        self.assertEqual(got['results'][0]['error'], 'write failed: offline')
+        self.assertNotIn('pwdStatus', self.db.tree['users']['u1'])
+
+    def test_bans_delete_auth_users_in_groups(self):
+        groups = []
+
+        def delete_users(group):
+            groups.append(list(group))
+            failed = [SimpleNamespace(index=0, reason='quota')] if 'u3' in group else []
+            return SimpleNamespace(errors=failed)
+
+        with mock.patch.object(moderation, 'AUTH_GROUP_SIZE', 2), \
+                mock.patch.object(moderation, 'init_firebase'), \
+                mock.patch('firebase_admin.auth.delete_users', side_effect=delete_users):
+            got = moderation.ban_users(['u1', 'u2', 'u3'], reason='abuse', banned_by='admin')
+        self.assertEqual(sorted(groups), [['u1', 'u2'], ['u3']])
+        self.assertEqual([r['ok'] for r in got['results']], [True, True, False])
+        self.assertEqual(got['results'][2]['error'], 'Firebase Auth delete failed: quota')
+        self.assertEqual(self.db.tree['users'], {})
+        self.assertEqual(set(self.db.tree['banned']['users']), {'u1', 'u2', 'u3'})
+
+    def test_slot_release(self):
+        with mock.patch.object(moderation.slots, 'index') as index:
+            got = moderation.release_slots(['k1', 'k2', 'k9'])
+        self.assertEqual([r.get('error') for r in got['results']], [None, 'already free', 'unknown slot'])
+        self.assertEqual(got['results'][0]['released'], {'uid': 'u1', 'txId': 't1'})
+        self.assertEqual(self.db.tree['configurations']['layout']['occupied']['k1'], {'status': 'FREE'})
+        index.return_value.mark.assert_called_once_with('k1', free=True)
+
+
+class BulkViewTests(TestCase):
+    def setUp(self):
+        fakedb.install(self, {'users': users('u1'), 'pwdRequests': {'u1': {'status': 'pending'}}})
+        self.client.force_login(get_user_model().objects.create_user('admin', password='x', is_admin=True))
+
+    def post(self, path, body):
+        return self.client.post(path, json.dumps(body), content_type='application/json')
+
+    def test_payload_validation(self):
+        self.assertEqual(self.post('/api/bulk/pwd/', {'uids': []}).status_code, 400)
+        self.assertEqual(self.post('/api/bulk/pwd/', {'uids': ['u1'], 'action': 'maybe'}).status_code, 400)
+        self.assertEqual(self.post('/api/bulk/release-slots/', {'slots': 'k1'}).status_code, 400)
+        got = self.post('/api/bulk/pwd/', {'uids': ['u1'], 'action': 'decline'}).json()
+        self.assertEqual((got['ok'], got['succeeded']), (True, 1))
@@ -0,0 +1,71 @@
+import threading
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from core import outbound
+
+
+class DeadlineTests(SimpleTestCase):
+    def test_timeout_is_capped_and_expires(self):
+        deadline = outbound.Deadline(10)
+        self.assertEqual(deadline.timeout(2), 2)
+        self.assertGreater(deadline.timeout(), 9)
+        with self.assertRaises(outbound.DeadlineExceeded):
+            outbound.Deadline(0).timeout()
+
+
+class ClientTests(SimpleTestCase):
+    def test_one_session_per_host_with_latency_stats(self):
+        http = outbound.Client(pool_size=2)
+        responses = [mock.Mock(status_code=200), mock.Mock(status_code=502), mock.Mock(status_code=200)]
+        with mock.patch('requests.Session.request', side_effect=responses + [OSError('reset')]) as request:
+            http.get('http://cam.local/capture?ts=1', timeout=3)
+            http.get('http://cam.local/capture')
+            http.post('https://api.ocr.space/parse/image', deadline=outbound.Deadline(5), timeout=1)
+            with self.assertRaises(OSError):
+                http.get('http://cam.local/capture')
+        self.assertIs(http.session('http://cam.local/a'), http.session('http://cam.local/b'))
+        self.assertIsNot(http.session('http://cam.local/a'), http.session('https://api.ocr.space/x'))
+        self.assertEqual(request.call_args_list[2].kwargs['timeout'], 1)
+        stats = http.stats()
+        self.assertEqual((stats['http://cam.local']['requests'], stats['http://cam.local']['errors']), (3, 2))
+        self.assertEqual(stats['https://api.ocr.space']['samples'], 1)
+
+    def test_budget_uses_the_hosts_percentile(self):
+        http = outbound.Client()
+        self.assertEqual(http.budget('http://h/x', default=1.5), 1.5)
+        for seconds in (0.01, 0.2, 0.3, 0.4):
+            http.host_stats('http://h/x').record(seconds, ok=True)
+        self.assertEqual(http.budget('http://h/y', pct=50), 0.3)
+        self.assertEqual(http.budget('http://h/y', pct=0), 0.05)
+
+
+class HedgedTests(SimpleTestCase):
+    def test_hedge_fires_after_the_delay_and_the_first_answer_wins(self):
+        release = threading.Event()
+        self.addCleanup(release.set)
+        slow = lambda: release.wait(5) and 'slow'
+        started = time.monotonic()
+        self.assertEqual(outbound.hedged([slow, lambda: 'fast'], delay=0.05), 'fast')
+        self.assertLess(time.monotonic() - started, 2)
+
+    def test_rejected_answer_starts_the_next_call_at_once(self):
+        calls = []
+
+        def answer(value):
+            calls.append(value)
+            return value
+
+        got = outbound.hedged([lambda: answer(''), lambda: answer('ABC 2345')], delay=30)
+        self.assertEqual((got, calls), ('ABC 2345', ['', 'ABC 2345']))
+
+    def test_errors_and_deadline_give_none(self):
+        def boom():
+            raise OSError('offline')
+
+        self.assertIsNone(outbound.hedged([boom, boom], delay=30))
+        release = threading.Event()
+        self.addCleanup(release.set)
+        self.assertIsNone(outbound.hedged([lambda: release.wait(5)], delay=30, deadline=outbound.Deadline(0.05)))
@@ -0,0 +1,68 @@
+import io
+import os
+from unittest import mock
+
+from django.test import SimpleTestCase
+from PIL import Image, ImageDraw, ImageFont
+
+from dashboard import plate_ocr
+
+
+def plate_jpeg(text):
+    """A light plate with dark glyphs on a grey car-coloured background."""
+    img = Image.new('L', (640, 360), 90)
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((150, 130, 490, 230), fill=245)
+    draw.text((175, 150), text, fill=10, font=ImageFont.load_default(size=56))
+    buffer = io.BytesIO()
+    img.convert('RGB').save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+class Fixed(plate_ocr.OcrBackend):
+    def __init__(self, text, formatted=False):
+        self.text, self.formatted = text, formatted
+        self.calls = 0
+
+    def read(self, image, url=None, deadline=None):
+        self.calls += 1
+        if isinstance(self.text, Exception):
+            raise self.text
+        return self.text
+
+
+class ExtractPlateTests(SimpleTestCase):
+    def test_ph_formats(self):
+        self.assertEqual(plate_ocr.extract_plate('REPUBLIC\nABC-2345\nLTO'), 'ABC 2345')
+        self.assertEqual(plate_ocr.extract_plate('nbc 789'), 'NBC 789')
+        self.assertEqual(plate_ocr.extract_plate(''), '')
+
+
+class LocalBackendTests(SimpleTestCase):
+    backend = plate_ocr.LocalBackend()
+
+    def test_reads_rendered_plates(self):
+        for text in ('ABC 1234', 'NBC 123', 'XY 12345'):
+            self.assertEqual(self.backend.read(plate_jpeg(text)), text)
+
+    def test_blank_image_reads_nothing(self):
+        buffer = io.BytesIO()
+        Image.new('RGB', (320, 200), (120, 120, 120)).save(buffer, 'JPEG')
+        self.assertEqual(self.backend.read(buffer.getvalue()), '')
+        self.assertEqual(self.backend.read(b''), '')
+
+
+class ReadPlateTests(SimpleTestCase):
+    def test_first_engine_with_a_plate_wins(self):
+        first, second, third = Fixed(''), Fixed('plate: abc 2345'), Fixed('ZZZ 9999', formatted=True)
+        self.assertEqual(plate_ocr.read_plate(b'img', backends=[first, second, third]), 'ABC 2345')
+        self.assertEqual((first.calls, second.calls, third.calls), (1, 1, 0))
+
+    def test_failing_engine_falls_through(self):
+        self.assertEqual(plate_ocr.read_plate(b'img', backends=[Fixed(OSError('offline')), Fixed('XY 12', True)]), 'XY 12')
+        self.assertEqual(plate_ocr.read_plate(b'img', backends=[]), '')
+
+    def test_backend_selection(self):
+        with mock.patch.object(plate_ocr, '_configured', None), \
+                mock.patch.dict(os.environ, {'OCR_BACKEND': 'local, ocrspace,unknown'}):
+            self.assertEqual([b.name for b in plate_ocr.get_backends()], ['local', 'ocrspace'])
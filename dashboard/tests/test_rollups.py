@@ -0,0 +1,73 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from dashboard import rollups
+
+from . import fakedb
+
+T0 = 1_790_000_000_000          # 2026-09-21 14:13 UTC, 22:13 in Manila
+HOUR = 3600000
+
+TXS = {
+    'a': {'timeIn': T0, 'timeOut': T0 + HOUR, 'amountPaid': 40, 'vehicleType': 'Car'},
+    'b': {'timeIn': '2026-09-22T01:00:00.000Z', 'timeOut': '2026-09-22T03:30:00.000Z',
+          'amountPaid': '20', 'vehicleType': 'MOTORCYCLE'},
+    'c': {'timeIn': T0 + 2 * HOUR},
+}
+
+
+class RollupTests(SimpleTestCase):
+    def record_all(self):
+        for tx_id, tx in TXS.items():
+            rollups.record_entry(tx_id, tx['timeIn'])
+            rollups.record_completion(tx_id, tx)
+
+    def test_incremental_matches_rebuild(self):
+        db = fakedb.install(self, {})
+        self.record_all()
+        self.record_all()          # counted once
+        self.assertEqual(db.tree['rollups'], rollups.build_from_transactions(TXS))
+
+        # Buckets are Manila days; the entry histogram is by UTC hour
+        day = db.tree['rollups']['daily']['2026-09-22']
+        self.assertEqual((day['total'], day['car'], day['motorcycle'], day['entries']), (20, 0, 20, 2))
+        self.assertEqual(day['hours'], {'h01': 1, 'h16': 1})
+        self.assertEqual(day['staySum'], 150)
+        self.assertEqual(db.tree['rollups']['daily']['2026-09-21']['car'], 40)
+        self.assertEqual(rollups.read_range('daily', '2026-09-22', '2026-09-22').keys(), {'2026-09-22'})
+
+    def test_increments_and_marker_go_out_together(self):
+        db = fakedb.install(self, {})
+        rollups.record_completion('a', TXS['a'])
+        updates = [c for c in db.calls if c[0] == 'update']
+        self.assertEqual(len(updates), 1)
+        self.assertIn('rollups/applied/completions/a', updates[0][2])
+        self.assertIn('rollups/monthly/2026-09/total', updates[0][2])
+
+    def test_failed_update_releases_the_claim(self):
+        db = fakedb.install(self, {})
+        with mock.patch.object(rollups.WriteBatch, 'commit', side_effect=RuntimeError('offline')):
+            with self.assertRaises(RuntimeError):
+                rollups.record_entry('a', T0)
+        self.assertFalse(db.tree['rollups']['applied']['entries'])
+        self.assertTrue(rollups.record_entry('a', T0))
+        self.assertEqual(db.tree['rollups']['daily']['2026-09-21']['entries'], 1)
+
+    def test_stale_pending_claim_is_taken_over(self):
+        now_ms = T0 + HOUR
+        db = fakedb.install(self, {'rollups': {'applied': {'entries': {
+            'old': {'pending': now_ms - rollups.PENDING_TTL_MS - 1},
+            'live': {'pending': now_ms - 1000},
+        }}}})
+        with mock.patch.object(rollups.time, 'time', return_value=now_ms / 1000):
+            self.assertTrue(rollups.record_entry('old', T0))
+            self.assertFalse(rollups.record_entry('live', T0))
+        self.assertEqual(db.tree['rollups']['applied']['entries'], {'old': True, 'live': {'pending': now_ms - 1000}})
+        self.assertEqual(db.tree['rollups']['daily']['2026-09-21']['entries'], 1)
+
+    def test_incomplete_transactions_are_skipped(self):
+        fakedb.install(self, {})
+        self.assertFalse(rollups.record_completion('c', TXS['c']))
+        self.assertFalse(rollups.record_entry('x', 'not a time'))
+        self.assertFalse(rollups.record_entry('', T0))
@@ -0,0 +1,122 @@
+import threading
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from dashboard import search
+
+from . import fakedb
+
+
+def users_index(data=None):
+    path, fields, extra, key_name = search.SOURCES['users']
+    idx = search.SearchIndex('users', path, fields, extra, key_name)
+    idx.apply([([], data or {})])
+    return idx
+
+
+def uids(rows):
+    return [row['uid'] for row in rows]
+
+
+class FoldTests(SimpleTestCase):
+    def test_plate_variants_fold_together(self):
+        self.assertEqual({search.fold(p) for p in ('ABC 1O23', 'abc-1023', 'ABCI023')}, {'abcio23'})
+        self.assertEqual(search.fold(None), '')
+
+    def test_grams(self):
+        self.assertEqual(search.grams(['Ana Cruz']), {'^a', '^an', '^c', '^cr', 'ana', 'nac', 'acr', 'cru', 'ruz'})
+        self.assertEqual(search.grams(['', '--']), set())
+
+
+class SearchIndexTests(SimpleTestCase):
+    data = {
+        'u1': {'displayName': 'Ana Cruz', 'email': 'ana@x.com', 'isPWD': True},
+        'u2': {'displayName': 'Juan dela Cruz', 'email': 'juan@x.com', 'contactNumber': '0917 100 2000'},
+        'u3': {'displayName': 'Cruzita Reyes', 'email': 'cr@x.com'},
+    }
+
+    def test_prefix_and_trigram_queries(self):
+        idx = users_index(self.data)
+        self.assertEqual(set(uids(idx.search('c'))), {'u1', 'u2', 'u3'})
+        self.assertEqual(uids(idx.search('ju')), ['u2'])
+        # Field-prefix matches rank ahead of matches further in
+        self.assertEqual(uids(idx.search('cruz'))[0], 'u3')
+        self.assertEqual(set(uids(idx.search('cruz'))), {'u1', 'u2', 'u3'})
+        self.assertEqual(uids(idx.search('O917-IOO')), ['u2'])
+        self.assertEqual(idx.search('zzz'), [])
+        self.assertEqual(idx.search('  '), [])
+        self.assertEqual(idx.search('c')[0].keys(), {'uid', 'displayName', 'email', 'contactNumber',
+                                                    'isPWD', 'pwdStatus', 'activeTransaction'})
+
+    def test_limit(self):
+        idx = users_index({f'u{i:03d}': {'displayName': f'Cruz {i}'} for i in range(150)})
+        self.assertEqual(len(idx.search('cruz', limit=5)), 5)
+        self.assertEqual(len(idx.search('cruz', limit=1000)), search.MAX_LIMIT)
+
+    def test_updates_reindex_only_what_changed(self):
+        idx = users_index(self.data)
+        idx.apply([(['u1', 'displayName'], 'Bea Santos')])
+        self.assertNotIn('u1', uids(idx.search('ana c')))
+        self.assertEqual(uids(idx.search('santos')), ['u1'])
+        self.assertEqual(idx.get('u1')['email'], 'ana@x.com')
+
+        before = idx.stats()
+        idx.apply([(['u2', 'lastLogin'], 123), (['u3'], dict(self.data['u3']))])
+        self.assertEqual(idx.stats(), before)
+
+        idx.apply([(['u2'], None)])
+        self.assertEqual(set(uids(idx.search('cruz'))), {'u3'})
+        self.assertIsNone(idx.get('u2'))
+
+    def test_snapshot_drops_missing_records(self):
+        idx = users_index(self.data)
+        idx.apply([([], {'u3': self.data['u3']})])
+        self.assertEqual(uids(idx.search('cruz')), ['u3'])
+        self.assertEqual(idx.stats()['records'], 1)
+
+    def test_compaction(self):
+        idx = users_index(self.data)
+        with mock.patch.object(search, 'COMPACT_MIN', 2):
+            idx.apply([(['u1', 'email'], 'a1@x.com')])
+            self.assertEqual(idx.stats()['dead'], 1)
+            idx.apply([(['u2', 'email'], 'j2@x.com'), (['u3', 'email'], 'c3@x.com')])
+            self.assertEqual(idx.stats()['dead'], 3)          # not more than the 3 live ones yet
+            idx.apply([(['u3'], None)])
+        stats = idx.stats()
+        self.assertEqual((stats['dead'], stats['documents'], stats['records']), (0, 2, 2))
+        self.assertEqual(set(uids(idx.search('cruz'))), {'u1', 'u2'})
+        self.assertEqual(uids(idx.search('j2@x')), ['u2'])
+
+
+class StartTests(SimpleTestCase):
+    def test_primes_from_the_listeners_snapshot(self):
+        db = fakedb.install(self, {'users': SearchIndexTests.data})
+        idx = users_index()
+        idx.start()
+        idx.start()
+        self.assertEqual(db.calls, [('listen', '/users')])
+        self.assertEqual(set(uids(idx.search('cruz'))), {'u1', 'u2', 'u3'})
+
+    def test_concurrent_callers_wait_for_the_first_snapshot(self):
+        listeners = []
+
+        class Ref:
+            def listen(self, cb):
+                listeners.append(cb)
+                return mock.Mock()
+
+        idx = users_index()
+        waiter_done = threading.Event()
+        with mock.patch.object(search, 'rtdb', return_value=mock.Mock(reference=lambda path: Ref())):
+            with self.assertRaises(TimeoutError):
+                idx.start(timeout=0)           # listener attached, snapshot not in yet
+            waiter = threading.Thread(target=lambda: (idx.start(timeout=5), waiter_done.set()))
+            waiter.start()
+            self.assertFalse(waiter_done.wait(0.05))
+            listeners[0](SimpleNamespace(event_type='put', path='/', data=SearchIndexTests.data))
+            waiter.join(5)
+        self.assertTrue(waiter_done.is_set())
+        self.assertEqual(len(listeners), 1)
+        self.assertEqual(idx.stats()['records'], 3)
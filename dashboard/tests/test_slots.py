@@ -0,0 +1,144 @@
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from dashboard import slots
+
+from . import fakedb
+
+NOW = 1_790_000_000_000
+
+
+def pool(*names):
+    return [{'id': n, 'name': n} for n in names]
+
+
+def layout(occupied=None):
+    return {
+        'floors': 2,
+        'slotsByFloor': {
+            '1': {'Car': pool('C1-1', 'C1-2'), 'Motorcycle': pool('M1-1')},
+            '2': {'Car': pool('C2-1', 'C2.2')},
+        },
+        'occupied': occupied or {},
+    }
+
+
+class SlotIndexTests(SimpleTestCase):
+    def test_lowest_free_slot_in_floor_order(self):
+        idx = slots.SlotIndex()
+        idx.build(layout({'C1-1': {'status': 'OCCUPIED'}, 'C1-2': {'status': 'FREE'}}))
+        self.assertEqual(idx.peek('Car')['slot'], 'C1-2')
+        self.assertEqual(idx.peek('Car', floor=2), {'slot': 'C2-1', 'key': 'C2-1', 'floor': 2, 'type': 'Car'})
+        self.assertIsNone(idx.peek('PWD'))
+        self.assertEqual(idx.summary()['Car'], {'1': {'free': 1, 'total': 2}, '2': {'free': 2, 'total': 2}})
+
+    def test_reserve_and_mark(self):
+        idx = slots.SlotIndex()
+        idx.build(layout())
+        self.assertEqual(idx.reserve('Motorcycle'), ('M1-1', 'M1-1', 1, 'Motorcycle'))
+        with self.assertRaises(slots.SlotError):
+            idx.reserve('Motorcycle')
+        self.assertEqual(idx.reserve('Car', name='C2.2')[0], 'C2_2')
+        with self.assertRaises(slots.SlotError) as cm:
+            idx.reserve('Car', name='X9')
+        self.assertEqual(cm.exception.status, 404)
+
+        # In-flight reservations survive a rebuild until settled
+        idx.build(layout())
+        self.assertIsNone(idx.peek('Motorcycle'))
+        idx.settle('M1-1')
+        idx.build(layout())
+        self.assertEqual(idx.peek('Motorcycle')['slot'], 'M1-1')
+        self.assertTrue(idx.mark('M1-1', free=False))
+        self.assertIsNone(idx.peek('Motorcycle'))
+        self.assertFalse(idx.mark('nope', free=True))
+
+    def test_stale_reservation_counts_as_free(self):
+        idx = slots.SlotIndex()
+        with mock.patch.object(slots, '_now_ms', return_value=NOW):
+            idx.build(layout({
+                'C1-1': {'status': 'RESERVED', 'reservedAt': NOW - slots.RESERVE_TTL_MS - 1},
+                'C1-2': {'status': 'RESERVED', 'reservedAt': NOW - 1000},
+            }))
+        self.assertEqual(idx.peek('Car')['slot'], 'C1-1')
+        self.assertEqual(idx.summary()['Car']['1']['free'], 1)
+
+    def test_type_names(self):
+        self.assertEqual(slots.normalize_type('motorcycle'), 'Motorcycle')
+        self.assertEqual(slots.normalize_type(None), 'Car')
+        with self.assertRaises(slots.SlotError):
+            slots.normalize_type('truck')
+        self.assertEqual(slots.slot_key('A.1/[2]#$'), 'A_1_(2)__')
+
+
+class AssignTests(SimpleTestCase):
+    def setUp(self):
+        patcher = mock.patch.object(slots, '_index', slots.SlotIndex())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def install(self, occupied=None, **txs):
+        txs = txs or {'t1': {'status': 'ONGOING', 'uid': 'u1', 'vehicleType': 'CAR'}}
+        return fakedb.install(self, {'configurations': {'layout': layout(occupied)}, 'transactions': txs})
+
+    def test_assigns_the_first_free_slot(self):
+        db = self.install({'C1-1': {'status': 'OCCUPIED', 'txId': 'other'}})
+        record = slots.assign('t1')
+        self.assertEqual((record['slotName'], record['floor'], record['status']), ('C1-2', 1, 'OCCUPIED'))
+        occupied = db.tree['configurations']['layout']['occupied']['C1-2']
+        self.assertEqual(occupied['txId'], 't1')
+        self.assertNotIn('reservedAt', occupied)
+        self.assertEqual(db.tree['transactions']['t1']['slot'], 'C1-2')
+        self.assertEqual(db.tree['transactions']['t1']['floor'], 1)
+        self.assertEqual(slots.index()._inflight, set())
+
+    def test_only_open_transactions_without_a_slot(self):
+        self.install(t1={'status': 'PAID'}, t2={'status': 'ONGOING', 'slot': 'C1-1'})
+        for tx_id, status in (('t1', 409), ('t2', 409), ('nope', 404), ('', 400)):
+            with self.assertRaises(slots.SlotError) as cm:
+                slots.assign(tx_id)
+            self.assertEqual(cm.exception.status, status, tx_id)
+
+    def test_lost_claim_moves_on_to_the_next_slot(self):
+        db = self.install()
+        slots.index().refresh(force=True)
+        # Another worker takes C1-1 after this one's last refresh
+        db.tree['configurations']['layout']['occupied']['C1-1'] = {'status': 'OCCUPIED', 'txId': 'other'}
+        self.assertEqual(slots.assign('t1')['slotName'], 'C1-2')
+        self.assertEqual(db.tree['configurations']['layout']['occupied']['C1-1']['txId'], 'other')
+
+    def test_second_assign_for_the_same_transaction_is_refused(self):
+        db = self.install()
+        real = slots._claim_tx
+
+        def claim_tx(tx_id, name):
+            db.tree['transactions'][tx_id]['slot'] = 'C2-1'      # a concurrent assign won
+            return real(tx_id, name)
+
+        with mock.patch.object(slots, '_claim_tx', claim_tx), self.assertRaises(slots.SlotError):
+            slots.assign('t1')
+        self.assertEqual(db.tree['configurations']['layout']['occupied']['C1-1'], {'status': 'FREE'})
+        self.assertEqual(db.tree['transactions']['t1']['slot'], 'C2-1')
+        self.assertEqual(slots.index().peek('Car')['slot'], 'C1-1')
+
+    def test_refresh_settles_stale_reservations(self):
+        stale = NOW - slots.RESERVE_TTL_MS - 1
+        db = self.install(
+            {'C1-1': {'status': 'RESERVED', 'reservedAt': stale, 'txId': 't1', 'slotName': 'C1-1'},
+             'C1-2': {'status': 'RESERVED', 'reservedAt': stale, 'txId': 't2', 'slotName': 'C1-2'}},
+            t1={'status': 'ONGOING', 'slot': 'C1-1'}, t2={'status': 'ONGOING'},
+        )
+        with mock.patch.object(slots, '_now_ms', return_value=NOW), \
+                mock.patch.object(slots.time, 'time', return_value=NOW / 1000):
+            slots.index().refresh(force=True)
+        occupied = db.tree['configurations']['layout']['occupied']
+        self.assertEqual(occupied['C1-1'], {'status': 'OCCUPIED', 'txId': 't1', 'slotName': 'C1-1'})
+        self.assertEqual(occupied['C1-2'], {'status': 'FREE'})
+
+    def test_release(self):
+        db = self.install({'C1-1': {'status': 'OCCUPIED', 'txId': 'other'}})
+        slots.index().refresh(force=True)
+        self.assertEqual(slots.release('C1-1'), 'C1-1')
+        self.assertEqual(db.tree['configurations']['layout']['occupied']['C1-1'], {'status': 'FREE'})
+        self.assertEqual(slots.index().peek('Car')['slot'], 'C1-1')
@@ -0,0 +1,96 @@
+from unittest import mock
+
+from django.test import TestCase
+
+from dashboard import sync
+from dashboard.models import ParkingLog
+
+from . import fakedb
+
+T0 = 1_790_000_000_000
+
+
+def tx(time_in, status='PAID', **extra):
+    return {'timeIn': time_in, 'status': status, 'uid': 'u1', **extra}
+
+
+class IncrementalSyncTests(TestCase):
+    def test_numeric_and_iso_watermarks(self):
+        db = fakedb.install(self, {'transactions': {
+            'n1': tx(T0), 'n2': tx(T0 + 1000),
+            'i1': tx('2026-09-22T10:00:00.000Z'), 'i2': tx('2026-09-22T11:00:00.000Z'),
+        }})
+        self.assertEqual(sync.incremental(batch_size=1)['transactions'], 4)
+        self.assertEqual(ParkingLog.objects.count(), 4)
+
+        db.tree['transactions']['i3'] = tx('2026-09-22T12:00:00.000Z')
+        db.calls.clear()
+        sync.incremental(batch_size=1)
+        self.assertTrue(ParkingLog.objects.filter(tx_id='i3').exists())
+        # Every timeIn read is a bounded page
+        queries = [c[3] for c in db.calls if c[0] == 'get' and c[1] == '/transactions' and c[2] == 'timeIn']
+        self.assertTrue(queries)
+        for filters in queries:
+            self.assertTrue(any(op == 'first' for op, _ in filters), filters)
+
+    def test_closed_logs_are_refreshed(self):
+        db = fakedb.install(self, {'transactions': {
+            'a': tx(T0, 'ONGOING'), 'b': tx(T0 + 1, 'ONGOING'),
+        }})
+        sync.incremental()
+        self.assertEqual(ParkingLog.objects.filter(exit_time__isnull=True).count(), 2)
+
+        db.tree['transactions']['a'].update({'status': 'PAID', 'timeOut': T0 + 3600000})
+        sync.incremental()
+        self.assertIsNotNone(ParkingLog.objects.get(tx_id='a').exit_time)
+        self.assertIsNone(ParkingLog.objects.get(tx_id='b').exit_time)
+        self.assertIn(('get', '/transactions/a', None, (), False), db.calls)
+        self.assertNotIn(('get', '/transactions/b', None, (), False), db.calls)
+
+
+    def test_cancelled_and_deleted_logs_are_read_once(self):
+        db = fakedb.install(self, {'transactions': {
+            'a': tx(T0, 'ONGOING'), 'b': tx(T0 + 1, 'ONGOING'), 'c': tx(T0 + 2, 'ONGOING'),
+        }})
+        sync.incremental()
+        db.tree['transactions']['a']['status'] = 'CANCELLED'
+        del db.tree['transactions']['b']
+        sync.incremental()
+        self.assertEqual(ParkingLog.objects.get(tx_id='a').status, 'CANCELLED')
+        self.assertEqual(ParkingLog.objects.get(tx_id='b').status, sync.REMOVED)
+        self.assertIsNone(ParkingLog.objects.get(tx_id='a').exit_time)
+
+        db.calls.clear()
+        sync.incremental()
+        reads = [c[1] for c in db.calls if c[0] == 'get' and c[1].startswith('/transactions/')]
+        self.assertEqual(reads, [])
+
+
+class SyncRollupTests(TestCase):
+    def test_entries_and_completions_from_any_writer_are_counted(self):
+        db = fakedb.install(self, {'transactions': {
+            'a': tx(T0, 'ONGOING'),
+            'b': tx(T0 + 1000, 'PAID', timeOut=T0 + 3600000, amountPaid=40),
+        }, 'rollups': {'applied': {'entries': {'b': True}}}})
+        sync.incremental()
+        applied = db.tree['rollups']['applied']
+        self.assertEqual(set(applied['entries']), {'a', 'b'})
+        self.assertEqual(set(applied['completions']), {'b'})
+        day = db.tree['rollups']['daily']['2026-09-21']
+        self.assertEqual((day['entries'], day['total']), (1, 40))   # b's entry was already counted
+
+        # Closed by an attendant edit: counted on the next pass, once
+        db.tree['transactions']['a'].update({'status': 'PAID', 'timeOut': T0 + 7200000, 'amountPaid': 60})
+        sync.incremental()
+        sync.incremental()
+        month = db.tree['rollups']['monthly']['2026-09']
+        self.assertEqual((month['total'], month['transactions']), (100, 2))
+
+    def test_failed_rollup_write_is_retried(self):
+        db = fakedb.install(self, {'transactions': {'a': tx(T0, 'ONGOING')}})
+        with mock.patch.object(sync.rollups, 'record_entry', side_effect=RuntimeError('offline')):
+            with self.assertRaises(RuntimeError):
+                sync.incremental()
+        self.assertFalse(ParkingLog.objects.exists())
+        sync.incremental()
+        self.assertEqual(db.tree['rollups']['daily']['2026-09-21']['entries'], 1)
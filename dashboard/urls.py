@@ -10,15 +10,35 @@ urlpatterns = [
     path('surveillance/', views.surveillance, name='surveillance'),
     path('register-slot/', views.register_slots, name='register_slots'),
     path('save-layout/', views.save_layout_labels, name='save_layout_labels'),
+    path('api/layout/provision/<int:provision_id>/', views.layout_provision_status, name='layout_provision_status'),
     path('api/approve-pwd/', views.approve_pwd, name='approve_pwd'),
     path('api/decline-pwd/', views.decline_pwd, name='decline_pwd'),
     path('api/resolve-incident/', views.resolve_incident, name='resolve_incident'),
+    path('api/incidents/sweeper/', views.incident_sweeper_stats, name='incident_sweeper_stats'),
+    path('api/incidents/past/', views.past_incidents, name='past_incidents'),
     path('api/delete-user/', views.delete_firebase_user, name='delete_firebase_user'),
     path('api/ban-user/', views.ban_user, name='ban_user'),
+    path('api/user-registered/', views.user_registered, name='user_registered'),
+    path('api/bulk/pwd/', views.bulk_pwd, name='bulk_pwd'),
+    path('api/bulk/ban/', views.bulk_ban, name='bulk_ban'),
+    path('api/bulk/release-slots/', views.bulk_release_slots, name='bulk_release_slots'),
+    path('api/occupancy/', views.occupancy_since, name='occupancy_since'),
+    path('api/occupancy/stream/', views.occupancy_stream, name='occupancy_stream'),
+    path('api/slots/next/', views.slot_next, name='slot_next'),
+    path('api/slots/assign/', views.slot_assign, name='slot_assign'),
+    path('api/slots/release/', views.slot_release, name='slot_release'),
+    path('api/slots/candidates/', views.slot_candidates, name='slot_candidates'),
     path('pending/', views.pending, name='pending'),
     path('reports/', views.reports, name='reports'),
     path('database/', views.database, name='database'),
+    path('api/db/users/', views.db_users, name='db_users'),
+    path('api/db/transactions/', views.db_transactions, name='db_transactions'),
+    path('api/db/occupants/', views.db_occupants, name='db_occupants'),
+    path('api/search/', views.search_records, name='search_records'),
     path('api/entrance-snapshot/', views.entrance_snapshot, name='entrance_snapshot'),
+    path('api/entrance-snapshot/<str:job_id>/', views.entrance_snapshot_status, name='entrance_snapshot_status'),
+    path('api/outbound-stats/', views.outbound_stats, name='outbound_stats'),
+    path('api/fees/quotes/', views.fee_quotes, name='fee_quotes'),
     path('mockpay/start', views.mockpay_start, name='mockpay_start'),
     path('mockpay/complete', views.mockpay_complete, name='mockpay_complete'),
     path('verify_pwd/', views.verify_pwd, name='verify_pwd'),
@@ -28,6 +48,10 @@ urlpatterns = [
     path('logout/', views.logout_view, name='logout'),
     path('analytics/', views.analytics, name='analytics'),
     path('reports/generate/', views.report_builder, name='report_builder'),
+    path('api/reports/export/', views.report_export, name='report_export'),
+    path('api/reports/export/jobs/', views.report_export_start, name='report_export_start'),
+    path('api/reports/export/jobs/<str:job_id>/', views.report_export_status, name='report_export_status'),
+    path('api/reports/export/jobs/<str:job_id>/download/', views.report_export_download, name='report_export_download'),
     # Registration and email verification
     path('register/', views.register_view, name='register'),
     path('verify-email/<uidb64>/<token>/', views.verify_email, name='verify_email'),
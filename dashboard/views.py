@@ -1,9 +1,5 @@
-import csv, io, os
-import matplotlib
-matplotlib.use("Agg")           # ✅ add this line
-import matplotlib.pyplot as plt
-
 from django.http import HttpResponse
+from django.views.decorators.http import condition
 from django.shortcuts import render, redirect
 from django.views.decorators.csrf import csrf_exempt
 from django.contrib.auth.decorators import login_required
@@ -18,15 +14,12 @@ from django.urls import reverse
 from accounts.models import CustomUser  # your custom user model
 from django.utils.safestring import mark_safe
 from django.contrib.auth.decorators import user_passes_test
-from core.firebase import rtdb, init_firebase
+from core.firebase import rtdb, init_firebase, subscribe as mirror_subscribe, read as mirror_read, transactions_between, query_range, WriteBatch
+from . import archive, charts, closing, counters, directory, exports, feeds, incidents, jobs, moderation, rollups, search, slots
+from . import layout as layout_model, provisioning
+from .models import LayoutProvision
 from django.http import JsonResponse
 from datetime import datetime, timedelta, timezone
-import base64, requests
-from firebase_admin import auth as firebase_auth, _auth_utils
-try:
-    from zoneinfo import ZoneInfo
-except ImportError:  # pragma: no cover - Python <3.9 fallback
-    ZoneInfo = None
 
 # Role-based decorators (must be defined before use)
 def mall_owner_required(view_func):
@@ -41,90 +34,49 @@ def admin_only_required(view_func):
 report_entries = []
 
 
-def _encode_ban_key(raw: str) -> str:
-    """
-    Convert emails or other identifiers to a Firebase RTDB-safe key using base64url (no padding).
-    Falls back to a simple sanitized string if encoding fails.
-    """
-    try:
-        encoded = base64.urlsafe_b64encode(raw.strip().lower().encode("utf-8")).decode("ascii")
-        return encoded.rstrip("=")
-    except Exception:
-        return raw.strip().lower().replace(".", "_").replace("@", "_at_")
-
 # ───────────────────────────────────────────────────────────────
 #  Dynamic graph view
 # ───────────────────────────────────────────────────────────────
+def _chart_etag(name):
+    def etag(request):
+        key = charts.cache_key(name, charts.params_from_request(request))
+        return f'"{key}"' if key else None
+    return etag
+
+def _chart_last_modified(name):
+    def last_modified(request):
+        mtime = charts.source_mtime(name)
+        return datetime.fromtimestamp(mtime, tz=timezone.utc) if mtime is not None else None
+    return last_modified
+
+def _chart_response(request, name):
+    params = charts.params_from_request(request)
+    key = charts.cache_key(name, params)
+    if key is None:
+        return HttpResponse("CSV file not found.", content_type="text/plain")
+    body = charts.cache().get_or_render(name, params, key)
+    response = HttpResponse(body, content_type=charts.FORMATS[params["format"]])
+    # Revalidate every time; the ETag makes that a cheap 304
+    response["Cache-Control"] = "public, max-age=0, must-revalidate"
+    return response
+
+@condition(etag_func=_chart_etag("entries"), last_modified_func=_chart_last_modified("entries"))
 def entries_graph(request):
     """
-    Reads data/parking_entries.csv and renders a bar chart as PNG.
+    Reads data/parking_entries.csv and renders a bar chart (PNG, or ?format=svg).
+    Optional ?w=&h=&dpi= size the figure. Renders are cached per CSV version.
     URL:  /entries-graph/
     """
-    csv_path = os.path.join(
-        os.path.dirname(os.path.dirname(__file__)),  # project root (where manage.py lives)
-        "data",
-        "parking_entries.csv"
-    )
-
-    if not os.path.exists(csv_path):
-        return HttpResponse("CSV file not found.", content_type="text/plain")
-
-    days, entries = [], []
-    with open(csv_path, newline="") as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            days.append(row["Day"])
-            entries.append(int(row["Entries"]))
-
-    # Build the graph
-    fig, ax = plt.subplots(figsize=(10, 6))  # or even (12, 6)          # ← size so it’s not tiny
-    ax.bar(days, entries, color="#e8b931")
-    ax.set_title("Weekly Parking Entries")
-    ax.set_ylabel("Entries")
-    ax.set_xlabel("Day")
-
-    # Stream image back to browser
-    buffer = io.BytesIO()
-    fig.tight_layout()
-    fig.savefig(buffer, format="png")
-    plt.close(fig)
-    buffer.seek(0)
-    return HttpResponse(buffer.getvalue(), content_type="image/png")
+    return _chart_response(request, "entries")
 
+@condition(etag_func=_chart_etag("earnings"), last_modified_func=_chart_last_modified("earnings"))
 def earnings_graph(request):
     """
-    Reads data/monthly_earnings.csv and renders a bar chart.
+    Reads data/monthly_earnings.csv and renders a line chart (PNG, or ?format=svg).
+    Optional ?w=&h=&dpi= size the figure. Renders are cached per CSV version.
     URL:  /earnings-graph/
     """
-    csv_path = os.path.join(
-        os.path.dirname(os.path.dirname(__file__)),
-        "data",
-        "monthly_earnings.csv"
-    )
-
-    if not os.path.exists(csv_path):
-        return HttpResponse("CSV file not found.", content_type="text/plain")
-
-    months, earnings = [], []
-    with open(csv_path) as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            months.append(row["Month"])
-            earnings.append(int(row["Earnings"]))
-
-    fig, ax = plt.subplots(figsize=(10, 6))  # or even (12, 6)
-    ax.plot(months, earnings, marker='o', color="#333")
-    ax.set_title("Monthly Earnings")
-    ax.set_ylabel("Earnings (₱)")
-    ax.set_xlabel("Month")
-    ax.grid(True)
-
-    buffer = io.BytesIO()
-    fig.tight_layout()
-    fig.savefig(buffer, format="png")
-    plt.close(fig)
-    buffer.seek(0)
-    return HttpResponse(buffer.getvalue(), content_type="image/png")
+    return _chart_response(request, "earnings")
 
 
 # ───────────────────────────────────────────────────────────────
@@ -232,52 +184,23 @@ def logout_view(request):
 @login_required
 @admin_required
 def monitor(request):
-    # Try to read from Firebase layout first so saved names persist
+    # Firebase layout first so saved names persist; built once per layout version
     floors = None
-    layout_for_template = {}
     try:
-        db = rtdb()
-        fb_layout = db.reference('/configurations/layout').get() or {}
-        floors = fb_layout.get('floors')
-        sbf = fb_layout.get('slotsByFloor', {})
-        # Handle dict or list
-        if isinstance(sbf, dict):
-            items_iter = sbf.items()
-        else:
-            items_iter = enumerate(sbf)
-        for floor_key, types in items_iter:
-            if types is None:
-                continue
-            floor_num = int(floor_key)
-            layout_for_template[floor_num] = {"Car": [], "Motorcycle": [], "PWD": []}
-            for tkey in ("Car", "Motorcycle", "PWD"):
-                slots_list = types.get(tkey, []) if isinstance(types, dict) else []
-                if not isinstance(slots_list, list):
-                    continue
-                for item in slots_list:
-                    if isinstance(item, dict):
-                        sid = item.get('id') or ''
-                        name = item.get('name') or sid
-                    else:
-                        sid = str(item)
-                        name = sid
-                    layout_for_template[floor_num][tkey].append((name, sid))
+        current = layout_model.current()
+        floors = mirror_read('/configurations/layout/floors') if current else None
     except Exception:
-        layout_for_template = {}
-
-    if not layout_for_template:
-        # Fallback to session-generated layout (use id for both name and id)
-        session_layout = request.session.get('layout') or {}
-        floors = request.session.get('floors')
-        for floor, types in session_layout.items():
-            layout_for_template[floor] = {"Car": [], "Motorcycle": [], "PWD": []}
-            for tkey in ("Car", "Motorcycle", "PWD"):
-                for slot_id, _ in types.get(tkey, []):
-                    layout_for_template[floor][tkey].append((slot_id, slot_id))
-
-    generated = bool(layout_for_template and floors)
+        current = None
+
+    if not current:
+        # Fallback to the last generated layout on record (ids double as names)
+        run = provisioning.latest()
+        floors = run.floors if run else None
+        current = layout_model.Layout.generated(floors or 0, run.counts() if run else {})
+
+    generated = bool(current and floors)
     return render(request, "monitor.html", {
-        "layout": layout_for_template,
+        "layout": current,
         "floors": floors,
         "generated": generated,
     })
@@ -288,56 +211,39 @@ def register_slots(request):
     if request.method == "POST" and not request.POST.get("clear_session"):
         # Get form data
         floors = int(request.POST.get("floors", 1))
-        car_slots = int(request.POST.get("car_slots", 0))
-        motor_slots = int(request.POST.get("motor_slots", 0))
-        pwd_slots = int(request.POST.get("pwd_slots", 0))
-
-        # Generate layout and store in session
-        layout = {}
-        for floor in range(1, floors + 1):
-            layout[floor] = {
-                "Car": [(f"C{floor}-{i+1}", "") for i in range(car_slots)],
-                "Motorcycle": [(f"M{floor}-{i+1}", "") for i in range(motor_slots)],
-                "PWD": [(f"P{floor}-{i+1}", "") for i in range(pwd_slots)],
-            }
-        request.session['layout'] = layout
-        request.session['floors'] = floors
-
-        # Push full layout to Firebase (Car, Motorcycle, PWD) with id+name per slot.
+        counts = {
+            "Car": int(request.POST.get("car_slots", 0)),
+            "Motorcycle": int(request.POST.get("motor_slots", 0)),
+            "PWD": int(request.POST.get("pwd_slots", 0)),
+        }
+        # Slots are generated and uploaded floor by floor in the background
+        # (see dashboard.provisioning); the page polls the run's progress.
         try:
-            db = rtdb()
-            ref = db.reference("/configurations/layout")
-            # Build a simplified layout: floors and slots per type
-            mobile_layout = {"floors": floors, "slotsByFloor": {}}
-            for floor, types in layout.items():
-                car_slots = [{"id": slot, "name": slot} for slot, _ in types.get("Car", [])]
-                motor_slots = [{"id": slot, "name": slot} for slot, _ in types.get("Motorcycle", [])]
-                pwd_slots_list = [{"id": slot, "name": slot} for slot, _ in types.get("PWD", [])]
-                mobile_layout["slotsByFloor"][str(floor)] = {
-                    "Car": car_slots,
-                    "Motorcycle": motor_slots,
-                    "PWD": pwd_slots_list,
-                }
-            # Overwrite layout
-            ref.set(mobile_layout)
-            # Clear any existing occupancy since slot mapping changed
-            try:
-                ref.child('occupied').set({})
-            except Exception:
-                # ignore if occupied path does not exist yet
-                pass
-        except Exception as e:
-            return JsonResponse({"ok": False, "error": str(e)}, status=500)
-
-        return redirect('monitor')
+            run = provisioning.start(floors, counts, user=request.user)
+        except provisioning.ProvisionError as e:
+            return JsonResponse({"ok": False, "error": str(e)}, status=e.status)
+        return redirect(f"{reverse('register_slots')}?provision={run.pk}")
 
     # If clear_session is posted, clear the session and reload form
     if request.method == "POST" and request.POST.get("clear_session"):
         request.session.pop('layout', None)
+        request.session.pop('layout_spec', None)
         request.session.pop('floors', None)
         return redirect('register_slots')
 
-    return render(request, "register_slots.html")
+    run = None
+    if (request.GET.get('provision') or '').isdigit():
+        run = LayoutProvision.objects.filter(pk=int(request.GET['provision'])).first()
+    return render(request, "register_slots.html", {"provision": run})
+
+@login_required
+@admin_required
+def layout_provision_status(request, provision_id):
+    """GET → { id, status, floor, written, total, percent, error } of a register_slots run."""
+    run = LayoutProvision.objects.filter(pk=provision_id).first()
+    if run is None:
+        return JsonResponse({'ok': False, 'error': 'unknown run'}, status=404)
+    return JsonResponse({'ok': True, **provisioning.progress(run)})
 
 @csrf_exempt
 @mall_owner_required
@@ -351,53 +257,9 @@ def save_layout_labels(request):
         labels = payload.get('labels', {})
         if not isinstance(labels, dict):
             return JsonResponse({"error": "Invalid labels"}, status=400)
-        db = rtdb()
-        layout_ref = db.reference('/configurations/layout')
-        layout = layout_ref.get() or {}
-        slots_by_floor = (layout or {}).get('slotsByFloor', {})
-        # Normalize floor iteration to handle dict or list structures
-        def floor_iter(sbf):
-            if isinstance(sbf, dict):
-                for k, v in sbf.items():
-                    yield str(k), v
-            elif isinstance(sbf, list):
-                for i, v in enumerate(sbf):
-                    if v is not None:
-                        yield str(i), v
-        changed = False
-        new_sbf = {}
-        for floor_key, types in floor_iter(slots_by_floor):
-            # Ensure types is a dict of categories
-            if not isinstance(types, dict):
-                continue
-            for tkey in ('Car', 'Motorcycle', 'PWD'):
-                slots_list = types.get(tkey, [])
-                if not isinstance(slots_list, list):
-                    continue
-                new_list = []
-                for item in slots_list:
-                    if isinstance(item, dict):
-                        sid = item.get('id')
-                        if sid and sid in labels:
-                            item['name'] = labels[sid]
-                            changed = True
-                        # ensure both id and name exist
-                        if 'id' in item and 'name' not in item:
-                            item['name'] = item['id']
-                        new_list.append(item)
-                    else:
-                        # legacy string; convert to object with name override if provided
-                        sid = str(item)
-                        name = labels.get(sid, sid)
-                        new_list.append({'id': sid, 'name': name})
-                        if sid in labels:
-                            changed = True
-                types[tkey] = new_list
-            new_sbf[floor_key] = types
-        if changed:
-            layout['slotsByFloor'] = new_sbf
-            layout_ref.set(layout)
-        return JsonResponse({"ok": True})
+        # Only the renamed items are written (see dashboard.layout.rename_slots)
+        renamed, unknown = layout_model.rename_slots({str(k): str(v) for k, v in labels.items()})
+        return JsonResponse({"ok": True, "renamed": len(renamed), "unknown": unknown})
     except Exception as e:
         # Return 200 with ok=false so frontend can show a friendly toast
         return JsonResponse({"ok": False, "error": str(e)})
@@ -417,9 +279,10 @@ def approve_pwd(request):
         uid = payload.get('uid')
         if not uid:
             return JsonResponse({"error": "uid required"}, status=400)
-        db = rtdb()
-        db.reference(f"/pwdRequests/{uid}").update({"status": "approved"})
-        db.reference(f"/users/{uid}").update({"pwdStatus": "approved", "isPWD": True})
+        with WriteBatch() as batch:
+            batch.update(f"/pwdRequests/{uid}", {"status": "approved"})
+            batch.update(f"/users/{uid}", {"pwdStatus": "approved", "isPWD": True})
+        counters.add_pwd(uid)
         return JsonResponse({"ok": True})
     except Exception as e:
         return JsonResponse({"ok": False, "error": str(e)})
@@ -435,9 +298,11 @@ def decline_pwd(request):
         uid = payload.get('uid')
         if not uid:
             return JsonResponse({"error": "uid required"}, status=400)
-        db = rtdb()
-        db.reference(f"/pwdRequests/{uid}").update({"status": "rejected"})
-        db.reference(f"/users/{uid}").update({"pwdStatus": "rejected"})
+        # The status change and the PWD counter go out as one update
+        with WriteBatch() as batch:
+            batch.update(f"/pwdRequests/{uid}", {"status": "rejected"})
+            batch.update(f"/users/{uid}", {"pwdStatus": "rejected", "isPWD": False})
+            counters.stage_remove_pwd(batch, uid)
         return JsonResponse({"ok": True})
     except Exception as e:
         return JsonResponse({"ok": False, "error": str(e)})
@@ -453,34 +318,49 @@ def resolve_incident(request):
         incident_id = payload.get('incidentId')
         if not incident_id:
             return JsonResponse({"error": "incidentId required"}, status=400)
-        db = rtdb()
         finalize = bool(payload.get('finalize'))
         now_ms = int(time.time()*1000)
+        batch = WriteBatch()
         if finalize:
-            # Mark resolved in current incidents
-            inc_ref = db.reference(f"/incidents/{incident_id}")
-            snapshot = inc_ref.get() or {}
-            # Copy to pastIncidents (do not delete from current)
-            try:
-                copy_payload = dict(snapshot) if isinstance(snapshot, dict) else {}
-            except Exception:
-                copy_payload = {}
-            copy_payload.update({"status": "RESOLVED", "resolvedAt": now_ms, "incidentId": incident_id})
-            db.reference(f"/pastIncidents/{incident_id}").set(copy_payload)
-            # Also update current record status
-            inc_ref.update({"status": "RESOLVED", "resolvedAt": now_ms})
+            mirror_subscribe()
+            snapshot = mirror_read(f"/incidents/{incident_id}") or {}
+            if isinstance(snapshot, dict) and str(snapshot.get('status') or '').upper() == 'RESOLVED':
+                # Already finalized (by the sweeper or another admin); don't copy twice
+                return JsonResponse({"ok": True, "alreadyResolved": True})
+            # Copy to pastIncidents (do not delete from current) and mark resolved
+            incidents.stage_finalize(batch, incident_id, snapshot, now_ms)
         else:
-            # Ask user to confirm; auto-resolve after 1 hour
-            db.reference(f"/incidents/{incident_id}").update({
-                "status": "PENDING_USER_CONFIRM",
-                "confirmRequestedAt": now_ms,
-                "confirmDeadline": now_ms + 3600*1000
-            })
+            # Ask user to confirm; the incident sweeper auto-resolves after 1 hour
+            incidents.stage_pending(batch, incident_id, now_ms)
+        batch.commit()
         return JsonResponse({"ok": True})
     except Exception as e:
         return JsonResponse({"ok": False, "error": str(e)})
 
 
+@login_required
+@admin_required
+def past_incidents(request):
+    """GET ?before=<resolvedAt ms>&limit= → { ok, rows, next }, newest first, across
+    /pastIncidents and the archived months (see dashboard.archive).
+    """
+    try:
+        items, next_before = archive.recent('pastIncidents', request.GET.get('before') or None,
+                                            request.GET.get('limit') or 50)
+    except ValueError as e:
+        return JsonResponse({'ok': False, 'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'ok': False, 'error': str(e)}, status=500)
+    return JsonResponse({'ok': True, 'rows': [{'id': k, **v} for k, v in items], 'next': next_before})
+
+
+@login_required
+@admin_required
+def incident_sweeper_stats(request):
+    """Auto-resolution counts and deadline-to-finalize lag published by run_incident_sweeper."""
+    return JsonResponse({'ok': True, 'sweeper': incidents.published_stats()})
+
+
 @csrf_exempt
 @admin_required
 def delete_firebase_user(request):
@@ -494,12 +374,18 @@ def delete_firebase_user(request):
             return JsonResponse({"error": "uid required"}, status=400)
 
         init_firebase()
+        from firebase_admin import auth as firebase_auth, _auth_utils
         try:
             firebase_auth.delete_user(uid)
         except _auth_utils.UserNotFoundError:
             pass
         try:
-            rtdb().reference(f"/users/{uid}").delete()
+            batch = WriteBatch()
+            batch.delete(f"/users/{uid}")
+            directory.stage_drop(batch, uid)
+            closing.stage_cancel(batch, uid)
+            batch.commit()
+            counters.remove_user(uid)
         except Exception:
             pass
 
@@ -508,6 +394,49 @@ def delete_firebase_user(request):
         return JsonResponse({"ok": False, "error": str(e)}, status=500)
 
 
+def _firebase_uid(request):
+    """uid of the Firebase ID token sent as 'Authorization: Bearer <token>', or None."""
+    scheme, _, token = request.META.get('HTTP_AUTHORIZATION', '').partition(' ')
+    if scheme.lower() != 'bearer' or not token.strip():
+        return None
+    init_firebase()
+    from firebase_admin import auth as firebase_auth
+    try:
+        return firebase_auth.verify_id_token(token.strip()).get('uid')
+    except Exception:
+        return None
+
+
+@csrf_exempt
+def user_registered(request):
+    """POST { uid } from the mobile app after sign-up: counts the new /users
+    profile in /counters and gives it a /userTxStatus entry. Idempotent; the
+    profile must already exist. The request must carry the user's own
+    Firebase ID token (Authorization: Bearer <idToken>).
+    """
+    if request.method != 'POST':
+        return JsonResponse({"error": "POST required"}, status=405)
+    try:
+        import json
+        payload = json.loads(request.body or '{}')
+        uid = (payload.get('uid') or '').strip()
+        if not uid:
+            return JsonResponse({"error": "uid required"}, status=400)
+        token_uid = _firebase_uid(request)
+        if token_uid is None:
+            return JsonResponse({"ok": False, "error": "Firebase ID token required"}, status=401)
+        if token_uid != uid:
+            return JsonResponse({"ok": False, "error": "token does not match uid"}, status=403)
+        profile = rtdb().reference(f'/users/{uid}').get()
+        if not isinstance(profile, dict):
+            return JsonResponse({"ok": False, "error": "user not found"}, status=404)
+        added = counters.add_user(uid, is_pwd=bool(profile.get('isPWD')))
+        directory.ensure_tx_status(uid)
+        return JsonResponse({"ok": True, "counted": added})
+    except Exception as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=500)
+
+
 @csrf_exempt
 @admin_required
 def ban_user(request):
@@ -524,51 +453,19 @@ def ban_user(request):
             return JsonResponse({"error": "uid required"}, status=400)
 
         init_firebase()
+        from firebase_admin import auth as firebase_auth, _auth_utils
         db = rtdb()
 
         user_snapshot = db.reference(f'/users/{uid}').get() or {}
-        email = (user_snapshot.get('email') or '').strip()
-        contact = (user_snapshot.get('contactNumber') or '').strip()
-        display_name = (user_snapshot.get('displayName') or '').strip()
         now_ms = int(_time.time() * 1000)
         banned_by = getattr(request.user, 'email', '') or getattr(request.user, 'username', '') or 'admin'
-        ban_reason = reason or 'No reason provided'
-
-        ban_payload = {
-            'uid': uid,
-            'email': email.lower(),
-            'contactNumber': contact,
-            'displayName': display_name,
-            'reason': ban_reason,
-            'bannedAt': now_ms,
-            'bannedAtIso': datetime.utcfromtimestamp(now_ms / 1000.0).isoformat() + 'Z',
-            'bannedBy': banned_by,
-        }
-
-        db.reference(f'/banned/users/{uid}').set(ban_payload)
-
-        index_payload = {
-            'uid': uid,
-            'reason': ban_reason,
-            'bannedAt': now_ms,
-            'bannedBy': banned_by,
-        }
-        if email:
-            email_key = _encode_ban_key(email)
-            db.reference(f'/banned/index/email/{email_key}').set({
-                **index_payload,
-                'email': email.lower(),
-                'contactNumber': contact,
-            })
-        if contact:
-            db.reference(f'/banned/index/contact/{contact}').set({
-                **index_payload,
-                'email': email.lower(),
-                'contactNumber': contact,
-            })
 
+        # Ban record, lookup indexes and profile removal go out as one atomic update
+        batch = WriteBatch()
+        ban_payload = moderation.stage_ban(batch, uid, user_snapshot, reason, banned_by, now_ms)
+        batch.commit()
         try:
-            db.reference(f'/users/{uid}').delete()
+            counters.remove_user(uid)
         except Exception:
             pass
 
@@ -583,44 +480,105 @@ def ban_user(request):
     except Exception as e:
         return JsonResponse({"ok": False, "error": str(e)}, status=500)
 
+# ───────────────────────────────────────────────────────────────
+#  Bulk moderation (see dashboard.moderation)
+# ───────────────────────────────────────────────────────────────
+def _bulk_payload(request, field):
+    import json
+    payload = json.loads(request.body or '{}')
+    ids = payload.get(field)
+    if not isinstance(ids, list) or not ids:
+        raise ValueError(f"{field} must be a non-empty list")
+    return payload, ids
+
+
+@csrf_exempt
+@admin_only_required
+def bulk_pwd(request):
+    """POST { uids: [...], action: "approve" | "decline" } → per-uid results."""
+    if request.method != 'POST':
+        return JsonResponse({"error": "POST required"}, status=405)
+    try:
+        payload, uids = _bulk_payload(request, 'uids')
+        action = (payload.get('action') or 'approve').strip().lower()
+        if action not in ('approve', 'decline'):
+            return JsonResponse({"error": "action must be approve or decline"}, status=400)
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    try:
+        return JsonResponse(moderation.decide_pwd(uids, approve=(action == 'approve')))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=500)
+
+
+@csrf_exempt
+@admin_required
+def bulk_ban(request):
+    """POST { uids: [...], reason } → per-uid results (RTDB ban + Auth delete)."""
+    if request.method != 'POST':
+        return JsonResponse({"error": "POST required"}, status=405)
+    try:
+        payload, uids = _bulk_payload(request, 'uids')
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    try:
+        banned_by = getattr(request.user, 'email', '') or getattr(request.user, 'username', '') or 'admin'
+        reason = (payload.get('reason') or '').strip()
+        return JsonResponse(moderation.ban_users(uids, reason=reason, banned_by=banned_by))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=500)
+
+
+@csrf_exempt
+@admin_required
+def bulk_release_slots(request):
+    """POST { slots: [occupied keys] } → per-slot results."""
+    if request.method != 'POST':
+        return JsonResponse({"error": "POST required"}, status=405)
+    try:
+        _, slots = _bulk_payload(request, 'slots')
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    try:
+        return JsonResponse(moderation.release_slots(slots))
+    except ValueError as e:
+        return JsonResponse({"error": str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({"ok": False, "error": str(e)}, status=500)
+
 @mall_owner_required
 def analytics(request):
     """Mall owner analytics: show registered users count and weekly entries.
 
-    - Registered users: count of keys under /users
-    - Weekly entries: number of transactions with timeIn in current ISO week (Mon-Sun)
+    - Registered users: /counters/totals (see dashboard.counters)
+    - Weekly entries: this ISO week's /rollups/weekly bucket (Asia/Manila)
+    Both are single small-node reads; the fallbacks only run before
+    ``reconcile_counters`` / ``rebuild_rollups`` have been run once.
     """
     registered_users_count = 0
     weekly_entries_count = 0
     try:
         db = rtdb()
-        # Registered users count
-        users_snapshot = db.reference('/users').get() or {}
-        if isinstance(users_snapshot, dict):
-            registered_users_count = len(users_snapshot.keys())
-        elif isinstance(users_snapshot, list):
-            registered_users_count = len([x for x in users_snapshot if x is not None])
-
-        # Weekly entries from /transactions by timeIn
-        now = datetime.now(timezone.utc)
-        # Start of current week (Monday 00:00) in UTC
-        start_of_week = (now - timedelta(days=now.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
-        start_ms = int(start_of_week.timestamp() * 1000)
-        tx_snapshot = db.reference('/transactions').get() or {}
-        if isinstance(tx_snapshot, dict):
-            for tx in tx_snapshot.values():
-                if not isinstance(tx, dict):
-                    continue
-                t_in = tx.get('timeIn')
-                if isinstance(t_in, (int, float)) and t_in >= start_ms:
-                    weekly_entries_count += 1
-        elif isinstance(tx_snapshot, list):
-            for tx in tx_snapshot:
-                if not isinstance(tx, dict):
-                    continue
-                t_in = tx.get('timeIn')
-                if isinstance(t_in, (int, float)) and t_in >= start_ms:
-                    weekly_entries_count += 1
+        totals = counters.read_totals()
+        if 'users' in totals:
+            registered_users_count = int(totals.get('users') or 0)
+        else:
+            # Shallow read: keys only, not every profile
+            registered_users_count = len(db.reference('/users').get(shallow=True) or {})
+
+        now_ph = datetime.now(timezone.utc).astimezone(rollups.tz_ph())
+        bucket = rollups.read_range('weekly', rollups.week_key(now_ph), rollups.week_key(now_ph))
+        week = bucket.get(rollups.week_key(now_ph))
+        if isinstance(week, dict) and 'entries' in week:
+            weekly_entries_count = int(week.get('entries') or 0)
+        else:
+            start_of_week = (now_ph - timedelta(days=now_ph.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
+            # Indexed timeIn query: only this week's records are transferred
+            weekly_entries_count = len(transactions_between(start_of_week))
     except Exception:
         # In dev, fail silently and show zeros
         pass
@@ -646,6 +604,73 @@ def report_builder(request):
         "generator_email": generator_email,
     })
 
+# ───────────────────────────────────────────────────────────────
+#  Report exports (see dashboard.exports)
+# ───────────────────────────────────────────────────────────────
+@login_required
+@admin_required
+def report_export(request):
+    """GET ?start=YYYY-MM-DD&end=YYYY-MM-DD&group=month,vehicle_type&basis=entry|exit&format=csv|xlsx
+    → the report as a streamed download.
+    """
+    from django.http import StreamingHttpResponse
+
+    fmt = request.GET.get('format') or 'csv'
+    try:
+        report = exports.Report.from_params(request.GET)
+        body = exports.chunks(report, fmt)
+    except exports.ExportError as e:
+        return JsonResponse({'ok': False, 'error': str(e)}, status=400)
+    response = StreamingHttpResponse(body, content_type=exports.CONTENT_TYPES[fmt])
+    response['Content-Disposition'] = f'attachment; filename="{report.filename(fmt)}"'
+    response['Cache-Control'] = 'no-store'
+    return response
+
+
+@csrf_exempt
+@login_required
+@admin_required
+def report_export_start(request):
+    """POST { start, end, group?, basis?, format? } → { ok, jobId }; the export is written in the background."""
+    if request.method != 'POST':
+        return JsonResponse({'error': 'POST required'}, status=405)
+    import json
+    try:
+        payload = json.loads(request.body or '{}')
+        job_id = exports.start_export(payload, payload.get('format') or 'csv')
+    except (ValueError, exports.ExportError) as e:
+        return JsonResponse({'ok': False, 'error': str(e)}, status=400)
+    except jobs.QueueFull as e:
+        return JsonResponse({'ok': False, 'error': str(e)}, status=503)
+    return JsonResponse({'ok': True, 'jobId': job_id}, status=202)
+
+
+@login_required
+@admin_required
+def report_export_status(request, job_id):
+    """GET → { id, status: queued|running|done|failed, rows, result?, downloadUrl? }."""
+    state = jobs.get_queue('exports').status(job_id)
+    if state is None:
+        return JsonResponse({'ok': False, 'error': 'unknown job'}, status=404)
+    body = {'ok': True, **state}
+    if state.get('status') == 'done' and exports.export_path(state.get('result')):
+        body['downloadUrl'] = reverse('report_export_download', args=[job_id])
+    return JsonResponse(body)
+
+
+@login_required
+@admin_required
+def report_export_download(request, job_id):
+    from django.http import FileResponse
+
+    state = jobs.get_queue('exports').status(job_id) or {}
+    result = state.get('result') if state.get('status') == 'done' else None
+    path = exports.export_path(result)
+    if path is None:
+        return JsonResponse({'ok': False, 'error': 'export not found or expired'}, status=404)
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=result.get('filename') or 'report',
+                        content_type=exports.CONTENT_TYPES.get(result.get('format'), 'application/octet-stream'))
+
 # ───────────────────────────────────────────────────────────────
 #  Live analytics JSON for charts (mall owner/admin)
 # ───────────────────────────────────────────────────────────────
@@ -654,12 +679,13 @@ def report_builder(request):
 def analytics_summary(request):
     try:
         db = rtdb()
+        mirror_subscribe()
 
         # Occupancy
-        occ = db.reference('/configurations/layout/occupied').get() or {}
+        occ = mirror_read('/configurations/layout/occupied') or {}
         car_occ = 0; motor_occ = 0; pwd_occ = 0
         # Capacity (total slots) from layout
-        layout = db.reference('/configurations/layout/slotsByFloor').get() or {}
+        layout = mirror_read('/configurations/layout/slotsByFloor') or {}
         total_car_slots = 0
         total_motor_slots = 0
         total_pwd_slots = 0
@@ -683,15 +709,8 @@ def analytics_summary(request):
                 if isinstance(item, dict):
                     _add_counts(item)
         # Occupancy by user type (PWD vs regular)
-        users_snapshot = db.reference('/users').get() or {}
-        is_pwd_by_uid = {}
-        if isinstance(users_snapshot, dict):
-            for uid, u in users_snapshot.items():
-                if isinstance(u, dict):
-                    try:
-                        is_pwd_by_uid[str(uid)] = bool(u.get('isPWD'))
-                    except Exception:
-                        is_pwd_by_uid[str(uid)] = False
+        # Maintained PWD index (keys only) instead of every /users profile
+        pwd_uids = counters.pwd_uids()
         occupied_pwd_users = 0; occupied_regular_users = 0
         total_occupied = 0
         if isinstance(occ, dict):
@@ -707,77 +726,20 @@ def analytics_summary(request):
                 else: car_occ += 1
                 uid = str(v.get('uid') or '')
                 if uid:
-                    if is_pwd_by_uid.get(uid):
+                    if uid in pwd_uids:
                         occupied_pwd_users += 1
                     else:
                         occupied_regular_users += 1
 
-        # Transactions snapshot
-        txs = db.reference('/transactions').get() or {}
-        if not isinstance(txs, (dict, list)):
-            txs = {}
-
-        try:
-            tz_ph = ZoneInfo("Asia/Manila")
-        except Exception:
-            tz_ph = timezone(timedelta(hours=8))
-        now_utc = datetime.now(timezone.utc)
-        now_ph = now_utc.astimezone(tz_ph)
+        # Earnings, entries and stay figures come from the maintained rollup
+        # buckets (see dashboard.rollups), never from a /transactions scan.
+        tz_ph = rollups.tz_ph()
+        now_ph = datetime.now(timezone.utc).astimezone(tz_ph)
         start_today_ph = now_ph.replace(hour=0, minute=0, second=0, microsecond=0)
-        start_today = start_today_ph.astimezone(timezone.utc)
-        start_yesterday = (start_today - timedelta(days=1))
         start_week_ph = (now_ph - timedelta(days=now_ph.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
-        start_week = start_week_ph.astimezone(timezone.utc)
 
-        def to_dt(val):
-            # timeIn/Out can be ISO string; sometimes ms epoch in older data
-            try:
-                if isinstance(val, (int, float)):
-                    return datetime.fromtimestamp(float(val)/1000.0, tz=timezone.utc)
-                return datetime.fromisoformat(str(val).replace('Z','+00:00'))
-            except Exception:
-                return None
-
-        today_earn = 0.0; week_earn = 0.0
-        today_entries = 0; yesterday_entries = 0
-        completed_today = 0; started_today = 0
-        stay_mins_sum = 0.0; stay_mins_n = 0
-        hist = [0]*24
-        weekly_earnings_by_day = [0.0]*7
-        stay_sum_by_day = [0.0]*7
-        stay_n_by_day = [0]*7
-
-        days_back = 6
-        day_ranges = []
-        day_index_map = {}
-        for offset in range(days_back, -1, -1):
-            day_start_ph = start_today_ph - timedelta(days=offset)
-            day_label = day_start_ph.strftime('%d %b %Y')
-            day_ranges.append((day_label, day_start_ph))
-            day_index_map[(day_start_ph.year, day_start_ph.month, day_start_ph.day)] = len(day_ranges) - 1
-        daily_total = [0.0] * len(day_ranges)
-        daily_car = [0.0] * len(day_ranges)
-        daily_motor = [0.0] * len(day_ranges)
-        daily_transactions = [0] * len(day_ranges)
-        daily_stay_sum = [0.0] * len(day_ranges)
-        daily_stay_n = [0] * len(day_ranges)
-
-        weeks_back = 7
-        week_ranges = []
-        week_index_map = {}
-        for offset in range(weeks_back, -1, -1):
-            week_start_ph = start_week_ph - timedelta(days=offset * 7)
-            week_end_ph = week_start_ph + timedelta(days=6)
-            week_label = f"Week of {week_start_ph.strftime('%d %b')} – {week_end_ph.strftime('%d %b %Y')}"
-            iso_key = week_start_ph.isocalendar()
-            week_ranges.append((week_label, week_start_ph))
-            week_index_map[(iso_key[0], iso_key[1])] = len(week_ranges) - 1
-        weekly_total_array = [0.0] * len(week_ranges)
-        weekly_car_array = [0.0] * len(week_ranges)
-        weekly_motor_array = [0.0] * len(week_ranges)
-        weekly_transactions = [0] * len(week_ranges)
-        weekly_stay_sum = [0.0] * len(week_ranges)
-        weekly_stay_n = [0] * len(week_ranges)
+        day_ranges = [start_today_ph - timedelta(days=offset) for offset in range(6, -1, -1)]
+        week_ranges = [start_week_ph - timedelta(days=offset * 7) for offset in range(7, -1, -1)]
 
         def _shift_month(dt, offset):
             year = dt.year + ((dt.month - 1 + offset) // 12)
@@ -785,123 +747,66 @@ def analytics_summary(request):
             return dt.replace(year=year, month=month)
 
         start_of_month_ph = now_ph.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        month_ranges = []
-        month_index_map = {}
-        for offset in range(-5, 1):
-            start = _shift_month(start_of_month_ph, offset)
-            label = start.strftime('%b %Y')
-            month_ranges.append((label, start))
-            month_index_map[(start.year, start.month)] = len(month_ranges) - 1
-        monthly_total = [0.0] * len(month_ranges)
-        monthly_car = [0.0] * len(month_ranges)
-        monthly_motor = [0.0] * len(month_ranges)
-        monthly_transactions = [0] * len(month_ranges)
-        monthly_stay_sum = [0.0] * len(month_ranges)
-        monthly_stay_n = [0] * len(month_ranges)
-
-        items = txs.items() if isinstance(txs, dict) else enumerate(txs)
-        for _, tx in items:
-            if not isinstance(tx, dict):
-                continue
-            t_in = to_dt(tx.get('timeIn'))
-            t_out = to_dt(tx.get('timeOut'))
-            status = str(tx.get('status','')).upper()
-            amt_paid = float(tx.get('amountPaid') or 0)
-            vehicle_type = str(tx.get('vehicleType', '')).upper()
-            stay_minutes = None
-
-            if t_in:
-                if t_in >= start_today:
-                    today_entries += 1
-                    hour = (t_in.astimezone(timezone.utc).hour)
-                    if 0 <= hour < 24:
-                        hist[hour] += 1
-                    started_today += 1
-                elif start_yesterday <= t_in < start_today:
-                    yesterday_entries += 1
-
-            if t_in and t_out:
-                stay = (t_out - t_in).total_seconds()/60.0
-                if stay > 0:
-                    stay_minutes = stay
-                    stay_mins_sum += stay
-                    stay_mins_n += 1
-                    if t_out and t_out >= start_week:
-                        day_idx = (t_out.date() - start_week.date()).days
-                        if 0 <= day_idx < 7:
-                            stay_sum_by_day[day_idx] += stay
-                            stay_n_by_day[day_idx] += 1
-
-            if t_out:
-                t_out_ph = t_out.astimezone(tz_ph)
-                if t_out >= start_today:
-                    today_earn += amt_paid
-                    completed_today += 1
-                if t_out >= start_week:
-                    week_earn += amt_paid
-                    # per-day earnings relative to start_week
-                    day_idx = (t_out.date() - start_week.date()).days
-                    if 0 <= day_idx < 7:
-                        weekly_earnings_by_day[day_idx] += amt_paid
-                month_key = (t_out_ph.year, t_out_ph.month)
-                idx = month_index_map.get(month_key)
-                if idx is not None:
-                    monthly_total[idx] += amt_paid
-                    if vehicle_type == 'MOTORCYCLE':
-                        monthly_motor[idx] += amt_paid
-                    else:
-                        monthly_car[idx] += amt_paid
-                    monthly_transactions[idx] += 1
-                    if stay_minutes is not None and stay_minutes > 0:
-                        monthly_stay_sum[idx] += stay_minutes
-                        monthly_stay_n[idx] += 1
-
-                day_key = (t_out_ph.year, t_out_ph.month, t_out_ph.day)
-                day_idx_custom = day_index_map.get(day_key)
-                if day_idx_custom is not None:
-                    daily_total[day_idx_custom] += amt_paid
-                    if vehicle_type == 'MOTORCYCLE':
-                        daily_motor[day_idx_custom] += amt_paid
-                    else:
-                        daily_car[day_idx_custom] += amt_paid
-                    daily_transactions[day_idx_custom] += 1
-                    if stay_minutes is not None and stay_minutes > 0:
-                        daily_stay_sum[day_idx_custom] += stay_minutes
-                        daily_stay_n[day_idx_custom] += 1
-
-                week_start_tx = (t_out_ph - timedelta(days=t_out_ph.weekday())).replace(hour=0, minute=0, second=0, microsecond=0)
-                iso_tx = week_start_tx.isocalendar()
-                week_idx_custom = week_index_map.get((iso_tx[0], iso_tx[1]))
-                if week_idx_custom is not None:
-                    weekly_total_array[week_idx_custom] += amt_paid
-                    if vehicle_type == 'MOTORCYCLE':
-                        weekly_motor_array[week_idx_custom] += amt_paid
-                    else:
-                        weekly_car_array[week_idx_custom] += amt_paid
-                    weekly_transactions[week_idx_custom] += 1
-                    if stay_minutes is not None and stay_minutes > 0:
-                        weekly_stay_sum[week_idx_custom] += stay_minutes
-                        weekly_stay_n[week_idx_custom] += 1
-
-        avg_stay = round(stay_mins_sum/stay_mins_n, 1) if stay_mins_n else 0.0
+        month_ranges = [_shift_month(start_of_month_ph, offset) for offset in range(-5, 1)]
+
+        first_day = min(day_ranges[0], start_week_ph, start_today_ph - timedelta(days=1))
+        daily = rollups.read_range('daily', rollups.day_key(first_day), rollups.day_key(start_today_ph))
+        weekly = rollups.read_range('weekly', rollups.week_key(week_ranges[0]), rollups.week_key(week_ranges[-1]))
+        monthly = rollups.read_range('monthly', rollups.month_key(month_ranges[0]), rollups.month_key(month_ranges[-1]))
+        totals = rollups.read_totals()
+
+        def _series(buckets, keys):
+            rows = [buckets.get(k) if isinstance(buckets.get(k), dict) else {} for k in keys]
+            out = {f: [row.get(f) or 0 for row in rows] for f in rollups.EARNING_FIELDS}
+            out['avgStay'] = [round(row.get('staySum', 0) / row['stayN'], 1) if row.get('stayN') else 0.0 for row in rows]
+            return out
+
+        daily_series = _series(daily, [rollups.day_key(d) for d in day_ranges])
+        weekly_series = _series(weekly, [rollups.week_key(w) for w in week_ranges])
+        monthly_series = _series(monthly, [rollups.month_key(m) for m in month_ranges])
+        this_week = _series(daily, [rollups.day_key(start_week_ph + timedelta(days=i)) for i in range(7)])
+
+        today_bucket = daily.get(rollups.day_key(start_today_ph)) or {}
+        yesterday_bucket = daily.get(rollups.day_key(start_today_ph - timedelta(days=1))) or {}
+        today_hours = today_bucket.get('hours') or {}
+        hist = [int(today_hours.get(rollups.hour_key(h)) or 0) for h in range(24)]
+
+        today_earn = float(today_bucket.get('total') or 0)
+        week_earn = float(sum(this_week['total']))
+        today_entries = int(today_bucket.get('entries') or 0)
+        started_today = today_entries
+        yesterday_entries = int(yesterday_bucket.get('entries') or 0)
+        completed_today = int(today_bucket.get('transactions') or 0)
+
+        stay_mins_n = int(totals.get('stayN') or 0)
+        avg_stay = round(float(totals.get('staySum') or 0) / stay_mins_n, 1) if stay_mins_n else 0.0
         conversion = round((completed_today/max(1, started_today))*100.0, 1)
-        avg_stay_by_day = [ round((stay_sum_by_day[i]/stay_n_by_day[i]), 1) if stay_n_by_day[i] else 0.0 for i in range(7) ]
-
-        month_labels = [label for label, _ in month_ranges]
-        monthly_total = [round(x, 2) for x in monthly_total]
-        monthly_car = [round(x, 2) for x in monthly_car]
-        monthly_motor = [round(x, 2) for x in monthly_motor]
-        monthly_avg_stay = [round((monthly_stay_sum[i]/monthly_stay_n[i]), 1) if monthly_stay_n[i] else 0.0 for i in range(len(month_ranges))]
-        daily_labels = [label for label, _ in day_ranges]
-        weekly_labels = [label for label, _ in week_ranges]
-        daily_total = [round(x, 2) for x in daily_total]
-        daily_car = [round(x, 2) for x in daily_car]
-        daily_motor = [round(x, 2) for x in daily_motor]
-        weekly_total_array = [round(x, 2) for x in weekly_total_array]
-        weekly_car_array = [round(x, 2) for x in weekly_car_array]
-        weekly_motor_array = [round(x, 2) for x in weekly_motor_array]
-        daily_avg_stay = [round((daily_stay_sum[i]/daily_stay_n[i]), 1) if daily_stay_n[i] else 0.0 for i in range(len(daily_stay_n))]
-        weekly_avg_stay = [round((weekly_stay_sum[i]/weekly_stay_n[i]), 1) if weekly_stay_n[i] else 0.0 for i in range(len(weekly_stay_n))]
+        avg_stay_by_day = this_week['avgStay']
+
+        def _money(values):
+            return [round(float(x), 2) for x in values]
+
+        month_labels = [m.strftime('%b %Y') for m in month_ranges]
+        daily_labels = [d.strftime('%d %b %Y') for d in day_ranges]
+        weekly_labels = [
+            f"Week of {w.strftime('%d %b')} – {(w + timedelta(days=6)).strftime('%d %b %Y')}"
+            for w in week_ranges
+        ]
+        monthly_total = _money(monthly_series['total'])
+        monthly_car = _money(monthly_series['car'])
+        monthly_motor = _money(monthly_series['motorcycle'])
+        monthly_transactions = monthly_series['transactions']
+        monthly_avg_stay = monthly_series['avgStay']
+        daily_total = _money(daily_series['total'])
+        daily_car = _money(daily_series['car'])
+        daily_motor = _money(daily_series['motorcycle'])
+        daily_transactions = daily_series['transactions']
+        daily_avg_stay = daily_series['avgStay']
+        weekly_total_array = _money(weekly_series['total'])
+        weekly_car_array = _money(weekly_series['car'])
+        weekly_motor_array = _money(weekly_series['motorcycle'])
+        weekly_transactions = weekly_series['transactions']
+        weekly_avg_stay = weekly_series['avgStay']
         current_total = monthly_total[-1] if monthly_total else 0.0
         previous_total = monthly_total[-2] if len(monthly_total) > 1 else 0.0
         current_label = month_labels[-1] if month_labels else ''
@@ -997,9 +902,11 @@ def verify_pwd(request):
 # ───────────────────────────────────────────────────────────────
 @csrf_exempt
 def entrance_snapshot(request):
-    """POST { uid, txId, cameraUrl } → captures JPEG, uploads to Cloudinary (dy5kbbskp),
-    OCRs text (optional via OCR.space if OCR_API_KEY set), writes plate to /transactions/<txId>/plateNumber and /users/<uid>/lastPlate.
-    Returns { ok, url, plate }.
+    """POST { uid, txId, cameraUrl } → queues the capture → Cloudinary upload (dy5kbbskp)
+    → OCR → RTDB pipeline (see dashboard.gate) and returns { ok, jobId } right away.
+    Poll /api/entrance-snapshot/<jobId>/ for progress; the finished job's result is
+    the old synchronous response { ok, url, plate, txId, tx }. Pass "wait": true to
+    block for the result as before.
     """
     if request.method != 'POST':
         return JsonResponse({"error": "POST required"}, status=405)
@@ -1012,163 +919,261 @@ def entrance_snapshot(request):
         if not (uid and tx_id and cam_url):
             return JsonResponse({"error": "uid, txId, cameraUrl required"}, status=400)
 
-        # 1) Capture JPEG from OV2640 /capture with cache-buster and plain fallback
-        base_url = cam_url.rstrip('/') + '/capture'
-        def _fetch_ts():
-            try:
-                ts = int(datetime.utcnow().timestamp() * 1000)
-            except Exception:
-                ts = 0
-            return requests.get(f"{base_url}?ts={ts}", timeout=30)
-        def _fetch_plain():
-            return requests.get(base_url, timeout=30)
-
-        # Attempt 1: cache-busted
-        cap_res = _fetch_ts()
-        # Attempt 2: retry ts after a short warm-up if suspicious
-        if cap_res.status_code != 200 or not cap_res.content or len(cap_res.content) < 1024:
-            try:
-                import time as _t
-                _t.sleep(0.25)
-            except Exception:
-                pass
-            cap_res = _fetch_ts()
-        # Attempt 3: compatibility fallback without query
-        if cap_res.status_code != 200 or not cap_res.content or len(cap_res.content) < 1024:
-            cap_res = _fetch_plain()
-        if cap_res.status_code != 200 or not cap_res.content:
-            return JsonResponse({"ok": False, "error": "capture failed"})
-
-        # 2) Upload to Cloudinary (unsigned)
-        cloud = 'dy5kbbskp'
-        upload_preset = os.environ.get('CLOUDINARY_UPLOAD_PRESET', 'unsigned')
-        cld_url = f'https://api.cloudinary.com/v1_1/{cloud}/image/upload'
-        files = { 'file': ('plate.jpg', cap_res.content, 'image/jpeg') }
-        data = { 'upload_preset': upload_preset, 'folder': 'cygo/entry' }
-        cld_res = requests.post(cld_url, files=files, data=data, timeout=30)
-        cld_json = {}
-        try: cld_json = cld_res.json()
-        except Exception: cld_json = {}
-        if cld_res.status_code >= 300 or 'secure_url' not in cld_json:
-            return JsonResponse({"ok": False, "error": "cloudinary upload failed", "status": cld_res.status_code})
-        secure_url = cld_json['secure_url']
-
-        # 3) OCR (optional via OCR.space) – with fallback and plate pattern extraction
-        def extract_plate(raw: str) -> str:
-            import re
-            s = (raw or '').upper().replace('\n', ' ').replace('\r',' ')
-            s = ' '.join(s.split())
-            # common confusions
-            s = s.replace('0', 'O') if s.count('0') <= 3 else s
-            s = s.replace('1', 'I') if s.count('1') <= 3 else s
-            # PH-like: ABC 123 or ABC 1234; also allow 2 letters + up to 4 digits
-            m = re.search(r'([A-Z]{2,4})\s*[- ]?\s*(\d{2,4})', s)
-            return (m.group(1) + ' ' + m.group(2)) if m else s if s else ''
-
-        plate_text = ''
-        ocr_key = os.environ.get('OCR_API_KEY')
-        if ocr_key:
-            try:
-                ocr_api = 'https://api.ocr.space/parse/image'
-                # First try Engine 2
-                resp = requests.post(
-                    ocr_api,
-                    data={'apikey': ocr_key, 'language': 'eng', 'scale': 'true', 'OCREngine': 2, 'url': secure_url},
-                    timeout=25
-                )
-                js = resp.json()
-                if not js.get('IsErroredOnProcessing'):
-                    pars = js.get('ParsedResults') or []
-                    raw = (pars[0].get('ParsedText') or '') if pars else ''
-                    plate_text = extract_plate(raw)
-                # Fallback to Engine 1 if empty
-                if not plate_text:
-                    resp1 = requests.post(
-                        ocr_api,
-                        data={'apikey': ocr_key, 'language': 'eng', 'scale': 'true', 'OCREngine': 1, 'url': secure_url},
-                        timeout=25
-                    )
-                    js1 = resp1.json()
-                    if not js1.get('IsErroredOnProcessing'):
-                        pars1 = js1.get('ParsedResults') or []
-                        raw1 = (pars1[0].get('ParsedText') or '') if pars1 else ''
-                        plate_text = extract_plate(raw1)
-            except Exception:
-                pass
-
-        # 4) Write to RTDB (only per-transaction fields; no writes to users/lastPlate)
-        db = rtdb()
+        from . import gate  # camera/OCR stack (requests, NumPy, Pillow) loads on first use
+        queue = jobs.get_queue('gate')
         try:
-            if plate_text:
-                db.reference(f'/transactions/{tx_id}').update({'plateNumber': plate_text, 'plateImageUrl': secure_url})
-            else:
-                db.reference(f'/transactions/{tx_id}').update({'plateImageUrl': secure_url})
-            # Retry once after a short delay in case DevKit overwrote the node
-            try:
-                import time as _time
-                _time.sleep(1.2)
-                if plate_text:
-                    db.reference(f'/transactions/{tx_id}').update({'plateNumber': plate_text, 'plateImageUrl': secure_url})
-                else:
-                    db.reference(f'/transactions/{tx_id}').update({'plateImageUrl': secure_url})
-            except Exception:
-                pass
-        except Exception as e:
-            return JsonResponse({'ok': False, 'error': f'RTDB write failed: {e}', 'url': secure_url})
+            job_id = queue.submit(gate.run_entrance, uid, tx_id, cam_url)
+        except jobs.QueueFull as e:
+            return JsonResponse({'ok': False, 'error': str(e)}, status=503)
+
+        if payload.get('wait'):
+            state = queue.wait(job_id) or {}
+            result = state.get('result') or {'ok': False, 'error': state.get('error') or 'job failed'}
+            return JsonResponse({**result, 'jobId': job_id})
+        return JsonResponse({'ok': True, 'jobId': job_id, 'txId': tx_id, 'status': 'queued'}, status=202)
+    except Exception as e:
+        return JsonResponse({ 'ok': False, 'error': str(e) })
 
-        # 4b) Establish closing deadline + notification schedule (Mall hours: 10:00–21:00 Asia/Manila)
-        try:
-            if uid:
-                try:
-                    tz_ph = ZoneInfo("Asia/Manila") if ZoneInfo else timezone(timedelta(hours=8))
-                except Exception:
-                    tz_ph = timezone(timedelta(hours=8))
-                now_ph = datetime.now(tz_ph)
-                closing_ph = now_ph.replace(hour=21, minute=0, second=0, microsecond=0)
-                if now_ph >= closing_ph:
-                    closing_ph = closing_ph + timedelta(days=1)
-                deadline_ms = int(closing_ph.timestamp() * 1000)
-                now_ms = int(now_ph.timestamp() * 1000)
-                thresholds = {}
-                for minutes in (60, 30, 15, 5):
-                    notify_at = deadline_ms - minutes * 60 * 1000
-                    status = 'scheduled'
-                    if notify_at <= now_ms:
-                        status = 'due'
-                    thresholds[str(minutes)] = {
-                        'notifyAt': notify_at,
-                        'status': status,
-                    }
-                closing_info = {
-                    'txId': tx_id,
-                    'deadline': deadline_ms,
-                    'deadlineIso': closing_ph.isoformat(),
-                    'setAt': now_ms,
-                    'thresholds': thresholds,
-                    'timezone': 'Asia/Manila',
-                    'mallOpenHour': 10,
-                    'mallCloseHour': 21,
-                }
-                try:
-                    db.reference(f'/transactions/{tx_id}').update({'closingDeadline': deadline_ms})
-                except Exception:
-                    pass
-                try:
-                    db.reference(f'/users/{uid}/closingInfo').set(closing_info)
-                except Exception:
-                    pass
-        except Exception:
-            # Silent failure – closing info is advisory and should not break the flow
-            pass
+def entrance_snapshot_status(request, job_id):
+    """GET → { id, status: queued|running|done|failed, stage, result?, error? }."""
+    state = jobs.get_queue('gate').status(job_id)
+    if state is None:
+        return JsonResponse({'ok': False, 'error': 'unknown job'}, status=404)
+    return JsonResponse({'ok': True, **state})
 
-        # Read back current tx snapshot for debugging visibility
-        try:
-            tx_snapshot = db.reference(f'/transactions/{tx_id}').get() or {}
-        except Exception:
-            tx_snapshot = {}
-        return JsonResponse({ 'ok': True, 'url': secure_url, 'plate': plate_text, 'txId': tx_id, 'tx': tx_snapshot })
+@login_required
+@admin_only_required
+def outbound_stats(request):
+    """Per-host latency percentiles (ms), request and error counts for camera/upload/OCR calls."""
+    from core import outbound
+    return JsonResponse({'ok': True, 'hosts': outbound.client().stats(), 'gateQueue': jobs.get_queue('gate').stats()})
+
+@login_required
+@admin_required
+def fee_quotes(request):
+    """Current fee for every ONGOING transaction under the active FeeConfig."""
+    try:
+        from . import fees
+        return JsonResponse({'ok': True, 'config': fees.active_config(), 'quotes': fees.quote_open_transactions()})
     except Exception as e:
-        return JsonResponse({ 'ok': False, 'error': str(e) })
+        return JsonResponse({'ok': False, 'error': str(e)}, status=500)
+
+# ───────────────────────────────────────────────────────────────
+#  Slot allocation (see dashboard.slots)
+# ───────────────────────────────────────────────────────────────
+@csrf_exempt
+def slot_next(request):
+    """GET ?type=Car|Motorcycle|PWD[&floor=N] → the slot assign would pick (not reserved)."""
+    try:
+        floor = request.GET.get('floor')
+        idx = slots.index()
+        idx.refresh()
+        pick = idx.peek(slots.normalize_type(request.GET.get('type')), int(floor) if floor else None)
+        return JsonResponse({'ok': True, 'slot': pick, 'free': idx.summary()})
+    except slots.SlotError as e:
+        return JsonResponse({'ok': False, 'error': str(e)}, status=e.status)
+    except Exception as e:
+        return JsonResponse({'ok': False, 'error': str(e)}, status=500)
+
+
+@csrf_exempt
+@login_required
+@admin_required
+def slot_assign(request):
+    """POST { txId, type?, floor?, slot?, uid? } → assigns the next free slot (or the named
+    one) and writes the occupancy record and the transaction's slot in one update.
+    """
+    if request.method != 'POST':
+        return JsonResponse({"error": "POST required"}, status=405)
+    try:
+        import json
+        payload = json.loads(request.body or '{}')
+        floor = payload.get('floor')
+        record = slots.assign(
+            (payload.get('txId') or '').strip(),
+            type_=payload.get('type'),
+            floor=int(floor) if floor not in (None, '') else None,
+            slot=(payload.get('slot') or None),
+            uid=(payload.get('uid') or None),
+        )
+        return JsonResponse({'ok': True, 'occupied': record})
+    except slots.SlotError as e:
+        return JsonResponse({'ok': False, 'error': str(e)}, status=e.status)
+    except Exception as e:
+        return JsonResponse({'ok': False, 'error': str(e)}, status=500)
+
+
+@csrf_exempt
+@admin_required
+def slot_release(request):
+    """POST { slot } or { key } → marks the slot FREE."""
+    if request.method != 'POST':
+        return JsonResponse({"error": "POST required"}, status=405)
+    try:
+        import json
+        payload = json.loads(request.body or '{}')
+        key = slots.release(name=payload.get('slot'), key=payload.get('key'))
+        return JsonResponse({'ok': True, 'key': key})
+    except slots.SlotError as e:
+        return JsonResponse({'ok': False, 'error': str(e)}, status=e.status)
+    except Exception as e:
+        return JsonResponse({'ok': False, 'error': str(e)}, status=500)
+
+
+@login_required
+@admin_required
+def slot_candidates(request):
+    """ONGOING transactions without a slot, for the monitor's assign dialog."""
+    try:
+        txs = query_range('/transactions', 'status', 'ONGOING', 'ONGOING')
+        pending = [(tx_id, tx) for tx_id, tx in txs.items() if isinstance(tx, dict) and not tx.get('slot')]
+        names = {}
+        for uid in {str(tx.get('uid') or '') for _, tx in pending} - {''}:
+            names[uid] = rtdb().reference(f'/users/{uid}/displayName').get() or ''
+        return JsonResponse({'ok': True, 'candidates': [
+            {
+                'uid': tx.get('uid') or '',
+                'txId': tx_id,
+                'name': names.get(str(tx.get('uid') or '')) or tx.get('uid') or tx_id,
+                'vehicleType': tx.get('vehicleType') or '',
+            }
+            for tx_id, tx in pending
+        ]})
+    except Exception as e:
+        return JsonResponse({'ok': False, 'error': str(e)}, status=500)
+
+# ───────────────────────────────────────────────────────────────
+#  Live occupancy push (see dashboard.feeds)
+# ───────────────────────────────────────────────────────────────
+@login_required
+@admin_required
+def occupancy_stream(request):
+    """SSE stream of /configurations/layout/occupied: a snapshot, then per-key deltas.
+
+    Resumes from Last-Event-ID (sent by EventSource on reconnect) or ?since=.
+    Under ASGI the stream stays open; under WSGI it sends the catch-up and
+    closes so the browser reconnects instead of holding a worker.
+    """
+    from django.core.handlers.asgi import ASGIRequest
+    from django.http import StreamingHttpResponse
+
+    try:
+        f = feeds.feed('occupancy')
+    except Exception as e:
+        return JsonResponse({'ok': False, 'error': str(e)}, status=503)
+    cursor = request.headers.get('Last-Event-ID') or request.GET.get('since') or ''
+    events = feeds.sse_events(f, cursor) if isinstance(request, ASGIRequest) else feeds.sse_once(f, cursor)
+    response = StreamingHttpResponse(events, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+def occupancy_since(request):
+    """GET ?since=<v> → { v, s?: {slotKey: "O"|"R"|"F"|null}, full? } for gate displays
+    and kiosks. Only slots changed since v are listed (null = removed); an unknown
+    or too-old v gets every slot with full=1. Carries no user data, like slot_next.
+    """
+    import json
+    from django.http import HttpResponse, HttpResponseNotModified
+
+    try:
+        f = feeds.feed('occupancy')
+    except Exception as e:
+        return JsonResponse({'ok': False, 'error': str(e)}, status=503)
+    etag = f'"{f.cursor()}"'
+    if request.headers.get('If-None-Match') == etag:
+        return HttpResponseNotModified(headers={'ETag': etag})
+    body = feeds.poll(f, request.GET.get('since') or '')
+    response = HttpResponse(json.dumps(body, separators=(',', ':')), content_type='application/json')
+    response['ETag'] = f'"{body["v"]}"'
+    response['Cache-Control'] = 'no-cache'
+    return response
+
+# ───────────────────────────────────────────────────────────────
+#  Database page: keyset-paginated listings (see dashboard.directory)
+# ───────────────────────────────────────────────────────────────
+def _flag(value):
+    """'1'/'true'/'yes' → True, '0'/'false'/'no' → False, missing/'' → None."""
+    if value in (None, ''):
+        return None
+    return str(value).strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+@login_required
+@admin_required
+def db_users(request):
+    """GET ?status=ONGOING|PAID|NONE&pwd=1&banned=1&cursor=&limit= → { ok, rows, next }.
+    Pass next back as cursor for the following page; next is null on the last one.
+    """
+    try:
+        page = directory.list_users(
+            status=request.GET.get('status') or None,
+            pwd=_flag(request.GET.get('pwd')),
+            banned=bool(_flag(request.GET.get('banned'))),
+            cursor=request.GET.get('cursor') or None,
+            limit=request.GET.get('limit') or directory.PAGE_SIZE,
+        )
+    except ValueError as e:
+        return JsonResponse({'ok': False, 'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'ok': False, 'error': str(e)}, status=500)
+    return JsonResponse({'ok': True, **page})
+
+
+@login_required
+@admin_required
+def db_transactions(request):
+    """GET ?status=&cursor=&limit= → { ok, rows, next }, newest entry first."""
+    try:
+        page = directory.list_transactions(
+            status=request.GET.get('status') or None,
+            cursor=request.GET.get('cursor') or None,
+            limit=request.GET.get('limit') or directory.PAGE_SIZE,
+        )
+    except ValueError as e:
+        return JsonResponse({'ok': False, 'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'ok': False, 'error': str(e)}, status=500)
+    return JsonResponse({'ok': True, **page})
+
+
+@login_required
+@admin_required
+def db_occupants(request):
+    """GET → { ok, rows } for the OCCUPIED slots, joined with only their users and transactions."""
+    try:
+        mirror_subscribe()
+        rows = directory.occupants(mirror_read('/configurations/layout/occupied') or {})
+    except Exception as e:
+        return JsonResponse({'ok': False, 'error': str(e)}, status=500)
+    return JsonResponse({'ok': True, 'rows': rows})
+
+# ───────────────────────────────────────────────────────────────
+#  Search (see dashboard.search)
+# ───────────────────────────────────────────────────────────────
+@login_required
+@admin_required
+def search_records(request):
+    """GET ?q=&kind=users|transactions&limit= → { ok, q, users?, transactions?, tookMs }.
+    Matches name, email and contact number prefixes and substrings, and plate
+    numbers with O/0 and I/1 treated alike. Without kind, both are searched.
+    """
+    import time
+    q = (request.GET.get('q') or '').strip()
+    kind = request.GET.get('kind') or None
+    try:
+        started = time.perf_counter()
+        results = search.search(
+            q,
+            kinds=(kind,) if kind else tuple(search.SOURCES),
+            limit=request.GET.get('limit') or search.LIMIT,
+        )
+        took_ms = round((time.perf_counter() - started) * 1000, 2)
+    except ValueError as e:
+        return JsonResponse({'ok': False, 'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'ok': False, 'error': str(e)}, status=500)
+    return JsonResponse({'ok': True, 'q': q, **results, 'tookMs': took_ms})
 
 # ───────────────────────────────────────────────────────────────
 #  Surveillance (admin only)
@@ -1184,9 +1189,25 @@ def surveillance(request):
     default_stream_url = request.GET.get('url') or "http://192.168.1.150:81/stream"
     return render(request, "surveillance.html", {"default_stream_url": default_stream_url})
 
+
 # ───────────────────────────────────────────────────────────────
 #  Mock payment flow (for testing mobile app without real GCash)
 # ───────────────────────────────────────────────────────────────
+def _mockpay_quote(tx_id, now_ms=None, tx=None):
+    """Server-side fee for tx_id under the active FeeConfig, or None."""
+    if not tx_id:
+        return None
+    try:
+        from . import fees
+        if fees.active_config() is None:
+            return None
+        if tx is None:
+            tx = rtdb().reference(f'/transactions/{tx_id}').get()
+        return fees.quote(tx, now_ms) if isinstance(tx, dict) else None
+    except Exception:
+        return None
+
+
 @csrf_exempt
 def mockpay_start(request):
     """GET /mockpay/start?txId=&amount=
@@ -1194,6 +1215,11 @@ def mockpay_start(request):
     """
     tx_id = request.GET.get('txId') or ''
     amount = request.GET.get('amount') or '0'
+    # Price the stay server-side when a tariff is configured; the query
+    # amount is only a fallback for setups without a FeeConfig.
+    quoted = _mockpay_quote(tx_id)
+    if quoted is not None:
+        amount = f"{quoted:.2f}"
     try:
         amt = float(amount)
         amount_disp = f"₱{amt:,.2f}"
@@ -1269,20 +1295,38 @@ def mockpay_complete(request):
         tx_id = request.POST.get('txId') or ''
         amount = request.POST.get('amount') or '0'
         db = rtdb()
+        now_ms = int(datetime.utcnow().timestamp()*1000)
+        tx = (db.reference(f'/transactions/{tx_id}').get() or {}) if tx_id else {}
+        # Never trust the posted amount when the fee can be computed here
+        quoted = _mockpay_quote(tx_id, now_ms, tx)
+        if quoted is not None:
+            amount = quoted
         if tx_id:
-            db.reference(f'/payments/{tx_id}').set({
-                'txId': tx_id,
-                'amount': float(amount or 0),
-                'method': 'MOCKPAY',
-                'referenceNumber': 'MOCK-' + tx_id[:6],
-                'status': 'PAID',
-                'createdAt': datetime.utcnow().isoformat() + 'Z'
-            })
-            db.reference(f'/transactions/{tx_id}').update({
+            tx_fields = {
                 'status': 'COMPLETED',
                 'amountPaid': float(amount or 0),
-                'timeOut': int(datetime.utcnow().timestamp()*1000)
-            })
+                'timeOut': now_ms
+            }
+            # Payment record and transaction close-out land together or not at all
+            with WriteBatch() as batch:
+                batch.set(f'/payments/{tx_id}', {
+                    'txId': tx_id,
+                    'amount': float(amount or 0),
+                    'method': 'MOCKPAY',
+                    'referenceNumber': 'MOCK-' + tx_id[:6],
+                    'status': 'PAID',
+                    'createdAt': datetime.utcnow().isoformat() + 'Z'
+                })
+                batch.update(f'/transactions/{tx_id}', tx_fields)
+                # Paid: no more closing-time notifications for this stay
+                if isinstance(tx, dict) and tx.get('uid'):
+                    closing.stage_cancel(batch, str(tx['uid']))
+                    directory.stage_tx_status(batch, str(tx['uid']), 'PAID', tx_id, now_ms)
+            # Fold the completed transaction into the analytics rollups once
+            try:
+                rollups.record_completion(tx_id, {**(tx if isinstance(tx, dict) else {}), **tx_fields})
+            except Exception:
+                pass
         html = """
         <!doctype html>
         <html lang='en'>